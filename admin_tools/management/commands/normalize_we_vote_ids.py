@@ -0,0 +1,55 @@
+# admin_tools/management/commands/normalize_we_vote_ids.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models.functions import Lower
+from follow.models import FollowIssue, FollowOrganization, SuggestedIssueToFollow, SuggestedOrganizationToFollow
+from friend.models import CurrentFriend, FriendInvitationEmailLink, FriendInvitationTwitterLink, \
+    FriendInvitationVoterLink, SuggestedFriend
+from position.models import clear_public_position_index_for_all_elections, PositionEntered, PositionForFriends
+from voter_guide.models import VoterGuide, VoterGuidePossibility
+from wevote_functions.functions import canonicalize_we_vote_id
+
+# The tables we look up with exact we_vote_id matches. Their save() functions keep new entries in lower case.
+MODELS_WITH_CANONICAL_WE_VOTE_IDS = [
+    CurrentFriend, FollowIssue, FollowOrganization, FriendInvitationEmailLink, FriendInvitationTwitterLink,
+    FriendInvitationVoterLink, PositionEntered, PositionForFriends, SuggestedFriend, SuggestedIssueToFollow,
+    SuggestedOrganizationToFollow, VoterGuide, VoterGuidePossibility,
+]
+
+
+class Command(BaseCommand):
+    help = 'Stores every we_vote_id in the position, friend, follow and voter guide tables in lower case, ' \
+           'so exact lookups find entries saved before we started normalizing'
+
+    def normalize_we_vote_id_field(self, model, field_name):
+        # Upper case letters are fixed in the database with one UPDATE
+        upper_case_filter = {field_name + '__regex': '[A-Z]'}
+        updated_count = model.objects.filter(**upper_case_filter).update(**{field_name: Lower(field_name)})
+
+        # Leading or trailing spaces are rare, so we fix those one entry at a time
+        white_space_filter = {field_name + '__regex': r'^\s|\s$'}
+        for entry_id, we_vote_id in model.objects.filter(**white_space_filter).values_list('id', field_name):
+            model.objects.filter(id=entry_id).update(**{field_name: canonicalize_we_vote_id(we_vote_id)})
+            updated_count += 1
+        return updated_count
+
+    def handle(self, *args, **options):
+        for model in MODELS_WITH_CANONICAL_WE_VOTE_IDS:
+            for field in model._meta.fields:
+                if not field.name.endswith('we_vote_id'):
+                    continue
+                try:
+                    with transaction.atomic():
+                        updated_count = self.normalize_we_vote_id_field(model, field.attname)
+                    self.stdout.write('{model}.{field}: {count} entries normalized'.format(
+                        model=model.__name__, field=field.name, count=updated_count))
+                    if model is PositionEntered and updated_count:
+                        # QuerySet.update doesn't send the signals that keep the cached position index current
+                        clear_public_position_index_for_all_elections()
+                except Exception as e:
+                    # For example, two entries whose unique we_vote_id only differs by case
+                    self.stderr.write('{model}.{field}: could not be normalized: {error}'.format(
+                        model=model.__name__, field=field.name, error=e))
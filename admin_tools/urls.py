@@ -8,6 +8,8 @@ from . import views
 
 urlpatterns = [
     url(r'^$', views.admin_home_view, name='admin_home',),
+    url(r'^api_profile/$', views.api_profile_view, name='api_profile'),
+    url(r'^api_profile_json/$', views.api_profile_json_view, name='api_profile_json'),
     url(r'^data_cleanup/$', views.data_cleanup_view, name='data_cleanup'),
     url(r'^data_cleanup_organization_analysis/$',
         views.data_cleanup_organization_analysis_view, name='data_cleanup_organization_analysis'),
@@ -2,6 +2,7 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+from apis_v1.middleware import clear_api_profile_statistics, fetch_api_profile_statistics
 from config.base import get_environment_variable, LOGIN_URL
 from ballot.models import BallotReturned, VoterBallotSaved
 from candidate.models import CandidateCampaign, CandidateCampaignManager
@@ -12,12 +13,14 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.messages import get_messages
 from django.core.urlresolvers import reverse
 from django.db.models import Count, Q
-from django.http import HttpResponseRedirect
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseRedirect
 from django.shortcuts import render
 from election.models import Election
 from election.controllers import elections_import_from_sample_file
 from email_outbound.models import EmailAddress
 from follow.models import FollowOrganizationList
+import json
 from friend.models import CurrentFriend, FriendManager, SuggestedFriend
 from import_export_facebook.models import FacebookLinkToVoter, FacebookManager
 from import_export_google_civic.models import GoogleCivicApiCounterManager
@@ -1767,6 +1770,41 @@ def redirect_to_sign_in_page(request, authority_required={}):
     return HttpResponseRedirect(LOGIN_URL + next_url_variable)
 
 
+@login_required
+def api_profile_view(request):
+    authority_required = {'admin'}  # admin, verified_volunteer
+    if not voter_has_authority(request, authority_required):
+        return redirect_to_sign_in_page(request, authority_required)
+
+    if positive_value_exists(request.GET.get('clear_statistics', False)):
+        clear_api_profile_statistics()
+        messages.add_message(request, messages.INFO, 'API profile statistics cleared for this server process.')
+        return HttpResponseRedirect(reverse('admin_tools:api_profile', args=()))
+
+    template_values = {
+        'api_profile_list':         fetch_api_profile_statistics(),
+        'api_profiling_enabled':    settings.API_PROFILING_ENABLED,
+        'slow_request_milliseconds':    settings.API_PROFILING_SLOW_REQUEST_MILLISECONDS,
+    }
+    return render(request, 'admin_tools/api_profile.html', template_values)
+
+
+@login_required
+def api_profile_json_view(request):
+    authority_required = {'admin'}  # admin, verified_volunteer
+    if not voter_has_authority(request, authority_required):
+        return redirect_to_sign_in_page(request, authority_required)
+
+    json_data = {
+        'success':                  True,
+        'status':                   "API_PROFILE_STATISTICS_RETRIEVED ",
+        'api_profiling_enabled':    settings.API_PROFILING_ENABLED,
+        'slow_request_milliseconds':    settings.API_PROFILING_SLOW_REQUEST_MILLISECONDS,
+        'api_profile_list':         fetch_api_profile_statistics(),
+    }
+    return HttpResponse(json.dumps(json_data), content_type='application/json')
+
+
 @login_required
 def statistics_summary_view(request):
     authority_required = {'verified_volunteer'}  # admin, verified_volunteer
@@ -5,6 +5,7 @@
 from .models import AnalyticsAction, AnalyticsCountManager, AnalyticsManager, \
     ACTIONS_THAT_REQUIRE_ORGANIZATION_IDS
 from candidate.models import CandidateCampaignManager
+from collections import OrderedDict
 from config.base import get_environment_variable
 from datetime import timedelta
 from django.db.models import Q
@@ -13,12 +14,15 @@ from measure.models import ContestMeasureManager
 from position.models import PositionMetricsManager
 from voter.models import VoterManager, VoterMetricsManager
 import wevote_functions.admin
-from wevote_functions.functions import convert_to_int, positive_value_exists
+from wevote_functions.functions import canonicalize_we_vote_id, convert_to_int, positive_value_exists
 
 logger = wevote_functions.admin.get_logger(__name__)
 
 WE_VOTE_API_KEY = get_environment_variable("WE_VOTE_API_KEY")
 
+# How many voters calculate_sitewide_voter_metrics_for_voter_list handles at a time
+SITEWIDE_VOTER_METRICS_CHUNK_SIZE = 500
+
 
 def augment_voter_analytics_action_entries_without_election_id(date_as_integer):
     """
@@ -425,106 +429,127 @@ def calculate_organization_daily_metrics(organization_we_vote_id, limit_to_one_d
 
 
 def calculate_sitewide_daily_metrics(limit_to_one_date_as_integer):
+    limit_to_one_date_as_integer = convert_to_int(limit_to_one_date_as_integer)
+    list_results = calculate_sitewide_daily_metrics_for_dates([limit_to_one_date_as_integer])
+    results = {
+        'status':                           list_results['status'],
+        'success':                          list_results['success'],
+        'sitewide_daily_metrics_values':    list_results['sitewide_daily_metrics_values_list'][0]
+        if list_results['success'] else {},
+    }
+    return results
+
+
+def calculate_sitewide_daily_metrics_for_dates(date_as_integer_list):
+    """
+    Calculate the sitewide daily metrics for many days at once. Instead of about ten count queries per day, each over
+    the whole AnalyticsAction table, we run a few GROUP BY queries for the whole span: one for the counts within
+    each day, and one each for the day every visitor and voter guide was first seen. The all time counts for a day are
+    the sum of the first seen counts through that day.
+    :param date_as_integer_list:
+    :return: sitewide_daily_metrics_values_list, in the order of date_as_integer_list
+    """
     status = ""
-    success = False
+    date_as_integer_list = [convert_to_int(date_as_integer) for date_as_integer in date_as_integer_list]
+    if not date_as_integer_list:
+        results = {
+            'status':                               "NO_DATES_TO_CALCULATE ",
+            'success':                              True,
+            'sitewide_daily_metrics_values_list':   [],
+        }
+        return results
 
     analytics_count_manager = AnalyticsCountManager()
     follow_metrics_manager = FollowMetricsManager()
+    date_as_integer_start = min(date_as_integer_list)
+    date_as_integer_end = max(date_as_integer_list)
 
-    google_civic_election_id_zero = 0
-    organization_we_vote_id_empty = ""
-    voter_we_vote_id_empty = ""
-    limit_to_authenticated = True
-    date_as_integer_zero = 0
-    limit_to_one_date_as_integer = convert_to_int(limit_to_one_date_as_integer)
-    count_through_this_date_as_integer = limit_to_one_date_as_integer
-
-    visitors_total = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id_empty, date_as_integer_zero,
-        count_through_this_date_as_integer)
-    visitors_today = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id_empty, limit_to_one_date_as_integer)
-    new_visitors_today = None
-    voter_guide_entrants_today = None
-    welcome_page_entrants_today = None
-    friend_entrants_today = None
-    authenticated_visitors_total = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id_empty,
-        date_as_integer_zero, count_through_this_date_as_integer, limit_to_authenticated)
-    authenticated_visitors_today = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id_empty,
-        limit_to_one_date_as_integer, date_as_integer_zero, limit_to_authenticated)
-    ballot_views_today = analytics_count_manager.fetch_ballot_views(
-        google_civic_election_id_zero, limit_to_one_date_as_integer)
-    voter_guides_viewed_total = analytics_count_manager.fetch_voter_guides_viewed(
-        google_civic_election_id_zero, date_as_integer_zero, count_through_this_date_as_integer)
-    voter_guides_viewed_today = analytics_count_manager.fetch_voter_guides_viewed(
-        google_civic_election_id_zero, limit_to_one_date_as_integer)
-
-    issues_followed_total = follow_metrics_manager.fetch_issues_followed(
-        voter_we_vote_id_empty, date_as_integer_zero, count_through_this_date_as_integer)
-    issues_followed_today = follow_metrics_manager.fetch_issues_followed(
-        voter_we_vote_id_empty, limit_to_one_date_as_integer)
-
-    organizations_followed_total = None
-    organizations_followed_today = None
-    organizations_auto_followed_total = None
-    organizations_auto_followed_today = None
-    organizations_with_linked_issues = None
-    issues_linked_total = None
-    issues_linked_today = None
-    organizations_signed_in_total = None
-    organizations_with_positions = None
-    organizations_with_new_positions_today = None
-    organization_public_positions = None
-    individuals_with_positions = None
-    individuals_with_public_positions = None
-    individuals_with_friends_only_positions = None
-    friends_only_positions = None
-    entered_full_address = None
+    daily_counts = analytics_count_manager.fetch_sitewide_daily_counts(date_as_integer_start, date_as_integer_end)
+    first_date_counts = analytics_count_manager.fetch_sitewide_first_date_counts(date_as_integer_end)
+    issues_followed_date_counts = follow_metrics_manager.fetch_issues_followed_date_counts(date_as_integer_end)
+    if daily_counts is None or first_date_counts is None or issues_followed_date_counts is None:
+        results = {
+            'status':                               "SITEWIDE_DAILY_METRICS_COUNTS_FAILED ",
+            'success':                              False,
+            'sitewide_daily_metrics_values_list':   [],
+        }
+        return results
 
-    success = True
+    total_counts_by_date = {}
+    date_counts_for_totals = dict(first_date_counts)
+    date_counts_for_totals['issues_followed_total'] = issues_followed_date_counts
+    for total_name, date_counts in date_counts_for_totals.items():
+        total_counts_by_date[total_name] = \
+            fetch_running_totals_for_dates(date_counts, date_as_integer_list)
+
+    sitewide_daily_metrics_values_list = []
+    for date_as_integer in date_as_integer_list:
+        one_date_counts = daily_counts.get(date_as_integer, {})
+        issues_followed_today = issues_followed_date_counts.get(date_as_integer, 0)
+        sitewide_daily_metrics_values = {
+            'date_as_integer':                          date_as_integer,
+            'visitors_total':                           total_counts_by_date['visitors_total'][date_as_integer],
+            'visitors_today':                           one_date_counts.get('visitors_today', 0),
+            'new_visitors_today':                       None,
+            'voter_guide_entrants_today':               None,
+            'welcome_page_entrants_today':              None,
+            'friend_entrants_today':                    None,
+            'authenticated_visitors_total':
+                total_counts_by_date['authenticated_visitors_total'][date_as_integer],
+            'authenticated_visitors_today':             one_date_counts.get('authenticated_visitors_today', 0),
+            'ballot_views_today':                       one_date_counts.get('ballot_views_today', 0),
+            'voter_guides_viewed_total':
+                total_counts_by_date['voter_guides_viewed_total'][date_as_integer],
+            'voter_guides_viewed_today':                one_date_counts.get('voter_guides_viewed_today', 0),
+            'issues_followed_total':                    total_counts_by_date['issues_followed_total'][date_as_integer],
+            'issues_followed_today':                    issues_followed_today,
+            'organizations_followed_total':             None,
+            'organizations_followed_today':             None,
+            'organizations_auto_followed_total':         None,
+            'organizations_auto_followed_today':         None,
+            'organizations_with_linked_issues':         None,
+            'issues_linked_total':                      None,
+            'issues_linked_today':                      None,
+            'organizations_signed_in_total':            None,
+            'organizations_with_positions':             None,
+            'organizations_with_new_positions_today':   None,
+            'organization_public_positions':            None,
+            'individuals_with_positions':               None,
+            'individuals_with_public_positions':        None,
+            'individuals_with_friends_only_positions':  None,
+            'friends_only_positions':                   None,
+            'entered_full_address':                     None,
+        }
+        sitewide_daily_metrics_values_list.append(sitewide_daily_metrics_values)
 
-    sitewide_daily_metrics_values = {
-        'date_as_integer':                          limit_to_one_date_as_integer,
-        'visitors_total':                           visitors_total,
-        'visitors_today':                           visitors_today,
-        'new_visitors_today':                       new_visitors_today,
-        'voter_guide_entrants_today':               voter_guide_entrants_today,
-        'welcome_page_entrants_today':              welcome_page_entrants_today,
-        'friend_entrants_today':                    friend_entrants_today,
-        'authenticated_visitors_total':             authenticated_visitors_total,
-        'authenticated_visitors_today':             authenticated_visitors_today,
-        'ballot_views_today':                       ballot_views_today,
-        'voter_guides_viewed_total':                voter_guides_viewed_total,
-        'voter_guides_viewed_today':                voter_guides_viewed_today,
-        'issues_followed_total':                    issues_followed_total,
-        'issues_followed_today':                    issues_followed_today,
-        'organizations_followed_total':             organizations_followed_total,
-        'organizations_followed_today':             organizations_followed_today,
-        'organizations_auto_followed_total':         organizations_auto_followed_total,
-        'organizations_auto_followed_today':         organizations_auto_followed_today,
-        'organizations_with_linked_issues':         organizations_with_linked_issues,
-        'issues_linked_total':                      issues_linked_total,
-        'issues_linked_today':                      issues_linked_today,
-        'organizations_signed_in_total':            organizations_signed_in_total,
-        'organizations_with_positions':             organizations_with_positions,
-        'organizations_with_new_positions_today':   organizations_with_new_positions_today,
-        'organization_public_positions':            organization_public_positions,
-        'individuals_with_positions':               individuals_with_positions,
-        'individuals_with_public_positions':        individuals_with_public_positions,
-        'individuals_with_friends_only_positions':  individuals_with_friends_only_positions,
-        'friends_only_positions':                   friends_only_positions,
-        'entered_full_address':                     entered_full_address,
-    }
+    status += "SITEWIDE_DAILY_METRICS_CALCULATED "
     results = {
-        'status':                           status,
-        'success':                          success,
-        'sitewide_daily_metrics_values':    sitewide_daily_metrics_values,
+        'status':                               status,
+        'success':                              True,
+        'sitewide_daily_metrics_values_list':   sitewide_daily_metrics_values_list,
     }
     return results
 
 
+def fetch_running_totals_for_dates(date_counts, date_as_integer_list):
+    """
+    :param date_counts: date_as_integer -> count for that day
+    :param date_as_integer_list:
+    :return: date_as_integer -> the sum of the counts for that day and every day before it
+    """
+    running_totals = {}
+    running_total = 0
+    sorted_date_counts = sorted(date_counts.items())
+    date_counts_index = 0
+    for date_as_integer in sorted(set(date_as_integer_list)):
+        while date_counts_index < len(sorted_date_counts) and \
+                sorted_date_counts[date_counts_index][0] <= date_as_integer:
+            running_total += sorted_date_counts[date_counts_index][1]
+            date_counts_index += 1
+        running_totals[date_as_integer] = running_total
+    return running_totals
+
+
 def calculate_sitewide_election_metrics(google_civic_election_id):
     status = ""
     success = False
@@ -665,6 +690,89 @@ def calculate_sitewide_voter_metrics_for_one_voter(voter_we_vote_id):
     return results
 
 
+def calculate_sitewide_voter_metrics_for_voter_list(voter_we_vote_id_list):
+    """
+    calculate_sitewide_voter_metrics_for_one_voter for many voters at once. Instead of about twenty queries per voter,
+    we run one GROUP BY query per table for the whole list, so use lists of a few hundred voters
+    (SITEWIDE_VOTER_METRICS_CHUNK_SIZE).
+    :param voter_we_vote_id_list:
+    :return: sitewide_voter_metrics_values_list, one entry per voter with voter_we_vote_id in lower case
+     (voter_we_vote_ids that only differ in case are the same voter)
+    """
+    voter_we_vote_id_lower_list = []
+    for voter_we_vote_id in voter_we_vote_id_list:
+        if positive_value_exists(voter_we_vote_id):
+            voter_we_vote_id_lower_list.append(voter_we_vote_id.lower())
+    voter_we_vote_id_lower_list = list(OrderedDict.fromkeys(voter_we_vote_id_lower_list))
+    if not voter_we_vote_id_lower_list:
+        results = {
+            'status':                               "NO_VOTERS_TO_CALCULATE ",
+            'success':                              True,
+            'sitewide_voter_metrics_values_list':   [],
+        }
+        return results
+
+    analytics_count_manager = AnalyticsCountManager()
+    follow_metrics_manager = FollowMetricsManager()
+    position_metrics_manager = PositionMetricsManager()
+    voter_metrics_manager = VoterMetricsManager()
+
+    voter_metrics_details = voter_metrics_manager.fetch_voter_metrics_details(voter_we_vote_id_lower_list)
+    voter_action_counts = analytics_count_manager.fetch_voter_action_counts(voter_we_vote_id_lower_list)
+    issues_followed_counts = follow_metrics_manager.fetch_issues_followed_by_voters(voter_we_vote_id_lower_list)
+    voter_position_counts = \
+        position_metrics_manager.fetch_positions_and_comments_entered_by_voters(voter_we_vote_id_lower_list)
+    organizations_followed_counts = None
+    if voter_metrics_details is not None:
+        organizations_followed_counts = follow_metrics_manager.fetch_organizations_followed_by_voters(
+            [one_voter_details['voter_id'] for one_voter_details in voter_metrics_details.values()])
+    if voter_metrics_details is None or voter_action_counts is None or issues_followed_counts is None or \
+            voter_position_counts is None or organizations_followed_counts is None:
+        results = {
+            'status':                               "SITEWIDE_VOTER_METRICS_COUNTS_FAILED ",
+            'success':                              False,
+            'sitewide_voter_metrics_values_list':   [],
+        }
+        return results
+
+    sitewide_voter_metrics_values_list = []
+    for voter_we_vote_id in voter_we_vote_id_lower_list:
+        one_voter_details = voter_metrics_details.get(voter_we_vote_id, {})
+        one_voter_action_counts = voter_action_counts.get(voter_we_vote_id, {})
+        one_voter_position_counts = voter_position_counts.get(canonicalize_we_vote_id(voter_we_vote_id), {})
+        voter_id = one_voter_details.get('voter_id', 0)
+        sitewide_voter_metrics_values = {
+            'voter_we_vote_id':         voter_we_vote_id,
+            'actions_count':            one_voter_action_counts.get('actions_count', 0),
+            'seconds_on_site':          None,
+            'elections_viewed':         None,
+            'voter_guides_viewed':      one_voter_action_counts.get('voter_guides_viewed', 0),
+            'issues_followed':          issues_followed_counts[canonicalize_we_vote_id(voter_we_vote_id)],
+            'organizations_followed':   organizations_followed_counts[voter_id],
+            'ballot_visited':           one_voter_action_counts.get('ballot_visited', 0),
+            'welcome_visited':          one_voter_action_counts.get('welcome_visited', 0),
+            'entered_full_address':     one_voter_details.get('entered_full_address', False),
+            'time_until_sign_in':       None,
+            'positions_entered_friends_only':   one_voter_position_counts.get('positions_entered_friends_only', 0),
+            'positions_entered_public':         one_voter_position_counts.get('positions_entered_public', 0),
+            'comments_entered_friends_only':    one_voter_position_counts.get('comments_entered_friends_only', 0),
+            'comments_entered_public':          one_voter_position_counts.get('comments_entered_public', 0),
+            'signed_in_twitter':        one_voter_details.get('signed_in_twitter', False),
+            'signed_in_facebook':       one_voter_details.get('signed_in_facebook', False),
+            'signed_in_with_email':     one_voter_details.get('signed_in_with_email', False),
+            'days_visited':             one_voter_action_counts.get('days_visited', 0),
+            'last_action_date':         one_voter_action_counts.get('last_action_date'),
+        }
+        sitewide_voter_metrics_values_list.append(sitewide_voter_metrics_values)
+
+    results = {
+        'status':                               "SITEWIDE_VOTER_METRICS_CALCULATED ",
+        'success':                              True,
+        'sitewide_voter_metrics_values_list':   sitewide_voter_metrics_values_list,
+    }
+    return results
+
+
 def move_analytics_info_to_another_voter(from_voter_we_vote_id, to_voter_we_vote_id):
     status = " MOVE_ANALYTICS_ACTION_DATA"
     success = False
@@ -771,18 +879,14 @@ def save_sitewide_daily_metrics(date_as_integer, date_as_integer_end=0):
         date_as_integer_list = date_as_integer_results['date_as_integer_list']
 
     sitewide_daily_metrics_saved_count = 0
-    for one_date_as_integer in date_as_integer_list:
-        results = calculate_sitewide_daily_metrics(one_date_as_integer)
-        status += results['status']
-        if results['success']:
-            sitewide_daily_metrics_values = results['sitewide_daily_metrics_values']
-
-            analytics_manager = AnalyticsManager()
-            update_results = analytics_manager.save_sitewide_daily_metrics_values(sitewide_daily_metrics_values)
-            status += update_results['status']
-            success = update_results['success']
-            if positive_value_exists(update_results['sitewide_daily_metrics_saved']):
-                sitewide_daily_metrics_saved_count += 1
+    results = calculate_sitewide_daily_metrics_for_dates(date_as_integer_list)
+    status += results['status']
+    if results['success']:
+        update_results = analytics_manager.save_sitewide_daily_metrics_values_list(
+            results['sitewide_daily_metrics_values_list'])
+        status += update_results['status']
+        success = update_results['success']
+        sitewide_daily_metrics_saved_count = update_results['sitewide_daily_metrics_saved_count']
 
     results = {
         'status':                           status,
@@ -823,20 +927,25 @@ def save_sitewide_voter_metrics(look_for_changes_since_this_date_as_integer):
     voter_list_results = analytics_manager.retrieve_voter_we_vote_id_list_with_changes_since(
         look_for_changes_since_this_date_as_integer)
     if voter_list_results['voter_we_vote_id_list_found']:
-        voter_we_vote_id_list = voter_list_results['voter_we_vote_id_list']
-        for voter_we_vote_id in voter_we_vote_id_list:
-            results = calculate_sitewide_voter_metrics_for_one_voter(voter_we_vote_id)
-            status += results['status']
-            if results['success']:
-                sitewide_voter_metrics_values = results['sitewide_voter_metrics_values']
-
-                analytics_manager = AnalyticsManager()
-                update_results = analytics_manager.save_sitewide_voter_metrics_values_for_one_voter(
-                    sitewide_voter_metrics_values)
+        success = True
+        # The same voter can be stored in more than one case
+        voter_we_vote_id_list = list(OrderedDict.fromkeys(
+            voter_we_vote_id.lower() for voter_we_vote_id in voter_list_results['voter_we_vote_id_list']))
+        for chunk_start in range(0, len(voter_we_vote_id_list), SITEWIDE_VOTER_METRICS_CHUNK_SIZE):
+            results = calculate_sitewide_voter_metrics_for_voter_list(
+                voter_we_vote_id_list[chunk_start:chunk_start + SITEWIDE_VOTER_METRICS_CHUNK_SIZE])
+            if results['status'] not in status:
+                status += results['status']
+            if not results['success']:
+                success = False
+                continue
+            update_results = analytics_manager.save_sitewide_voter_metrics_values_list(
+                results['sitewide_voter_metrics_values_list'])
+            if update_results['status'] not in status:
                 status += update_results['status']
-                success = update_results['success']
-                if success:
-                    sitewide_voter_metrics_updated += 1
+            if not update_results['success']:
+                success = False
+            sitewide_voter_metrics_updated += update_results['sitewide_voter_metrics_saved_count']
 
     results = {
         'status':   status,
@@ -0,0 +1,117 @@
+# analytics/management/commands/benchmark_sitewide_voter_metrics.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from analytics.controllers import calculate_sitewide_voter_metrics_for_one_voter, \
+    calculate_sitewide_voter_metrics_for_voter_list, SITEWIDE_VOTER_METRICS_CHUNK_SIZE
+from analytics.models import ACTION_BALLOT_VISIT, ACTION_VOTER_GUIDE_VISIT, ACTION_WELCOME_VISIT, AnalyticsAction, \
+    AnalyticsManager
+from collections import OrderedDict
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+import random
+import time
+
+SYNTHETIC_ACTION_CONSTANT_LIST = [ACTION_VOTER_GUIDE_VISIT, ACTION_VOTER_GUIDE_VISIT, ACTION_BALLOT_VISIT,
+                                  ACTION_WELCOME_VISIT]
+SYNTHETIC_DATE_AS_INTEGER_LIST = [20170901 + day for day in range(30)]
+SYNTHETIC_ORGANIZATION_COUNT = 50
+
+
+class Command(BaseCommand):
+    help = 'Times calculating SitewideVoterMetrics one voter at a time against calculating it a chunk of voters at ' \
+           'a time. By default uses the voters with actions since a date, and only reads, so nothing is saved. ' \
+           'With --synthetic N, creates AnalyticsActions for N made up voters instead, and rolls them back when ' \
+           'done, so it can be run on a fresh or developer database. ' \
+           'analytics/tests.py checks that both give the same metrics.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=int, default=0, help='date_as_integer, like 20170901')
+        parser.add_argument('--voters', type=int, default=1000)
+        parser.add_argument('--chunk-size', type=int, default=SITEWIDE_VOTER_METRICS_CHUNK_SIZE)
+        parser.add_argument('--synthetic', type=int, default=0,
+                            help='Number of made up voters to create AnalyticsActions for, instead of using --since')
+        parser.add_argument('--actions-per-voter', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0,
+                            help='The same seed creates the same synthetic AnalyticsActions')
+
+    def handle(self, *args, **options):
+        if options['synthetic'] > 0:
+            # Nothing created here is kept: the analytics transaction is always rolled back
+            with transaction.atomic(using='analytics'):
+                voter_we_vote_id_list = self.create_synthetic_analytics_actions(
+                    options['synthetic'], options['actions_per_voter'], options['seed'])
+                try:
+                    self.time_sitewide_voter_metrics(voter_we_vote_id_list, options['chunk_size'])
+                finally:
+                    transaction.set_rollback(True, using='analytics')
+            return
+
+        analytics_manager = AnalyticsManager()
+        voter_list_results = analytics_manager.retrieve_voter_we_vote_id_list_with_changes_since(options['since'])
+        if not voter_list_results['voter_we_vote_id_list_found']:
+            raise CommandError('Could not retrieve the voters with actions since {since}'.format(
+                since=options['since']))
+        # The same voter can be stored in more than one case
+        voter_we_vote_id_list = list(OrderedDict.fromkeys(
+            voter_we_vote_id.lower() for voter_we_vote_id in voter_list_results['voter_we_vote_id_list']))
+        voter_we_vote_id_list = voter_we_vote_id_list[:options['voters']]
+        if not voter_we_vote_id_list:
+            raise CommandError('No voters with actions since {since}'.format(since=options['since']))
+
+        self.time_sitewide_voter_metrics(voter_we_vote_id_list, options['chunk_size'])
+
+    def create_synthetic_analytics_actions(self, voter_count, actions_per_voter, seed):
+        """
+        Create actions_per_voter AnalyticsActions for each of voter_count made up voters. Must be called inside a
+        transaction on 'analytics' that is rolled back.
+        :param voter_count:
+        :param actions_per_voter:
+        :param seed:
+        :return: voter_we_vote_id_list
+        """
+        random_generator = random.Random(seed)
+        voter_we_vote_id_list = []
+        action_list = []
+        for voter_number in range(1, voter_count + 1):
+            voter_we_vote_id = "wv00synthvoter{voter_number}".format(voter_number=voter_number)
+            voter_we_vote_id_list.append(voter_we_vote_id)
+            is_signed_in = random_generator.random() < 0.25
+            for date_as_integer in sorted(random_generator.choice(SYNTHETIC_DATE_AS_INTEGER_LIST)
+                                          for _ in range(actions_per_voter)):
+                action_constant = random_generator.choice(SYNTHETIC_ACTION_CONSTANT_LIST)
+                organization_we_vote_id = ""
+                if action_constant == ACTION_VOTER_GUIDE_VISIT:
+                    organization_we_vote_id = "wv00synthorg{organization_number}".format(
+                        organization_number=random_generator.randint(1, SYNTHETIC_ORGANIZATION_COUNT))
+                action_list.append(AnalyticsAction(
+                    action_constant=action_constant,
+                    date_as_integer=date_as_integer,
+                    voter_we_vote_id=voter_we_vote_id,
+                    is_signed_in=is_signed_in,
+                    organization_we_vote_id=organization_we_vote_id,
+                ))
+        AnalyticsAction.objects.using('analytics').bulk_create(action_list, batch_size=1000)
+        self.stdout.write('Created {actions} synthetic AnalyticsActions (rolled back when done)'.format(
+            actions=len(action_list)))
+        return voter_we_vote_id_list
+
+    def time_sitewide_voter_metrics(self, voter_we_vote_id_list, chunk_size):
+        start_time = time.time()
+        for voter_we_vote_id in voter_we_vote_id_list:
+            calculate_sitewide_voter_metrics_for_one_voter(voter_we_vote_id)
+        one_voter_seconds = time.time() - start_time
+
+        start_time = time.time()
+        for chunk_start in range(0, len(voter_we_vote_id_list), chunk_size):
+            results = calculate_sitewide_voter_metrics_for_voter_list(
+                voter_we_vote_id_list[chunk_start:chunk_start + chunk_size])
+            if not results['success']:
+                raise CommandError(results['status'])
+        voter_list_seconds = time.time() - start_time
+
+        self.stdout.write('{voters} voters'.format(voters=len(voter_we_vote_id_list)))
+        self.stdout.write('One voter at a time: {seconds:.2f} seconds'.format(seconds=one_voter_seconds))
+        self.stdout.write('{chunk_size} voters at a time: {seconds:.2f} seconds ({times:.1f} times faster)'.format(
+            chunk_size=chunk_size, seconds=voter_list_seconds,
+            times=one_voter_seconds / voter_list_seconds if voter_list_seconds else 0))
@@ -2,13 +2,16 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+from collections import Counter
 from django.db import models
-from django.db.models import Q
+from django.db.models import Case, Count, Max, Min, Q, When
+from django.db.models.functions import Lower
 from django.utils.timezone import localtime, now
 from election.models import Election
 from follow.models import FollowOrganizationList
 from organization.models import Organization
 import wevote_functions.admin
+from wevote_functions.bulk_upsert import bulk_upsert
 from wevote_functions.functions import convert_to_int, positive_value_exists
 
 ACTION_VOTER_GUIDE_VISIT = 1
@@ -457,6 +460,55 @@ class AnalyticsCountManager(models.Model):
             pass
         return count_result
 
+    def fetch_voter_action_counts(self, voter_we_vote_id_list):
+        """
+        The counts behind fetch_voter_action_count, fetch_voter_voter_guides_viewed, fetch_voter_ballot_visited,
+        fetch_voter_welcome_visited, fetch_voter_days_visited and fetch_voter_last_action_date, for many voters with
+        one GROUP BY query (and one more for the last action dates). Like those, voter_we_vote_ids that only differ in
+        case are the same voter.
+        :param voter_we_vote_id_list:
+        :return: lower case voter_we_vote_id -> {actions_count, voter_guides_viewed, ballot_visited, welcome_visited,
+         days_visited, last_action_date}, or None if a query failed. Voters without actions are left out.
+        """
+        voter_we_vote_id_lower_list = list(set(voter_we_vote_id.lower() for voter_we_vote_id in voter_we_vote_id_list
+                                               if positive_value_exists(voter_we_vote_id)))
+        if not voter_we_vote_id_lower_list:
+            return {}
+        try:
+            count_query = AnalyticsAction.objects.using('analytics').extra(
+                select={'voter_we_vote_id_lower': "LOWER(voter_we_vote_id)"},
+                where=["LOWER(voter_we_vote_id) IN %s"], params=[tuple(voter_we_vote_id_lower_list)])
+            count_query = count_query.values('voter_we_vote_id_lower').annotate(
+                actions_count=Count('id'),
+                voter_guides_viewed=Count(
+                    Case(When(action_constant=ACTION_VOTER_GUIDE_VISIT, then='organization_we_vote_id')),
+                    distinct=True),
+                # COUNT DISTINCT leaves out NULL, which fetch_voter_voter_guides_viewed counts as one more value
+                voter_guide_visits_without_organization=Count(
+                    Case(When(action_constant=ACTION_VOTER_GUIDE_VISIT, organization_we_vote_id__isnull=True,
+                              then='id'))),
+                ballot_visited=Count(Case(When(action_constant=ACTION_BALLOT_VISIT, then='id'))),
+                welcome_visited=Count(Case(When(action_constant=ACTION_WELCOME_VISIT, then='id'))),
+                days_visited=Count('date_as_integer', distinct=True),
+                last_action_id=Max('id'),
+            ).order_by()
+            voter_action_counts = {}
+            for one_voter_counts in count_query:
+                if one_voter_counts.pop('voter_guide_visits_without_organization'):
+                    one_voter_counts['voter_guides_viewed'] += 1
+                voter_action_counts[one_voter_counts.pop('voter_we_vote_id_lower')] = one_voter_counts
+
+            last_action_id_list = [one_voter_counts['last_action_id']
+                                   for one_voter_counts in voter_action_counts.values()]
+            exact_time_by_id = dict(AnalyticsAction.objects.using('analytics').filter(id__in=last_action_id_list)
+                                    .values_list('id', 'exact_time'))
+            for one_voter_counts in voter_action_counts.values():
+                one_voter_counts['last_action_date'] = exact_time_by_id.get(one_voter_counts.pop('last_action_id'))
+            return voter_action_counts
+        except Exception as e:
+            logger.error("fetch_voter_action_counts: {error}".format(error=e))
+            return None
+
     def fetch_voter_guides_viewed(
             self, google_civic_election_id=0, limit_to_one_date_as_integer=0, count_through_this_date_as_integer=0):
         count_result = 0
@@ -475,6 +527,82 @@ class AnalyticsCountManager(models.Model):
             pass
         return count_result
 
+    def fetch_sitewide_daily_counts(self, date_as_integer_start, date_as_integer_end):
+        """
+        The per day counts behind fetch_visitors, fetch_ballot_views and fetch_voter_guides_viewed, for every day in
+        a range, with one GROUP BY query
+        :param date_as_integer_start:
+        :param date_as_integer_end:
+        :return: date_as_integer -> {visitors_today, authenticated_visitors_today, ballot_views_today,
+         voter_guides_viewed_today}, or None if the query failed
+        """
+        try:
+            count_query = AnalyticsAction.objects.using('analytics').filter(
+                date_as_integer__gte=date_as_integer_start, date_as_integer__lte=date_as_integer_end)
+            count_query = count_query.values('date_as_integer').annotate(
+                visitors_today=Count('voter_we_vote_id', distinct=True),
+                authenticated_visitors_today=Count(
+                    Case(When(is_signed_in=True, then='voter_we_vote_id')), distinct=True),
+                ballot_views_today=Count(
+                    Case(When(action_constant=ACTION_BALLOT_VISIT, then='voter_we_vote_id')), distinct=True),
+                voter_guides_viewed_today=Count(
+                    Case(When(action_constant=ACTION_VOTER_GUIDE_VISIT, then='organization_we_vote_id')),
+                    distinct=True),
+                # COUNT DISTINCT leaves out NULL, which fetch_voter_guides_viewed counts as one more value
+                voter_guide_visits_without_organization=Count(
+                    Case(When(action_constant=ACTION_VOTER_GUIDE_VISIT, organization_we_vote_id__isnull=True,
+                              then='id'))),
+            ).order_by()
+            daily_counts = {}
+            for one_date_counts in count_query:
+                if one_date_counts.pop('voter_guide_visits_without_organization'):
+                    one_date_counts['voter_guides_viewed_today'] += 1
+                daily_counts[one_date_counts.pop('date_as_integer')] = one_date_counts
+            return daily_counts
+        except Exception as e:
+            logger.error("fetch_sitewide_daily_counts: {error}".format(error=e))
+            return None
+
+    def fetch_sitewide_first_date_counts(self, count_through_this_date_as_integer):
+        """
+        How many visitors (and signed in visitors, and voter guides viewed) were seen for the first time on each day.
+        Adding these up through a day gives the all time counts of fetch_visitors and fetch_voter_guides_viewed for
+        that day, for every day at once.
+        :param count_through_this_date_as_integer:
+        :return: {visitors_total, authenticated_visitors_total, voter_guides_viewed_total}, each a Counter of
+         date_as_integer -> how many were first seen that day. None if a query failed.
+        """
+        first_date_counts = {
+            'visitors_total':                   Counter(),
+            'authenticated_visitors_total':     Counter(),
+            'voter_guides_viewed_total':        Counter(),
+        }
+        try:
+            action_query = AnalyticsAction.objects.using('analytics').filter(
+                date_as_integer__lte=count_through_this_date_as_integer)
+            # One row per voter, which only holds two dates
+            first_visit_query = action_query.values('voter_we_vote_id').annotate(
+                first_date=Min('date_as_integer'),
+                first_authenticated_date=Min(Case(When(is_signed_in=True, then='date_as_integer'),
+                                                  output_field=models.PositiveIntegerField())),
+            ).order_by().values_list('first_date', 'first_authenticated_date')
+            for first_date, first_authenticated_date in first_visit_query.iterator():
+                if first_date is not None:
+                    first_date_counts['visitors_total'][first_date] += 1
+                if first_authenticated_date is not None:
+                    first_date_counts['authenticated_visitors_total'][first_authenticated_date] += 1
+
+            first_view_query = action_query.filter(action_constant=ACTION_VOTER_GUIDE_VISIT)\
+                .values('organization_we_vote_id').annotate(first_date=Min('date_as_integer'))\
+                .order_by().values_list('first_date', flat=True)
+            for first_date in first_view_query.iterator():
+                if first_date is not None:
+                    first_date_counts['voter_guides_viewed_total'][first_date] += 1
+            return first_date_counts
+        except Exception as e:
+            logger.error("fetch_sitewide_first_date_counts: {error}".format(error=e))
+            return None
+
 
 class AnalyticsManager(models.Model):
 
@@ -836,6 +964,29 @@ class AnalyticsManager(models.Model):
         }
         return results
 
+    def save_sitewide_daily_metrics_values_list(self, sitewide_daily_metrics_values_list):
+        """
+        Save many days of sitewide daily metrics with bulk upserts, instead of an update_or_create per day
+        :param sitewide_daily_metrics_values_list:
+        :return:
+        """
+        sitewide_daily_metrics_values_list = [
+            sitewide_daily_metrics_values for sitewide_daily_metrics_values in sitewide_daily_metrics_values_list
+            if positive_value_exists(sitewide_daily_metrics_values['date_as_integer'])]
+        upsert_results = bulk_upsert(SitewideDailyMetrics, sitewide_daily_metrics_values_list,
+                                     key_field_names=('date_as_integer',), using='analytics')
+        status = upsert_results['status']
+        if upsert_results['not_processed']:
+            status += 'SITEWIDE_DAILY_METRICS_NOT_SAVED: {not_processed} '.format(
+                not_processed=upsert_results['not_processed'])
+
+        results = {
+            'success':                              not upsert_results['not_processed'],
+            'status':                               status,
+            'sitewide_daily_metrics_saved_count':   upsert_results['saved'] + upsert_results['updated'],
+        }
+        return results
+
     def save_sitewide_election_metrics_values(self, sitewide_election_metrics_values):
         success = False
         status = ""
@@ -888,6 +1039,42 @@ class AnalyticsManager(models.Model):
         }
         return results
 
+    def save_sitewide_voter_metrics_values_list(self, sitewide_voter_metrics_values_list):
+        """
+        Save the sitewide voter metrics of many voters with bulk upserts, instead of an update_or_create per voter
+        :param sitewide_voter_metrics_values_list:
+        :return:
+        """
+        sitewide_voter_metrics_values_list = [
+            sitewide_voter_metrics_values for sitewide_voter_metrics_values in sitewide_voter_metrics_values_list
+            if positive_value_exists(sitewide_voter_metrics_values['voter_we_vote_id'])]
+        status = ""
+        if sitewide_voter_metrics_values_list:
+            # bulk_upsert looks for voter_we_vote_id in lower case, where update_or_create ignored case. So we first
+            #  put any entries for these voters that were saved in another case in lower case.
+            voter_we_vote_id_lower_list = list(set(
+                sitewide_voter_metrics_values['voter_we_vote_id'].lower()
+                for sitewide_voter_metrics_values in sitewide_voter_metrics_values_list))
+            try:
+                SitewideVoterMetrics.objects.using('analytics').extra(
+                    where=["LOWER(voter_we_vote_id) IN %s", "voter_we_vote_id <> LOWER(voter_we_vote_id)"],
+                    params=[tuple(voter_we_vote_id_lower_list)]).update(voter_we_vote_id=Lower('voter_we_vote_id'))
+            except Exception as e:
+                status += 'SITEWIDE_VOTER_METRICS_LOWER_CASE_UPDATE_FAILED {error} '.format(error=e)
+        upsert_results = bulk_upsert(SitewideVoterMetrics, sitewide_voter_metrics_values_list,
+                                     key_field_names=('voter_we_vote_id',), using='analytics')
+        status += upsert_results['status']
+        if upsert_results['not_processed']:
+            status += 'SITEWIDE_VOTER_METRICS_NOT_SAVED: {not_processed} '.format(
+                not_processed=upsert_results['not_processed'])
+
+        results = {
+            'success':                              not upsert_results['not_processed'],
+            'status':                               status,
+            'sitewide_voter_metrics_saved_count':   upsert_results['saved'] + upsert_results['updated'],
+        }
+        return results
+
     def update_first_visit_today_for_all_voters_since_date(self, date_as_integer=0):
         success = False
         status = ""
@@ -0,0 +1,130 @@
+# analytics/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from analytics.controllers import calculate_sitewide_voter_metrics_for_one_voter, \
+    calculate_sitewide_voter_metrics_for_voter_list, fetch_running_totals_for_dates
+from analytics.models import ACTION_BALLOT_VISIT, ACTION_VOTER_GUIDE_VISIT, ACTION_WELCOME_VISIT, AnalyticsAction, \
+    AnalyticsCountManager
+from django.test import SimpleTestCase, TestCase
+
+
+class RunningTotalsTestCase(SimpleTestCase):
+
+    def test_running_totals_for_dates(self):
+        date_counts = {20171001: 2, 20171003: 5, 20171010: 1}
+        running_totals = fetch_running_totals_for_dates(
+            date_counts, [20171003, 20170930, 20171001, 20171002, 20171003, 20171020])
+        self.assertEqual(running_totals, {
+            20170930: 0,
+            20171001: 2,
+            20171002: 2,
+            20171003: 7,
+            # Counts for days we weren't asked about still add up
+            20171020: 8,
+        })
+
+    def test_running_totals_without_counts(self):
+        self.assertEqual(fetch_running_totals_for_dates({}, [20171001]), {20171001: 0})
+        self.assertEqual(fetch_running_totals_for_dates({20171001: 3}, []), {})
+
+
+class SitewideDailyCountsTestCase(TestCase):
+    multi_db = True
+
+    DATE_AS_INTEGER_LIST = [20171001, 20171002, 20171003, 20171004]
+
+    def create_action(self, date_as_integer, voter_we_vote_id, action_constant, organization_we_vote_id='',
+                      is_signed_in=False):
+        AnalyticsAction.objects.using('analytics').create(
+            action_constant=action_constant, date_as_integer=date_as_integer, voter_we_vote_id=voter_we_vote_id,
+            organization_we_vote_id=organization_we_vote_id, is_signed_in=is_signed_in)
+
+    def setUp(self):
+        self.create_action(20171001, "wv01voter1", ACTION_VOTER_GUIDE_VISIT, "wv01org1")
+        self.create_action(20171002, "wv01voter1", ACTION_BALLOT_VISIT, is_signed_in=True)
+        self.create_action(20171002, "wv01voter2", ACTION_VOTER_GUIDE_VISIT, "wv01org2")
+        self.create_action(20171002, "wv01voter2", ACTION_VOTER_GUIDE_VISIT, "wv01org1")
+        self.create_action(20171003, "wv01voter2", ACTION_BALLOT_VISIT)
+        self.create_action(20171003, "wv01voter3", ACTION_WELCOME_VISIT, is_signed_in=True)
+        self.create_action(20171003, "wv01voter3", ACTION_VOTER_GUIDE_VISIT, "wv01org3", is_signed_in=True)
+        self.create_action(20171003, "wv01voter3", ACTION_VOTER_GUIDE_VISIT, None)
+        # After the dates we count
+        self.create_action(20171005, "wv01voter4", ACTION_VOTER_GUIDE_VISIT, "wv01org4")
+
+    def test_daily_counts_match_counts_for_one_date(self):
+        analytics_count_manager = AnalyticsCountManager()
+        daily_counts = analytics_count_manager.fetch_sitewide_daily_counts(
+            min(self.DATE_AS_INTEGER_LIST), max(self.DATE_AS_INTEGER_LIST))
+
+        for date_as_integer in self.DATE_AS_INTEGER_LIST:
+            one_date_counts = daily_counts.get(date_as_integer, {})
+            self.assertEqual(one_date_counts.get('visitors_today', 0), analytics_count_manager.fetch_visitors(
+                limit_to_one_date_as_integer=date_as_integer))
+            self.assertEqual(one_date_counts.get('authenticated_visitors_today', 0),
+                             analytics_count_manager.fetch_visitors(limit_to_one_date_as_integer=date_as_integer,
+                                                                    limit_to_authenticated=True))
+            self.assertEqual(one_date_counts.get('ballot_views_today', 0), analytics_count_manager.fetch_ballot_views(
+                limit_to_one_date_as_integer=date_as_integer))
+            self.assertEqual(one_date_counts.get('voter_guides_viewed_today', 0),
+                             analytics_count_manager.fetch_voter_guides_viewed(
+                                 limit_to_one_date_as_integer=date_as_integer))
+        self.assertEqual(daily_counts[20171002]['voter_guides_viewed_today'], 2)
+
+    def test_first_date_counts_match_counts_through_each_date(self):
+        analytics_count_manager = AnalyticsCountManager()
+        first_date_counts = analytics_count_manager.fetch_sitewide_first_date_counts(max(self.DATE_AS_INTEGER_LIST))
+        visitors_total = fetch_running_totals_for_dates(
+            first_date_counts['visitors_total'], self.DATE_AS_INTEGER_LIST)
+        authenticated_visitors_total = fetch_running_totals_for_dates(
+            first_date_counts['authenticated_visitors_total'], self.DATE_AS_INTEGER_LIST)
+        voter_guides_viewed_total = fetch_running_totals_for_dates(
+            first_date_counts['voter_guides_viewed_total'], self.DATE_AS_INTEGER_LIST)
+
+        for date_as_integer in self.DATE_AS_INTEGER_LIST:
+            self.assertEqual(visitors_total[date_as_integer], analytics_count_manager.fetch_visitors(
+                count_through_this_date_as_integer=date_as_integer))
+            self.assertEqual(authenticated_visitors_total[date_as_integer], analytics_count_manager.fetch_visitors(
+                count_through_this_date_as_integer=date_as_integer, limit_to_authenticated=True))
+            self.assertEqual(voter_guides_viewed_total[date_as_integer],
+                             analytics_count_manager.fetch_voter_guides_viewed(
+                                 count_through_this_date_as_integer=date_as_integer))
+        self.assertEqual(visitors_total[20171004], 3)
+
+
+class SitewideVoterMetricsTestCase(TestCase):
+    multi_db = True
+
+    def create_action(self, voter_we_vote_id, action_constant, organization_we_vote_id=None, date_as_integer=20171001):
+        AnalyticsAction.objects.using('analytics').create(
+            action_constant=action_constant, date_as_integer=date_as_integer, voter_we_vote_id=voter_we_vote_id,
+            organization_we_vote_id=organization_we_vote_id)
+
+    def test_voter_list_matches_one_voter_at_a_time(self):
+        self.create_action("wv01voter1", ACTION_VOTER_GUIDE_VISIT, "wv01org1")
+        # The same voter, stored in upper case
+        self.create_action("WV01VOTER1", ACTION_VOTER_GUIDE_VISIT, "wv01org1", date_as_integer=20171002)
+        self.create_action("wv01voter1", ACTION_VOTER_GUIDE_VISIT, "wv01org2", date_as_integer=20171002)
+        # Voter guide visits without an organization count as one more voter guide viewed
+        self.create_action("wv01voter1", ACTION_VOTER_GUIDE_VISIT)
+        self.create_action("wv01voter1", ACTION_VOTER_GUIDE_VISIT)
+        self.create_action("wv01voter1", ACTION_WELCOME_VISIT)
+        self.create_action("wv01voter2", ACTION_BALLOT_VISIT)
+        self.create_action("wv01voter2", ACTION_BALLOT_VISIT, date_as_integer=20171003)
+        # wv01voter3 has no actions at all
+        voter_we_vote_id_list = ["wv01voter1", "wv01voter2", "wv01voter3"]
+
+        results = calculate_sitewide_voter_metrics_for_voter_list(voter_we_vote_id_list)
+        self.assertTrue(results['success'])
+        voter_list_values_by_voter = {}
+        for sitewide_voter_metrics_values in results['sitewide_voter_metrics_values_list']:
+            voter_list_values_by_voter[sitewide_voter_metrics_values['voter_we_vote_id']] = sitewide_voter_metrics_values
+
+        for voter_we_vote_id in voter_we_vote_id_list:
+            one_voter_values = calculate_sitewide_voter_metrics_for_one_voter(voter_we_vote_id)[
+                'sitewide_voter_metrics_values']
+            self.assertEqual(voter_list_values_by_voter[voter_we_vote_id], one_voter_values)
+        self.assertEqual(voter_list_values_by_voter["wv01voter1"]['actions_count'], 6)
+        self.assertEqual(voter_list_values_by_voter["wv01voter1"]['voter_guides_viewed'], 3)
+        self.assertEqual(voter_list_values_by_voter["wv01voter1"]['days_visited'], 2)
+        self.assertEqual(voter_list_values_by_voter["wv01voter2"]['ballot_visited'], 2)
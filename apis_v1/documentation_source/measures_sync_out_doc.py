@@ -18,6 +18,30 @@ def measures_sync_out_doc_template_values(url_root):
             'value':        'string',  # boolean, integer, long, string
             'description':  'Limit the measures entries retrieved to those in a particular state.',
         },
+        {
+            'name':         'changed_since',
+            'value':        'string',  # boolean, integer, long, string
+            'description':  'Only return entries changed at or after this time (ISO 8601). Use the '
+                            'X-We-Vote-Sync-Watermark header from the previous response.',
+        },
+        {
+            'name':         'limit',
+            'value':        'integer',  # boolean, integer, long, string
+            'description':  'Only return this many entries. When there may be more, the X-We-Vote-Sync-Next-Cursor '
+                            'header holds the cursor for the next page.',
+        },
+        {
+            'name':         'cursor',
+            'value':        'integer',  # boolean, integer, long, string
+            'description':  'Start after this point in the export. Use the X-We-Vote-Sync-Next-Cursor header from '
+                            'the previous page.',
+        },
+        {
+            'name':         'format',
+            'value':        'string',  # boolean, integer, long, string
+            'description':  'Use ndjson to get one json object per line instead of a json array. The response is '
+                            'gzipped when the request accepts gzip.',
+        },
     ]
 
     potential_status_codes_list = [
@@ -25,6 +25,17 @@ def search_all_doc_template_values(url_root):
         },
     ]
     optional_query_parameter_list = [
+        {
+            'name':         'search_results_limit',
+            'value':        'integer',  # boolean, integer, long, string
+            'description':  'The number of results to return, up to 50. Defaults to 10.',
+        },
+        {
+            'name':         'search_results_offset',
+            'value':        'integer',  # boolean, integer, long, string
+            'description':  'The number of best scoring results to skip, for the next page of results. '
+                            'search_results_offset plus search_results_limit can\'t go past 500.',
+        },
     ]
 
     potential_status_codes_list = [
@@ -48,6 +59,8 @@ def search_all_doc_template_values(url_root):
                    '  "voter_device_id": string (88 characters long),\n' \
                    '  "text_from_search_field": string,\n' \
                    '  "search_results_found": boolean,\n' \
+                   '  "search_results_total": integer,\n' \
+                   '  "search_results_offset": integer,\n' \
                    '  "search_results": list\n' \
                    '   [{\n' \
                    '     "result_title": string,\n' \
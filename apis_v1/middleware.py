@@ -0,0 +1,210 @@
+# apis_v1/middleware.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+"""
+Opt-in profiling of the apis_v1 endpoints. When API_PROFILING_ENABLED is set, every call to /apis/v1/ records its
+wall time, time spent in the database, number of queries, number of repeated queries and response size. The totals
+are kept per API name in this server process, and can be seen at /admin/api_profile/ (or as json at
+/admin/api_profile_json/). Requests slower than API_PROFILING_SLOW_REQUEST_MILLISECONDS are logged with every query
+they ran.
+"""
+
+from collections import Counter
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+import re
+import threading
+import time
+import wevote_functions.admin
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+API_PROFILING_URL_PREFIX = '/apis/v1/'
+API_PROFILING_SLOW_REQUEST_MILLISECONDS_DEFAULT = 1000
+
+# api_name -> running totals for that api, since this process started or the totals were cleared
+_api_profile_statistics = {}
+_api_profile_statistics_lock = threading.Lock()
+
+# Numbers and quoted strings are replaced, so "WHERE id = 12" and "WHERE id = 13" count as the same query shape
+_sql_literal_pattern = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def fetch_api_name_from_path(path):
+    """
+    "/apis/v1/voterBallotItemsRetrieve/" -> "voterBallotItemsRetrieve"
+    :param path:
+    :return: None if this isn't an apis_v1 call
+    """
+    if not path or not path.startswith(API_PROFILING_URL_PREFIX):
+        return None
+    api_name = path[len(API_PROFILING_URL_PREFIX):].strip('/').split('/')[0]
+    return api_name if api_name else None
+
+
+def normalize_sql_for_profile(sql):
+    return _sql_literal_pattern.sub('?', sql or '')
+
+
+def count_repeated_queries(sql_list):
+    """
+    :param sql_list:
+    :return: (number of queries that exactly repeat an earlier query,
+              number of queries with the same shape as an earlier query - the usual sign of a query in a loop)
+    """
+    duplicate_query_count = sum(count - 1 for count in Counter(sql_list).values())
+    similar_query_count = sum(count - 1 for count in Counter(
+        normalize_sql_for_profile(sql) for sql in sql_list).values())
+    return duplicate_query_count, similar_query_count
+
+
+def record_api_profile(api_name, wall_time, database_time, query_count, duplicate_query_count,
+                       similar_query_count, response_bytes, is_slow_request=False):
+    """
+    Add one request to the running totals for api_name
+    :param api_name:
+    :param wall_time: seconds
+    :param database_time: seconds
+    :param query_count:
+    :param duplicate_query_count:
+    :param similar_query_count:
+    :param response_bytes:
+    :param is_slow_request:
+    :return:
+    """
+    with _api_profile_statistics_lock:
+        statistics = _api_profile_statistics.get(api_name)
+        if statistics is None:
+            statistics = {
+                'api_name':                 api_name,
+                'request_count':            0,
+                'slow_request_count':       0,
+                'wall_time_total':          0.0,
+                'wall_time_maximum':        0.0,
+                'database_time_total':      0.0,
+                'query_count_total':        0,
+                'query_count_maximum':      0,
+                'duplicate_query_count_total':  0,
+                'similar_query_count_total':    0,
+                'response_bytes_total':     0,
+                'response_bytes_maximum':   0,
+            }
+            _api_profile_statistics[api_name] = statistics
+        statistics['request_count'] += 1
+        if is_slow_request:
+            statistics['slow_request_count'] += 1
+        statistics['wall_time_total'] += wall_time
+        statistics['wall_time_maximum'] = max(statistics['wall_time_maximum'], wall_time)
+        statistics['database_time_total'] += database_time
+        statistics['query_count_total'] += query_count
+        statistics['query_count_maximum'] = max(statistics['query_count_maximum'], query_count)
+        statistics['duplicate_query_count_total'] += duplicate_query_count
+        statistics['similar_query_count_total'] += similar_query_count
+        statistics['response_bytes_total'] += response_bytes
+        statistics['response_bytes_maximum'] = max(statistics['response_bytes_maximum'], response_bytes)
+
+
+def fetch_api_profile_statistics():
+    """
+    :return: one dict per api (with averages added, and times in milliseconds), most total wall time first
+    """
+    with _api_profile_statistics_lock:
+        statistics_list = [dict(statistics) for statistics in _api_profile_statistics.values()]
+
+    for statistics in statistics_list:
+        request_count = statistics['request_count']
+        for time_key in ('wall_time_total', 'wall_time_maximum', 'database_time_total'):
+            statistics[time_key + '_milliseconds'] = int(round(statistics.pop(time_key) * 1000))
+        statistics['wall_time_average_milliseconds'] = \
+            int(round(float(statistics['wall_time_total_milliseconds']) / request_count))
+        statistics['database_time_average_milliseconds'] = \
+            int(round(float(statistics['database_time_total_milliseconds']) / request_count))
+        statistics['query_count_average'] = round(float(statistics['query_count_total']) / request_count, 1)
+        statistics['duplicate_query_count_average'] = \
+            round(float(statistics['duplicate_query_count_total']) / request_count, 1)
+        statistics['similar_query_count_average'] = \
+            round(float(statistics['similar_query_count_total']) / request_count, 1)
+        statistics['response_bytes_average'] = int(round(float(statistics['response_bytes_total']) / request_count))
+
+    statistics_list.sort(key=lambda statistics: statistics['wall_time_total_milliseconds'], reverse=True)
+    return statistics_list
+
+
+def clear_api_profile_statistics():
+    with _api_profile_statistics_lock:
+        _api_profile_statistics.clear()
+
+
+class ApiProfileMiddleware(object):
+    """
+    Only installed when settings.API_PROFILING_ENABLED is true. We turn on the debug cursor for the length of each
+    apis_v1 request so Django records the queries (with their times) even when DEBUG is off.
+    """
+
+    def __init__(self):
+        if not getattr(settings, 'API_PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.slow_request_seconds = float(getattr(
+            settings, 'API_PROFILING_SLOW_REQUEST_MILLISECONDS', API_PROFILING_SLOW_REQUEST_MILLISECONDS_DEFAULT)) \
+            / 1000
+
+    def process_request(self, request):
+        api_name = fetch_api_name_from_path(request.path)
+        if api_name is None:
+            return None
+
+        # For each database connection: (was force_debug_cursor already on, number of queries already logged)
+        connection_state_list = []
+        for connection in connections.all():
+            connection_state_list.append((connection, connection.force_debug_cursor, len(connection.queries_log)))
+            connection.force_debug_cursor = True
+        request.api_profile = {
+            'api_name':                 api_name,
+            'connection_state_list':    connection_state_list,
+            'time_started':             time.time(),
+        }
+        return None
+
+    def process_response(self, request, response):
+        api_profile = getattr(request, 'api_profile', None)
+        if api_profile is None:
+            return response
+
+        try:
+            wall_time = time.time() - api_profile['time_started']
+            query_list = []
+            for connection, force_debug_cursor, queries_already_logged in api_profile['connection_state_list']:
+                connection.force_debug_cursor = force_debug_cursor
+                for query in list(connection.queries_log)[queries_already_logged:]:
+                    query_list.append((connection.alias, query.get('sql', ''), float(query.get('time') or 0)))
+
+            database_time = sum(query_time for alias, sql, query_time in query_list)
+            duplicate_query_count, similar_query_count = count_repeated_queries(
+                [sql for alias, sql, query_time in query_list])
+            if response.streaming:
+                response_bytes = 0
+            else:
+                response_bytes = len(response.content)
+            is_slow_request = wall_time >= self.slow_request_seconds
+
+            record_api_profile(api_profile['api_name'], wall_time, database_time, len(query_list),
+                               duplicate_query_count, similar_query_count, response_bytes, is_slow_request)
+
+            if is_slow_request:
+                query_description_list = ["{time:.3f}s [{alias}] {sql}".format(time=query_time, alias=alias, sql=sql)
+                                          for alias, sql, query_time in query_list]
+                logger.warning(
+                    "Slow API call {api_name}: {wall_time:.3f}s total, {database_time:.3f}s in {query_count} "
+                    "queries ({duplicate_query_count} duplicates), {response_bytes} bytes\n"
+                    "{query_descriptions}".format(
+                        api_name=api_profile['api_name'], wall_time=wall_time, database_time=database_time,
+                        query_count=len(query_list), duplicate_query_count=duplicate_query_count,
+                        response_bytes=response_bytes,
+                        query_descriptions="\n".join(query_description_list)))
+        except Exception as e:
+            logger.error("ApiProfileMiddleware could not record {api_name}: {error}".format(
+                api_name=api_profile['api_name'], error=e))
+
+        return response
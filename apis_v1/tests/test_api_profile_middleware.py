@@ -0,0 +1,46 @@
+# apis_v1/test_api_profile_middleware.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+
+from apis_v1.middleware import clear_api_profile_statistics, count_repeated_queries, fetch_api_name_from_path, \
+    fetch_api_profile_statistics
+
+
+class WeVoteAPIsV1TestsApiProfileMiddleware(TestCase):
+
+    def setUp(self):
+        clear_api_profile_statistics()
+
+    def test_api_name_from_path(self):
+        self.assertEqual(fetch_api_name_from_path('/apis/v1/voterRetrieve/'), 'voterRetrieve')
+        self.assertEqual(fetch_api_name_from_path('/apis/v1/'), None)
+        self.assertEqual(fetch_api_name_from_path('/admin/'), None)
+
+    def test_count_repeated_queries(self):
+        sql_list = [
+            'SELECT * FROM voter WHERE id = 1',
+            'SELECT * FROM voter WHERE id = 1',
+            'SELECT * FROM voter WHERE id = 2',
+            "SELECT * FROM position WHERE we_vote_id = 'wv01pos1'",
+        ]
+        duplicate_query_count, similar_query_count = count_repeated_queries(sql_list)
+        self.assertEqual(duplicate_query_count, 1)
+        self.assertEqual(similar_query_count, 2)
+
+    @override_settings(API_PROFILING_ENABLED=False)
+    def test_nothing_recorded_when_turned_off(self):
+        self.client.get(reverse("apis_v1:deviceIdGenerateView"))
+        self.assertEqual(fetch_api_profile_statistics(), [])
+
+    @override_settings(API_PROFILING_ENABLED=True)
+    def test_requests_recorded_per_api(self):
+        self.client.get(reverse("apis_v1:deviceIdGenerateView"))
+        response = self.client.get(reverse("apis_v1:deviceIdGenerateView"))
+        api_profile_list = fetch_api_profile_statistics()
+        self.assertEqual(len(api_profile_list), 1)
+        self.assertEqual(api_profile_list[0]['api_name'], 'deviceIdGenerate')
+        self.assertEqual(api_profile_list[0]['request_count'], 2)
+        self.assertEqual(api_profile_list[0]['response_bytes_maximum'], len(response.content))
@@ -7,6 +7,7 @@ from election.controllers import elections_retrieve_for_api, elections_sync_out_
 import json
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, get_voter_device_id, positive_value_exists
+from wevote_functions.master_sync import fetch_sync_out_watermark, sync_out_response
 
 logger = wevote_functions.admin.get_logger(__name__)
 
@@ -40,11 +41,11 @@ def elections_sync_out_view(request):  # electionsSyncOut
         return HttpResponse(json.dumps(json_data), content_type='application/json')
     else:
         election_list = results['election_list']
-        election_list_dict = election_list.values('google_civic_election_id', 'election_name', 'election_day_text',
-                                                  'ocd_division_id', 'state_code', 'include_in_list_for_voters')
-        if election_list_dict:
-            election_list_json = list(election_list_dict)
-            return HttpResponse(json.dumps(election_list_json), content_type='application/json')
+        response = sync_out_response(request, election_list, [
+            'google_civic_election_id', 'election_name', 'election_day_text', 'ocd_division_id', 'state_code',
+            'include_in_list_for_voters'], fetch_sync_out_watermark())
+        if response is not None:
+            return response
         else:
             json_data = {
                 'success': False,
@@ -7,7 +7,7 @@ import json
 from measure.controllers import measure_retrieve_for_api
 from office.controllers import office_retrieve_for_api
 from quick_info.controllers import quick_info_retrieve_for_api
-from search.controllers import search_all_for_api
+from search.controllers import search_all_for_api, SEARCH_ALL_DEFAULT_LIMIT
 import wevote_functions.admin
 from wevote_functions.functions import generate_voter_device_id, get_voter_device_id, positive_value_exists
 
@@ -77,6 +77,8 @@ def search_all_view(request):  # searchAll
     """
     voter_device_id = get_voter_device_id(request)  # We standardize how we take in the voter_device_id
     text_from_search_field = request.GET.get('text_from_search_field', '')
+    search_results_limit = request.GET.get('search_results_limit', SEARCH_ALL_DEFAULT_LIMIT)
+    search_results_offset = request.GET.get('search_results_offset', 0)
 
     if not positive_value_exists(text_from_search_field):
         status = 'MISSING_TEXT_FROM_SEARCH_FIELD'
@@ -89,7 +91,8 @@ def search_all_view(request):  # searchAll
         }
         return HttpResponse(json.dumps(json_data), content_type='application/json')
 
-    results = search_all_for_api(text_from_search_field, voter_device_id)
+    results = search_all_for_api(text_from_search_field, voter_device_id, search_results_limit,
+                                 search_results_offset)
     status = "UNABLE_TO_FIND_ANY_SEARCH_RESULTS "
     search_results = []
     if results['search_results_found']:
@@ -104,5 +107,7 @@ def search_all_view(request):  # searchAll
         'text_from_search_field':   text_from_search_field,
         'voter_device_id':          voter_device_id,
         'search_results':           search_results,
+        'search_results_total':     results['search_results_total'],
+        'search_results_offset':    results['search_results_offset'],
     }
     return HttpResponse(json.dumps(json_data), content_type='application/json')
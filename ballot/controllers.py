@@ -2,12 +2,13 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
-from .models import BallotItemListManager, BallotItemManager, BallotReturnedListManager, BallotReturnedManager, \
-    CANDIDATE, copy_existing_ballot_items_from_stored_ballot, OFFICE, MEASURE, \
-    VoterBallotSaved, VoterBallotSavedManager
+from .models import BallotItem, BallotItemListManager, BallotReturnedListManager, \
+    BallotReturnedManager, BALLOT_ITEM_LIST_CACHE_TIMEOUT, CANDIDATE, copy_existing_ballot_items_from_stored_ballot, \
+    fetch_ballot_item_list_cache_key, OFFICE, MEASURE, VoterBallotSaved, VoterBallotSavedManager
 from candidate.models import CandidateCampaignListManager
 from config.base import get_environment_variable
 from datetime import datetime
+from django.core.cache import cache
 from election.models import ElectionManager
 from exception.models import handle_exception
 from import_export_google_civic.controllers import voter_ballot_items_retrieve_from_google_civic_for_api
@@ -17,7 +18,9 @@ from polling_location.models import PollingLocationManager
 from voter.models import BALLOT_ADDRESS, VoterAddressManager, \
     VoterDeviceLinkManager
 import wevote_functions.admin
-from wevote_functions.functions import convert_to_int, positive_value_exists, process_request_from_master
+from wevote_functions.bulk_upsert import bulk_upsert
+from wevote_functions.functions import canonicalize_we_vote_id, convert_to_int, positive_value_exists
+from wevote_functions.master_sync import import_from_master_server_in_chunks
 from geopy.geocoders import get_geocoder_for_service
 
 logger = wevote_functions.admin.get_logger(__name__)
@@ -59,31 +62,23 @@ def ballot_items_import_from_master_server(request, google_civic_election_id, st
         }
         return import_results
 
-    import_results, structured_json = \
-        process_request_from_master(request, "Loading Ballot Items from We Vote Master servers",
-                                    BALLOT_ITEMS_SYNC_URL, params)
+    duplicate_index_by_election = {}
 
-    if not import_results['success']:
+    def import_ballot_items_chunk(structured_json):
+        results = filter_ballot_items_structured_json_for_local_duplicates(
+            structured_json, duplicate_index_by_election)
+        import_results = ballot_items_import_from_structured_json(results['structured_json'])
+        import_results['duplicates_removed'] = results['duplicates_removed']
         return import_results
 
-    try:
-        if 'success' in structured_json:  # On error, you get: {'success': False, 'status': 'BALLOT_ITEM_LIST_MISSING'}
-            import_results = {
-                'success': False,
-                'status': structured_json['status'] + ": Did you set the correct state for syncing this election?",
-            }
-        else:
-            results = filter_ballot_items_structured_json_for_local_duplicates(structured_json)
-            filtered_structured_json = results['structured_json']
-            duplicates_removed = results['duplicates_removed']
+    import_results = import_from_master_server_in_chunks(
+        request, "Loading Ballot Items from We Vote Master servers",
+        BALLOT_ITEMS_SYNC_URL, params,
+        import_ballot_items_chunk, 'ballot_items')
 
-            import_results = ballot_items_import_from_structured_json(filtered_structured_json)
-            import_results['duplicates_removed'] = duplicates_removed
-    except Exception as e:
-        import_results = {
-            'success': False,
-            'status': "FAILED_TO_GET_JSON_FROM_MASTER_SERVER",
-        }
+    # On error, you get: {'success': False, 'status': 'BALLOT_ITEM_LIST_MISSING'}
+    if not import_results['success'] and 'BALLOT_ITEM_LIST_MISSING' in import_results['status']:
+        import_results['status'] += ": Did you set the correct state for syncing this election?"
 
     return import_results
 
@@ -98,8 +93,16 @@ def ballot_returned_import_from_master_server(request, google_civic_election_id,
     :param state_code:
     :return:
     """
+    duplicate_index_by_election = {}
+
+    def import_ballot_returned_chunk(structured_json):
+        results = filter_ballot_returned_structured_json_for_local_duplicates(
+            structured_json, duplicate_index_by_election)
+        import_results = ballot_returned_import_from_structured_json(results['structured_json'])
+        import_results['duplicates_removed'] = results['duplicates_removed']
+        return import_results
 
-    import_results, structured_json = process_request_from_master(
+    return import_from_master_server_in_chunks(
         request, "Loading Ballot Returned entries (saved ballots, specific to one location) from WeVote Master servers",
         BALLOT_RETURNED_SYNC_URL,
         {
@@ -107,34 +110,26 @@ def ballot_returned_import_from_master_server(request, google_civic_election_id,
             "format": 'json',
             "google_civic_election_id": str(google_civic_election_id),
             "state_code": str(state_code),
-        }
-    )
-
-    print("... the master server returned " + str(len(structured_json)) + " polling locations for election " +
-          str(google_civic_election_id) + " in state " + str(state_code))
-
-    if import_results['success']:
-        results = filter_ballot_returned_structured_json_for_local_duplicates(structured_json)
-        filtered_structured_json = results['structured_json']
-        duplicates_removed = results['duplicates_removed']
-
-        import_results = ballot_returned_import_from_structured_json(filtered_structured_json)
-        import_results['duplicates_removed'] = duplicates_removed
-
-    return import_results
+        },
+        import_ballot_returned_chunk, 'ballot_returned')
 
 
-def filter_ballot_items_structured_json_for_local_duplicates(structured_json):
+def filter_ballot_items_structured_json_for_local_duplicates(structured_json, duplicate_index_by_election=None):
     """
     With this function, we remove ballot_items that seem to be duplicates, but have different we_vote_id's.
     We do not check to see if we have a matching office or measure in the database this routine --
     that is done elsewhere.
     :param structured_json:
+    :param duplicate_index_by_election: when importing in chunks, pass the same dict with each chunk so we only load
+     the local entries once
     :return:
     """
     duplicates_removed = 0
     filtered_structured_json = []
     ballot_item_list_manager = BallotItemListManager()
+    # We load the local ballot items for each election once, instead of running a query for every incoming item
+    if duplicate_index_by_election is None:
+        duplicate_index_by_election = {}
     for one_ballot_item in structured_json:
         ballot_item_display_name = one_ballot_item['ballot_item_display_name'] \
             if 'ballot_item_display_name' in one_ballot_item else ''
@@ -153,11 +148,14 @@ def filter_ballot_items_structured_json_for_local_duplicates(structured_json):
         # contest_office_we_vote_id or contest_measure_we_vote_id. That is, an entry for a
         # google_civic_election_id + polling_location_we_vote_id that has the same ballot_item_display_name,
         # but different contest_office_we_vote_id or contest_measure_we_vote_id
-        results = ballot_item_list_manager.retrieve_possible_duplicate_ballot_items(
-            ballot_item_display_name, google_civic_election_id, polling_location_we_vote_id, contest_office_we_vote_id,
-            contest_measure_we_vote_id, state_code)
-
-        if results['ballot_item_list_found']:
+        election_key = str(google_civic_election_id)
+        if election_key not in duplicate_index_by_election:
+            duplicate_index_by_election[election_key] = \
+                ballot_item_list_manager.retrieve_possible_duplicate_ballot_items_index(google_civic_election_id)
+
+        if ballot_item_list_manager.is_possible_duplicate_ballot_item(
+                duplicate_index_by_election[election_key], ballot_item_display_name, google_civic_election_id,
+                polling_location_we_vote_id, contest_office_we_vote_id, contest_measure_we_vote_id, state_code):
             # There seems to be a duplicate already in this database using a different we_vote_id
             duplicates_removed += 1
         else:
@@ -176,17 +174,22 @@ def filter_ballot_items_structured_json_for_local_duplicates(structured_json):
     return ballot_items_results
 
 
-def filter_ballot_returned_structured_json_for_local_duplicates(structured_json):
+def filter_ballot_returned_structured_json_for_local_duplicates(structured_json, duplicate_index_by_election=None):
     """
     With this function, we remove ballot_returned entries that seem to be duplicates,
     but have different polling_location_we_vote_id's.
     We do not check to see if we have a local entry for polling_location_we_vote_id -- that is done elsewhere.
     :param structured_json:
+    :param duplicate_index_by_election: when importing in chunks, pass the same dict with each chunk so we only load
+     the local entries once
     :return:
     """
     duplicates_removed = 0
     filtered_structured_json = []
     ballot_returned_list_manager = BallotReturnedListManager()
+    # We load the local ballots returned for each election once, instead of running a query for every incoming one
+    if duplicate_index_by_election is None:
+        duplicate_index_by_election = {}
     for one_ballot_returned in structured_json:
         polling_location_we_vote_id = one_ballot_returned['polling_location_we_vote_id'] \
             if 'polling_location_we_vote_id' in one_ballot_returned else ''
@@ -196,10 +199,15 @@ def filter_ballot_returned_structured_json_for_local_duplicates(structured_json)
         normalized_zip = one_ballot_returned['normalized_zip'] if 'normalized_zip' in one_ballot_returned else ''
 
         # Check to see if there is an entry that matches in all critical ways, minus the polling_location_we_vote_id
-        results = ballot_returned_list_manager.retrieve_possible_duplicate_ballot_returned(
-            google_civic_election_id, normalized_line1, normalized_zip, polling_location_we_vote_id)
-
-        if results['ballot_returned_list_found']:
+        election_key = str(google_civic_election_id)
+        if election_key not in duplicate_index_by_election:
+            duplicate_index_by_election[election_key] = \
+                ballot_returned_list_manager.retrieve_possible_duplicate_ballot_returned_index(
+                    google_civic_election_id)
+
+        if ballot_returned_list_manager.is_possible_duplicate_ballot_returned(
+                duplicate_index_by_election[election_key], normalized_line1, normalized_zip,
+                polling_location_we_vote_id):
             # There seems to be a duplicate already in this database using a different we_vote_id
             duplicates_removed += 1
         else:
@@ -224,14 +232,23 @@ def filter_ballot_returned_structured_json_for_local_duplicates(structured_json)
 
 def ballot_items_import_from_structured_json(structured_json):
     """
-    This pathway in requires a we_vote_id, and is not used when we import from Google Civic
+    This pathway in requires a we_vote_id, and is not used when we import from Google Civic.
+    Ballot items don't have a we_vote_id of their own, so bulk_upsert matches them the way
+    update_or_create_ballot_item_for_polling_location does: on polling location, election, office id and measure id.
     :param structured_json:
     :return:
     """
-    ballot_item_manager = BallotItemManager()
-    ballot_items_saved = 0
-    ballot_items_updated = 0
     ballot_items_not_processed = 0
+
+    # We check to make sure we have a local copy of each contest_office or contest_measure, one query each
+    contest_office_manager = ContestOfficeManager()
+    contest_office_id_dict = contest_office_manager.fetch_contest_office_id_dict_from_we_vote_id_list(
+        [one_ballot_item.get('contest_office_we_vote_id') for one_ballot_item in structured_json])
+    contest_measure_manager = ContestMeasureManager()
+    contest_measure_id_dict = contest_measure_manager.fetch_contest_measure_id_dict_from_we_vote_id_list(
+        [one_ballot_item.get('contest_measure_we_vote_id') for one_ballot_item in structured_json])
+
+    ballot_item_values_list = []
     for one_ballot_item in structured_json:
         polling_location_we_vote_id = one_ballot_item['polling_location_we_vote_id'] \
             if 'polling_location_we_vote_id' in one_ballot_item else ''
@@ -242,59 +259,45 @@ def ballot_items_import_from_structured_json(structured_json):
             if 'contest_office_we_vote_id' in one_ballot_item else ''
         contest_measure_we_vote_id = one_ballot_item['contest_measure_we_vote_id'] \
             if 'contest_measure_we_vote_id' in one_ballot_item else ''
-
-        if positive_value_exists(polling_location_we_vote_id) and positive_value_exists(google_civic_election_id) \
-                and (positive_value_exists(contest_office_we_vote_id) or
-                     positive_value_exists(contest_measure_we_vote_id)):
-            # We check to make sure we have a local copy of this polling_location, contest_office or contest_measure
-            #  in ballot_item_manager.update_or_create_ballot_item_for_polling_location
-            proceed_to_update_or_create = True
-        else:
-            proceed_to_update_or_create = False
-
-        if proceed_to_update_or_create:
-            ballot_item_display_name = one_ballot_item['ballot_item_display_name'] \
-                if 'ballot_item_display_name' in one_ballot_item else ''
-            measure_subtitle = one_ballot_item['measure_subtitle'] if 'measure_subtitle' in one_ballot_item else 0
-            google_ballot_placement = one_ballot_item['google_ballot_placement'] \
-                if 'google_ballot_placement' in one_ballot_item else 0
-            local_ballot_order = one_ballot_item['local_ballot_order'] \
-                if 'local_ballot_order' in one_ballot_item else ''
-
-            contest_office_id = 0
-            contest_measure_id = 0
-
-            results = ballot_item_manager.update_or_create_ballot_item_for_polling_location(
-                polling_location_we_vote_id, google_civic_election_id, google_ballot_placement,
-                ballot_item_display_name, measure_subtitle, local_ballot_order,
-                contest_office_id, contest_office_we_vote_id,
-                contest_measure_id, contest_measure_we_vote_id, state_code)
-
-        else:
-            ballot_items_not_processed += 1
-            results = {
-                'success': False,
-                'status': 'Required value missing, cannot update or create'
-            }
-
-        if results['success']:
-            if results['new_ballot_item_created']:
-                ballot_items_saved += 1
-            else:
-                ballot_items_updated += 1
-        else:
+        contest_office_id = contest_office_id_dict.get(canonicalize_we_vote_id(contest_office_we_vote_id), 0) \
+            if positive_value_exists(contest_office_we_vote_id) else 0
+        contest_measure_id = contest_measure_id_dict.get(canonicalize_we_vote_id(contest_measure_we_vote_id), 0) \
+            if positive_value_exists(contest_measure_we_vote_id) else 0
+
+        # We require both contest_office_id and contest_office_we_vote_id
+        #  OR both contest_measure_id and contest_measure_we_vote_id
+        if not positive_value_exists(polling_location_we_vote_id) \
+                or not positive_value_exists(google_civic_election_id) \
+                or not (positive_value_exists(contest_office_id) or positive_value_exists(contest_measure_id)):
             ballot_items_not_processed += 1
+            continue
 
-        count = ballot_items_saved + ballot_items_updated
-        if not count % 10000:
-            print("... processed for update/create: " + str(count) + " of " + str(len(structured_json)))
+        ballot_item_values_list.append({
+            # Values we search against
+            'contest_measure_id':           contest_measure_id,
+            'contest_office_id':            contest_office_id,
+            'google_civic_election_id':     google_civic_election_id,
+            'polling_location_we_vote_id':  polling_location_we_vote_id,
+            # The rest of the values
+            'contest_office_we_vote_id':    contest_office_we_vote_id,
+            'contest_measure_we_vote_id':   contest_measure_we_vote_id,
+            'google_ballot_placement':      one_ballot_item.get('google_ballot_placement', 0),
+            'local_ballot_order':           one_ballot_item.get('local_ballot_order', ''),
+            'ballot_item_display_name':     one_ballot_item.get('ballot_item_display_name', ''),
+            'measure_subtitle':             one_ballot_item.get('measure_subtitle', 0),
+            'state_code':                   state_code,
+        })
+
+    results = bulk_upsert(BallotItem, ballot_item_values_list,
+                          key_field_names=('contest_measure_id', 'contest_office_id', 'google_civic_election_id',
+                                           'polling_location_we_vote_id'))
 
     ballot_items_results = {
         'success': True,
-        'status': "ballot_items_IMPORT_PROCESS_COMPLETE",
-        'saved': ballot_items_saved,
-        'updated': ballot_items_updated,
-        'not_processed': ballot_items_not_processed,
+        'status': "ballot_items_IMPORT_PROCESS_COMPLETE " + results['status'],
+        'saved': results['saved'],
+        'updated': results['updated'],
+        'not_processed': ballot_items_not_processed + results['not_processed'],
     }
     return ballot_items_results
 
@@ -1198,6 +1201,78 @@ def choose_election_from_existing_data(voter_device_link, google_civic_election_
     return error_results
 
 
+def generate_ballot_items_to_display(ballot_item_list):
+    """
+    Turn a voter's BallotItem entries into the dicts returned by voterBallotItemsRetrieve. The candidates for all of
+    the offices on the ballot are retrieved with one query.
+    :param ballot_item_list:
+    :return:
+    """
+    office_list = [(ballot_item.contest_office_id, ballot_item.contest_office_we_vote_id)
+                   for ballot_item in ballot_item_list if ballot_item.contest_office_we_vote_id]
+    candidate_list_by_office = {}
+    if len(office_list):
+        candidate_list_object = CandidateCampaignListManager()
+        results = candidate_list_object.retrieve_all_candidates_for_office_list(office_list)
+        if results['candidate_list_found']:
+            candidate_list_by_office = results['candidate_list_by_office']
+
+    ballot_items_to_display = []
+    for ballot_item in ballot_item_list:
+        if ballot_item.contest_office_we_vote_id:
+            kind_of_ballot_item = OFFICE
+            ballot_item_id = ballot_item.contest_office_id
+            we_vote_id = ballot_item.contest_office_we_vote_id
+            candidates_to_display = []
+            for candidate in candidate_list_by_office.get(we_vote_id, []):
+                # This should match values returned in candidates_retrieve_for_api
+                one_candidate = {
+                    'id':                           candidate.id,
+                    'we_vote_id':                   candidate.we_vote_id,
+                    'ballot_item_display_name':     candidate.display_candidate_name(),
+                    'candidate_photo_url_large':    candidate.we_vote_hosted_profile_image_url_large
+                        if positive_value_exists(candidate.we_vote_hosted_profile_image_url_large)
+                        else candidate.candidate_photo_url(),
+                    'candidate_photo_url_medium':   candidate.we_vote_hosted_profile_image_url_medium,
+                    'candidate_photo_url_tiny':     candidate.we_vote_hosted_profile_image_url_tiny,
+                    'party':                        candidate.political_party_display(),
+                    'order_on_ballot':              candidate.order_on_ballot,
+                    'kind_of_ballot_item':          CANDIDATE,
+                    'twitter_handle':               candidate.candidate_twitter_handle,
+                    'twitter_description':          candidate.twitter_description,
+                    'twitter_followers_count':      candidate.twitter_followers_count,
+                }
+                candidates_to_display.append(one_candidate.copy())
+            one_ballot_item = {
+                'ballot_item_display_name':     ballot_item.ballot_item_display_name,
+                'google_civic_election_id':     ballot_item.google_civic_election_id,
+                'google_ballot_placement':      ballot_item.google_ballot_placement,
+                'local_ballot_order':           ballot_item.local_ballot_order,
+                'kind_of_ballot_item':          kind_of_ballot_item,
+                'id':                           ballot_item_id,
+                'we_vote_id':                   we_vote_id,
+                'candidate_list':               candidates_to_display,
+            }
+            ballot_items_to_display.append(one_ballot_item.copy())
+        elif ballot_item.contest_measure_we_vote_id:
+            kind_of_ballot_item = MEASURE
+            ballot_item_id = ballot_item.contest_measure_id
+            we_vote_id = ballot_item.contest_measure_we_vote_id
+            one_ballot_item = {
+                'ballot_item_display_name':     ballot_item.ballot_item_display_name,
+                'google_civic_election_id':     ballot_item.google_civic_election_id,
+                'google_ballot_placement':      ballot_item.google_ballot_placement,
+                'local_ballot_order':           ballot_item.local_ballot_order,
+                'measure_subtitle':             ballot_item.measure_subtitle,
+                'kind_of_ballot_item':          kind_of_ballot_item,
+                'id':                           ballot_item_id,
+                'we_vote_id':                   we_vote_id,
+            }
+            ballot_items_to_display.append(one_ballot_item.copy())
+
+    return ballot_items_to_display
+
+
 def voter_ballot_items_retrieve_for_one_election_for_api(voter_device_id, voter_id, google_civic_election_id):
     """
 
@@ -1225,68 +1300,12 @@ def voter_ballot_items_retrieve_for_one_election_for_api(voter_device_id, voter_
         success = False
 
     if success:
-        for ballot_item in ballot_item_list:
-            if ballot_item.contest_office_we_vote_id:
-                kind_of_ballot_item = OFFICE
-                ballot_item_id = ballot_item.contest_office_id
-                we_vote_id = ballot_item.contest_office_we_vote_id
-                try:
-                    candidate_list_object = CandidateCampaignListManager()
-                    results = candidate_list_object.retrieve_all_candidates_for_office(ballot_item_id, we_vote_id)
-                    candidates_to_display = []
-                    if results['candidate_list_found']:
-                        candidate_list = results['candidate_list']
-                        for candidate in candidate_list:
-                            # This should match values returned in candidates_retrieve_for_api
-                            one_candidate = {
-                                'id':                           candidate.id,
-                                'we_vote_id':                   candidate.we_vote_id,
-                                'ballot_item_display_name':     candidate.display_candidate_name(),
-                                'candidate_photo_url_large':    candidate.we_vote_hosted_profile_image_url_large
-                                    if positive_value_exists(candidate.we_vote_hosted_profile_image_url_large)
-                                    else candidate.candidate_photo_url(),
-                                'candidate_photo_url_medium':   candidate.we_vote_hosted_profile_image_url_medium,
-                                'candidate_photo_url_tiny':     candidate.we_vote_hosted_profile_image_url_tiny,
-                                'party':                        candidate.political_party_display(),
-                                'order_on_ballot':              candidate.order_on_ballot,
-                                'kind_of_ballot_item':          CANDIDATE,
-                                'twitter_handle':               candidate.candidate_twitter_handle,
-                                'twitter_description':          candidate.twitter_description,
-                                'twitter_followers_count':      candidate.twitter_followers_count,
-                            }
-                            candidates_to_display.append(one_candidate.copy())
-                except Exception as e:
-                    # status = 'FAILED candidates_retrieve. ' \
-                    #          '{error} [type: {error_type}]'.format(error=e.message, error_type=type(e))
-                    candidates_to_display = []
-                    if hasattr(results, 'status'):
-                        status += results['status'] + " "
-                one_ballot_item = {
-                    'ballot_item_display_name':     ballot_item.ballot_item_display_name,
-                    'google_civic_election_id':     ballot_item.google_civic_election_id,
-                    'google_ballot_placement':      ballot_item.google_ballot_placement,
-                    'local_ballot_order':           ballot_item.local_ballot_order,
-                    'kind_of_ballot_item':          kind_of_ballot_item,
-                    'id':                           ballot_item_id,
-                    'we_vote_id':                   we_vote_id,
-                    'candidate_list':               candidates_to_display,
-                }
-                ballot_items_to_display.append(one_ballot_item.copy())
-            elif ballot_item.contest_measure_we_vote_id:
-                kind_of_ballot_item = MEASURE
-                ballot_item_id = ballot_item.contest_measure_id
-                we_vote_id = ballot_item.contest_measure_we_vote_id
-                one_ballot_item = {
-                    'ballot_item_display_name':     ballot_item.ballot_item_display_name,
-                    'google_civic_election_id':     ballot_item.google_civic_election_id,
-                    'google_ballot_placement':      ballot_item.google_ballot_placement,
-                    'local_ballot_order':           ballot_item.local_ballot_order,
-                    'measure_subtitle':             ballot_item.measure_subtitle,
-                    'kind_of_ballot_item':          kind_of_ballot_item,
-                    'id':                           ballot_item_id,
-                    'we_vote_id':                   we_vote_id,
-                }
-                ballot_items_to_display.append(one_ballot_item.copy())
+        # Every voter at the same polling location gets the same list, so look for one we have assembled already
+        ballot_item_list_cache_key = fetch_ballot_item_list_cache_key(google_civic_election_id, ballot_item_list)
+        ballot_items_to_display = cache.get(ballot_item_list_cache_key)
+        if ballot_items_to_display is None:
+            ballot_items_to_display = generate_ballot_items_to_display(ballot_item_list)
+            cache.set(ballot_item_list_cache_key, ballot_items_to_display, BALLOT_ITEM_LIST_CACHE_TIMEOUT)
 
         results = {
             'status': 'VOTER_BALLOT_ITEMS_RETRIEVED',
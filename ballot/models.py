@@ -2,20 +2,27 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+from .spatial_index import clear_ballot_returned_spatial_index, fetch_ballot_returned_spatial_index
 from candidate.models import CandidateCampaign
 from config.base import get_environment_variable
 from datetime import date, datetime, time
-from django.db import models
-from django.db.models import F, Q, Count
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, F, Q, Value, When
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
 from election.models import ElectionManager
-from exception.models import handle_exception, handle_record_found_more_than_one_exception
+from exception.models import handle_exception, handle_record_found_more_than_one_exception, \
+    handle_record_not_found_exception, handle_record_not_saved_exception
+from geoip.models import GeocodeCacheManager
 from geopy.geocoders import get_geocoder_for_service
-from geopy.exc import GeocoderQuotaExceeded
+import hashlib
 from measure.models import ContestMeasureManager
-from office.models import ContestOfficeManager
+from office.models import ContestOffice, ContestOfficeManager
 from polling_location.models import PollingLocationManager
 import wevote_functions.admin
-from wevote_functions.functions import convert_date_to_date_as_integer, convert_to_int, positive_value_exists
+from wevote_functions.bulk_upsert import fetch_bulk_upsert_google_civic_election_id_set, post_bulk_upsert
+from wevote_functions.functions import canonicalize_we_vote_id, convert_date_to_date_as_integer, convert_to_int, \
+    fetch_duplicate_index_value, LocalDuplicateIndex, positive_value_exists
 from wevote_settings.models import fetch_next_we_vote_id_ballot_returned_integer, fetch_site_unique_id_prefix
 
 OFFICE = 'OFFICE'
@@ -31,6 +38,11 @@ KIND_OF_BALLOT_ITEM_CHOICES = (
 
 GOOGLE_MAPS_API_KEY = get_environment_variable("GOOGLE_MAPS_API_KEY")
 
+# Every voter at the same polling location gets the same assembled ballot_item_list, so we cache it by election
+#  and "ballot shape" (the ordered offices and measures on the ballot) for this many seconds. Candidate and office
+#  changes are picked up on the next request through BallotItemListCacheVersion.
+BALLOT_ITEM_LIST_CACHE_TIMEOUT = 300
+
 logger = wevote_functions.admin.get_logger(__name__)
 
 
@@ -80,6 +92,8 @@ class BallotItem(models.Model):
     measure_subtitle = models.TextField(verbose_name="google civic referendum subtitle",
                                         null=True, blank=True, default="")
 
+    date_last_changed = models.DateTimeField(verbose_name='date last changed', null=True, auto_now=True)
+
     def is_contest_office(self):
         if self.contest_office_id:
             return True
@@ -562,21 +576,142 @@ class BallotItemListManager(models.Model):
             return error_results
 
         ballot_item_list = retrieve_results['ballot_item_list']
-        ballot_item_manager = BallotItemManager()
+        copy_results = self.bulk_copy_ballot_items_for_voter(
+            ballot_item_list, to_voter_id, ballot_returned.google_civic_election_id)
+        status += copy_results['status']
+
+        results = {
+            'ballot_returned_copied':   copy_results['success'],
+            'success':                  copy_results['success'],
+            'status':                   status,
+            'ballot_items_created':     copy_results['ballot_items_created'],
+            'ballot_items_updated':     copy_results['ballot_items_updated'],
+            'ballot_items_unchanged':   copy_results['ballot_items_unchanged'],
+            'ballot_items_not_copied':  copy_results['ballot_items_not_copied'],
+        }
+        return results
+
+    def bulk_copy_ballot_items_for_voter(self, ballot_item_list, to_voter_id, google_civic_election_id):
+        """
+        Copy ballot items (usually from a stored polling location ballot) to one voter. We compare against the
+        voter's existing ballot items for this election, then write everything with one bulk_create and one bulk
+        UPDATE, inside a single transaction. This matches what update_or_create_ballot_item_for_voter does for
+        each item, without a select and a write per item.
+        :param ballot_item_list:
+        :param to_voter_id:
+        :param google_civic_election_id:
+        :return:
+        """
+        ballot_items_created = 0
+        ballot_items_updated = 0
+        ballot_items_unchanged = 0
+        ballot_items_not_copied = 0
+        fields_to_update = ['contest_office_id', 'contest_office_we_vote_id', 'contest_measure_id',
+                            'contest_measure_we_vote_id', 'google_ballot_placement', 'local_ballot_order',
+                            'ballot_item_display_name', 'measure_subtitle']
+
+        if not positive_value_exists(to_voter_id) or not positive_value_exists(google_civic_election_id):
+            results = {
+                'success':                  False,
+                'status':                   'BULK_COPY_BALLOT_ITEMS-MISSING_VOTER_ID_OR_GOOGLE_CIVIC_ELECTION_ID ',
+                'ballot_items_created':     ballot_items_created,
+                'ballot_items_updated':     ballot_items_updated,
+                'ballot_items_unchanged':   ballot_items_unchanged,
+                'ballot_items_not_copied':  ballot_items_not_copied,
+            }
+            return results
 
-        for ballot_item in ballot_item_list:
-            create_results = ballot_item_manager.update_or_create_ballot_item_for_voter(
-                to_voter_id, ballot_returned.google_civic_election_id, ballot_item.google_ballot_placement,
-                ballot_item.ballot_item_display_name, ballot_item.measure_subtitle, ballot_item.local_ballot_order,
-                ballot_item.contest_office_id, ballot_item.contest_office_we_vote_id,
-                ballot_item.contest_measure_id, ballot_item.contest_measure_we_vote_id, ballot_item.state_code)
-            if not create_results['success']:
-                status += create_results['status']
+        def ballot_item_key(contest_office_id, contest_measure_id):
+            # This is the same combination update_or_create_ballot_item_for_voter searches with
+            return (str(contest_office_id) if positive_value_exists(contest_office_id) else '',
+                    str(contest_measure_id) if positive_value_exists(contest_measure_id) else '')
+
+        try:
+            with transaction.atomic():
+                existing_ballot_items = {}
+                existing_query = BallotItem.objects.filter(voter_id=to_voter_id,
+                                                           google_civic_election_id=google_civic_election_id)
+                for existing_ballot_item in existing_query:
+                    existing_ballot_items[ballot_item_key(existing_ballot_item.contest_office_id,
+                                                          existing_ballot_item.contest_measure_id)] = \
+                        existing_ballot_item
+
+                ballot_items_to_create = []
+                ballot_items_to_update = []
+                for ballot_item in ballot_item_list:
+                    # We require both contest_office_id and contest_office_we_vote_id
+                    #  OR both contest_measure_id and contest_measure_we_vote_id
+                    required_office_ids_found = positive_value_exists(ballot_item.contest_office_id) \
+                        and positive_value_exists(ballot_item.contest_office_we_vote_id)
+                    required_measure_ids_found = positive_value_exists(ballot_item.contest_measure_id) \
+                        and positive_value_exists(ballot_item.contest_measure_we_vote_id)
+                    if not required_office_ids_found and not required_measure_ids_found:
+                        ballot_items_not_copied += 1
+                        continue
+
+                    key = ballot_item_key(ballot_item.contest_office_id, ballot_item.contest_measure_id)
+                    if key in existing_ballot_items:
+                        existing_ballot_item = existing_ballot_items.pop(key)
+                        changed = False
+                        for field_name in fields_to_update:
+                            if getattr(existing_ballot_item, field_name) != getattr(ballot_item, field_name):
+                                setattr(existing_ballot_item, field_name, getattr(ballot_item, field_name))
+                                changed = True
+                        if changed:
+                            ballot_items_to_update.append(existing_ballot_item)
+                        else:
+                            ballot_items_unchanged += 1
+                    else:
+                        ballot_items_to_create.append(BallotItem(
+                            voter_id=to_voter_id,
+                            google_civic_election_id=google_civic_election_id,
+                            contest_office_id=ballot_item.contest_office_id,
+                            contest_office_we_vote_id=ballot_item.contest_office_we_vote_id,
+                            contest_measure_id=ballot_item.contest_measure_id,
+                            contest_measure_we_vote_id=ballot_item.contest_measure_we_vote_id,
+                            google_ballot_placement=ballot_item.google_ballot_placement,
+                            local_ballot_order=ballot_item.local_ballot_order,
+                            ballot_item_display_name=ballot_item.ballot_item_display_name,
+                            measure_subtitle=ballot_item.measure_subtitle,
+                            state_code=ballot_item.state_code,
+                        ))
+                        # Protect against the reference ballot listing the same office or measure twice
+                        existing_ballot_items[key] = ballot_items_to_create[-1]
+
+                if len(ballot_items_to_create):
+                    BallotItem.objects.bulk_create(ballot_items_to_create)
+                    ballot_items_created = len(ballot_items_to_create)
+
+                if len(ballot_items_to_update):
+                    # One UPDATE statement, with a CASE per field picking the new value for each row
+                    update_values = {}
+                    for field_name in fields_to_update:
+                        update_values[field_name] = Case(
+                            *[When(id=ballot_item.id, then=Value(getattr(ballot_item, field_name)))
+                              for ballot_item in ballot_items_to_update],
+                            output_field=BallotItem._meta.get_field(field_name))
+                    BallotItem.objects.filter(id__in=[ballot_item.id for ballot_item in ballot_items_to_update])\
+                        .update(**update_values)
+                    ballot_items_updated = len(ballot_items_to_update)
+            success = True
+            status = 'BULK_COPY_BALLOT_ITEMS created: {created}, updated: {updated}, unchanged: {unchanged}, ' \
+                     'not_copied: {not_copied} '.format(created=ballot_items_created, updated=ballot_items_updated,
+                                                        unchanged=ballot_items_unchanged,
+                                                        not_copied=ballot_items_not_copied)
+        except Exception as e:
+            handle_exception(e, logger=logger)
+            success = False
+            ballot_items_created = 0
+            ballot_items_updated = 0
+            status = 'BULK_COPY_BALLOT_ITEMS_FAILED {error} [type: {error_type}] '.format(error=e, error_type=type(e))
 
         results = {
-            'ballot_returned_copied':   True,
-            'success':                  True,
+            'success':                  success,
             'status':                   status,
+            'ballot_items_created':     ballot_items_created,
+            'ballot_items_updated':     ballot_items_updated,
+            'ballot_items_unchanged':   ballot_items_unchanged,
+            'ballot_items_not_copied':  ballot_items_not_copied,
         }
         return results
 
@@ -689,6 +824,67 @@ class BallotItemListManager(models.Model):
         }
         return results
 
+    def retrieve_possible_duplicate_ballot_items_index(self, google_civic_election_id):
+        """
+        Load every ballot item in this election into a LocalDuplicateIndex, so is_possible_duplicate_ballot_item can
+        do the retrieve_possible_duplicate_ballot_items check without a query per ballot item.
+        Each entry is filed twice: under its office we_vote_id (for incoming office ballot items) and under its
+        measure we_vote_id (for incoming measure ballot items).
+        :param google_civic_election_id:
+        :return:
+        """
+        duplicate_index = LocalDuplicateIndex()
+        try:
+            ballot_item_queryset = BallotItem.objects.filter(google_civic_election_id=google_civic_election_id)
+            for polling_location_we_vote_id, ballot_item_display_name, state_code, contest_office_we_vote_id, \
+                    contest_measure_we_vote_id in ballot_item_queryset.values_list(
+                        'polling_location_we_vote_id', 'ballot_item_display_name', 'state_code',
+                        'contest_office_we_vote_id', 'contest_measure_we_vote_id').iterator():
+                polling_location_we_vote_id = fetch_duplicate_index_value(polling_location_we_vote_id)
+                ballot_item_display_name = fetch_duplicate_index_value(ballot_item_display_name)
+                state_code = fetch_duplicate_index_value(state_code, False)
+                duplicate_index.add_entry([
+                    ('office', polling_location_we_vote_id, ballot_item_display_name),
+                    ('office_and_state_code', polling_location_we_vote_id, ballot_item_display_name, state_code),
+                ], ('office', canonicalize_we_vote_id(contest_office_we_vote_id)))
+                duplicate_index.add_entry([
+                    ('measure', polling_location_we_vote_id, ballot_item_display_name),
+                    ('measure_and_state_code', polling_location_we_vote_id, ballot_item_display_name, state_code),
+                ], ('measure', canonicalize_we_vote_id(contest_measure_we_vote_id)))
+        except Exception as e:
+            handle_exception(e, logger=logger,
+                             exception_message="retrieve_possible_duplicate_ballot_items_index failed")
+        return duplicate_index
+
+    def is_possible_duplicate_ballot_item(self, duplicate_index, ballot_item_display_name, google_civic_election_id,
+                                          polling_location_we_vote_id, contest_office_we_vote_id,
+                                          contest_measure_we_vote_id, state_code):
+        """
+        The same test as retrieve_possible_duplicate_ballot_items, against an index from
+        retrieve_possible_duplicate_ballot_items_index
+        """
+        if not positive_value_exists(google_civic_election_id) \
+                or not positive_value_exists(polling_location_we_vote_id) \
+                or not positive_value_exists(ballot_item_display_name) \
+                or (not positive_value_exists(contest_office_we_vote_id)
+                    and not positive_value_exists(contest_measure_we_vote_id)):
+            return False
+
+        if positive_value_exists(contest_office_we_vote_id):
+            kind = 'office'
+            identity_to_ignore = ('office', canonicalize_we_vote_id(contest_office_we_vote_id))
+        else:
+            kind = 'measure'
+            identity_to_ignore = ('measure', canonicalize_we_vote_id(contest_measure_we_vote_id))
+        polling_location_we_vote_id = fetch_duplicate_index_value(polling_location_we_vote_id)
+        ballot_item_display_name = fetch_duplicate_index_value(ballot_item_display_name)
+        if positive_value_exists(state_code):
+            key = (kind + '_and_state_code', polling_location_we_vote_id, ballot_item_display_name,
+                   fetch_duplicate_index_value(state_code, False))
+        else:
+            key = (kind, polling_location_we_vote_id, ballot_item_display_name)
+        return duplicate_index.has_duplicate([key], identity_to_ignore)
+
 
 class BallotReturned(models.Model):
     """
@@ -738,6 +934,8 @@ class BallotReturned(models.Model):
     normalized_zip = models.CharField(max_length=255, blank=True, null=True,
                                       verbose_name='normalized zip returned from Google')
 
+    date_last_changed = models.DateTimeField(verbose_name='date last changed', null=True, auto_now=True)
+
     # We override the save function so we can auto-generate we_vote_id
     def save(self, *args, **kwargs):
         # Even if this voter_guide came from another source we still need a unique we_vote_id
@@ -746,6 +944,8 @@ class BallotReturned(models.Model):
         if self.we_vote_id == "" or self.we_vote_id is None:  # If there isn't a value...
             self.generate_new_we_vote_id()
         super(BallotReturned, self).save(*args, **kwargs)
+        # Make sure find_closest_ballot_returned sees this location
+        clear_ballot_returned_spatial_index(self.google_civic_election_id)
 
     def generate_new_we_vote_id(self):
         # ...generate a new id
@@ -1178,38 +1378,30 @@ class BallotReturnedManager(models.Model):
         ballot_returned_found = False
         ballot_returned = None
         location = None
-        try_without_maps_key = False
         status = ""
 
         if not hasattr(self, 'google_client') or not self.google_client:
             self.google_client = get_geocoder_for_service('google')(GOOGLE_MAPS_API_KEY)
-
-        try:
-            location = self.google_client.geocode(text_for_map_search)
-        except GeocoderQuotaExceeded:
-            try_without_maps_key = True
-            status += "GEOCODER_QUOTA_EXCEEDED "
-        except Exception as e:
-            try_without_maps_key = True
-            status += 'GEOCODER_ERROR {error} [type: {error_type}] '.format(error=e, error_type=type(e))
+        # If we have exceeded our account, try without a maps key
+        if not hasattr(self, 'google_client_without_maps_key') or not self.google_client_without_maps_key:
+            self.google_client_without_maps_key = get_geocoder_for_service('google')()
+
+        geocode_cache_manager = GeocodeCacheManager()
+        geocode_results = geocode_cache_manager.geocode(text_for_map_search, self.google_client,
+                                                        self.google_client_without_maps_key)
+        status += geocode_results['status']
+        if geocode_results['geocoder_quota_exceeded']:
+            results = {
+                'status':                   status,
+                'geocoder_quota_exceeded':  True,
+                'ballot_returned_found':    ballot_returned_found,
+                'ballot_returned':          ballot_returned,
+            }
+            return results
+        elif not geocode_results['success']:
             logger.info(status + " @ " + text_for_map_search + "  google_civic_election_id=" +
                         str(google_civic_election_id))
-
-        if try_without_maps_key:
-            # If we have exceeded our account, try without a maps key
-            try:
-                temp_google_client = get_geocoder_for_service('google')()
-                location = temp_google_client.geocode(text_for_map_search)
-            except GeocoderQuotaExceeded:
-                results = {
-                    'status':                   status,
-                    'geocoder_quota_exceeded':  True,
-                    'ballot_returned_found':    ballot_returned_found,
-                    'ballot_returned':          ballot_returned,
-                }
-                return results
-            except Exception as e:
-                location = None
+        location = geocode_results['location']
 
         ballot = None
         if location is None:
@@ -1234,26 +1426,23 @@ class BallotReturnedManager(models.Model):
             status += 'GEOCODER_FOUND_LOCATION '
             address = location.address
             # address has format "line_1, state zip, USA"
-            ballot_returned_query = BallotReturned.objects.all()
-            ballot_returned_query = ballot_returned_query.exclude(polling_location_we_vote_id=None)
             state_code = address.split(', ')[-2][:2]
+            election_id_to_search = 0
             if positive_value_exists(state_code):
-                ballot_returned_query = ballot_returned_query.filter(normalized_state__iexact=state_code)
                 # If we have an active election coming up, including today
                 # fetch_next_upcoming_election_in_this_state returns next election with ballot items
                 upcoming_google_civic_election_id = self.fetch_next_upcoming_election_in_this_state(state_code)
                 if positive_value_exists(upcoming_google_civic_election_id):
-                    ballot_returned_query = ballot_returned_query.filter(
-                        google_civic_election_id=upcoming_google_civic_election_id)
+                    election_id_to_search = upcoming_google_civic_election_id
                 else:
                     past_google_civic_election_id = self.fetch_last_election_in_this_state(state_code)
                     if positive_value_exists(past_google_civic_election_id):
                         # Limit the search to the most recent election with ballot items
-                        ballot_returned_query = ballot_returned_query.filter(
-                            google_civic_election_id=past_google_civic_election_id)
-            ballot_returned_query = ballot_returned_query.annotate(distance=(F('latitude') - location.latitude) ** 2 +
-                                                                            (F('longitude') - location.longitude) ** 2)
-            ballot = ballot_returned_query.order_by('distance').first()
+                        election_id_to_search = past_google_civic_election_id
+            nearest_results = self.retrieve_nearest_ballot_returned_list(
+                location.latitude, location.longitude, state_code, election_id_to_search)
+            if nearest_results['ballot_returned_list_found']:
+                ballot = nearest_results['ballot_returned_list'][0]
 
         if ballot is not None:
             ballot_returned = ballot
@@ -1269,6 +1458,58 @@ class BallotReturnedManager(models.Model):
             'ballot_returned':          ballot_returned,
         }
 
+    def retrieve_nearest_ballot_returned_list(self, latitude, longitude, state_code='', google_civic_election_id=0,
+                                              number_to_return=1):
+        """
+        Find the stored polling location ballots closest to this point, nearest first. The lookup runs against an
+        in-process spatial index for this election + state, so after the index is built the only query is the one
+        that retrieves the number_to_return BallotReturned entries.
+        :param latitude:
+        :param longitude:
+        :param state_code: Limit the search to ballots in this state
+        :param google_civic_election_id: Limit the search to this election. 0 means any election.
+        :param number_to_return:
+        :return:
+        """
+        ballot_returned_list = []
+        google_civic_election_id = convert_to_int(google_civic_election_id)
+
+        def retrieve_location_list():
+            ballot_returned_query = BallotReturned.objects.exclude(polling_location_we_vote_id=None)
+            ballot_returned_query = ballot_returned_query.exclude(latitude=None).exclude(longitude=None)
+            if positive_value_exists(state_code):
+                ballot_returned_query = ballot_returned_query.filter(normalized_state__iexact=state_code)
+            if positive_value_exists(google_civic_election_id):
+                ballot_returned_query = ballot_returned_query.filter(google_civic_election_id=google_civic_election_id)
+            return ballot_returned_query.values_list('id', 'latitude', 'longitude').iterator()
+
+        try:
+            spatial_index = fetch_ballot_returned_spatial_index(google_civic_election_id, state_code,
+                                                                retrieve_location_list)
+            nearest_list = spatial_index.find_nearest(latitude, longitude, number_to_return)
+            ballot_returned_id_list = [ballot_returned_id for ballot_returned_id, distance in nearest_list]
+            ballot_returned_by_id = BallotReturned.objects.in_bulk(ballot_returned_id_list)
+            for ballot_returned_id, distance in nearest_list:
+                if ballot_returned_id in ballot_returned_by_id:
+                    ballot_returned = ballot_returned_by_id[ballot_returned_id]
+                    ballot_returned.distance_in_miles = distance
+                    ballot_returned_list.append(ballot_returned)
+            status = "NEAREST_BALLOT_RETURNED_LIST_RETRIEVED "
+            success = True
+        except Exception as e:
+            handle_exception(e, logger=logger)
+            status = "NEAREST_BALLOT_RETURNED_LIST_FAILED {error} [type: {error_type}] ".format(
+                error=e, error_type=type(e))
+            success = False
+
+        results = {
+            'success':                      success,
+            'status':                       status,
+            'ballot_returned_list_found':   True if len(ballot_returned_list) else False,
+            'ballot_returned_list':         ballot_returned_list,
+        }
+        return results
+
     def update_or_create_ballot_returned(
             self, polling_location_we_vote_id, voter_id, google_civic_election_id, election_date=False,
             election_description_text=False, latitude=False, longitude=False,
@@ -1374,15 +1615,16 @@ class BallotReturnedManager(models.Model):
             ballot_returned_object.normalized_city,
             ballot_returned_object.normalized_state,
             ballot_returned_object.normalized_zip)
-        try:
-            location = self.google_client.geocode(full_ballot_address)
-        except GeocoderQuotaExceeded:
+        geocode_cache_manager = GeocodeCacheManager()
+        geocode_results = geocode_cache_manager.geocode(full_ballot_address, self.google_client)
+        if geocode_results['geocoder_quota_exceeded']:
             results = {
                 'status':                  "GeocoderQuotaExceeded ",
                 'geocoder_quota_exceeded':  True,
                 'success':                  False,
             }
             return results
+        location = geocode_results['location']
 
         if location is None:
             results = {
@@ -1526,6 +1768,39 @@ class BallotReturnedListManager(models.Model):
         }
         return results
 
+    def retrieve_possible_duplicate_ballot_returned_index(self, google_civic_election_id):
+        """
+        Load every BallotReturned in this election into a LocalDuplicateIndex, so
+        is_possible_duplicate_ballot_returned can do the retrieve_possible_duplicate_ballot_returned check without a
+        query per entry
+        :param google_civic_election_id:
+        :return:
+        """
+        duplicate_index = LocalDuplicateIndex()
+        try:
+            ballot_returned_queryset = BallotReturned.objects.filter(google_civic_election_id=google_civic_election_id)
+            for polling_location_we_vote_id, normalized_line1, normalized_zip in ballot_returned_queryset.values_list(
+                    'polling_location_we_vote_id', 'normalized_line1', 'normalized_zip').iterator():
+                duplicate_index.add_entry([
+                    ('address', fetch_duplicate_index_value(normalized_line1),
+                     fetch_duplicate_index_value(normalized_zip)),
+                ], fetch_duplicate_index_value(polling_location_we_vote_id))
+        except Exception as e:
+            handle_exception(e, logger=logger,
+                             exception_message="retrieve_possible_duplicate_ballot_returned_index failed")
+        return duplicate_index
+
+    def is_possible_duplicate_ballot_returned(self, duplicate_index, normalized_line1, normalized_zip,
+                                              polling_location_we_vote_id):
+        """
+        The same test as retrieve_possible_duplicate_ballot_returned, against an index from
+        retrieve_possible_duplicate_ballot_returned_index
+        """
+        if not positive_value_exists(normalized_line1) and not positive_value_exists(normalized_zip):
+            return False
+        key = ('address', fetch_duplicate_index_value(normalized_line1), fetch_duplicate_index_value(normalized_zip))
+        return duplicate_index.has_duplicate([key], fetch_duplicate_index_value(polling_location_we_vote_id))
+
 
 class VoterBallotSaved(models.Model):
     """
@@ -1998,6 +2273,15 @@ def copy_existing_ballot_items_from_stored_ballot(voter_id, text_for_map_search,
     if ballot_returned.voter_id != voter_id:
         copy_item_results = ballot_item_list_manager.copy_ballot_items(ballot_returned, voter_id)
         status += copy_item_results['status']
+        if copy_item_results['ballot_returned_copied']:
+            logger.debug("copy_existing_ballot_items_from_stored_ballot voter_id: {voter_id}, "
+                         "ballot_returned: {ballot_returned_we_vote_id}, created: {created}, updated: {updated}, "
+                         "unchanged: {unchanged}, not_copied: {not_copied}".format(
+                             voter_id=voter_id, ballot_returned_we_vote_id=ballot_returned.we_vote_id,
+                             created=copy_item_results['ballot_items_created'],
+                             updated=copy_item_results['ballot_items_updated'],
+                             unchanged=copy_item_results['ballot_items_unchanged'],
+                             not_copied=copy_item_results['ballot_items_not_copied']))
 
         if not copy_item_results['ballot_returned_copied']:
             error_results = {
@@ -2034,3 +2318,109 @@ def copy_existing_ballot_items_from_stored_ballot(voter_id, text_for_map_search,
         'status':                               status,
     }
     return results
+
+
+class BallotItemListCacheVersion(models.Model):
+    """
+    The version of each election's cached ballot_item_lists (see fetch_ballot_item_list_cache_key). Every write to a
+    CandidateCampaign or ContestOffice in the election moves it forward.
+    """
+    google_civic_election_id = models.PositiveIntegerField(
+        verbose_name="google civic election id", unique=True, db_index=True)
+    cache_version = models.PositiveIntegerField(verbose_name="ballot item list cache version", default=0)
+
+
+def fetch_ballot_item_list_cache_key(google_civic_election_id, ballot_item_list):
+    """
+    Build the cache key for an assembled ballot_item_list. Two voters whose BallotItem entries were copied from the
+    same stored ballot get the same key.
+    :param google_civic_election_id:
+    :param ballot_item_list: BallotItem objects, in display order
+    :return:
+    """
+    google_civic_election_id = convert_to_int(google_civic_election_id)
+    cache_version = 0
+    try:
+        cache_version = BallotItemListCacheVersion.objects.filter(google_civic_election_id=google_civic_election_id)\
+            .values_list('cache_version', flat=True).first() or 0
+    except Exception as e:
+        handle_record_not_found_exception(e, logger=logger)
+    # The candidates of an office are found by contest_office_id when we have it, so it is part of the shape too
+    ballot_shape = [(ballot_item.contest_office_id, ballot_item.contest_office_we_vote_id,
+                     ballot_item.contest_measure_we_vote_id, ballot_item.ballot_item_display_name,
+                     ballot_item.measure_subtitle, ballot_item.google_ballot_placement,
+                     ballot_item.local_ballot_order, ballot_item.google_civic_election_id)
+                    for ballot_item in ballot_item_list]
+    ballot_shape_hash = hashlib.md5(repr(ballot_shape).encode('utf-8')).hexdigest()
+    return "ballot_item_list_{id}_{version}_{shape}".format(
+        id=google_civic_election_id, version=cache_version, shape=ballot_shape_hash)
+
+
+def clear_ballot_item_list_cache_for_election(google_civic_election_id):
+    """
+    Candidates or offices changed in this election, so stop serving the ballot_item_lists cached for it. The version
+    is kept in the database, so every server process stops serving its copy on its next request.
+    :param google_civic_election_id:
+    :return:
+    """
+    google_civic_election_id = convert_to_int(google_civic_election_id)
+    if not positive_value_exists(google_civic_election_id):
+        return
+    version_query = BallotItemListCacheVersion.objects.filter(google_civic_election_id=google_civic_election_id)
+    try:
+        if version_query.update(cache_version=F('cache_version') + 1):
+            return
+        try:
+            with transaction.atomic():
+                BallotItemListCacheVersion.objects.create(google_civic_election_id=google_civic_election_id,
+                                                          cache_version=1)
+        except IntegrityError:
+            # Another process created it first
+            version_query.update(cache_version=F('cache_version') + 1)
+    except Exception as e:
+        handle_record_not_saved_exception(e, logger=logger)
+
+
+def clear_ballot_item_list_cache_for_previous_election(sender, instance):
+    # A candidate or office moved to another election also changes the ballots of the election it was in
+    if not instance.pk:
+        return
+    previous_google_civic_election_id = sender.objects.filter(pk=instance.pk)\
+        .values_list('google_civic_election_id', flat=True).first()
+    if convert_to_int(previous_google_civic_election_id) != convert_to_int(instance.google_civic_election_id):
+        clear_ballot_item_list_cache_for_election(previous_google_civic_election_id)
+
+
+# Keep the cached ballot_item_lists current for every way a candidate or office is written. save() (the admin pages,
+#  for example) and QuerySet.delete (which sends post_delete for each entry) are handled one entry at a time.
+#  bulk_upsert sends neither pre_save nor post_save. It sends post_bulk_upsert once for each batch instead.
+@receiver(pre_save, sender=CandidateCampaign)
+def pre_save_candidate_campaign_signal(sender, instance, **kwargs):
+    clear_ballot_item_list_cache_for_previous_election(sender, instance)
+
+
+@receiver(post_save, sender=CandidateCampaign)
+@receiver(post_delete, sender=CandidateCampaign)
+def save_or_delete_candidate_campaign_signal(sender, instance, **kwargs):
+    clear_ballot_item_list_cache_for_election(instance.google_civic_election_id)
+
+
+@receiver(pre_save, sender=ContestOffice)
+def pre_save_contest_office_signal(sender, instance, **kwargs):
+    clear_ballot_item_list_cache_for_previous_election(sender, instance)
+
+
+@receiver(post_save, sender=ContestOffice)
+@receiver(post_delete, sender=ContestOffice)
+def save_or_delete_contest_office_signal(sender, instance, **kwargs):
+    clear_ballot_item_list_cache_for_election(instance.google_civic_election_id)
+
+
+@receiver(post_bulk_upsert, sender=CandidateCampaign)
+@receiver(post_bulk_upsert, sender=ContestOffice)
+def bulk_upsert_candidate_campaign_or_contest_office_signal(sender, created_entry_list, updated_entry_list,
+                                                            previous_values_by_pk, **kwargs):
+    # One version bump for each election in the batch, including the elections entries were moved out of
+    for google_civic_election_id in fetch_bulk_upsert_google_civic_election_id_set(
+            created_entry_list, updated_entry_list, previous_values_by_pk):
+        clear_ballot_item_list_cache_for_election(google_civic_election_id)
@@ -0,0 +1,139 @@
+# ballot/spatial_index.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+# In-process nearest-neighbour index of the stored polling location ballots (BallotReturned) for one
+# election + state. Points are stored as 3D unit vectors so the straight-line (chord) distance between two points
+# orders them exactly the same way the great-circle distance does. That means there is no longitude compression to
+# correct for at high latitudes, and a plain 3D KD-tree gives us the k nearest ballots.
+
+import heapq
+from math import cos, radians, sin
+import time
+from wevote_functions.functions import convert_to_int
+
+# Rebuild an index this many seconds after it was built, so entries saved by other server processes show up
+SPATIAL_INDEX_TIMEOUT = 900
+EARTH_RADIUS_IN_MILES = 3958.8
+
+# Indexes we have built in this process, keyed by (google_civic_election_id, state_code)
+_spatial_index_cache = {}
+
+
+def convert_latitude_and_longitude_to_unit_vector(latitude, longitude):
+    latitude_radians = radians(latitude)
+    longitude_radians = radians(longitude)
+    return (cos(latitude_radians) * cos(longitude_radians),
+            cos(latitude_radians) * sin(longitude_radians),
+            sin(latitude_radians))
+
+
+def convert_chord_squared_to_miles(chord_squared):
+    # The chord length c between two points on a unit sphere spans an angle of 2 * asin(c / 2). For the distances
+    # between a voter and a nearby polling location, c is small enough that the angle is simply c.
+    return (chord_squared ** 0.5) * EARTH_RADIUS_IN_MILES
+
+
+class BallotReturnedSpatialIndex(object):
+    """
+    A static 3D KD-tree over (ballot_returned_id, latitude, longitude) entries. Build cost is O(n log n) and a
+    k-nearest lookup visits O(log n) nodes, so lookups do not depend on how many polling locations a state has.
+    """
+
+    def __init__(self, location_list):
+        """
+        :param location_list: iterable of (ballot_returned_id, latitude, longitude)
+        """
+        point_list = []
+        for ballot_returned_id, latitude, longitude in location_list:
+            if latitude is None or longitude is None:
+                continue
+            point_list.append(convert_latitude_and_longitude_to_unit_vector(latitude, longitude) +
+                              (ballot_returned_id,))
+        self.size = len(point_list)
+        self.date_built = time.time()
+        self.root = self._build(point_list, 0)
+
+    def _build(self, point_list, depth):
+        if not point_list:
+            return None
+        axis = depth % 3
+        point_list.sort(key=lambda point: point[axis])
+        median = len(point_list) // 2
+        # Each node is (point, axis, left_node, right_node)
+        return (point_list[median], axis,
+                self._build(point_list[:median], depth + 1),
+                self._build(point_list[median + 1:], depth + 1))
+
+    def find_nearest(self, latitude, longitude, number_to_return=1):
+        """
+        :param latitude:
+        :param longitude:
+        :param number_to_return:
+        :return: list of (ballot_returned_id, distance_in_miles), nearest first
+        """
+        if self.root is None or number_to_return < 1:
+            return []
+
+        target = convert_latitude_and_longitude_to_unit_vector(latitude, longitude)
+        # A max-heap (by negated distance) of the best matches found so far
+        best_heap = []
+        # Each entry is (node, a lower bound on the squared distance from target to anything under that node)
+        node_stack = [(self.root, 0.0)]
+        while node_stack:
+            node, minimum_distance_squared = node_stack.pop()
+            if node is None:
+                continue
+            if len(best_heap) == number_to_return and minimum_distance_squared >= -best_heap[0][0]:
+                # Nothing under this node can be closer than what we already have
+                continue
+            point, axis, left_node, right_node = node
+            distance_squared = (point[0] - target[0]) ** 2 + (point[1] - target[1]) ** 2 + \
+                (point[2] - target[2]) ** 2
+            if len(best_heap) < number_to_return:
+                heapq.heappush(best_heap, (-distance_squared, point[3]))
+            elif distance_squared < -best_heap[0][0]:
+                heapq.heapreplace(best_heap, (-distance_squared, point[3]))
+
+            axis_difference = target[axis] - point[axis]
+            near_node, far_node = (left_node, right_node) if axis_difference < 0 else (right_node, left_node)
+            # Visit the near side of the splitting plane first, since that is where the closest points usually are
+            node_stack.append((far_node, max(minimum_distance_squared, axis_difference ** 2)))
+            node_stack.append((near_node, minimum_distance_squared))
+
+        nearest_list = sorted((-negative_distance_squared, ballot_returned_id)
+                              for negative_distance_squared, ballot_returned_id in best_heap)
+        return [(ballot_returned_id, convert_chord_squared_to_miles(distance_squared))
+                for distance_squared, ballot_returned_id in nearest_list]
+
+
+def fetch_ballot_returned_spatial_index(google_civic_election_id, state_code, location_list_function):
+    """
+    Return the index for this election + state, building it if we don't have a current one in this process.
+    :param google_civic_election_id: 0 means every election in this state
+    :param state_code:
+    :param location_list_function: called with no arguments to get the (id, latitude, longitude) entries to index
+    :return:
+    """
+    cache_key = (convert_to_int(google_civic_election_id), state_code.upper() if state_code else '')
+    spatial_index = _spatial_index_cache.get(cache_key)
+    if spatial_index is None or time.time() - spatial_index.date_built > SPATIAL_INDEX_TIMEOUT:
+        spatial_index = BallotReturnedSpatialIndex(location_list_function())
+        _spatial_index_cache[cache_key] = spatial_index
+    return spatial_index
+
+
+def clear_ballot_returned_spatial_index(google_civic_election_id=None):
+    """
+    Throw away the indexes for one election (and the all-elections indexes), or all indexes if no election is given
+    :param google_civic_election_id:
+    :return:
+    """
+    if google_civic_election_id is None:
+        _spatial_index_cache.clear()
+        return
+    # A BallotReturned can carry the id as a string from request data, but the cache keys are ints
+    google_civic_election_id = convert_to_int(google_civic_election_id)
+    for cache_key in list(_spatial_index_cache.keys()):
+        if cache_key[0] in (google_civic_election_id, 0):
+            del _spatial_index_cache[cache_key]
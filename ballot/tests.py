@@ -1,9 +1,17 @@
 from unittest import mock
 from collections import namedtuple
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
 
-from ballot.models import BallotReturned, BallotReturnedManager
+from ballot.controllers import voter_ballot_items_retrieve_for_one_election_for_api
+from ballot.models import BallotItem, BallotItemListCacheVersion, BallotItemListManager, BallotReturned, \
+    BallotReturnedManager, fetch_ballot_item_list_cache_key
+from ballot.spatial_index import clear_ballot_returned_spatial_index, fetch_ballot_returned_spatial_index
+from candidate.models import CandidateCampaign
+from geoip.models import clear_geocode_in_process_cache
+from office.models import ContestOffice
+from wevote_functions.bulk_upsert import bulk_upsert
 
 
 Location = namedtuple('Location', ['address', 'latitude', 'longitude'])
@@ -12,6 +20,7 @@ Location = namedtuple('Location', ['address', 'latitude', 'longitude'])
 class BallotTestCase(TestCase):
 
     def setUp(self):
+        clear_geocode_in_process_cache()
         BallotReturned.objects.create(**{'google_civic_election_id': 4184,
                                          'latitude': 34.6604854,
                                          'longitude': -90.184124,
@@ -85,3 +94,152 @@ class BallotTestCase(TestCase):
                                       'geocoder_quota_exceeded': False,
                                       'ballot_returned_found': True,
                                       'ballot_returned': ballot_in_jackson})
+
+    def test_retrieve_nearest_ballot_returned_list(self):
+        """ The k nearest ballots come back nearest first, and ballots in other states are left out. """
+        ballot_in_coldwater = BallotReturned.objects.get()
+        ballot_in_jackson = BallotReturned.objects.create(**{'google_civic_election_id': 4184,
+                                                             'latitude': 32.269163,
+                                                             'longitude': -90.234566,
+                                                             'normalized_city': 'jackson',
+                                                             'normalized_line1': '1020 w mcdowell rd',
+                                                             'normalized_state': 'MS',
+                                                             'normalized_zip': '39204',
+                                                             'polling_location_we_vote_id': 'wv01ploc42284',
+                                                             })
+        BallotReturned.objects.create(**{'google_civic_election_id': 4184,
+                                         'latitude': 35.1495343,
+                                         'longitude': -90.0489801,
+                                         'normalized_city': 'memphis',
+                                         'normalized_line1': '125 n main st',
+                                         'normalized_state': 'TN',
+                                         'normalized_zip': '38103',
+                                         'polling_location_we_vote_id': 'wv01ploc50001',
+                                         })
+
+        results = self.ballot_manager.retrieve_nearest_ballot_returned_list(32.310251, -90.3289724, 'MS', 4184, 5)
+        self.assertEqual(results['ballot_returned_list'], [ballot_in_jackson, ballot_in_coldwater])
+        self.assertLess(results['ballot_returned_list'][0].distance_in_miles, 10)
+
+    def test_bulk_copy_ballot_items_for_voter(self):
+        """ New items are created, changed items are updated, and repeating the copy changes nothing. """
+        reference_ballot_item_values = [
+            {'contest_office_id': '11', 'contest_office_we_vote_id': 'wv01off11', 'ballot_item_display_name': 'Mayor',
+             'local_ballot_order': 1},
+            {'contest_measure_id': '21', 'contest_measure_we_vote_id': 'wv01meas21',
+             'ballot_item_display_name': 'Measure A', 'local_ballot_order': 2},
+            {'ballot_item_display_name': 'Missing ids', 'local_ballot_order': 3},
+        ]
+        for one_values in reference_ballot_item_values:
+            BallotItem.objects.create(voter_id=0, polling_location_we_vote_id='wv01ploc43132',
+                                      google_civic_election_id='4184', state_code='MS', **one_values)
+        BallotItem.objects.create(voter_id=77, google_civic_election_id='4184', contest_office_id='11',
+                                  contest_office_we_vote_id='wv01off11', ballot_item_display_name='Old name',
+                                  local_ballot_order=5)
+
+        ballot_item_list_manager = BallotItemListManager()
+        reference_list = BallotItem.objects.filter(polling_location_we_vote_id='wv01ploc43132')
+        results = ballot_item_list_manager.bulk_copy_ballot_items_for_voter(reference_list, 77, '4184')
+        self.assertTrue(results['success'])
+        self.assertEqual((results['ballot_items_created'], results['ballot_items_updated'],
+                          results['ballot_items_not_copied']), (1, 1, 1))
+        voter_ballot_items = BallotItem.objects.filter(voter_id=77).order_by('local_ballot_order')
+        self.assertEqual([ballot_item.ballot_item_display_name for ballot_item in voter_ballot_items],
+                         ['Mayor', 'Measure A'])
+
+        results = ballot_item_list_manager.bulk_copy_ballot_items_for_voter(reference_list, 77, '4184')
+        self.assertEqual((results['ballot_items_created'], results['ballot_items_updated'],
+                          results['ballot_items_unchanged']), (0, 0, 2))
+
+
+class BallotReturnedSpatialIndexTestCase(SimpleTestCase):
+
+    def test_election_id_as_string_clears_its_index(self):
+        location_list_function = mock.Mock(return_value=[(1, 34.6604854, -90.184124)])
+        clear_ballot_returned_spatial_index()
+        fetch_ballot_returned_spatial_index(4184, 'ms', location_list_function)
+        fetch_ballot_returned_spatial_index('4184', 'MS', location_list_function)
+        self.assertEqual(location_list_function.call_count, 1)
+
+        # Like BallotReturned.save() with the id from request data
+        clear_ballot_returned_spatial_index('4184')
+        fetch_ballot_returned_spatial_index(4184, 'MS', location_list_function)
+        self.assertEqual(location_list_function.call_count, 2)
+
+
+class BallotItemListCacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.office = ContestOffice.objects.create(office_name='Mayor', google_civic_election_id='4184')
+        BallotItem.objects.create(voter_id=77, google_civic_election_id='4184', contest_office_id=self.office.id,
+                                  contest_office_we_vote_id=self.office.we_vote_id, ballot_item_display_name='Mayor',
+                                  local_ballot_order=1)
+        self.candidate = CandidateCampaign.objects.create(
+            candidate_name='Jane Doe', contest_office_id=self.office.id,
+            contest_office_we_vote_id=self.office.we_vote_id, google_civic_election_id='4184')
+
+    def fetch_candidate_names_on_ballot(self):
+        results = voter_ballot_items_retrieve_for_one_election_for_api('', 77, 4184)
+        self.assertTrue(results['success'])
+        return [one_candidate['ballot_item_display_name']
+                for one_candidate in results['ballot_item_list'][0]['candidate_list']]
+
+    def test_cached_ballot_follows_candidate_writes(self):
+        self.assertEqual(self.fetch_candidate_names_on_ballot(), ['Jane Doe'])
+
+        # Like an edit on the admin candidate page
+        self.candidate.candidate_name = 'Jane Smith'
+        self.candidate.save()
+        self.assertEqual(self.fetch_candidate_names_on_ballot(), ['Jane Smith'])
+
+        # QuerySet.delete doesn't call delete() on each entry
+        CandidateCampaign.objects.filter(id=self.candidate.id).delete()
+        self.assertEqual(self.fetch_candidate_names_on_ballot(), [])
+
+    def test_candidates_are_found_by_office_id_first(self):
+        # Older imports only set the office id
+        CandidateCampaign.objects.create(candidate_name='John Roe', contest_office_id=self.office.id,
+                                         google_civic_election_id='4184')
+        # The office id wins over the office we_vote_id, like in retrieve_all_candidates_for_office
+        CandidateCampaign.objects.create(candidate_name='Other Office', contest_office_id=self.office.id + 1,
+                                         contest_office_we_vote_id=self.office.we_vote_id,
+                                         google_civic_election_id='4184')
+        self.assertEqual(sorted(self.fetch_candidate_names_on_ballot()), ['Jane Doe', 'John Roe'])
+
+    def test_office_and_election_changes_clear_cached_ballots(self):
+        ballot_item_list = list(BallotItem.objects.filter(voter_id=77))
+        cache_key = fetch_ballot_item_list_cache_key(4184, ballot_item_list)
+
+        self.office.office_name = 'Mayor of Coldwater'
+        self.office.save()
+        self.assertNotEqual(fetch_ballot_item_list_cache_key(4184, ballot_item_list), cache_key)
+
+        # A candidate moved to another election changes the ballots of both elections
+        cache_key = fetch_ballot_item_list_cache_key(4184, ballot_item_list)
+        other_election_cache_key = fetch_ballot_item_list_cache_key(5000, ballot_item_list)
+        self.candidate.google_civic_election_id = '5000'
+        self.candidate.save()
+        self.assertNotEqual(fetch_ballot_item_list_cache_key(4184, ballot_item_list), cache_key)
+        self.assertNotEqual(fetch_ballot_item_list_cache_key(5000, ballot_item_list), other_election_cache_key)
+
+    def test_bulk_upsert_clears_each_election_once(self):
+        def fetch_cache_version(google_civic_election_id):
+            return BallotItemListCacheVersion.objects.filter(google_civic_election_id=google_civic_election_id)\
+                .values_list('cache_version', flat=True).first() or 0
+
+        cache_version = fetch_cache_version(4184)
+        bulk_upsert(CandidateCampaign, [
+            {'we_vote_id': 'wv01candbulk{number}'.format(number=number),
+             'candidate_name': 'Candidate {number}'.format(number=number),
+             'contest_office_id': self.office.id, 'contest_office_we_vote_id': self.office.we_vote_id,
+             'google_civic_election_id': '4184'}
+            for number in range(5)])
+        self.assertEqual(fetch_cache_version(4184), cache_version + 1)
+        self.assertEqual(len(self.fetch_candidate_names_on_ballot()), 6)
+
+        # The importer moves a candidate to another election, so the ballots of both elections change
+        bulk_upsert(CandidateCampaign, [{'we_vote_id': 'wv01candbulk0', 'google_civic_election_id': '5000'},
+                                        {'we_vote_id': 'wv01candbulk1', 'candidate_name': 'Candidate One'}])
+        self.assertEqual(fetch_cache_version(4184), cache_version + 2)
+        self.assertEqual(fetch_cache_version(5000), 1)
@@ -23,6 +23,7 @@ import time
 from voter.models import voter_has_authority
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, positive_value_exists
+from wevote_functions.master_sync import fetch_sync_out_changed_since, fetch_sync_out_watermark, sync_out_response
 from django.http import HttpResponse
 import json
 
@@ -35,6 +36,8 @@ logger = wevote_functions.admin.get_logger(__name__)
 def ballot_items_sync_out_view(request):  # ballotItemsSyncOut
     google_civic_election_id = convert_to_int(request.GET.get('google_civic_election_id', 0))
     state_code = request.GET.get('state_code', False)
+    changed_since = fetch_sync_out_changed_since(request)
+    sync_watermark = fetch_sync_out_watermark()
 
     if not positive_value_exists(google_civic_election_id) and not positive_value_exists(state_code):
         json_data = {
@@ -48,6 +51,8 @@ def ballot_items_sync_out_view(request):  # ballotItemsSyncOut
         # We only want BallotItem values associated with polling locations
         ballot_item_list = ballot_item_list.exclude(polling_location_we_vote_id__isnull=True)
         ballot_item_list = ballot_item_list.exclude(polling_location_we_vote_id__iexact='')
+        if changed_since is not None:
+            ballot_item_list = ballot_item_list.filter(date_last_changed__gte=changed_since)
         if positive_value_exists(google_civic_election_id):
             ballot_item_list = ballot_item_list.filter(google_civic_election_id=google_civic_election_id)
         if positive_value_exists(state_code):
@@ -55,13 +60,12 @@ def ballot_items_sync_out_view(request):  # ballotItemsSyncOut
 
         # serializer = BallotItemSerializer(ballot_item_list, many=True)
         # return Response(serializer.data)
-        ballot_item_list_dict = ballot_item_list.values('ballot_item_display_name', 'contest_office_we_vote_id',
-                                                        'contest_measure_we_vote_id', 'google_ballot_placement',
-                                                        'google_civic_election_id', 'state_code', 'local_ballot_order',
-                                                        'measure_subtitle', 'polling_location_we_vote_id')
-        if ballot_item_list_dict:
-            ballot_item_list_json = list(ballot_item_list_dict)
-            return HttpResponse(json.dumps(ballot_item_list_json), content_type='application/json')
+        response = sync_out_response(request, ballot_item_list, [
+            'ballot_item_display_name', 'contest_office_we_vote_id', 'contest_measure_we_vote_id',
+            'google_ballot_placement', 'google_civic_election_id', 'state_code', 'local_ballot_order',
+            'measure_subtitle', 'polling_location_we_vote_id'], sync_watermark)
+        if response is not None:
+            return response
     except Exception as e:
         pass
 
@@ -143,6 +147,8 @@ def ballot_returned_delete_process_view(request, ballot_returned_id):
 def ballot_returned_sync_out_view(request):  # ballotReturnedSyncOut
     google_civic_election_id = convert_to_int(request.GET.get('google_civic_election_id', 0))
     state_code = request.GET.get('state_code', '')
+    changed_since = fetch_sync_out_changed_since(request)
+    sync_watermark = fetch_sync_out_watermark()
 
     if not positive_value_exists(google_civic_election_id) and not positive_value_exists(state_code):
         json_data = {
@@ -156,6 +162,8 @@ def ballot_returned_sync_out_view(request):  # ballotReturnedSyncOut
         # We only want BallotReturned values associated with polling locations
         ballot_returned_list = ballot_returned_list.exclude(polling_location_we_vote_id__isnull=True)
         ballot_returned_list = ballot_returned_list.exclude(polling_location_we_vote_id__iexact='')
+        if changed_since is not None:
+            ballot_returned_list = ballot_returned_list.filter(date_last_changed__gte=changed_since)
         if positive_value_exists(google_civic_election_id):
             ballot_returned_list = ballot_returned_list.filter(google_civic_election_id=google_civic_election_id)
         if positive_value_exists(state_code):
@@ -163,18 +171,14 @@ def ballot_returned_sync_out_view(request):  # ballotReturnedSyncOut
 
         # serializer = BallotReturnedSerializer(ballot_returned_list, many=True)
         # return Response(serializer.data)
-        if ballot_returned_list:
-            ballot_returned_list = ballot_returned_list.extra(
-                select={'election_date': "to_char(election_date, 'YYYY-MM-DD')"})
-            ballot_returned_list_dict = ballot_returned_list.values('election_date', 'election_description_text',
-                                                                    'google_civic_election_id', 'latitude', 'longitude',
-                                                                    'normalized_line1', 'normalized_line2',
-                                                                    'normalized_city', 'normalized_state',
-                                                                    'normalized_zip', 'polling_location_we_vote_id',
-                                                                    'text_for_map_search')
-            if ballot_returned_list_dict:
-                ballot_returned_list_json = list(ballot_returned_list_dict)
-                return HttpResponse(json.dumps(ballot_returned_list_json), content_type='application/json')
+        ballot_returned_list = ballot_returned_list.extra(
+            select={'election_date': "to_char(election_date, 'YYYY-MM-DD')"})
+        response = sync_out_response(request, ballot_returned_list, [
+            'election_date', 'election_description_text', 'google_civic_election_id', 'latitude', 'longitude',
+            'normalized_line1', 'normalized_line2', 'normalized_city', 'normalized_state', 'normalized_zip',
+            'polling_location_we_vote_id', 'text_for_map_search'], sync_watermark)
+        if response is not None:
+            return response
     except Exception as e:
         pass
 
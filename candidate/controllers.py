@@ -18,7 +18,9 @@ from position.controllers import update_all_position_details_from_candidate
 from twitter.models import TwitterUserManager
 import requests
 import wevote_functions.admin
-from wevote_functions.functions import positive_value_exists, process_request_from_master, convert_to_int
+from wevote_functions.bulk_upsert import bulk_upsert
+from wevote_functions.functions import canonicalize_we_vote_id, positive_value_exists, convert_to_int
+from wevote_functions.master_sync import import_from_master_server_in_chunks
 
 logger = wevote_functions.admin.get_logger(__name__)
 
@@ -48,8 +50,15 @@ def candidates_import_from_master_server(request, google_civic_election_id='', s
     :param state_code:
     :return:
     """
+    duplicate_index_by_election = {}
 
-    import_results, structured_json = process_request_from_master(
+    def import_candidates_chunk(structured_json):
+        results = filter_candidates_structured_json_for_local_duplicates(structured_json, duplicate_index_by_election)
+        import_results = candidates_import_from_structured_json(results['structured_json'])
+        import_results['duplicates_removed'] = results['duplicates_removed']
+        return import_results
+
+    return import_from_master_server_in_chunks(
         request, "Loading Candidates from We Vote Master servers",
         CANDIDATES_SYNC_URL,
         {
@@ -57,18 +66,8 @@ def candidates_import_from_master_server(request, google_civic_election_id='', s
             "format": 'json',
             "google_civic_election_id": str(google_civic_election_id),
             "state_code": state_code,
-        }
-    )
-
-    if import_results['success']:
-        results = filter_candidates_structured_json_for_local_duplicates(structured_json)
-        filtered_structured_json = results['structured_json']
-        duplicates_removed = results['duplicates_removed']
-
-        import_results = candidates_import_from_structured_json(filtered_structured_json)
-        import_results['duplicates_removed'] = duplicates_removed
-
-    return import_results
+        },
+        import_candidates_chunk, 'candidates')
 
 
 def find_duplicate_candidate(we_vote_candidate, ignore_candidate_id_list=[]):
@@ -181,17 +180,22 @@ def merge_duplicate_candidates(candidate1, candidate2, merge_conflict_values):
     return results
 
 
-def filter_candidates_structured_json_for_local_duplicates(structured_json):
+def filter_candidates_structured_json_for_local_duplicates(structured_json, duplicate_index_by_election=None):
     """
     With this function, we remove candidates that seem to be duplicates, but have different we_vote_id's.
     We do not check to see if we have a matching office this routine -- that is done elsewhere.
     :param structured_json:
+    :param duplicate_index_by_election: when importing in chunks, pass the same dict with each chunk so we only load
+     the local entries once
     :return:
     """
     processed = 0
     duplicates_removed = 0
     filtered_structured_json = []
     candidate_list_manager = CandidateCampaignListManager()
+    # We load the local candidates for each election once, instead of running a query for every incoming candidate
+    if duplicate_index_by_election is None:
+        duplicate_index_by_election = {}
     for one_candidate in structured_json:
         candidate_name = one_candidate['candidate_name'] if 'candidate_name' in one_candidate else ''
         google_civic_candidate_name = one_candidate['google_civic_candidate_name'] \
@@ -199,8 +203,6 @@ def filter_candidates_structured_json_for_local_duplicates(structured_json):
         we_vote_id = one_candidate['we_vote_id'] if 'we_vote_id' in one_candidate else ''
         google_civic_election_id = \
             one_candidate['google_civic_election_id'] if 'google_civic_election_id' in one_candidate else ''
-        contest_office_we_vote_id = \
-            one_candidate['contest_office_we_vote_id'] if 'contest_office_we_vote_id' in one_candidate else ''
         politician_we_vote_id = one_candidate['politician_we_vote_id'] \
             if 'politician_we_vote_id' in one_candidate else ''
         candidate_twitter_handle = one_candidate['candidate_twitter_handle'] \
@@ -211,12 +213,15 @@ def filter_candidates_structured_json_for_local_duplicates(structured_json):
         # Check to see if there is an entry that matches in all critical ways, minus the we_vote_id
         we_vote_id_from_master = we_vote_id
 
-        results = candidate_list_manager.retrieve_possible_duplicate_candidates(
-            candidate_name, google_civic_candidate_name, google_civic_election_id, contest_office_we_vote_id,
-            politician_we_vote_id, candidate_twitter_handle, vote_smart_id, maplight_id,
-            we_vote_id_from_master)
+        election_key = str(google_civic_election_id)
+        if election_key not in duplicate_index_by_election:
+            duplicate_index_by_election[election_key] = \
+                candidate_list_manager.retrieve_possible_duplicate_candidates_index(google_civic_election_id)
 
-        if results['candidate_list_found']:
+        if candidate_list_manager.is_possible_duplicate_candidate(
+                duplicate_index_by_election[election_key], candidate_name, google_civic_candidate_name,
+                politician_we_vote_id, candidate_twitter_handle, vote_smart_id, maplight_id,
+                we_vote_id_from_master):
             # print("Skipping candidate " + str(candidate_name) + ",  " + str(google_civic_candidate_name) + ",  " +
             #       str(google_civic_election_id) + ",  " + str(contest_office_we_vote_id) + ",  " +
             #       str(politician_we_vote_id) + ",  " + str(candidate_twitter_handle) + ",  " +
@@ -240,10 +245,23 @@ def filter_candidates_structured_json_for_local_duplicates(structured_json):
 
 
 def candidates_import_from_structured_json(structured_json):
-    candidate_campaign_manager = CandidateCampaignManager()
-    candidates_saved = 0
-    candidates_updated = 0
+    """
+    Candidates are matched on we_vote_id and written with bulk_upsert, a batch at a time
+    :param structured_json:
+    :return:
+    """
     candidates_not_processed = 0
+
+    # This routine imports from another We Vote server, so a contest_office_id doesn't come from import
+    # Look up contest_office in this local database.
+    # If we don't find a contest_office by we_vote_id, then we know the contest_office hasn't been imported
+    # from another server yet, so we fail out.
+    contest_office_manager = ContestOfficeManager()
+    contest_office_id_dict = contest_office_manager.fetch_contest_office_id_dict_from_we_vote_id_list(
+        [one_candidate['contest_office_we_vote_id'] for one_candidate in structured_json
+         if 'contest_office_we_vote_id' in one_candidate])
+
+    candidate_values_list = []
     for one_candidate in structured_json:
         candidate_name = one_candidate['candidate_name'] if 'candidate_name' in one_candidate else ''
         we_vote_id = one_candidate['we_vote_id'] if 'we_vote_id' in one_candidate else ''
@@ -252,103 +270,78 @@ def candidates_import_from_structured_json(structured_json):
         ocd_division_id = one_candidate['ocd_division_id'] if 'ocd_division_id' in one_candidate else ''
         contest_office_we_vote_id = \
             one_candidate['contest_office_we_vote_id'] if 'contest_office_we_vote_id' in one_candidate else ''
+        contest_office_id = contest_office_id_dict.get(canonicalize_we_vote_id(contest_office_we_vote_id), 0)
 
-        # This routine imports from another We Vote server, so a contest_office_id doesn't come from import
-        # Look up contest_office in this local database.
-        # If we don't find a contest_office by we_vote_id, then we know the contest_office hasn't been imported
-        # from another server yet, so we fail out.
-        contest_office_manager = ContestOfficeManager()
-        contest_office_id = contest_office_manager.fetch_contest_office_id_from_we_vote_id(
-            contest_office_we_vote_id)
-
-        if positive_value_exists(candidate_name) and positive_value_exists(google_civic_election_id) \
-                and positive_value_exists(we_vote_id) and positive_value_exists(contest_office_id):
-            proceed_to_update_or_create = True
-        else:
-            proceed_to_update_or_create = False
-        if proceed_to_update_or_create:
-            updated_candidate_campaign_values = {
-                # Values we search against
-                'google_civic_election_id': google_civic_election_id,
-                'ocd_division_id': ocd_division_id,
-                'contest_office_we_vote_id': contest_office_we_vote_id,
-                'candidate_name': candidate_name,
-                # The rest of the values
-                'we_vote_id': we_vote_id,
-                'maplight_id': one_candidate['maplight_id'] if 'maplight_id' in one_candidate else None,
-                'vote_smart_id': one_candidate['vote_smart_id'] if 'vote_smart_id' in one_candidate else None,
-                'contest_office_id': contest_office_id,  # Retrieved from above
-                'politician_we_vote_id':
-                    one_candidate['politician_we_vote_id'] if 'politician_we_vote_id' in one_candidate else '',
-                'state_code': one_candidate['state_code'] if 'state_code' in one_candidate else '',
-                'party': one_candidate['party'] if 'party' in one_candidate else '',
-                'order_on_ballot': one_candidate['order_on_ballot'] if 'order_on_ballot' in one_candidate else 0,
-                'candidate_url': one_candidate['candidate_url'] if 'candidate_url' in one_candidate else '',
-                'photo_url': one_candidate['photo_url'] if 'photo_url' in one_candidate else '',
-                'photo_url_from_maplight':
-                    one_candidate['photo_url_from_maplight'] if 'photo_url_from_maplight' in one_candidate else '',
-                'photo_url_from_vote_smart':
-                    one_candidate['photo_url_from_vote_smart'] if 'photo_url_from_vote_smart' in one_candidate else '',
-                'facebook_url': one_candidate['facebook_url'] if 'facebook_url' in one_candidate else '',
-                'twitter_url': one_candidate['twitter_url'] if 'twitter_url' in one_candidate else '',
-                'google_plus_url': one_candidate['google_plus_url'] if 'google_plus_url' in one_candidate else '',
-                'youtube_url': one_candidate['youtube_url'] if 'youtube_url' in one_candidate else '',
-                'google_civic_candidate_name':
-                    one_candidate['google_civic_candidate_name']
-                    if 'google_civic_candidate_name' in one_candidate else '',
-                'candidate_email': one_candidate['candidate_email'] if 'candidate_email' in one_candidate else '',
-                'candidate_phone': one_candidate['candidate_phone'] if 'candidate_phone' in one_candidate else '',
-                'twitter_user_id': one_candidate['twitter_user_id'] if 'twitter_user_id' in one_candidate else '',
-                'candidate_twitter_handle': one_candidate['candidate_twitter_handle']
-                    if 'candidate_twitter_handle' in one_candidate else '',
-                'twitter_name': one_candidate['twitter_name'] if 'twitter_name' in one_candidate else '',
-                'twitter_location': one_candidate['twitter_location'] if 'twitter_location' in one_candidate else '',
-                'twitter_followers_count': one_candidate['twitter_followers_count']
-                    if 'twitter_followers_count' in one_candidate else '',
-                'twitter_profile_image_url_https': one_candidate['twitter_profile_image_url_https']
-                    if 'twitter_profile_image_url_https' in one_candidate else '',
-                'twitter_description': one_candidate['twitter_description']
-                    if 'twitter_description' in one_candidate else '',
-                'wikipedia_page_id': one_candidate['wikipedia_page_id']
-                    if 'wikipedia_page_id' in one_candidate else '',
-                'wikipedia_page_title': one_candidate['wikipedia_page_title']
-                    if 'wikipedia_page_title' in one_candidate else '',
-                'wikipedia_photo_url': one_candidate['wikipedia_photo_url']
-                    if 'wikipedia_photo_url' in one_candidate else '',
-                'ballotpedia_page_title': one_candidate['ballotpedia_page_title']
-                    if 'ballotpedia_page_title' in one_candidate else '',
-                'ballotpedia_photo_url': one_candidate['ballotpedia_photo_url']
-                    if 'ballotpedia_photo_url' in one_candidate else '',
-                'ballot_guide_official_statement': one_candidate['ballot_guide_official_statement']
-                    if 'ballot_guide_official_statement' in one_candidate else '',
-            }
-            results = candidate_campaign_manager.update_or_create_candidate_campaign(
-                we_vote_id, google_civic_election_id, ocd_division_id,
-                contest_office_id, contest_office_we_vote_id,
-                candidate_name, updated_candidate_campaign_values)
-        else:
+        if not positive_value_exists(candidate_name) or not positive_value_exists(google_civic_election_id) \
+                or not positive_value_exists(we_vote_id) or not positive_value_exists(contest_office_id):
             candidates_not_processed += 1
-            results = {
-                'success': False,
-                'status': 'Required value missing, cannot update or create'
-            }
+            continue
 
-        if results['success']:
-            if results['new_candidate_created']:
-                candidates_saved += 1
-            else:
-                candidates_updated += 1
+        candidate_values = {
+            'google_civic_election_id': google_civic_election_id,
+            'ocd_division_id': ocd_division_id,
+            'contest_office_we_vote_id': contest_office_we_vote_id,
+            'candidate_name': candidate_name,
+            'we_vote_id': we_vote_id,
+            # Like CandidateCampaign.save(), we store an empty maplight_id as None, since maplight_id is unique
+            'maplight_id': one_candidate.get('maplight_id') or None,
+            'vote_smart_id': one_candidate['vote_smart_id'] if 'vote_smart_id' in one_candidate else None,
+            'contest_office_id': contest_office_id,  # Retrieved from above
+            'politician_we_vote_id':
+                one_candidate['politician_we_vote_id'] if 'politician_we_vote_id' in one_candidate else '',
+            'state_code': one_candidate['state_code'] if 'state_code' in one_candidate else '',
+            'party': one_candidate['party'] if 'party' in one_candidate else '',
+            'order_on_ballot': one_candidate['order_on_ballot'] if 'order_on_ballot' in one_candidate else 0,
+            'candidate_url': one_candidate['candidate_url'] if 'candidate_url' in one_candidate else '',
+            'photo_url': one_candidate['photo_url'] if 'photo_url' in one_candidate else '',
+            'photo_url_from_maplight':
+                one_candidate['photo_url_from_maplight'] if 'photo_url_from_maplight' in one_candidate else '',
+            'photo_url_from_vote_smart':
+                one_candidate['photo_url_from_vote_smart'] if 'photo_url_from_vote_smart' in one_candidate else '',
+            'facebook_url': one_candidate['facebook_url'] if 'facebook_url' in one_candidate else '',
+            'twitter_url': one_candidate['twitter_url'] if 'twitter_url' in one_candidate else '',
+            'google_plus_url': one_candidate['google_plus_url'] if 'google_plus_url' in one_candidate else '',
+            'youtube_url': one_candidate['youtube_url'] if 'youtube_url' in one_candidate else '',
+            'google_civic_candidate_name':
+                one_candidate['google_civic_candidate_name']
+                if 'google_civic_candidate_name' in one_candidate else '',
+            'candidate_email': one_candidate['candidate_email'] if 'candidate_email' in one_candidate else '',
+            'candidate_phone': one_candidate['candidate_phone'] if 'candidate_phone' in one_candidate else '',
+            'twitter_user_id': one_candidate['twitter_user_id'] if 'twitter_user_id' in one_candidate else '',
+            'candidate_twitter_handle': one_candidate['candidate_twitter_handle']
+                if 'candidate_twitter_handle' in one_candidate else '',
+            'twitter_name': one_candidate['twitter_name'] if 'twitter_name' in one_candidate else '',
+            'twitter_location': one_candidate['twitter_location'] if 'twitter_location' in one_candidate else '',
+            'twitter_followers_count': one_candidate['twitter_followers_count']
+                if 'twitter_followers_count' in one_candidate else '',
+            'twitter_profile_image_url_https': one_candidate['twitter_profile_image_url_https']
+                if 'twitter_profile_image_url_https' in one_candidate else '',
+            'twitter_description': one_candidate['twitter_description']
+                if 'twitter_description' in one_candidate else '',
+            'wikipedia_page_id': one_candidate['wikipedia_page_id']
+                if 'wikipedia_page_id' in one_candidate else '',
+            'wikipedia_page_title': one_candidate['wikipedia_page_title']
+                if 'wikipedia_page_title' in one_candidate else '',
+            'wikipedia_photo_url': one_candidate['wikipedia_photo_url']
+                if 'wikipedia_photo_url' in one_candidate else '',
+            'ballotpedia_page_title': one_candidate['ballotpedia_page_title']
+                if 'ballotpedia_page_title' in one_candidate else '',
+            'ballotpedia_photo_url': one_candidate['ballotpedia_photo_url']
+                if 'ballotpedia_photo_url' in one_candidate else '',
+            'ballot_guide_official_statement': one_candidate['ballot_guide_official_statement']
+                if 'ballot_guide_official_statement' in one_candidate else '',
+        }
+        candidate_values_list.append(candidate_values)
 
-        processed = candidates_not_processed + candidates_saved + candidates_updated
-        if not processed % 10000:
-            print("... candidates processed for update/create: " + str(processed) + " of " + str(len(structured_json)))
+    # bulk_upsert sends post_bulk_upsert for each batch, which clears the cached ballots once for each election in it
+    results = bulk_upsert(CandidateCampaign, candidate_values_list)
 
     candidates_results = {
         'success':          True,
-        'status':           "CANDIDATES_IMPORT_PROCESS_COMPLETE",
-        'saved':            candidates_saved,
-        'updated':          candidates_updated,
-        'not_processed':    candidates_not_processed,
+        'status':           "CANDIDATES_IMPORT_PROCESS_COMPLETE " + results['status'],
+        'saved':            results['saved'],
+        'updated':          results['updated'],
+        'not_processed':    candidates_not_processed + results['not_processed'],
     }
     return candidates_results
 
@@ -13,6 +13,7 @@ import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, display_full_name_with_correct_capitalization, \
     extract_first_name_from_full_name, \
     extract_last_name_from_full_name, extract_state_from_ocd_division_id, extract_twitter_handle_from_text_string, \
+    canonicalize_we_vote_id, canonicalize_we_vote_id_list, fetch_duplicate_index_value, LocalDuplicateIndex, \
     positive_value_exists
 
 logger = wevote_functions.admin.get_logger(__name__)
@@ -72,6 +73,71 @@ class CandidateCampaignListManager(models.Model):
         }
         return results
 
+    def retrieve_all_candidates_for_office_list(self, office_list):
+        """
+        Retrieve the candidates for every office in office_list with one query, so we don't have to call
+        retrieve_all_candidates_for_office once per office on a ballot. Like retrieve_all_candidates_for_office, an
+        office's candidates are found by office_id when we have it, and by office_we_vote_id when we don't.
+        :param office_list: (office_id, office_we_vote_id) for each office
+        :return: candidate_list_by_office is a dict with office_we_vote_id as the key, and a list of candidates
+         (ordered the same way as retrieve_all_candidates_for_office) as the value
+        """
+        candidate_list_by_office = {}
+        candidate_list_found = False
+        # Some imports leave contest_office_we_vote_id empty on the candidate, so the id comes first
+        office_we_vote_id_by_office_id = {}
+        office_we_vote_id_list = []
+        for office_id, office_we_vote_id in office_list:
+            if not positive_value_exists(office_we_vote_id):
+                continue
+            if positive_value_exists(office_id):
+                office_we_vote_id_by_office_id[str(office_id)] = office_we_vote_id
+            else:
+                office_we_vote_id_list.append(office_we_vote_id)
+
+        if not len(office_we_vote_id_by_office_id) and not len(office_we_vote_id_list):
+            status = 'VALID_OFFICE_LIST_MISSING'
+            results = {
+                'success':                  False,
+                'status':                   status,
+                'candidate_list_found':     candidate_list_found,
+                'candidate_list_by_office': candidate_list_by_office,
+            }
+            return results
+
+        try:
+            candidate_queryset = CandidateCampaign.objects.filter(
+                Q(contest_office_id__in=list(office_we_vote_id_by_office_id.keys())) |
+                Q(contest_office_we_vote_id__in=office_we_vote_id_list))
+            candidate_queryset = candidate_queryset.order_by('-twitter_followers_count')
+            office_we_vote_id_set = set(office_we_vote_id_list)
+            for candidate in candidate_queryset:
+                if candidate.contest_office_id in office_we_vote_id_by_office_id:
+                    candidate_list_by_office.setdefault(
+                        office_we_vote_id_by_office_id[candidate.contest_office_id], []).append(candidate)
+                if candidate.contest_office_we_vote_id in office_we_vote_id_set:
+                    candidate_list_by_office.setdefault(candidate.contest_office_we_vote_id, []).append(candidate)
+
+            if len(candidate_list_by_office):
+                candidate_list_found = True
+                status = 'CANDIDATES_RETRIEVED_FOR_OFFICE_LIST'
+            else:
+                status = 'NO_CANDIDATES_RETRIEVED_FOR_OFFICE_LIST'
+            success = True
+        except Exception as e:
+            handle_exception(e, logger=logger)
+            status = 'FAILED retrieve_all_candidates_for_office_list ' \
+                     '{error} [type: {error_type}]'.format(error=e, error_type=type(e))
+            success = False
+
+        results = {
+            'success':                  success,
+            'status':                   status,
+            'candidate_list_found':     candidate_list_found,
+            'candidate_list_by_office': candidate_list_by_office,
+        }
+        return results
+
     def retrieve_all_candidates_for_upcoming_election(self, google_civic_election_id=0, state_code='',
                                                       return_list_of_objects=False):
         candidate_list_objects = []
@@ -327,6 +393,61 @@ class CandidateCampaignListManager(models.Model):
         }
         return results
 
+    def retrieve_possible_duplicate_candidates_index(self, google_civic_election_id):
+        """
+        Load every candidate in this election into a LocalDuplicateIndex, so is_possible_duplicate_candidate can do
+        the retrieve_possible_duplicate_candidates check without a query per candidate
+        :param google_civic_election_id:
+        :return:
+        """
+        duplicate_index = LocalDuplicateIndex()
+        try:
+            candidate_queryset = CandidateCampaign.objects.filter(google_civic_election_id=google_civic_election_id)
+            for we_vote_id, google_civic_candidate_name, candidate_name, politician_we_vote_id, \
+                    candidate_twitter_handle, vote_smart_id, maplight_id in candidate_queryset.values_list(
+                        'we_vote_id', 'google_civic_candidate_name', 'candidate_name', 'politician_we_vote_id',
+                        'candidate_twitter_handle', 'vote_smart_id', 'maplight_id').iterator():
+                duplicate_index.add_entry([
+                    ('google_civic_candidate_name', fetch_duplicate_index_value(google_civic_candidate_name, False)),
+                    ('candidate_name', fetch_duplicate_index_value(candidate_name)),
+                    ('politician_we_vote_id', fetch_duplicate_index_value(politician_we_vote_id)),
+                    ('candidate_twitter_handle', fetch_duplicate_index_value(candidate_twitter_handle)),
+                    ('vote_smart_id', fetch_duplicate_index_value(vote_smart_id, False)),
+                    ('maplight_id', fetch_duplicate_index_value(maplight_id, False)),
+                ], canonicalize_we_vote_id(we_vote_id))
+        except Exception as e:
+            handle_exception(e, logger=logger, exception_message="retrieve_possible_duplicate_candidates_index failed")
+        return duplicate_index
+
+    def is_possible_duplicate_candidate(self, duplicate_index, candidate_name, google_civic_candidate_name,
+                                        politician_we_vote_id, candidate_twitter_handle, vote_smart_id, maplight_id,
+                                        we_vote_id_from_master=''):
+        """
+        The same test as retrieve_possible_duplicate_candidates, against an index from
+        retrieve_possible_duplicate_candidates_index
+        """
+        key_list = []
+        if positive_value_exists(google_civic_candidate_name):
+            # We intentionally use case sensitive matching here
+            key_list.append(('google_civic_candidate_name',
+                             fetch_duplicate_index_value(google_civic_candidate_name, False)))
+        elif positive_value_exists(candidate_name):
+            key_list.append(('candidate_name', fetch_duplicate_index_value(candidate_name)))
+        if positive_value_exists(politician_we_vote_id):
+            key_list.append(('politician_we_vote_id', fetch_duplicate_index_value(politician_we_vote_id)))
+        if positive_value_exists(candidate_twitter_handle):
+            key_list.append(('candidate_twitter_handle', fetch_duplicate_index_value(candidate_twitter_handle)))
+        if positive_value_exists(vote_smart_id):
+            key_list.append(('vote_smart_id', fetch_duplicate_index_value(vote_smart_id, False)))
+        if positive_value_exists(maplight_id):
+            key_list.append(('maplight_id', fetch_duplicate_index_value(maplight_id, False)))
+        if not len(key_list):
+            key_list.append(LocalDuplicateIndex.ANY_ENTRY)
+
+        identity_to_ignore = canonicalize_we_vote_id(we_vote_id_from_master) \
+            if positive_value_exists(we_vote_id_from_master) else None
+        return duplicate_index.has_duplicate(key_list, identity_to_ignore)
+
     def retrieve_candidates_from_non_unique_identifiers(self, google_civic_election_id, state_code,
                                                         candidate_twitter_handle, candidate_name):
         keep_looking_for_duplicates = True
@@ -543,6 +664,8 @@ class CandidateCampaign(models.Model):
     candidate_is_top_ticket = models.BooleanField(verbose_name="candidate is top ticket", default=False)
     candidate_is_incumbent = models.BooleanField(verbose_name="candidate is the current incumbent", default=False)
 
+    date_last_changed = models.DateTimeField(verbose_name='date last changed', null=True, auto_now=True)
+
     def election(self):
         try:
             election = Election.objects.get(google_civic_election_id=self.google_civic_election_id)
@@ -780,6 +903,21 @@ class CandidateCampaignManager(models.Model):
             return candidate_campaign.google_civic_candidate_name
         return 0
 
+    def fetch_candidate_campaign_id_and_name_dict_from_we_vote_id_list(self, we_vote_id_list):
+        """
+        Like fetch_candidate_campaign_id_from_we_vote_id and fetch_google_civic_candidate_name_from_we_vote_id, for a
+        list of candidates in one query
+        :param we_vote_id_list:
+        :return: we_vote_id -> (candidate_campaign_id, google_civic_candidate_name), for the candidates we have
+        """
+        we_vote_id_list = canonicalize_we_vote_id_list(we_vote_id_list)
+        if not we_vote_id_list:
+            return {}
+        return {we_vote_id: (candidate_campaign_id, google_civic_candidate_name)
+                for we_vote_id, candidate_campaign_id, google_civic_candidate_name
+                in CandidateCampaign.objects.filter(we_vote_id__in=we_vote_id_list)
+                .values_list('we_vote_id', 'id', 'google_civic_candidate_name')}
+
     def retrieve_candidate_campaign_from_maplight_id(self, candidate_maplight_id):
         candidate_campaign_id = 0
         we_vote_id = ''
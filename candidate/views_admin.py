@@ -27,6 +27,7 @@ from voter.models import voter_has_authority
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, extract_twitter_handle_from_text_string, \
     positive_value_exists, STATE_CODE_MAP
+from wevote_functions.master_sync import fetch_sync_out_changed_since, fetch_sync_out_watermark, sync_out_response
 from django.http import HttpResponse
 import json
 
@@ -41,9 +42,13 @@ def candidates_sync_out_view(request):  # candidatesSyncOut
     google_civic_election_id = convert_to_int(request.GET.get('google_civic_election_id', 0))
     state_code = request.GET.get('state_code', '')
     candidate_search = request.GET.get('candidate_search', '')
+    changed_since = fetch_sync_out_changed_since(request)
+    sync_watermark = fetch_sync_out_watermark()
 
     try:
         candidate_list = CandidateCampaign.objects.all()
+        if changed_since is not None:
+            candidate_list = candidate_list.filter(date_last_changed__gte=changed_since)
         if positive_value_exists(google_civic_election_id):
             candidate_list = candidate_list.filter(google_civic_election_id=google_civic_election_id)
         if positive_value_exists(state_code):
@@ -75,23 +80,17 @@ def candidates_sync_out_view(request):  # candidatesSyncOut
 
                 candidate_list = candidate_list.filter(final_filters)
 
-        candidate_list_dict = candidate_list.values('we_vote_id', 'maplight_id', 'vote_smart_id',
-                                                    'contest_office_we_vote_id', 'politician_we_vote_id',
-                                                    'candidate_name', 'google_civic_candidate_name', 'party',
-                                                    'photo_url', 'photo_url_from_maplight',
-                                                    'photo_url_from_vote_smart', 'order_on_ballot',
-                                                    'google_civic_election_id', 'ocd_division_id', 'state_code',
-                                                    'candidate_url', 'facebook_url', 'twitter_url',
-                                                    'twitter_user_id', 'candidate_twitter_handle', 'twitter_name',
-                                                    'twitter_location', 'twitter_followers_count',
-                                                    'twitter_profile_image_url_https', 'twitter_description',
-                                                    'google_plus_url', 'youtube_url', 'candidate_email',
-                                                    'candidate_phone', 'wikipedia_page_id', 'wikipedia_page_title',
-                                                    'wikipedia_photo_url', 'ballotpedia_page_title',
-                                                    'ballotpedia_photo_url', 'ballot_guide_official_statement')
-        if candidate_list_dict:
-            candidate_list_json = list(candidate_list_dict)
-            return HttpResponse(json.dumps(candidate_list_json), content_type='application/json')
+        response = sync_out_response(request, candidate_list, [
+            'we_vote_id', 'maplight_id', 'vote_smart_id', 'contest_office_we_vote_id', 'politician_we_vote_id',
+            'candidate_name', 'google_civic_candidate_name', 'party', 'photo_url', 'photo_url_from_maplight',
+            'photo_url_from_vote_smart', 'order_on_ballot', 'google_civic_election_id', 'ocd_division_id',
+            'state_code', 'candidate_url', 'facebook_url', 'twitter_url', 'twitter_user_id',
+            'candidate_twitter_handle', 'twitter_name', 'twitter_location', 'twitter_followers_count',
+            'twitter_profile_image_url_https', 'twitter_description', 'google_plus_url', 'youtube_url',
+            'candidate_email', 'candidate_phone', 'wikipedia_page_id', 'wikipedia_page_title', 'wikipedia_photo_url',
+            'ballotpedia_page_title', 'ballotpedia_photo_url', 'ballot_guide_official_statement'], sync_watermark)
+        if response is not None:
+            return response
     except Exception as e:
         pass
 
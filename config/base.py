@@ -127,6 +127,7 @@ INSTALLED_APPS = (
 )
 
 MIDDLEWARE_CLASSES = (
+    'apis_v1.middleware.ApiProfileMiddleware',  # First, so its timing includes the other middleware
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'corsheaders.middleware.CorsPostCsrfMiddleware',
@@ -141,6 +142,16 @@ MIDDLEWARE_CLASSES = (
     'wevote_social.middleware.WeVoteSocialAuthExceptionMiddleware',
 )
 
+# Per-endpoint profiling of the apis_v1 calls, off unless API_PROFILING_ENABLED is set. See apis_v1/middleware.py
+try:
+    API_PROFILING_ENABLED = get_environment_variable("API_PROFILING_ENABLED") in (True, 'True', 'true', '1')
+except ImproperlyConfigured:
+    API_PROFILING_ENABLED = False
+try:
+    API_PROFILING_SLOW_REQUEST_MILLISECONDS = int(get_environment_variable("API_PROFILING_SLOW_REQUEST_MILLISECONDS"))
+except (ImproperlyConfigured, ValueError):
+    API_PROFILING_SLOW_REQUEST_MILLISECONDS = 1000
+
 AUTHENTICATION_BACKENDS = (
     'social.backends.facebook.FacebookOAuth2',
     'social.backends.google.GoogleOAuth2',
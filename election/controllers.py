@@ -9,7 +9,8 @@ from import_export_google_civic.controllers import retrieve_from_google_civic_ap
     store_results_from_google_civic_api_election_query
 import json
 import wevote_functions.admin
-from wevote_functions.functions import positive_value_exists, process_request_from_master
+from wevote_functions.functions import positive_value_exists
+from wevote_functions.master_sync import import_from_master_server_in_chunks
 
 logger = wevote_functions.admin.get_logger(__name__)
 
@@ -53,18 +54,14 @@ def elections_import_from_master_server(request=None):
     Get the json data, and either create new entries or update existing
     :return:
     """
-    import_results, structured_json = process_request_from_master(
+    # There are only a few elections, so we always get all of them
+    return import_from_master_server_in_chunks(
         request, "Loading Election from We Vote Master servers",
         ELECTIONS_SYNC_URL, {
             "key":    WE_VOTE_API_KEY,  # This comes from an environment variable
             "format": 'json',
-        }
-    )
-
-    if not import_results['success']:
-        return import_results
-
-    return elections_import_from_structured_json(structured_json)
+        },
+        elections_import_from_structured_json)
 
 
 def elections_import_from_structured_json(structured_json):
@@ -12,6 +12,8 @@ from exception.models import handle_record_found_more_than_one_exception
 
 logger = wevote_functions.admin.get_logger(__name__)
 
+ELECTORAL_DISTRICT_IMPORT_LIMIT_FOR_TESTING = 5
+
 
 def electoral_districts_import_from_sample_file(filename):
     """
@@ -35,9 +37,12 @@ def electoral_districts_import_from_sample_file(filename):
     return electoral_district_import_from_xml_data(electoral_district_item_list)
 
 
-def electoral_district_import_from_xml_data(electoral_district_xml_data):
+def electoral_district_import_from_xml_data(electoral_district_xml_data,
+                                            limit_for_testing=ELECTORAL_DISTRICT_IMPORT_LIMIT_FOR_TESTING):
     """
     Get the xml data, and either create new entries or update existing entries for electoral district
+    :param electoral_district_xml_data:
+    :param limit_for_testing: Stop after this many electoral districts have been saved, updated or not processed
     :return:
     """
 
@@ -49,8 +54,6 @@ def electoral_district_import_from_xml_data(electoral_district_xml_data):
 
     electoral_district_manager = ElectoralDistrictManager()
 
-    limit_for_testing = 5
-
     for one_electoral_district in electoral_district_xml_data:
         if (electoral_district_saved+electoral_district_not_processed+electoral_district_updated) >= limit_for_testing:
             break
@@ -216,7 +216,7 @@ def schedule_verification_email(sender_voter_we_vote_id, recipient_voter_we_vote
     :return:
     """
     email_scheduled_saved = False
-    email_scheduled_sent = False
+    email_scheduled_queued = False
     email_scheduled_id = 0
 
     email_manager = EmailManager()
@@ -233,7 +233,7 @@ def schedule_verification_email(sender_voter_we_vote_id, recipient_voter_we_vote
             'status': "SCHEDULE_VERIFICATION-MISSING_EMAIL_SECRET_KEY ",
             'success': False,
             'email_scheduled_saved': email_scheduled_saved,
-            'email_scheduled_sent': email_scheduled_sent,
+            'email_scheduled_queued': email_scheduled_queued,
             'email_scheduled_id': email_scheduled_id,
         }
         return results
@@ -266,14 +266,16 @@ def schedule_verification_email(sender_voter_we_vote_id, recipient_voter_we_vote
         email_scheduled = schedule_results['email_scheduled']
 
         if email_scheduled_saved:
-            send_results = email_manager.send_scheduled_email(email_scheduled)
-            email_scheduled_sent = send_results['email_scheduled_sent']
+            # The send_scheduled_email worker sends it, so this request doesn't wait on the email server
+            send_results = email_manager.queue_scheduled_email(email_scheduled)
+            status += send_results['status']
+            email_scheduled_queued = send_results['email_scheduled_queued']
 
     results = {
         'status':                   status,
         'success':                  True,
         'email_scheduled_saved':    email_scheduled_saved,
-        'email_scheduled_sent':     email_scheduled_sent,
+        'email_scheduled_queued':   email_scheduled_queued,
         'email_scheduled_id':       email_scheduled_id,
     }
     return results
@@ -294,7 +296,7 @@ def schedule_link_to_sign_in_email(sender_voter_we_vote_id, recipient_voter_we_v
     :return:
     """
     email_scheduled_saved = False
-    email_scheduled_sent = False
+    email_scheduled_queued = False
     email_scheduled_id = 0
 
     email_manager = EmailManager()
@@ -311,7 +313,7 @@ def schedule_link_to_sign_in_email(sender_voter_we_vote_id, recipient_voter_we_v
             'status': "SCHEDULE_LINK_TO_SIGN_IN-MISSING_EMAIL_SECRET_KEY ",
             'success': False,
             'email_scheduled_saved': email_scheduled_saved,
-            'email_scheduled_sent': email_scheduled_sent,
+            'email_scheduled_queued': email_scheduled_queued,
             'email_scheduled_id': email_scheduled_id,
         }
         return results
@@ -344,14 +346,16 @@ def schedule_link_to_sign_in_email(sender_voter_we_vote_id, recipient_voter_we_v
         email_scheduled = schedule_results['email_scheduled']
 
         if email_scheduled_saved:
-            send_results = email_manager.send_scheduled_email(email_scheduled)
-            email_scheduled_sent = send_results['email_scheduled_sent']
+            # The send_scheduled_email worker sends it, so this request doesn't wait on the email server
+            send_results = email_manager.queue_scheduled_email(email_scheduled)
+            status += send_results['status']
+            email_scheduled_queued = send_results['email_scheduled_queued']
 
     results = {
         'status':                   status,
         'success':                  True,
         'email_scheduled_saved':    email_scheduled_saved,
-        'email_scheduled_sent':     email_scheduled_sent,
+        'email_scheduled_queued':   email_scheduled_queued,
         'email_scheduled_id':       email_scheduled_id,
     }
     return results
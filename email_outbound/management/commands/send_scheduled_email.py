@@ -0,0 +1,47 @@
+# email_outbound/management/commands/send_scheduled_email.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from email_outbound.models import EmailManager, EMAIL_SEND_BATCH_SIZE
+import time
+import wevote_functions.admin
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+EMAIL_QUEUE_POLL_SECONDS = 5
+
+
+class Command(BaseCommand):
+    help = 'Sends the emails waiting in the EmailScheduled queue, in batches that share one connection to the ' \
+           'email server. With --forever it keeps checking the queue, which is how the worker process runs it.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--forever', action='store_true', default=False,
+                            help='Keep sending as emails are queued, instead of stopping when the queue is empty')
+        parser.add_argument('--batch-size', type=int, default=EMAIL_SEND_BATCH_SIZE)
+        parser.add_argument('--poll-seconds', type=int, default=EMAIL_QUEUE_POLL_SECONDS,
+                            help='How long to wait after finding the queue empty')
+
+    def handle(self, *args, **options):
+        email_manager = EmailManager()
+        while True:
+            try:
+                results = email_manager.send_scheduled_email_queue(batch_size=options['batch_size'])
+            except Exception as e:
+                if not options['forever']:
+                    raise
+                # Most likely the database went away. We close our connection so the next pass opens a new one.
+                logger.error("send_scheduled_email: {error}".format(error=e))
+                connection.close()
+                time.sleep(options['poll_seconds'])
+                continue
+            if results['emails_sent'] or results['emails_to_retry'] or results['emails_failed'] or \
+                    not options['forever']:
+                self.stdout.write('{sent} emails sent, {to_retry} to retry, {failed} failed. {status}'.format(
+                    sent=results['emails_sent'], to_retry=results['emails_to_retry'],
+                    failed=results['emails_failed'], status=results['status']))
+            if not options['forever']:
+                break
+            time.sleep(options['poll_seconds'])
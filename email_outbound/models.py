@@ -2,12 +2,18 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
-from django.core.mail import EmailMultiAlternatives
-from django.db import models
+from datetime import timedelta
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils import timezone
+import wevote_functions.admin
 from wevote_functions.functions import extract_email_addresses_from_string, generate_random_string, \
     positive_value_exists
 from wevote_settings.models import fetch_next_we_vote_id_email_integer, fetch_site_unique_id_prefix
 
+logger = wevote_functions.admin.get_logger(__name__)
+
 FRIEND_ACCEPTED_INVITATION_TEMPLATE = 'FRIEND_ACCEPTED_INVITATION_TEMPLATE'
 FRIEND_INVITATION_TEMPLATE = 'FRIEND_INVITATION_TEMPLATE'
 GENERIC_EMAIL_TEMPLATE = 'GENERIC_EMAIL_TEMPLATE'
@@ -32,12 +38,22 @@ ASSEMBLY_STATUS_CHOICES = (
 
 BEING_SENT = 'BEING_SENT'
 SENT = 'SENT'
+SEND_FAILED = 'SEND_FAILED'
 SEND_STATUS_CHOICES = (
     (TO_BE_PROCESSED,  'Message to be processed'),
     (BEING_SENT, 'Message being sent'),
     (SENT, 'Message sent'),
+    (SEND_FAILED, 'Message could not be sent'),
 )
 
+# EmailScheduled is our outbound queue. The APIs only add to it, and the send_scheduled_email management command
+# sends what is waiting, EMAIL_SEND_BATCH_SIZE messages at a time over one connection to the email server.
+EMAIL_SEND_BATCH_SIZE = 50
+EMAIL_SEND_MAXIMUM_ATTEMPTS = 5
+EMAIL_SEND_RETRY_SECONDS = 60  # Doubles after each failed attempt
+# A message left BEING_SENT this long belongs to a worker that stopped, so it goes back in the queue
+EMAIL_BEING_SENT_TIMEOUT_SECONDS = 600
+
 
 class EmailAddress(models.Model):
     """
@@ -123,7 +139,16 @@ class EmailScheduled(models.Model):
         verbose_name="we vote id for the email", max_length=255, null=True, blank=True, unique=False)
     recipient_voter_email = models.EmailField(
         verbose_name='recipient email address', max_length=255, null=True, blank=True, unique=False)
-    send_status = models.CharField(max_length=50, choices=SEND_STATUS_CHOICES, default=TO_BE_PROCESSED)
+    send_status = models.CharField(max_length=50, choices=SEND_STATUS_CHOICES, default=TO_BE_PROCESSED,
+                                   db_index=True)
+    # Set by queue_scheduled_email. Entries from before the queue were sent as they were scheduled but are still
+    #  TO_BE_PROCESSED, so they get False when this field is added, and stay out of the queue.
+    send_queued = models.BooleanField(verbose_name="in the outbound queue", default=False, db_index=True)
+    send_attempt_count = models.PositiveIntegerField(verbose_name="times we tried to send", default=0, null=False)
+    # When a send fails we wait until this time before trying again
+    date_send_next_attempt = models.DateTimeField(verbose_name='date to try sending again', null=True, blank=True)
+    date_sent = models.DateTimeField(verbose_name='date sent', null=True, blank=True)
+    send_error = models.TextField(verbose_name="why the last attempt failed", null=True, blank=True)
     email_outbound_description_id = models.PositiveIntegerField(
         verbose_name="the internal id of EmailOutboundDescription", default=0, null=False)
     date_last_changed = models.DateTimeField(verbose_name='date last changed', null=True, auto_now=True)
@@ -617,7 +642,13 @@ class EmailManager(models.Model):
         }
         return results
 
-    def send_scheduled_email(self, email_scheduled):
+    def queue_scheduled_email(self, email_scheduled):
+        """
+        Called by the APIs once an email is scheduled. We check that it can be sent, then put it in the queue. The
+        send_scheduled_email management command does the sending.
+        :param email_scheduled:
+        :return:
+        """
         success = True
         status = ""
 
@@ -627,7 +658,7 @@ class EmailManager(models.Model):
         #     success = False
 
         if not positive_value_exists(email_scheduled.recipient_voter_email):
-            status += "MISSING_RECIPIENT_VOTER_EMAIL"
+            status += "MISSING_RECIPIENT_VOTER_EMAIL "
             success = False
 
         if not positive_value_exists(email_scheduled.subject):
@@ -641,20 +672,34 @@ class EmailManager(models.Model):
             success = False
 
         if success:
-            return self.send_scheduled_email_via_sendgrid(email_scheduled)
+            try:
+                email_scheduled.send_queued = True
+                email_scheduled.save()
+                status += "EMAIL_SCHEDULED_QUEUED "
+            except Exception as e:
+                status += "COULD_NOT_QUEUE_EMAIL_SCHEDULED "
+                success = False
         else:
-            email_scheduled_sent = False
-            results = {
-                'success': success,
-                'status': status,
-                'email_scheduled_sent': email_scheduled_sent,
-            }
-            return results
+            # Leave it out of the queue, since trying again won't help
+            try:
+                email_scheduled.send_status = SEND_FAILED
+                email_scheduled.send_error = status
+                email_scheduled.save()
+            except Exception as e:
+                status += "COULD_NOT_MARK_EMAIL_SCHEDULED_FAILED "
 
-    def send_scheduled_email_via_sendgrid(self, email_scheduled):
+        results = {
+            'success':                  success,
+            'status':                   status,
+            'email_scheduled_queued':   success,
+        }
+        return results
+
+    def send_scheduled_email_via_sendgrid(self, email_scheduled, connection=None):
         """
         Send a single scheduled email
         :param email_scheduled:
+        :param connection: an open connection from get_connection(), so a batch of emails can share it
         :return:
         """
         status = ""
@@ -676,7 +721,8 @@ class EmailManager(models.Model):
             body=email_scheduled.message_text,
             from_email=system_sender_email_address,
             to=[email_scheduled.recipient_voter_email],
-            headers={"Reply-To": email_scheduled.sender_voter_email}
+            headers={"Reply-To": email_scheduled.sender_voter_email},
+            connection=connection,
         )
         # TODO DALE ADD: reply_to = email_scheduled.sender_voter_email,
         if positive_value_exists(email_scheduled.message_html):
@@ -685,10 +731,11 @@ class EmailManager(models.Model):
         try:
             mail.send()
             status += "SENDING_VIA_SENDGRID "
+            email_scheduled_sent = True
         except Exception as e:
-            status += "COULD_NOT_SEND_VIA_SENDGRID "
-
-        email_scheduled_sent = True
+            status += "COULD_NOT_SEND_VIA_SENDGRID {error} [type: {error_type}] ".format(error=e, error_type=type(e))
+            success = False
+            email_scheduled_sent = False
 
         results = {
             'success':                  success,
@@ -699,18 +746,112 @@ class EmailManager(models.Model):
 
     def send_scheduled_email_list(self, messages_to_send):
         """
-        Take in a list of scheduled_email_id's, and send them
+        Take in a list of scheduled_email_id's, and send them with a single connection to the email server. A message
+        that fails is tried again later, up to EMAIL_SEND_MAXIMUM_ATTEMPTS times.
         :param messages_to_send:
         :return:
         """
-        success = False
         status = ""
+        date_now = timezone.now()
+
+        # Claim the messages, so another worker sending at the same time skips them. select_for_update makes a
+        # second worker wait here, and then see they are no longer TO_BE_PROCESSED.
+        with transaction.atomic():
+            email_scheduled_list = list(EmailScheduled.objects.select_for_update().filter(
+                id__in=messages_to_send, send_queued=True, send_status=TO_BE_PROCESSED).order_by('id'))
+            EmailScheduled.objects.filter(id__in=[email_scheduled.id for email_scheduled in email_scheduled_list])\
+                .update(send_status=BEING_SENT, date_last_changed=date_now)
+
+        sent_id_list = []
+        failed_list = []  # (email_scheduled, error)
+        connection = None
+        try:
+            connection = get_connection()
+            connection.open()
+        except Exception as e:
+            status += "COULD_NOT_OPEN_EMAIL_CONNECTION "
+            logger.error("send_scheduled_email_list could not open a connection: {error}".format(error=e))
+            failed_list = [(email_scheduled, str(e)) for email_scheduled in email_scheduled_list]
+            connection = None
+        if connection is not None:
+            try:
+                for email_scheduled in email_scheduled_list:
+                    send_results = self.send_scheduled_email_via_sendgrid(email_scheduled, connection)
+                    if send_results['email_scheduled_sent']:
+                        sent_id_list.append(email_scheduled.id)
+                    else:
+                        failed_list.append((email_scheduled, send_results['status']))
+            finally:
+                try:
+                    connection.close()
+                except Exception as e:
+                    pass
+
+        date_now = timezone.now()
+        EmailScheduled.objects.filter(id__in=sent_id_list).update(
+            send_status=SENT, date_sent=date_now, send_error=None, date_last_changed=date_now,
+            send_attempt_count=models.F('send_attempt_count') + 1)
+        failed_for_good_count = 0
+        for email_scheduled, send_error in failed_list:
+            email_scheduled.send_attempt_count += 1
+            email_scheduled.send_error = send_error
+            if email_scheduled.send_attempt_count >= EMAIL_SEND_MAXIMUM_ATTEMPTS:
+                email_scheduled.send_status = SEND_FAILED
+                failed_for_good_count += 1
+            else:
+                email_scheduled.send_status = TO_BE_PROCESSED
+                email_scheduled.date_send_next_attempt = date_now + timedelta(
+                    seconds=EMAIL_SEND_RETRY_SECONDS * 2 ** (email_scheduled.send_attempt_count - 1))
+            email_scheduled.save()
 
+        status += "SCHEDULED_EMAIL_LIST_SENT "
         results = {
-            'success':                  success,
+            'success':                  not failed_list,
             'status':                   status,
-            'at_least_one_email_found': True,
+            'at_least_one_email_found': True if len(email_scheduled_list) else False,
+            'emails_sent':              len(sent_id_list),
+            'emails_to_retry':          len(failed_list) - failed_for_good_count,
+            'emails_failed':            failed_for_good_count,
+        }
+        return results
+
+    def send_scheduled_email_queue(self, batch_size=EMAIL_SEND_BATCH_SIZE):
+        """
+        Send every message in the queue that is ready to go, batch_size at a time
+        :param batch_size:
+        :return:
+        """
+        # Put back anything a stopped worker left half sent. It might go out twice, which beats never.
+        stale_date = timezone.now() - timedelta(seconds=EMAIL_BEING_SENT_TIMEOUT_SECONDS)
+        emails_released = EmailScheduled.objects.filter(send_status=BEING_SENT, date_last_changed__lt=stale_date)\
+            .update(send_status=TO_BE_PROCESSED)
+
+        results = {
+            'success':          True,
+            'status':           "",
+            'emails_released':  emails_released,
+            'emails_sent':      0,
+            'emails_to_retry':  0,
+            'emails_failed':    0,
         }
+        last_email_scheduled_id = 0
+        while True:
+            # We go in id order, past the last batch, so messages another worker claimed first can't keep us looping
+            messages_to_send = list(EmailScheduled.objects.filter(
+                Q(date_send_next_attempt__isnull=True) | Q(date_send_next_attempt__lte=timezone.now()),
+                send_queued=True, send_status=TO_BE_PROCESSED, id__gt=last_email_scheduled_id)
+                .order_by('id').values_list('id', flat=True)[:batch_size])
+            if not messages_to_send:
+                break
+            last_email_scheduled_id = messages_to_send[-1]
+            list_results = self.send_scheduled_email_list(messages_to_send)
+            for count_name in ('emails_sent', 'emails_to_retry', 'emails_failed'):
+                results[count_name] += list_results[count_name]
+            if not list_results['success']:
+                results['success'] = False
+                if list_results['status'] not in results['status']:
+                    results['status'] += list_results['status']
+        results['status'] += "SCHEDULED_EMAIL_QUEUE_SENT "
         return results
 
     def update_email_address_with_new_secret_key(self, email_we_vote_id):
@@ -0,0 +1,72 @@
+# email_outbound/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.test import TestCase
+from django.test.utils import override_settings
+from email_outbound.models import EmailManager, EmailScheduled, EMAIL_SEND_MAXIMUM_ATTEMPTS, SEND_FAILED, SENT, \
+    TO_BE_PROCESSED
+
+
+class FailingEmailBackend(BaseEmailBackend):
+
+    def send_messages(self, email_messages):
+        raise IOError("The email server is down")
+
+
+class EmailScheduledQueueTestCase(TestCase):
+
+    def create_email_scheduled(self, recipient_voter_email):
+        return EmailScheduled.objects.create(subject="Subject", message_text="Message",
+                                             recipient_voter_email=recipient_voter_email)
+
+    def test_queued_emails_are_sent_by_the_worker(self):
+        email_manager = EmailManager()
+        first_email_scheduled = self.create_email_scheduled("first@example.com")
+        second_email_scheduled = self.create_email_scheduled("second@example.com")
+        no_recipient_email_scheduled = self.create_email_scheduled("")
+        self.assertTrue(email_manager.queue_scheduled_email(first_email_scheduled)['email_scheduled_queued'])
+        self.assertTrue(email_manager.queue_scheduled_email(second_email_scheduled)['email_scheduled_queued'])
+        self.assertFalse(email_manager.queue_scheduled_email(no_recipient_email_scheduled)['email_scheduled_queued'])
+        # Queuing doesn't send anything
+        self.assertEqual(len(mail.outbox), 0)
+
+        results = email_manager.send_scheduled_email_queue(batch_size=1)
+        self.assertEqual(results['emails_sent'], 2)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ["first@example.com", "second@example.com"])
+        self.assertEqual(EmailScheduled.objects.get(id=first_email_scheduled.id).send_status, SENT)
+        self.assertEqual(EmailScheduled.objects.get(id=no_recipient_email_scheduled.id).send_status, SEND_FAILED)
+
+        # Nothing is sent twice
+        self.assertEqual(email_manager.send_scheduled_email_queue()['emails_sent'], 0)
+
+    def test_emails_that_were_never_queued_are_not_sent(self):
+        # Like the entries saved before the queue, which were sent right away and left TO_BE_PROCESSED
+        email_scheduled = self.create_email_scheduled("voter@example.com")
+
+        results = EmailManager().send_scheduled_email_queue()
+        self.assertEqual(results['emails_sent'], 0)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(EmailScheduled.objects.get(id=email_scheduled.id).send_status, TO_BE_PROCESSED)
+
+    @override_settings(EMAIL_BACKEND='email_outbound.tests.FailingEmailBackend')
+    def test_failed_emails_are_retried_then_given_up_on(self):
+        email_manager = EmailManager()
+        email_scheduled = self.create_email_scheduled("voter@example.com")
+        email_manager.queue_scheduled_email(email_scheduled)
+
+        results = email_manager.send_scheduled_email_queue()
+        self.assertEqual(results['emails_to_retry'], 1)
+        email_scheduled = EmailScheduled.objects.get(id=email_scheduled.id)
+        self.assertEqual(email_scheduled.send_status, TO_BE_PROCESSED)
+        self.assertEqual(email_scheduled.send_attempt_count, 1)
+        # It waits before the next attempt
+        self.assertEqual(email_manager.send_scheduled_email_queue()['emails_to_retry'], 0)
+
+        for attempt in range(1, EMAIL_SEND_MAXIMUM_ATTEMPTS):
+            email_manager.send_scheduled_email_list([email_scheduled.id])
+        email_scheduled = EmailScheduled.objects.get(id=email_scheduled.id)
+        self.assertEqual(email_scheduled.send_status, SEND_FAILED)
+        self.assertEqual(email_scheduled.send_attempt_count, EMAIL_SEND_MAXIMUM_ATTEMPTS)
@@ -2,8 +2,10 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+from collections import Counter
 from datetime import datetime, timedelta
 from django.db import models
+from django.db.models import Count
 from django.utils.timezone import localtime, now
 from election.models import ElectionManager
 from exception.models import handle_record_found_more_than_one_exception,\
@@ -12,7 +14,7 @@ from issue.models import IssueManager
 from organization.models import OrganizationManager
 import pytz
 import wevote_functions.admin
-from wevote_functions.functions import positive_value_exists
+from wevote_functions.functions import canonicalize_we_vote_id, canonicalize_we_vote_id_fields, positive_value_exists
 from voter.models import VoterManager
 
 
@@ -46,7 +48,7 @@ class FollowIssue(models.Model):
     # We are relying on built-in Python id field
     # The voter following the issue
     voter_we_vote_id = models.CharField(
-        verbose_name="we vote permanent id", max_length=255, null=True, blank=True, unique=False)
+        verbose_name="we vote permanent id", max_length=255, null=True, blank=True, unique=False, db_index=True)
 
     # NOTE: we will use the organization_we_vote_id in FollowIssue if we decide to let a voter publish to
     # the public the issues they follow. 2017-09 NOT CURRENTLY SUPPORTED
@@ -58,7 +60,7 @@ class FollowIssue(models.Model):
 
     # This is used when we want to export the issues that are being following
     issue_we_vote_id = models.CharField(
-        verbose_name="we vote permanent id", max_length=255, null=True, blank=True, unique=False)
+        verbose_name="we vote permanent id", max_length=255, null=True, blank=True, unique=False, db_index=True)
 
     # Is this person following, not following, or ignoring this issue?
     following_status = models.CharField(max_length=15, choices=FOLLOWING_CHOICES, default=FOLLOWING)
@@ -87,6 +89,11 @@ class FollowIssue(models.Model):
             return True
         return False
 
+    # We override the save function so every we_vote_id is stored in lower case, and can be found with an exact match
+    def save(self, *args, **kwargs):
+        canonicalize_we_vote_id_fields(self)
+        super(FollowIssue, self).save(*args, **kwargs)
+
 
 class FollowIssueManager(models.Model):
 
@@ -213,15 +220,15 @@ class FollowIssueManager(models.Model):
                 status = 'FOLLOW_ISSUE_FOUND_WITH_ID'
             elif positive_value_exists(voter_we_vote_id) and positive_value_exists(issue_id):
                 follow_issue_on_stage = FollowIssue.objects.get(
-                    voter_we_vote_id__iexact=voter_we_vote_id,
+                    voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id),
                     issue_id=issue_id)
                 follow_issue_on_stage_id = follow_issue_on_stage.id
                 success = True
                 status = 'FOLLOW_ISSUE_FOUND_WITH_VOTER_WE_VOTE_ID_AND_ISSUE_ID'
             elif positive_value_exists(voter_we_vote_id) and positive_value_exists(issue_we_vote_id):
                 follow_issue_on_stage = FollowIssue.objects.get(
-                    voter_we_vote_id__iexact=voter_we_vote_id,
-                    issue_we_vote_id__iexact=issue_we_vote_id)
+                    voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id),
+                    issue_we_vote_id=canonicalize_we_vote_id(issue_we_vote_id))
                 follow_issue_on_stage_id = follow_issue_on_stage.id
                 success = True
                 status = 'FOLLOW_ISSUE_FOUND_WITH_VOTER_WE_VOTE_ID_AND_ISSUE_WE_VOTE_ID'
@@ -312,7 +319,7 @@ class FollowIssueManager(models.Model):
         try:
             suggested_issue_to_follow_queryset = SuggestedIssueToFollow.objects.all()
             suggested_issue_to_follow_list = suggested_issue_to_follow_queryset.filter(
-                viewer_voter_we_vote_id__iexact=viewer_voter_we_vote_id,
+                viewer_voter_we_vote_id=canonicalize_we_vote_id(viewer_voter_we_vote_id),
                 from_twitter=from_twitter)
             if len(suggested_issue_to_follow_list):
                 success = True
@@ -350,7 +357,7 @@ class FollowMetricsManager(models.Model):
         count_result = None
         try:
             count_query = FollowOrganization.objects.using('readonly').all()
-            count_query = count_query.filter(organization_we_vote_id__iexact=organization_we_vote_id)
+            count_query = count_query.filter(organization_we_vote_id=canonicalize_we_vote_id(organization_we_vote_id))
             count_query = count_query.filter(following_status=FOLLOWING)
             count_query = count_query.values("voter_id").distinct()
             if positive_value_exists(google_civic_election_id):
@@ -384,7 +391,7 @@ class FollowMetricsManager(models.Model):
         try:
             count_query = FollowIssue.objects.using('readonly').all()
             if positive_value_exists(voter_we_vote_id):
-                count_query = count_query.filter(voter_we_vote_id__iexact=voter_we_vote_id)
+                count_query = count_query.filter(voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id))
             count_query = count_query.filter(following_status=FOLLOWING)
             if positive_value_exists(limit_to_one_date_as_integer):
                 # TODO DALE THIS NEEDS WORK TO FIND ALL ENTRIES ON ONE DAY
@@ -396,6 +403,29 @@ class FollowMetricsManager(models.Model):
             pass
         return count_result
 
+    def fetch_issues_followed_date_counts(self, count_through_this_date_as_integer):
+        """
+        How many issues currently followed were last changed on each day (in Pacific time), with one GROUP BY query.
+        Adding these up through a day gives the issues followed as of the end of that day.
+        :param count_through_this_date_as_integer:
+        :return: Counter of date_as_integer -> count, or None if the query failed
+        """
+        try:
+            count_query = FollowIssue.objects.using('readonly').filter(following_status=FOLLOWING)
+            count_query = count_query.extra(select={
+                'date_as_integer':
+                    "CAST(to_char(date_last_changed AT TIME ZONE 'America/Los_Angeles', 'YYYYMMDD') AS INTEGER)"})
+            count_query = count_query.values('date_as_integer').annotate(issues_followed=Count('id')).order_by()
+            date_counts = Counter()
+            for one_date_count in count_query:
+                date_as_integer = one_date_count['date_as_integer']
+                if date_as_integer is not None and date_as_integer <= count_through_this_date_as_integer:
+                    date_counts[date_as_integer] += one_date_count['issues_followed']
+            return date_counts
+        except Exception as e:
+            logger.error("fetch_issues_followed_date_counts: {error}".format(error=e))
+            return None
+
     def fetch_voter_organizations_followed(self, voter_id):
         count_result = None
         try:
@@ -407,6 +437,50 @@ class FollowMetricsManager(models.Model):
             pass
         return count_result
 
+    def fetch_issues_followed_by_voters(self, voter_we_vote_id_list):
+        """
+        fetch_issues_followed for many voters, with one GROUP BY query
+        :param voter_we_vote_id_list:
+        :return: Counter of voter_we_vote_id (in canonical form) -> issues followed, or None if the query failed
+        """
+        voter_we_vote_id_list = list(set(canonicalize_we_vote_id(voter_we_vote_id)
+                                         for voter_we_vote_id in voter_we_vote_id_list
+                                         if positive_value_exists(voter_we_vote_id)))
+        issues_followed_counts = Counter()
+        if not voter_we_vote_id_list:
+            return issues_followed_counts
+        try:
+            count_query = FollowIssue.objects.using('readonly').filter(
+                voter_we_vote_id__in=voter_we_vote_id_list, following_status=FOLLOWING)
+            count_query = count_query.values('voter_we_vote_id').annotate(issues_followed=Count('id')).order_by()
+            for one_voter_count in count_query:
+                issues_followed_counts[one_voter_count['voter_we_vote_id']] = one_voter_count['issues_followed']
+            return issues_followed_counts
+        except Exception as e:
+            logger.error("fetch_issues_followed_by_voters: {error}".format(error=e))
+            return None
+
+    def fetch_organizations_followed_by_voters(self, voter_id_list):
+        """
+        fetch_voter_organizations_followed for many voters, with one GROUP BY query
+        :param voter_id_list:
+        :return: Counter of voter_id -> organizations followed, or None if the query failed
+        """
+        voter_id_list = list(set(voter_id for voter_id in voter_id_list if positive_value_exists(voter_id)))
+        organizations_followed_counts = Counter()
+        if not voter_id_list:
+            return organizations_followed_counts
+        try:
+            count_query = FollowOrganization.objects.using('readonly').filter(
+                voter_id__in=voter_id_list, following_status=FOLLOWING)
+            count_query = count_query.values('voter_id').annotate(organizations_followed=Count('id')).order_by()
+            for one_voter_count in count_query:
+                organizations_followed_counts[one_voter_count['voter_id']] = one_voter_count['organizations_followed']
+            return organizations_followed_counts
+        except Exception as e:
+            logger.error("fetch_organizations_followed_by_voters: {error}".format(error=e))
+            return None
+
 
 class FollowIssueList(models.Model):
     """
@@ -419,7 +493,8 @@ class FollowIssueList(models.Model):
         follow_issue_list_length = 0
         try:
             follow_issue_list_query = FollowIssue.objects.all()
-            follow_issue_list_query = follow_issue_list_query.filter(voter_we_vote_id__iexact=voter_we_vote_id)
+            follow_issue_list_query = follow_issue_list_query.filter(
+                voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id))
             follow_issue_list_query = follow_issue_list_query.filter(following_status=following_status)
             follow_issue_list_length = follow_issue_list_query.count()
 
@@ -441,7 +516,8 @@ class FollowIssueList(models.Model):
         follow_issue_list = {}
         try:
             follow_issue_list_query = FollowIssue.objects.all()
-            follow_issue_list_query = follow_issue_list_query.filter(voter_we_vote_id__iexact=voter_we_vote_id)
+            follow_issue_list_query = follow_issue_list_query.filter(
+                voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id))
             if positive_value_exists(following_status):
                 follow_issue_list = follow_issue_list_query.filter(following_status=following_status)
             if len(follow_issue_list):
@@ -463,7 +539,8 @@ class FollowIssueList(models.Model):
 
         try:
             follow_issue_list_query = FollowIssue.objects.all()
-            follow_issue_list_query = follow_issue_list_query.filter(voter_we_vote_id__iexact=voter_we_vote_id)
+            follow_issue_list_query = follow_issue_list_query.filter(
+                voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id))
             if positive_value_exists(following_status):
                 follow_issue_list_query = follow_issue_list_query.filter(following_status=following_status)
             follow_issue_list_query = follow_issue_list_query.values("issue_we_vote_id").distinct()
@@ -515,7 +592,7 @@ class FollowIssueList(models.Model):
             if positive_value_exists(issue_id):
                 follow_issue_list = follow_issue_list.filter(issue_id=issue_id)
             else:
-                follow_issue_list = follow_issue_list.filter(issue_we_vote_id__iexact=issue_we_vote_id)
+                follow_issue_list = follow_issue_list.filter(issue_we_vote_id=canonicalize_we_vote_id(issue_we_vote_id))
             if positive_value_exists(following_status):
                 follow_issue_list = follow_issue_list.filter(following_status=following_status)
             if len(follow_issue_list):
@@ -538,11 +615,12 @@ class FollowOrganization(models.Model):
     organization_id = models.BigIntegerField(null=True, blank=True)
 
     voter_linked_organization_we_vote_id = models.CharField(
-        verbose_name="organization we vote permanent id", max_length=255, null=True, blank=True, unique=False)
+        verbose_name="organization we vote permanent id", max_length=255, null=True, blank=True, unique=False,
+        db_index=True)
 
     # This is used when we want to export the organizations that a voter is following
     organization_we_vote_id = models.CharField(
-        verbose_name="we vote permanent id", max_length=255, null=True, blank=True, unique=False)
+        verbose_name="we vote permanent id", max_length=255, null=True, blank=True, unique=False, db_index=True)
 
     # Is this person following or ignoring this organization?
     following_status = models.CharField(max_length=15, choices=FOLLOWING_CHOICES, default=FOLLOWING)
@@ -579,6 +657,10 @@ class FollowOrganization(models.Model):
             return True
         return False
 
+    def save(self, *args, **kwargs):
+        canonicalize_we_vote_id_fields(self)
+        super(FollowOrganization, self).save(*args, **kwargs)
+
 
 class FollowOrganizationManager(models.Model):
 
@@ -850,7 +932,7 @@ class FollowOrganizationManager(models.Model):
         try:
             suggested_organization_to_follow_queryset = SuggestedOrganizationToFollow.objects.all()
             suggested_organization_to_follow_list = suggested_organization_to_follow_queryset.filter(
-                viewer_voter_we_vote_id__iexact=viewer_voter_we_vote_id,
+                viewer_voter_we_vote_id=canonicalize_we_vote_id(viewer_voter_we_vote_id),
                 from_twitter=from_twitter)
             if len(suggested_organization_to_follow_list):
                 success = True
@@ -1110,7 +1192,7 @@ class SuggestedIssueToFollow(models.Model):
     This table stores possible suggested issues to follow
     """
     viewer_voter_we_vote_id = models.CharField(
-        verbose_name="voter we vote id", max_length=255, null=True, blank=True, unique=False)
+        verbose_name="voter we vote id", max_length=255, null=True, blank=True, unique=False, db_index=True)
     issue_we_vote_id = models.CharField(
         verbose_name="issue we vote id", max_length=255, null=True, blank=True, unique=False)
     # organization_we_vote_id_making_suggestion = models.CharField(
@@ -1125,13 +1207,17 @@ class SuggestedIssueToFollow(models.Model):
     #         # If the we_vote_id passed in wasn't found, don't return another we_vote_id
     #         return ""
 
+    def save(self, *args, **kwargs):
+        canonicalize_we_vote_id_fields(self)
+        super(SuggestedIssueToFollow, self).save(*args, **kwargs)
+
 
 class SuggestedOrganizationToFollow(models.Model):
     """
     This table stores possible suggested organization from twitter ids i follow or organization of my friends follow.
     """
     viewer_voter_we_vote_id = models.CharField(
-        verbose_name="voter we vote id person 1", max_length=255, null=True, blank=True, unique=False)
+        verbose_name="voter we vote id person 1", max_length=255, null=True, blank=True, unique=False, db_index=True)
     organization_we_vote_id = models.CharField(
         verbose_name="organization we vote id person 2", max_length=255, null=True, blank=True, unique=False)
     # organization_we_vote_id_making_suggestion = models.CharField(
@@ -1145,3 +1231,7 @@ class SuggestedOrganizationToFollow(models.Model):
         else:
             # If the we_vote_id passed in wasn't found, don't return another we_vote_id
             return ""
+
+    def save(self, *args, **kwargs):
+        canonicalize_we_vote_id_fields(self)
+        super(SuggestedOrganizationToFollow, self).save(*args, **kwargs)
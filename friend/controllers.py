@@ -135,16 +135,11 @@ def friend_accepted_invitation_send(accepting_voter_we_vote_id, original_sender_
             schedule_results = schedule_email_with_email_outbound_description(email_outbound_description)
             status += schedule_results['status'] + " "
             if schedule_results['email_scheduled_saved']:
-                # messages_to_send.append(schedule_results['email_scheduled_id'])
+                # The send_scheduled_email worker sends it, so this request doesn't wait on the email server
                 email_scheduled = schedule_results['email_scheduled']
-                send_results = email_manager.send_scheduled_email(email_scheduled)
-                email_scheduled_sent = send_results['email_scheduled_sent']
+                send_results = email_manager.queue_scheduled_email(email_scheduled)
                 status += send_results['status']
 
-    # When we are done scheduling all email, send it with a single connection to the smtp server
-    # if send_now:
-    #     send_results = email_manager.send_scheduled_email_list(messages_to_send)
-
     results = {
         'success':                              True,
         'status':                               status,
@@ -333,10 +328,6 @@ def friend_invitation_by_email_send_for_api(voter_device_id, email_address_array
             }
             return error_results
 
-    # When we are done scheduling all email, send it with a single connection to the smtp server
-    # if send_now:
-    #     send_results = email_manager.send_scheduled_email_list(messages_to_send)
-
     results = {
         'success':                              success,
         'status':                               status,
@@ -479,10 +470,9 @@ def send_to_one_friend(voter_device_id, sender_voter, send_now, sender_email_wit
             schedule_results = schedule_email_with_email_outbound_description(email_outbound_description)
             status += schedule_results['status'] + " "
             if schedule_results['email_scheduled_saved']:
-                # messages_to_send.append(schedule_results['email_scheduled_id'])
+                # The send_scheduled_email worker sends it, so this request doesn't wait on the email server
                 email_scheduled = schedule_results['email_scheduled']
-                send_results = email_manager.send_scheduled_email(email_scheduled)
-                email_scheduled_sent = send_results['email_scheduled_sent']
+                send_results = email_manager.queue_scheduled_email(email_scheduled)
                 status += send_results['status']
 
     results = {
@@ -1144,16 +1134,11 @@ def friend_invitation_by_we_vote_id_send_for_api(voter_device_id, other_voter_we
                     schedule_results = schedule_email_with_email_outbound_description(email_outbound_description)
                     status += schedule_results['status'] + " "
                     if schedule_results['email_scheduled_saved']:
-                        # messages_to_send.append(schedule_results['email_scheduled_id'])
+                        # The send_scheduled_email worker sends it, so this request doesn't wait on the email server
                         email_scheduled = schedule_results['email_scheduled']
-                        send_results = email_manager.send_scheduled_email(email_scheduled)
-                        email_scheduled_sent = send_results['email_scheduled_sent']
+                        send_results = email_manager.queue_scheduled_email(email_scheduled)
                         status += send_results['status']
 
-    # When we are done scheduling all email, send it with a single connection to the smtp server
-    # if send_now:
-    #     send_results = email_manager.send_scheduled_email_list(messages_to_send)
-
     results = {
         'success':                              success,
         'status':                               status,
@@ -0,0 +1,18 @@
+# friend/management/commands/update_suggested_friends.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.core.management.base import BaseCommand, CommandError
+from friend.models import FriendManager
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the suggested friends for every voter, with one pass over the CurrentFriend table'
+
+    def handle(self, *args, **options):
+        friend_manager = FriendManager()
+        results = friend_manager.update_suggested_friends_for_all_voters()
+        if not results['success']:
+            raise CommandError(results['status'])
+        self.stdout.write('{created} suggested friends created for {voters} voters with friends'.format(
+            created=results['suggested_friend_created_count'], voters=results['voters_with_friends_count']))
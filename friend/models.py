@@ -5,9 +5,14 @@
 from django.db import models
 from django.db.models import Q
 from email_outbound.models import EmailAddress, EmailManager
-from wevote_functions.functions import convert_to_int, positive_value_exists
+from exception.models import handle_exception, handle_record_not_saved_exception
+import wevote_functions.admin
+from wevote_functions.functions import canonicalize_we_vote_id, canonicalize_we_vote_id_fields, convert_to_int, \
+    positive_value_exists
 from voter.models import VoterManager
 
+logger = wevote_functions.admin.get_logger(__name__)
+
 NO_RESPONSE = 'NO_RESPONSE'
 PENDING_EMAIL_VERIFICATION = 'PENDING_EMAIL_VERIFICATION'
 ACCEPTED = 'ACCEPTED'
@@ -35,6 +40,47 @@ FRIENDS_IN_COMMON = 'FRIENDS_IN_COMMON'
 IGNORED_FRIEND_INVITATIONS = 'IGNORED_FRIEND_INVITATIONS'
 SUGGESTED_FRIEND_LIST = 'SUGGESTED_FRIEND_LIST'
 
+# How many SuggestedFriend entries we insert per query
+SUGGESTED_FRIEND_BULK_CREATE_BATCH_SIZE = 1000
+
+
+def build_friend_adjacency(current_friend_pair_list):
+    """
+    Turn CurrentFriend entries into a graph we can walk without going back to the database
+    :param current_friend_pair_list: iterable of (viewer_voter_we_vote_id, viewee_voter_we_vote_id)
+    :return: dict with voter_we_vote_id as key, and the set of that voter's friends' we_vote_ids as value
+    """
+    friend_adjacency = {}
+    for viewer_voter_we_vote_id, viewee_voter_we_vote_id in current_friend_pair_list:
+        viewer_voter_we_vote_id = canonicalize_we_vote_id(viewer_voter_we_vote_id)
+        viewee_voter_we_vote_id = canonicalize_we_vote_id(viewee_voter_we_vote_id)
+        if not positive_value_exists(viewer_voter_we_vote_id) or not positive_value_exists(viewee_voter_we_vote_id) \
+                or viewer_voter_we_vote_id == viewee_voter_we_vote_id:
+            continue
+        friend_adjacency.setdefault(viewer_voter_we_vote_id, set()).add(viewee_voter_we_vote_id)
+        friend_adjacency.setdefault(viewee_voter_we_vote_id, set()).add(viewer_voter_we_vote_id)
+    return friend_adjacency
+
+
+def generate_suggested_friend_pairs(friend_adjacency, voter_we_vote_id_list=None):
+    """
+    Two friends of the same voter, who aren't already friends with each other, are suggested to each other.
+    :param friend_adjacency: from build_friend_adjacency
+    :param voter_we_vote_id_list: the voters whose friends we suggest to each other. None means every voter.
+    :return: set of (voter_we_vote_id, voter_we_vote_id) tuples, with the lower we_vote_id first
+    """
+    if voter_we_vote_id_list is None:
+        voter_we_vote_id_list = friend_adjacency.keys()
+    suggested_friend_pair_set = set()
+    for voter_we_vote_id in voter_we_vote_id_list:
+        friends_of_voter = friend_adjacency.get(canonicalize_we_vote_id(voter_we_vote_id), set())
+        for one_friend_we_vote_id in friends_of_voter:
+            not_yet_friends = friends_of_voter - friend_adjacency.get(one_friend_we_vote_id, set())
+            for other_friend_we_vote_id in not_yet_friends:
+                if one_friend_we_vote_id < other_friend_we_vote_id:
+                    suggested_friend_pair_set.add((one_friend_we_vote_id, other_friend_we_vote_id))
+    return suggested_friend_pair_set
+
 
 class CurrentFriend(models.Model):
     """
@@ -42,9 +88,9 @@ class CurrentFriend(models.Model):
     who initiated the first friend invitation.
     """
     viewer_voter_we_vote_id = models.CharField(
-        verbose_name="voter we vote id person 1", max_length=255, null=True, blank=True, unique=False)
+        verbose_name="voter we vote id person 1", max_length=255, null=True, blank=True, unique=False, db_index=True)
     viewee_voter_we_vote_id = models.CharField(
-        verbose_name="voter we vote id person 2", max_length=255, null=True, blank=True, unique=False)
+        verbose_name="voter we vote id person 2", max_length=255, null=True, blank=True, unique=False, db_index=True)
     date_last_changed = models.DateTimeField(verbose_name='date last changed', null=True, auto_now=True)
 
     def fetch_other_voter_we_vote_id(self, one_we_vote_id):
@@ -56,6 +102,11 @@ class CurrentFriend(models.Model):
             # If the we_vote_id passed in wasn't found, don't return another we_vote_id
             return ""
 
+    # We override the save function so every we_vote_id is stored in lower case, and can be found with an exact match
+    def save(self, *args, **kwargs):
+        canonicalize_we_vote_id_fields(self)
+        super(CurrentFriend, self).save(*args, **kwargs)
+
 
 class FriendInvitationEmailLink(models.Model):
     """
@@ -64,7 +115,7 @@ class FriendInvitationEmailLink(models.Model):
     rely on the FriendInvitationVoterLink.
     """
     sender_voter_we_vote_id = models.CharField(
-        verbose_name="we vote id for the sender", max_length=255, null=True, blank=True, unique=False)
+        verbose_name="we vote id for the sender", max_length=255, null=True, blank=True, unique=False, db_index=True)
     sender_email_ownership_is_verified = models.BooleanField(default=False)  # Do we have an email address for sender?
     recipient_email_we_vote_id = models.CharField(
         verbose_name="email we vote id for recipient", max_length=255, null=True, blank=True, unique=False)
@@ -81,6 +132,10 @@ class FriendInvitationEmailLink(models.Model):
     merge_by_secret_key_allowed = models.BooleanField(default=True)  # To allow merges after delete
     deleted = models.BooleanField(default=False)  # If invitation is completed or rescinded, mark as deleted
 
+    def save(self, *args, **kwargs):
+        canonicalize_we_vote_id_fields(self)
+        super(FriendInvitationEmailLink, self).save(*args, **kwargs)
+
 
 class FriendInvitationTwitterLink(models.Model):
     """
@@ -100,6 +155,10 @@ class FriendInvitationTwitterLink(models.Model):
     merge_by_secret_key_allowed = models.BooleanField(default=True)  # To allow merges after delete
     deleted = models.BooleanField(default=False)  # If invitation is completed or rescinded, mark as deleted
 
+    def save(self, *args, **kwargs):
+        canonicalize_we_vote_id_fields(self)
+        super(FriendInvitationTwitterLink, self).save(*args, **kwargs)
+
 
 class FriendInvitationFacebookLink(models.Model):
     """
@@ -122,10 +181,11 @@ class FriendInvitationVoterLink(models.Model):
     3) invites via “friend suggestion” shown on We Vote.
     """
     sender_voter_we_vote_id = models.CharField(
-        verbose_name="we vote id for the sender", max_length=255, null=True, blank=True, unique=False)
+        verbose_name="we vote id for the sender", max_length=255, null=True, blank=True, unique=False, db_index=True)
     sender_email_ownership_is_verified = models.BooleanField(default=False)  # Do we have an email address for sender?
     recipient_voter_we_vote_id = models.CharField(
-        verbose_name="we vote id for the recipient if we have it", max_length=255, null=True, blank=True, unique=False)
+        verbose_name="we vote id for the recipient if we have it", max_length=255, null=True, blank=True, unique=False,
+        db_index=True)
     secret_key = models.CharField(
         verbose_name="secret key to accept invite", max_length=255, null=True, blank=True, unique=True)
     invitation_message = models.TextField(null=True, blank=True)
@@ -134,6 +194,10 @@ class FriendInvitationVoterLink(models.Model):
     merge_by_secret_key_allowed = models.BooleanField(default=True)  # To allow merges after delete
     deleted = models.BooleanField(default=False)  # If invitation is completed or rescinded, mark as deleted
 
+    def save(self, *args, **kwargs):
+        canonicalize_we_vote_id_fields(self)
+        super(FriendInvitationVoterLink, self).save(*args, **kwargs)
+
 
 class FriendManager(models.Model):
 
@@ -164,7 +228,7 @@ class FriendManager(models.Model):
 
         try:
             friend_invitation, created = FriendInvitationEmailLink.objects.update_or_create(
-                sender_voter_we_vote_id__iexact=sender_voter_we_vote_id,
+                sender_voter_we_vote_id=canonicalize_we_vote_id(sender_voter_we_vote_id),
                 recipient_voter_email__iexact=recipient_voter_email,
                 defaults=defaults,
             )
@@ -204,8 +268,8 @@ class FriendManager(models.Model):
 
         try:
             friend_invitation, created = FriendInvitationVoterLink.objects.update_or_create(
-                sender_voter_we_vote_id__iexact=sender_voter_we_vote_id,
-                recipient_voter_we_vote_id__iexact=recipient_voter_we_vote_id,
+                sender_voter_we_vote_id=canonicalize_we_vote_id(sender_voter_we_vote_id),
+                recipient_voter_we_vote_id=canonicalize_we_vote_id(recipient_voter_we_vote_id),
                 defaults=defaults,
             )
             friend_invitation_saved = True
@@ -266,8 +330,8 @@ class FriendManager(models.Model):
         # Note that the direction of the friendship does not matter
         try:
             current_friend = CurrentFriend.objects.get(
-                viewer_voter_we_vote_id__iexact=sender_voter_we_vote_id,
-                viewee_voter_we_vote_id__iexact=recipient_voter_we_vote_id,
+                viewer_voter_we_vote_id=canonicalize_we_vote_id(sender_voter_we_vote_id),
+                viewee_voter_we_vote_id=canonicalize_we_vote_id(recipient_voter_we_vote_id),
             )
             current_friend_found = True
             success = True
@@ -286,8 +350,8 @@ class FriendManager(models.Model):
         if not current_friend_found and success:
             try:
                 current_friend = CurrentFriend.objects.get(
-                    viewer_voter_we_vote_id__iexact=recipient_voter_we_vote_id,
-                    viewee_voter_we_vote_id__iexact=sender_voter_we_vote_id,
+                    viewer_voter_we_vote_id=canonicalize_we_vote_id(recipient_voter_we_vote_id),
+                    viewee_voter_we_vote_id=canonicalize_we_vote_id(sender_voter_we_vote_id),
                 )
                 current_friend_found = True
                 success = True
@@ -316,8 +380,8 @@ class FriendManager(models.Model):
         # Note that the direction of the friendship does not matter
         try:
             suggested_friend = SuggestedFriend.objects.get(
-                viewer_voter_we_vote_id__iexact=sender_voter_we_vote_id,
-                viewee_voter_we_vote_id__iexact=recipient_voter_we_vote_id,
+                viewer_voter_we_vote_id=canonicalize_we_vote_id(sender_voter_we_vote_id),
+                viewee_voter_we_vote_id=canonicalize_we_vote_id(recipient_voter_we_vote_id),
             )
             suggested_friend_found = True
             success = True
@@ -336,8 +400,8 @@ class FriendManager(models.Model):
         if not suggested_friend_found and success:
             try:
                 suggested_friend = SuggestedFriend.objects.get(
-                    viewer_voter_we_vote_id__iexact=recipient_voter_we_vote_id,
-                    viewee_voter_we_vote_id__iexact=sender_voter_we_vote_id,
+                    viewer_voter_we_vote_id=canonicalize_we_vote_id(recipient_voter_we_vote_id),
+                    viewee_voter_we_vote_id=canonicalize_we_vote_id(sender_voter_we_vote_id),
                 )
                 suggested_friend_found = True
                 success = True
@@ -494,8 +558,8 @@ class FriendManager(models.Model):
         friend_invitation_voter_link = FriendInvitationVoterLink()
         try:
             friend_invitation_voter_link = FriendInvitationVoterLink.objects.get(
-                recipient_voter_we_vote_id__iexact=voter.we_vote_id,
-                sender_voter_we_vote_id__iexact=sender_voter.we_vote_id,
+                recipient_voter_we_vote_id=canonicalize_we_vote_id(voter.we_vote_id),
+                sender_voter_we_vote_id=canonicalize_we_vote_id(sender_voter.we_vote_id),
             )
             success = True
             friend_invitation_found = True
@@ -581,7 +645,7 @@ class FriendManager(models.Model):
         friend_invitation_email_link = FriendInvitationEmailLink()
         try:
             friend_invitation_email_link = FriendInvitationEmailLink.objects.get(
-                sender_voter_we_vote_id__iexact=sender_voter.we_vote_id,
+                sender_voter_we_vote_id=canonicalize_we_vote_id(sender_voter.we_vote_id),
                 recipient_voter_email__iexact=recipient_voter_email,
             )
             success = True
@@ -657,8 +721,8 @@ class FriendManager(models.Model):
         try:
             current_friend_queryset = CurrentFriend.objects.all()
             current_friend_queryset = current_friend_queryset.filter(
-                Q(viewer_voter_we_vote_id__iexact=voter_we_vote_id) |
-                Q(viewee_voter_we_vote_id__iexact=voter_we_vote_id))
+                Q(viewer_voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id)) |
+                Q(viewee_voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id)))
             current_friend_queryset = current_friend_queryset.order_by('-date_last_changed')
             current_friend_list = current_friend_queryset
 
@@ -716,8 +780,8 @@ class FriendManager(models.Model):
         try:
             current_friend_queryset = CurrentFriend.objects.all()
             current_friend_queryset = current_friend_queryset.filter(
-                Q(viewer_voter_we_vote_id__iexact=voter_we_vote_id) |
-                Q(viewee_voter_we_vote_id__iexact=voter_we_vote_id))
+                Q(viewer_voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id)) |
+                Q(viewee_voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id)))
             current_friend_queryset = current_friend_queryset.order_by('-date_last_changed')
             current_friend_list = current_friend_queryset
 
@@ -786,8 +850,8 @@ class FriendManager(models.Model):
         try:
             current_friend_queryset = CurrentFriend.objects.all()
             current_friend_queryset = current_friend_queryset.filter(
-                Q(viewer_voter_we_vote_id__iexact=voter_we_vote_id) |
-                Q(viewee_voter_we_vote_id__iexact=voter_we_vote_id))
+                Q(viewer_voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id)) |
+                Q(viewee_voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id)))
             current_friend_queryset = current_friend_queryset.order_by('-date_last_changed')
             current_friend_list = current_friend_queryset
 
@@ -849,7 +913,7 @@ class FriendManager(models.Model):
             # Find invitations that I sent.
             friend_invitation_email_queryset = FriendInvitationEmailLink.objects.all()
             friend_invitation_email_queryset = friend_invitation_email_queryset.filter(
-                sender_voter_we_vote_id__iexact=sender_voter_we_vote_id)
+                sender_voter_we_vote_id=canonicalize_we_vote_id(sender_voter_we_vote_id))
             friend_invitation_email_link_list = friend_invitation_email_queryset
 
             if len(friend_invitation_email_link_list):
@@ -902,10 +966,10 @@ class FriendManager(models.Model):
             friend_invitation_voter_queryset = FriendInvitationVoterLink.objects.all()
             if positive_value_exists(sender_voter_we_vote_id):
                 friend_invitation_voter_queryset = friend_invitation_voter_queryset.filter(
-                    sender_voter_we_vote_id__iexact=sender_voter_we_vote_id)
+                    sender_voter_we_vote_id=canonicalize_we_vote_id(sender_voter_we_vote_id))
             if positive_value_exists(recipient_voter_we_vote_id):
                 friend_invitation_voter_queryset = friend_invitation_voter_queryset.filter(
-                    recipient_voter_we_vote_id__iexact=recipient_voter_we_vote_id)
+                    recipient_voter_we_vote_id=canonicalize_we_vote_id(recipient_voter_we_vote_id))
             friend_invitation_from_voter_list = friend_invitation_voter_queryset
 
             if len(friend_invitation_from_voter_list):
@@ -967,10 +1031,10 @@ class FriendManager(models.Model):
             # Find invitations that I sent that were accepted. Do NOT show invitations that were ignored.
             friend_invitation_voter_queryset = FriendInvitationVoterLink.objects.all()
             friend_invitation_voter_queryset = friend_invitation_voter_queryset.filter(
-                sender_voter_we_vote_id__iexact=viewer_voter_we_vote_id)
+                sender_voter_we_vote_id=canonicalize_we_vote_id(viewer_voter_we_vote_id))
             # It is possible through account merging to have an invitation to yourself. We want to exclude these.
             friend_invitation_voter_queryset = friend_invitation_voter_queryset.exclude(
-                recipient_voter_we_vote_id__iexact=viewer_voter_we_vote_id)
+                recipient_voter_we_vote_id=canonicalize_we_vote_id(viewer_voter_we_vote_id))
             friend_invitation_voter_queryset = friend_invitation_voter_queryset.filter(invitation_status=ACCEPTED)
             friend_invitation_voter_queryset = friend_invitation_voter_queryset.filter(deleted=True)
             friend_invitation_voter_queryset = friend_invitation_voter_queryset.order_by('-date_last_changed')
@@ -1000,7 +1064,7 @@ class FriendManager(models.Model):
             # Find invitations that I sent that were accepted. Do NOT show invitations that were ignored.
             friend_invitation_email_queryset = FriendInvitationEmailLink.objects.all()
             friend_invitation_email_queryset = friend_invitation_email_queryset.filter(
-                sender_voter_we_vote_id__iexact=viewer_voter_we_vote_id)
+                sender_voter_we_vote_id=canonicalize_we_vote_id(viewer_voter_we_vote_id))
             friend_invitation_email_queryset = friend_invitation_email_queryset.filter(invitation_status=ACCEPTED)
             friend_invitation_email_queryset = friend_invitation_email_queryset.filter(deleted=True)
             friend_invitation_email_queryset = friend_invitation_email_queryset.order_by('-date_last_changed')
@@ -1043,10 +1107,10 @@ class FriendManager(models.Model):
             # Find invitations that I received, including ones that I have ignored.
             friend_invitation_voter_queryset = FriendInvitationVoterLink.objects.all()
             friend_invitation_voter_queryset = friend_invitation_voter_queryset.filter(
-                recipient_voter_we_vote_id__iexact=viewer_voter_we_vote_id)
+                recipient_voter_we_vote_id=canonicalize_we_vote_id(viewer_voter_we_vote_id))
             # It is possible through account merging to have an invitation to yourself. We want to exclude these.
             friend_invitation_voter_queryset = friend_invitation_voter_queryset.exclude(
-                sender_voter_we_vote_id__iexact=viewer_voter_we_vote_id)
+                sender_voter_we_vote_id=canonicalize_we_vote_id(viewer_voter_we_vote_id))
             friend_invitation_voter_queryset = friend_invitation_voter_queryset.filter(
                 Q(invitation_status=ACCEPTED) |
                 Q(invitation_status=IGNORED))
@@ -1209,10 +1273,10 @@ class FriendManager(models.Model):
         try:
             friend_invitation_voter_queryset = FriendInvitationVoterLink.objects.all()
             friend_invitation_voter_queryset = friend_invitation_voter_queryset.filter(
-                sender_voter_we_vote_id__iexact=sender_voter_we_vote_id)
+                sender_voter_we_vote_id=canonicalize_we_vote_id(sender_voter_we_vote_id))
             # It is possible through account merging to have an invitation to yourself. We want to exclude these.
             friend_invitation_voter_queryset = friend_invitation_voter_queryset.exclude(
-                recipient_voter_we_vote_id__iexact=sender_voter_we_vote_id)
+                recipient_voter_we_vote_id=canonicalize_we_vote_id(sender_voter_we_vote_id))
             friend_invitation_voter_queryset = friend_invitation_voter_queryset.filter(deleted=False)
             friend_invitation_voter_queryset = friend_invitation_voter_queryset.order_by('-date_last_changed')
             friend_list = friend_invitation_voter_queryset
@@ -1240,7 +1304,7 @@ class FriendManager(models.Model):
         try:
             friend_invitation_email_queryset = FriendInvitationEmailLink.objects.all()
             friend_invitation_email_queryset = friend_invitation_email_queryset.filter(
-                sender_voter_we_vote_id__iexact=sender_voter_we_vote_id)
+                sender_voter_we_vote_id=canonicalize_we_vote_id(sender_voter_we_vote_id))
             friend_invitation_email_queryset = friend_invitation_email_queryset.filter(deleted=False)
             friend_invitation_email_queryset = friend_invitation_email_queryset.order_by('-date_last_changed')
             friend_list_email = friend_invitation_email_queryset
@@ -1338,10 +1402,10 @@ class FriendManager(models.Model):
         try:
             friend_invitation_voter_queryset = FriendInvitationVoterLink.objects.all()
             friend_invitation_voter_queryset = friend_invitation_voter_queryset.filter(
-                recipient_voter_we_vote_id__iexact=recipient_voter_we_vote_id)
+                recipient_voter_we_vote_id=canonicalize_we_vote_id(recipient_voter_we_vote_id))
             # It is possible through account merging to have an invitation to yourself. We want to exclude these.
             friend_invitation_voter_queryset = friend_invitation_voter_queryset.exclude(
-                sender_voter_we_vote_id__iexact=recipient_voter_we_vote_id)
+                sender_voter_we_vote_id=canonicalize_we_vote_id(recipient_voter_we_vote_id))
             friend_invitation_voter_queryset = friend_invitation_voter_queryset.order_by('-date_last_changed')
             friend_list = friend_invitation_voter_queryset
 
@@ -1561,8 +1625,8 @@ class FriendManager(models.Model):
         try:
             suggested_friend_queryset = SuggestedFriend.objects.all()
             suggested_friend_queryset = suggested_friend_queryset.filter(
-                Q(viewer_voter_we_vote_id__iexact=voter_we_vote_id) |
-                Q(viewee_voter_we_vote_id__iexact=voter_we_vote_id))
+                Q(viewer_voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id)) |
+                Q(viewee_voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id)))
             suggested_friend_queryset = suggested_friend_queryset.order_by('-date_last_changed')
             suggested_friend_list = suggested_friend_queryset
 
@@ -1620,8 +1684,8 @@ class FriendManager(models.Model):
         try:
             suggested_friend_queryset = SuggestedFriend.objects.all()
             suggested_friend_queryset = suggested_friend_queryset.filter(
-                Q(viewer_voter_we_vote_id__iexact=voter_we_vote_id) |
-                Q(viewee_voter_we_vote_id__iexact=voter_we_vote_id))
+                Q(viewer_voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id)) |
+                Q(viewee_voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id)))
             suggested_friend_queryset = suggested_friend_queryset.order_by('-date_last_changed')
             suggested_friend_list = suggested_friend_queryset
 
@@ -1697,51 +1761,168 @@ class FriendManager(models.Model):
         }
         return results
 
-    def update_suggested_friends_starting_with_one_voter(self, starting_voter_we_vote_id):
+    def retrieve_friend_adjacency(self, voter_we_vote_id=''):
+        """
+        Read the friend graph with values_list scans of CurrentFriend. For one voter we only need that voter's
+        friends, and who those friends are friends with, which takes two queries.
+        :param voter_we_vote_id: If empty, we read the whole friend graph
+        :return:
         """
+        friend_adjacency = {}
+        voter_we_vote_id = canonicalize_we_vote_id(voter_we_vote_id)
+        try:
+            if positive_value_exists(voter_we_vote_id):
+                friend_pair_list = CurrentFriend.objects.filter(
+                    Q(viewer_voter_we_vote_id=voter_we_vote_id) |
+                    Q(viewee_voter_we_vote_id=voter_we_vote_id)).values_list(
+                    'viewer_voter_we_vote_id', 'viewee_voter_we_vote_id')
+                friends_of_voter = build_friend_adjacency(friend_pair_list).get(voter_we_vote_id, set())
+                if len(friends_of_voter):
+                    friend_pair_list = CurrentFriend.objects.filter(
+                        Q(viewer_voter_we_vote_id__in=friends_of_voter) |
+                        Q(viewee_voter_we_vote_id__in=friends_of_voter)).values_list(
+                        'viewer_voter_we_vote_id', 'viewee_voter_we_vote_id')
+                    friend_adjacency = build_friend_adjacency(friend_pair_list)
+            else:
+                friend_pair_list = CurrentFriend.objects.values_list(
+                    'viewer_voter_we_vote_id', 'viewee_voter_we_vote_id').iterator()
+                friend_adjacency = build_friend_adjacency(friend_pair_list)
+            success = True
+            status = "FRIEND_ADJACENCY_RETRIEVED "
+        except Exception as e:
+            success = False
+            status = "FRIEND_ADJACENCY_NOT_RETRIEVED "
+            handle_exception(e, logger=logger, exception_message=status)
 
-        :param starting_voter_we_vote_id:
+        results = {
+            'success':          success,
+            'status':           status,
+            'friend_adjacency': friend_adjacency,
+        }
+        return results
+
+    def create_suggested_friends_in_bulk(self, suggested_friend_pair_set, read_all_existing_suggestions=False):
+        """
+        Save the suggestions we don't already have (in either direction) with bulk inserts
+        :param suggested_friend_pair_set: from generate_suggested_friend_pairs
+        :param read_all_existing_suggestions: Scan the whole SuggestedFriend table instead of looking up the voters
+          in suggested_friend_pair_set, which is faster when we are updating every voter
         :return:
         """
-        all_friends_one_person_results = self.retrieve_current_friends(starting_voter_we_vote_id)
         suggested_friend_created_count = 0
-        if all_friends_one_person_results['current_friend_list_found']:
-            current_friend_list = all_friends_one_person_results['current_friend_list']
-            # For each friend on this list, suggest every other friend as a possible friend
-            for one_current_friend_to_suggest in current_friend_list:
-                first_voter_we_vote_id = one_current_friend_to_suggest.fetch_other_voter_we_vote_id(
-                    starting_voter_we_vote_id)
-                for second_current_friend_to_suggest in current_friend_list:
-                    second_voter_we_vote_id = second_current_friend_to_suggest.fetch_other_voter_we_vote_id(
-                        starting_voter_we_vote_id)
-                    if positive_value_exists(first_voter_we_vote_id) and \
-                            positive_value_exists(second_voter_we_vote_id) and \
-                            first_voter_we_vote_id != second_voter_we_vote_id:
-                        # Are they already friends?
-                        already_friend_results = self.retrieve_current_friend(first_voter_we_vote_id,
-                                                                              second_voter_we_vote_id)
-                        if not already_friend_results['current_friend_found']:
-                            suggested_friend_results = self.create_or_update_suggested_friend(first_voter_we_vote_id,
-                                                                                              second_voter_we_vote_id)
-                            if suggested_friend_results['suggested_friend_created']:
-                                suggested_friend_created_count += 1
+        if not len(suggested_friend_pair_set):
+            results = {
+                'success':                          True,
+                'status':                           "NO_SUGGESTED_FRIENDS_TO_CREATE ",
+                'suggested_friend_created_count':   suggested_friend_created_count,
+            }
+            return results
+
+        try:
+            if read_all_existing_suggestions:
+                existing_pair_list = SuggestedFriend.objects.values_list(
+                    'viewer_voter_we_vote_id', 'viewee_voter_we_vote_id').iterator()
+            else:
+                voter_we_vote_id_set = set()
+                for one_we_vote_id, other_we_vote_id in suggested_friend_pair_set:
+                    voter_we_vote_id_set.add(one_we_vote_id)
+                    voter_we_vote_id_set.add(other_we_vote_id)
+                existing_pair_list = SuggestedFriend.objects.filter(
+                    viewer_voter_we_vote_id__in=voter_we_vote_id_set,
+                    viewee_voter_we_vote_id__in=voter_we_vote_id_set).values_list(
+                    'viewer_voter_we_vote_id', 'viewee_voter_we_vote_id')
+            existing_pair_set = set()
+            for viewer_voter_we_vote_id, viewee_voter_we_vote_id in existing_pair_list:
+                viewer_voter_we_vote_id = canonicalize_we_vote_id(viewer_voter_we_vote_id) or ''
+                viewee_voter_we_vote_id = canonicalize_we_vote_id(viewee_voter_we_vote_id) or ''
+                existing_pair_set.add((min(viewer_voter_we_vote_id, viewee_voter_we_vote_id),
+                                       max(viewer_voter_we_vote_id, viewee_voter_we_vote_id)))
+
+            suggested_friend_list = [
+                SuggestedFriend(viewer_voter_we_vote_id=one_we_vote_id, viewee_voter_we_vote_id=other_we_vote_id)
+                for one_we_vote_id, other_we_vote_id in sorted(suggested_friend_pair_set - existing_pair_set)]
+            # bulk_create doesn't call save(), but every we_vote_id in the pair set is already in canonical form
+            SuggestedFriend.objects.bulk_create(suggested_friend_list,
+                                                batch_size=SUGGESTED_FRIEND_BULK_CREATE_BATCH_SIZE)
+            suggested_friend_created_count = len(suggested_friend_list)
+            success = True
+            status = "SUGGESTED_FRIENDS_CREATED_IN_BULK "
+        except Exception as e:
+            success = False
+            status = "SUGGESTED_FRIENDS_NOT_CREATED_IN_BULK "
+            handle_record_not_saved_exception(e, logger=logger, exception_message_optional=status)
 
         results = {
-            'status':                           "UPDATE_SUGGESTED_FRIENDS_COMPLETED ",
-            'success':                          True,
+            'success':                          success,
+            'status':                           status,
             'suggested_friend_created_count':   suggested_friend_created_count,
         }
         return results
 
+    def update_suggested_friends_starting_with_one_voter(self, starting_voter_we_vote_id):
+        """
+        Suggest each of this voter's friends to every other friend of this voter they aren't already friends with.
+        :param starting_voter_we_vote_id:
+        :return:
+        """
+        adjacency_results = self.retrieve_friend_adjacency(starting_voter_we_vote_id)
+        if not adjacency_results['success']:
+            results = {
+                'status':                           adjacency_results['status'],
+                'success':                          False,
+                'suggested_friend_created_count':   0,
+            }
+            return results
+
+        suggested_friend_pair_set = generate_suggested_friend_pairs(adjacency_results['friend_adjacency'],
+                                                                    [starting_voter_we_vote_id])
+        create_results = self.create_suggested_friends_in_bulk(suggested_friend_pair_set)
+
+        results = {
+            'status':                           "UPDATE_SUGGESTED_FRIENDS_COMPLETED " + create_results['status'],
+            'success':                          create_results['success'],
+            'suggested_friend_created_count':   create_results['suggested_friend_created_count'],
+        }
+        return results
+
+    def update_suggested_friends_for_all_voters(self):
+        """
+        The same as update_suggested_friends_starting_with_one_voter, for every voter, with one pass over
+        the friend graph.
+        :return:
+        """
+        adjacency_results = self.retrieve_friend_adjacency()
+        if not adjacency_results['success']:
+            results = {
+                'status':                           adjacency_results['status'],
+                'success':                          False,
+                'voters_with_friends_count':        0,
+                'suggested_friend_created_count':   0,
+            }
+            return results
+
+        friend_adjacency = adjacency_results['friend_adjacency']
+        suggested_friend_pair_set = generate_suggested_friend_pairs(friend_adjacency)
+        create_results = self.create_suggested_friends_in_bulk(suggested_friend_pair_set,
+                                                               read_all_existing_suggestions=True)
+
+        results = {
+            'status':                           "UPDATE_ALL_SUGGESTED_FRIENDS_COMPLETED " + create_results['status'],
+            'success':                          create_results['success'],
+            'voters_with_friends_count':        len(friend_adjacency),
+            'suggested_friend_created_count':   create_results['suggested_friend_created_count'],
+        }
+        return results
+
 
 class SuggestedFriend(models.Model):
     """
     This table stores possible friend connections.
     """
     viewer_voter_we_vote_id = models.CharField(
-        verbose_name="voter we vote id person 1", max_length=255, null=True, blank=True, unique=False)
+        verbose_name="voter we vote id person 1", max_length=255, null=True, blank=True, unique=False, db_index=True)
     viewee_voter_we_vote_id = models.CharField(
-        verbose_name="voter we vote id person 2", max_length=255, null=True, blank=True, unique=False)
+        verbose_name="voter we vote id person 2", max_length=255, null=True, blank=True, unique=False, db_index=True)
     date_last_changed = models.DateTimeField(verbose_name='date last changed', null=True, auto_now=True)
 
     def fetch_other_voter_we_vote_id(self, one_we_vote_id):
@@ -1752,3 +1933,7 @@ class SuggestedFriend(models.Model):
         else:
             # If the we_vote_id passed in wasn't found, don't return another we_vote_id
             return ""
+
+    def save(self, *args, **kwargs):
+        canonicalize_we_vote_id_fields(self)
+        super(SuggestedFriend, self).save(*args, **kwargs)
@@ -0,0 +1,60 @@
+# friend/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.test import SimpleTestCase, TestCase
+from friend.models import build_friend_adjacency, CurrentFriend, FriendManager, generate_suggested_friend_pairs, \
+    SuggestedFriend
+
+# voter1 is friends with voter2, voter3 and voter4. voter2 and voter3 are already friends.
+FRIEND_PAIR_LIST = [
+    ("wv01voter1", "wv01voter2"),
+    ("WV01VOTER3", "wv01voter1"),
+    ("wv01voter1", "wv01voter4"),
+    ("wv01voter2", "wv01voter3"),
+    # Entries we can't make a friend out of
+    ("wv01voter5", "WV01VOTER5"),
+    ("wv01voter6", ""),
+    (None, "wv01voter6"),
+]
+
+
+class FriendGraphTestCase(SimpleTestCase):
+
+    def test_build_friend_adjacency(self):
+        self.assertEqual(build_friend_adjacency(FRIEND_PAIR_LIST), {
+            "wv01voter1": {"wv01voter2", "wv01voter3", "wv01voter4"},
+            "wv01voter2": {"wv01voter1", "wv01voter3"},
+            "wv01voter3": {"wv01voter1", "wv01voter2"},
+            "wv01voter4": {"wv01voter1"},
+        })
+
+    def test_suggestions_leave_out_existing_friends_and_self_pairs(self):
+        friend_adjacency = build_friend_adjacency(FRIEND_PAIR_LIST)
+        expected_pair_set = {("wv01voter2", "wv01voter4"), ("wv01voter3", "wv01voter4")}
+        self.assertEqual(generate_suggested_friend_pairs(friend_adjacency), expected_pair_set)
+        self.assertEqual(generate_suggested_friend_pairs(friend_adjacency, ["WV01VOTER1"]), expected_pair_set)
+        # voter4 only has one friend, so there is nobody to suggest
+        self.assertEqual(generate_suggested_friend_pairs(friend_adjacency, ["wv01voter4"]), set())
+        self.assertEqual(generate_suggested_friend_pairs(friend_adjacency, ["wv01voter5"]), set())
+
+
+class SuggestedFriendTestCase(TestCase):
+
+    def test_update_suggested_friends_for_all_voters(self):
+        for viewer_voter_we_vote_id, viewee_voter_we_vote_id in FRIEND_PAIR_LIST:
+            CurrentFriend.objects.create(viewer_voter_we_vote_id=viewer_voter_we_vote_id,
+                                         viewee_voter_we_vote_id=viewee_voter_we_vote_id)
+        # Already suggested, the other way around
+        SuggestedFriend.objects.create(viewer_voter_we_vote_id="wv01voter4", viewee_voter_we_vote_id="wv01voter2")
+
+        friend_manager = FriendManager()
+        results = friend_manager.update_suggested_friends_for_all_voters()
+        self.assertTrue(results['success'])
+        self.assertEqual(results['suggested_friend_created_count'], 1)
+        self.assertEqual(set(SuggestedFriend.objects.values_list('viewer_voter_we_vote_id', 'viewee_voter_we_vote_id')),
+                         {("wv01voter4", "wv01voter2"), ("wv01voter3", "wv01voter4")})
+
+        # Running it again doesn't suggest anybody twice
+        results = friend_manager.update_suggested_friends_for_all_voters()
+        self.assertEqual(results['suggested_friend_created_count'], 0)
@@ -1,3 +1,230 @@
+# geoip/models.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from collections import namedtuple, OrderedDict
+from datetime import timedelta
 from django.db import models
+from django.utils import timezone
+from geopy.exc import GeocoderQuotaExceeded
+import re
+import wevote_functions.admin
+from wevote_functions.functions import positive_value_exists
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+# How long we trust a geocoded address before asking Google again
+GEOCODE_CACHE_TIMEOUT_DAYS = 90
+# When Google can't find an address, we remember that for a shorter time
+GEOCODE_NOT_FOUND_CACHE_TIMEOUT_DAYS = 1
+# Number of addresses each server process keeps in memory in front of the GeocodedAddress table
+GEOCODE_IN_PROCESS_CACHE_SIZE = 10000
+# Log the hit and miss counters every time this many lookups have been made
+GEOCODE_CACHE_STATISTICS_LOG_INTERVAL = 1000
+
+# Has the same attributes we use from geopy's Location
+GeocodedLocation = namedtuple('GeocodedLocation', ['address', 'latitude', 'longitude'])
+
+# Address -> (GeocodedLocation or None, date_geocoded), least recently used first
+_geocode_in_process_cache = OrderedDict()
+_geocode_cache_statistics = {
+    'in_process_hits':      0,
+    'database_hits':        0,
+    'misses':               0,
+    'geocoder_errors':      0,
+    'quota_exceeded':       0,
+}
+
+
+def normalize_address_for_geocode_cache(text_for_map_search):
+    """
+    "1200 Broadway Ave.,  Oakland CA" and "1200 broadway ave, oakland, ca" should share one cache entry
+    :param text_for_map_search:
+    :return:
+    """
+    if not positive_value_exists(text_for_map_search):
+        return ''
+    normalized_address = text_for_map_search.lower()
+    normalized_address = re.sub(r'[.,#]', ' ', normalized_address)
+    normalized_address = re.sub(r'\s+', ' ', normalized_address)
+    return normalized_address.strip()
+
+
+def fetch_geocode_cache_statistics():
+    statistics = dict(_geocode_cache_statistics)
+    lookups = statistics['in_process_hits'] + statistics['database_hits'] + statistics['misses']
+    statistics['lookups'] = lookups
+    statistics['hit_rate'] = \
+        float(statistics['in_process_hits'] + statistics['database_hits']) / lookups if lookups else 0.0
+    statistics['in_process_cache_size'] = len(_geocode_in_process_cache)
+    statistics['in_process_cache_maximum_size'] = GEOCODE_IN_PROCESS_CACHE_SIZE
+    return statistics
+
+
+def clear_geocode_in_process_cache():
+    _geocode_in_process_cache.clear()
+    for key in _geocode_cache_statistics:
+        _geocode_cache_statistics[key] = 0
+
+
+class GeocodedAddress(models.Model):
+    """
+    The result of asking the Google geocoder about one address, so identical text_for_map_search values don't each
+    pay for a round trip (and count against our quota)
+    """
+    normalized_address = models.CharField(verbose_name='address as entered, normalized', max_length=255,
+                                          null=False, unique=True)
+    # The address as Google formatted it. Empty if Google could not find the address.
+    formatted_address = models.CharField(max_length=255, null=True, blank=True)
+    latitude = models.FloatField(null=True)
+    longitude = models.FloatField(null=True)
+    date_geocoded = models.DateTimeField(verbose_name='date geocoded', null=False, auto_now=True)
+
+    def __unicode__(self):
+        return self.normalized_address
+
+    def location_found(self):
+        return self.latitude is not None and self.longitude is not None
+
+
+class GeocodeCacheManager(models.Model):
+
+    def __unicode__(self):
+        return "GeocodeCacheManager"
+
+    def is_cache_entry_current(self, location, date_geocoded):
+        if location is None:
+            timeout = timedelta(days=GEOCODE_NOT_FOUND_CACHE_TIMEOUT_DAYS)
+        else:
+            timeout = timedelta(days=GEOCODE_CACHE_TIMEOUT_DAYS)
+        return timezone.now() - date_geocoded < timeout
+
+    def store_in_process(self, normalized_address, location, date_geocoded):
+        _geocode_in_process_cache[normalized_address] = (location, date_geocoded)
+        _geocode_in_process_cache.move_to_end(normalized_address)
+        while len(_geocode_in_process_cache) > GEOCODE_IN_PROCESS_CACHE_SIZE:
+            _geocode_in_process_cache.popitem(last=False)
+
+    def geocode(self, text_for_map_search, google_client, fallback_google_client=None):
+        """
+        Geocode an address, looking in the in-process cache, then the GeocodedAddress table, and only then asking
+        the geocoder.
+        :param text_for_map_search:
+        :param google_client: a geopy geocoder
+        :param fallback_google_client: Tried if google_client has exceeded its quota
+        :return: location is a GeocodedLocation, or None if the geocoder could not find the address
+        """
+        status = ""
+        statistics = fetch_geocode_cache_statistics()
+        if statistics['lookups'] and not statistics['lookups'] % GEOCODE_CACHE_STATISTICS_LOG_INTERVAL:
+            logger.info("Geocode cache statistics: {statistics}".format(statistics=statistics))
+        normalized_address = normalize_address_for_geocode_cache(text_for_map_search)
+        cacheable = positive_value_exists(normalized_address) and len(normalized_address) <= 255
+
+        if cacheable and normalized_address in _geocode_in_process_cache:
+            location, date_geocoded = _geocode_in_process_cache[normalized_address]
+            if self.is_cache_entry_current(location, date_geocoded):
+                _geocode_in_process_cache.move_to_end(normalized_address)
+                _geocode_cache_statistics['in_process_hits'] += 1
+                return {
+                    'success':                  True,
+                    'status':                   "GEOCODE_CACHE_HIT_IN_PROCESS ",
+                    'geocoder_quota_exceeded':  False,
+                    'location_found':           location is not None,
+                    'location':                 location,
+                }
+            del _geocode_in_process_cache[normalized_address]
+
+        if cacheable:
+            try:
+                geocoded_address = GeocodedAddress.objects.get(normalized_address=normalized_address)
+                if geocoded_address.location_found():
+                    location = GeocodedLocation(address=geocoded_address.formatted_address,
+                                                latitude=geocoded_address.latitude,
+                                                longitude=geocoded_address.longitude)
+                else:
+                    location = None
+                if self.is_cache_entry_current(location, geocoded_address.date_geocoded):
+                    self.store_in_process(normalized_address, location, geocoded_address.date_geocoded)
+                    _geocode_cache_statistics['database_hits'] += 1
+                    return {
+                        'success':                  True,
+                        'status':                   "GEOCODE_CACHE_HIT_IN_DATABASE ",
+                        'geocoder_quota_exceeded':  False,
+                        'location_found':           location is not None,
+                        'location':                 location,
+                    }
+            except GeocodedAddress.DoesNotExist:
+                pass
+            except Exception as e:
+                status += "GEOCODE_CACHE_RETRIEVE_FAILED {error} [type: {error_type}] ".format(
+                    error=e, error_type=type(e))
+
+        _geocode_cache_statistics['misses'] += 1
+        geocoder_location = None
+        geocoder_succeeded = False
+        quota_exceeded = False
+        try:
+            geocoder_location = google_client.geocode(text_for_map_search)
+            geocoder_succeeded = True
+        except GeocoderQuotaExceeded:
+            _geocode_cache_statistics['quota_exceeded'] += 1
+            quota_exceeded = True
+            status += "GEOCODER_QUOTA_EXCEEDED "
+        except Exception as e:
+            _geocode_cache_statistics['geocoder_errors'] += 1
+            status += 'GEOCODER_ERROR {error} [type: {error_type}] '.format(error=e, error_type=type(e))
+
+        if not geocoder_succeeded and fallback_google_client is not None:
+            try:
+                geocoder_location = fallback_google_client.geocode(text_for_map_search)
+                geocoder_succeeded = True
+            except GeocoderQuotaExceeded:
+                _geocode_cache_statistics['quota_exceeded'] += 1
+                return {
+                    'success':                  False,
+                    'status':                   status + "FALLBACK_GEOCODER_QUOTA_EXCEEDED ",
+                    'geocoder_quota_exceeded':  True,
+                    'location_found':           False,
+                    'location':                 None,
+                }
+            except Exception as e:
+                _geocode_cache_statistics['geocoder_errors'] += 1
+                status += 'FALLBACK_GEOCODER_ERROR {error} [type: {error_type}] '.format(error=e, error_type=type(e))
+
+        if not geocoder_succeeded:
+            # Don't cache anything, since we didn't get an answer from the geocoder
+            return {
+                'success':                  False,
+                'status':                   status,
+                'geocoder_quota_exceeded':  quota_exceeded and fallback_google_client is None,
+                'location_found':           False,
+                'location':                 None,
+            }
+
+        if geocoder_location is None:
+            location = None
+        else:
+            location = GeocodedLocation(address=geocoder_location.address, latitude=geocoder_location.latitude,
+                                        longitude=geocoder_location.longitude)
+
+        if cacheable:
+            try:
+                geocoded_address, created = GeocodedAddress.objects.update_or_create(
+                    normalized_address=normalized_address,
+                    defaults={
+                        'formatted_address':    location.address[:255] if location else None,
+                        'latitude':             location.latitude if location else None,
+                        'longitude':            location.longitude if location else None,
+                    })
+                self.store_in_process(normalized_address, location, geocoded_address.date_geocoded)
+            except Exception as e:
+                status += "GEOCODE_CACHE_NOT_SAVED {error} [type: {error_type}] ".format(error=e, error_type=type(e))
 
-# Create your models here.
+        return {
+            'success':                  True,
+            'status':                   status + "GEOCODER_CALLED ",
+            'geocoder_quota_exceeded':  False,
+            'location_found':           location is not None,
+            'location':                 location,
+        }
@@ -1,3 +1,52 @@
+from collections import namedtuple
+from unittest import mock
+
 from django.test import TestCase
+from geopy.exc import GeocoderQuotaExceeded
+
+from geoip.models import clear_geocode_in_process_cache, fetch_geocode_cache_statistics, GeocodeCacheManager, \
+    GeocodedAddress, normalize_address_for_geocode_cache
+
+
+Location = namedtuple('Location', ['address', 'latitude', 'longitude'])
+
+
+class GeocodeCacheTestCase(TestCase):
+
+    def setUp(self):
+        clear_geocode_in_process_cache()
+        self.geocode_cache_manager = GeocodeCacheManager()
+        self.google_client = mock.Mock()
+        self.google_client.geocode.return_value = Location(address='1200 Broadway, Oakland, CA 94612, USA',
+                                                           latitude=37.8030442, longitude=-122.2739699)
+
+    def test_normalize_address(self):
+        self.assertEqual(normalize_address_for_geocode_cache('1200 Broadway Ave.,  Oakland CA'),
+                         normalize_address_for_geocode_cache('1200 broadway ave, oakland, ca'))
+
+    def test_identical_addresses_geocoded_once(self):
+        first_results = self.geocode_cache_manager.geocode('1200 Broadway, Oakland CA', self.google_client)
+        second_results = self.geocode_cache_manager.geocode('1200 broadway,  oakland, CA', self.google_client)
+        self.assertEqual(self.google_client.geocode.call_count, 1)
+        self.assertEqual(first_results['location'], second_results['location'])
+        self.assertEqual(GeocodedAddress.objects.count(), 1)
+        statistics = fetch_geocode_cache_statistics()
+        self.assertEqual(statistics['misses'], 1)
+        self.assertEqual(statistics['in_process_hits'], 1)
+
+    def test_database_hit_after_in_process_cache_cleared(self):
+        self.geocode_cache_manager.geocode('1200 Broadway, Oakland CA', self.google_client)
+        clear_geocode_in_process_cache()
+        results = self.geocode_cache_manager.geocode('1200 Broadway, Oakland CA', self.google_client)
+        self.assertEqual(self.google_client.geocode.call_count, 1)
+        self.assertEqual(results['location'].latitude, 37.8030442)
+        self.assertEqual(fetch_geocode_cache_statistics()['database_hits'], 1)
 
-# Create your tests here.
+    def test_quota_exceeded_uses_fallback_client(self):
+        self.google_client.geocode.side_effect = GeocoderQuotaExceeded()
+        fallback_google_client = mock.Mock()
+        fallback_google_client.geocode.return_value = None
+        results = self.geocode_cache_manager.geocode('blah bal blh, OK', self.google_client, fallback_google_client)
+        self.assertFalse(results['geocoder_quota_exceeded'])
+        self.assertFalse(results['location_found'])
+        self.assertEqual(fallback_google_client.geocode.call_count, 1)
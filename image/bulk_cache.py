@@ -0,0 +1,272 @@
+# image/bulk_cache.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+# Caches the images for every organization or voter using a pool of worker threads. The serial versions in
+# image/controllers.py spend nearly all of their time waiting on Twitter, Facebook and S3, so running several
+# entities at once is where the speedup comes from. image/functions.py keeps us from opening more than
+# IMAGE_REQUESTS_PER_HOST requests to any one host, and retries failed downloads with backoff.
+# Work is done in id order, in chunks. After each chunk the last id is saved as a WeVoteSetting, so a run that is
+# interrupted picks up where it stopped the next time it is started. Entities with a failed image are saved in a
+# second WeVoteSetting, and the next run tries each of them once more before it goes on from the saved id. An image
+# that is gone for good (a dead Twitter or Facebook url) doesn't hold the cursor back.
+
+from .controllers import cache_organization_master_images, cache_voter_master_images, \
+    create_resized_image_if_not_created, FACEBOOK, MAPLIGHT, TWITTER, VOTE_SMART, IMAGE_ALREADY_CACHED
+from .functions import fetch_image_download_statistics, start_image_download_statistics
+from .models import WeVoteImage
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connection
+from exception.models import handle_exception
+from organization.models import Organization
+from voter.models import Voter
+from wevote_functions.functions import convert_to_int, positive_value_exists
+from wevote_settings.models import WeVoteSettingsManager
+import time
+import wevote_functions.admin
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+IMAGE_CACHING_WORKER_COUNT = 8
+# The cursor is saved after each chunk, so at most this many entities are redone after an interruption
+IMAGE_CACHING_CHUNK_SIZE = 200
+IMAGE_CACHING_CURSOR_SETTING_PREFIX = "image_caching_cursor_"
+IMAGE_CACHING_RETRY_SETTING_PREFIX = "image_caching_retry_"
+
+ORGANIZATION_MASTER_IMAGES = "organization_master_images"
+VOTER_MASTER_IMAGES = "voter_master_images"
+ORGANIZATION_RESIZED_IMAGES = "organization_resized_images"
+VOTER_RESIZED_IMAGES = "voter_resized_images"
+UNKNOWN_SOURCE = "unknown"
+
+
+def fetch_image_source_from_result_key(result_key):
+    """
+    "cached_twitter_profile_image" -> TWITTER
+    :param result_key:
+    :return:
+    """
+    if TWITTER in result_key:
+        return TWITTER
+    elif FACEBOOK in result_key:
+        return FACEBOOK
+    return UNKNOWN_SOURCE
+
+
+def fetch_image_source_from_we_vote_image(we_vote_image):
+    if we_vote_image.kind_of_image_twitter_profile or we_vote_image.kind_of_image_twitter_background or \
+            we_vote_image.kind_of_image_twitter_banner:
+        return TWITTER
+    elif we_vote_image.kind_of_image_facebook_profile or we_vote_image.kind_of_image_facebook_background:
+        return FACEBOOK
+    elif we_vote_image.kind_of_image_maplight:
+        return MAPLIGHT
+    elif we_vote_image.kind_of_image_vote_smart:
+        return VOTE_SMART
+    return UNKNOWN_SOURCE
+
+
+def cache_master_images_outcome_list(cache_all_kind_of_images_results):
+    """
+    Turn the results of cache_organization_master_images or cache_voter_master_images into (source, outcome) pairs
+    :param cache_all_kind_of_images_results:
+    :return:
+    """
+    return [(fetch_image_source_from_result_key(result_key), outcome)
+            for result_key, outcome in cache_all_kind_of_images_results.items() if result_key.startswith('cached_')]
+
+
+def cache_organization_master_images_by_id(organization_id):
+    organization_we_vote_id = Organization.objects.filter(id=organization_id).values_list(
+        'we_vote_id', flat=True).first()
+    if not organization_we_vote_id:
+        return []
+    return cache_master_images_outcome_list(cache_organization_master_images(organization_we_vote_id))
+
+
+def cache_voter_master_images_by_id(voter_id):
+    return cache_master_images_outcome_list(cache_voter_master_images(voter_id))
+
+
+def create_resized_images_by_we_vote_image_id(we_vote_image_id):
+    try:
+        we_vote_image = WeVoteImage.objects.get(id=we_vote_image_id)
+    except WeVoteImage.DoesNotExist:
+        return []
+    source = fetch_image_source_from_we_vote_image(we_vote_image)
+    create_resized_image_results = create_resized_image_if_not_created(we_vote_image)
+    return [(source, outcome) for result_key, outcome in create_resized_image_results.items()
+            if result_key.startswith('cached_')]
+
+
+# job name -> (function returning the queryset of entities to work through, function caching one entity by id)
+IMAGE_CACHING_JOBS = {
+    ORGANIZATION_MASTER_IMAGES: (
+        lambda: Organization.objects.all(),
+        cache_organization_master_images_by_id),
+    VOTER_MASTER_IMAGES: (
+        lambda: Voter.objects.all(),
+        cache_voter_master_images_by_id),
+    ORGANIZATION_RESIZED_IMAGES: (
+        lambda: WeVoteImage.objects.filter(kind_of_image_original=True, organization_we_vote_id__isnull=False)
+        .exclude(organization_we_vote_id=''),
+        create_resized_images_by_we_vote_image_id),
+    VOTER_RESIZED_IMAGES: (
+        lambda: WeVoteImage.objects.filter(kind_of_image_original=True, voter_we_vote_id__isnull=False)
+        .exclude(voter_we_vote_id=''),
+        create_resized_images_by_we_vote_image_id),
+}
+
+
+def cache_images_for_one_entity(cache_function, entity_id):
+    """
+    Runs in a worker thread
+    :param cache_function:
+    :param entity_id:
+    :return: (list of (source, outcome), image download statistics for this entity)
+    """
+    start_image_download_statistics()
+    try:
+        outcome_list = cache_function(entity_id)
+    except Exception as e:
+        handle_exception(e, logger=logger, exception_message="cache_images_for_one_entity failed for {entity_id}"
+                                                               "".format(entity_id=entity_id))
+        outcome_list = [(UNKNOWN_SOURCE, False)]
+    finally:
+        # Each worker thread has its own database connection, which Django would otherwise leave open
+        connection.close()
+    return outcome_list, fetch_image_download_statistics()
+
+
+def summarize_image_caching_run(summary, time_started):
+    elapsed_seconds = time.time() - time_started
+    summary['elapsed_seconds'] = round(elapsed_seconds, 1)
+    images_processed = summary['images_cached'] + summary['images_already_cached'] + summary['images_failed']
+    summary['images_per_second'] = round(images_processed / elapsed_seconds, 2) if elapsed_seconds else 0.0
+    summary['bytes_per_second'] = int(summary['bytes_downloaded'] / elapsed_seconds) if elapsed_seconds else 0
+    return summary
+
+
+def fetch_image_caching_retry_list(we_vote_settings_manager, retry_setting_name):
+    retry_entity_ids = we_vote_settings_manager.fetch_setting(retry_setting_name) or ''
+    return [convert_to_int(entity_id) for entity_id in str(retry_entity_ids).split(',')
+            if positive_value_exists(convert_to_int(entity_id))]
+
+
+def save_image_caching_retry_list(we_vote_settings_manager, retry_setting_name, retry_entity_id_list):
+    we_vote_settings_manager.save_setting(retry_setting_name,
+                                          ','.join(str(entity_id) for entity_id in retry_entity_id_list))
+
+
+def cache_images_for_chunk(executor, cache_function, chunk, summary):
+    """
+    Cache the images of one chunk of entities with the worker pool, and add the outcomes to summary
+    :param executor:
+    :param cache_function:
+    :param chunk: entity ids
+    :param summary:
+    :return: the ids of the entities with a failed image
+    """
+    failed_entity_id_list = []
+    chunk_results = executor.map(lambda entity_id: cache_images_for_one_entity(cache_function, entity_id), chunk)
+    for entity_id, (outcome_list, download_statistics) in zip(chunk, chunk_results):
+        summary['entities_processed'] += 1
+        for statistic_name, statistic_value in download_statistics.items():
+            summary[statistic_name] += statistic_value
+        for source, outcome in outcome_list:
+            if outcome is True:
+                summary['images_cached'] += 1
+                summary['images_cached_by_source'][source] = summary['images_cached_by_source'].get(source, 0) + 1
+            elif outcome == IMAGE_ALREADY_CACHED:
+                summary['images_already_cached'] += 1
+            elif outcome is False:
+                summary['images_failed'] += 1
+                summary['failures_by_source'][source] = summary['failures_by_source'].get(source, 0) + 1
+                if entity_id not in failed_entity_id_list:
+                    failed_entity_id_list.append(entity_id)
+            else:
+                # No account or no image url for this source
+                summary['images_skipped'] += 1
+    summary['failed_entity_id_list'] += failed_entity_id_list
+    return failed_entity_id_list
+
+
+def cache_images_in_worker_pool(job_name, worker_count=IMAGE_CACHING_WORKER_COUNT, restart=False, limit=0):
+    """
+    Work through every entity for job_name, IMAGE_CACHING_CHUNK_SIZE at a time, with worker_count threads.
+    The entities that failed in the last run are tried once more first.
+    :param job_name: one of IMAGE_CACHING_JOBS
+    :param worker_count:
+    :param restart: ignore the saved cursor and retry list, and start from the first entity
+    :param limit: stop after this many entities (0 means no limit), not counting the retries. The cursor is saved, so
+     the next run continues.
+    :return: throughput summary
+    """
+    entity_queryset_function, cache_function = IMAGE_CACHING_JOBS[job_name]
+    cursor_setting_name = IMAGE_CACHING_CURSOR_SETTING_PREFIX + job_name
+    retry_setting_name = IMAGE_CACHING_RETRY_SETTING_PREFIX + job_name
+    we_vote_settings_manager = WeVoteSettingsManager()
+    if restart:
+        last_entity_id = 0
+        retry_entity_id_list = []
+    else:
+        last_entity_id = convert_to_int(we_vote_settings_manager.fetch_setting(cursor_setting_name) or 0)
+        retry_entity_id_list = fetch_image_caching_retry_list(we_vote_settings_manager, retry_setting_name)
+
+    entity_id_list = list(entity_queryset_function().filter(id__gt=last_entity_id).order_by('id')
+                          .values_list('id', flat=True))
+    if positive_value_exists(limit):
+        entity_id_list = entity_id_list[:limit]
+
+    summary = {
+        'job_name':                 job_name,
+        'worker_count':             worker_count,
+        'resumed_after_id':         last_entity_id,
+        'last_entity_id':           last_entity_id,
+        'entities_retried':         len(retry_entity_id_list),
+        'entities_processed':       0,
+        'images_cached':            0,
+        'images_already_cached':    0,
+        'images_skipped':           0,
+        'images_failed':            0,
+        'images_cached_by_source':  {},
+        'failures_by_source':       {},
+        'bytes_downloaded':         0,
+        'requests_made':            0,
+        'requests_retried':         0,
+        'failed_entity_id_list':    [],
+        'finished':                 False,
+    }
+    time_started = time.time()
+    with ThreadPoolExecutor(max_workers=worker_count) as executor:
+        # Each failed entity gets one more try. If it fails again, it waits for the next full pass.
+        for chunk_start in range(0, len(retry_entity_id_list), IMAGE_CACHING_CHUNK_SIZE):
+            cache_images_for_chunk(executor, cache_function,
+                                   retry_entity_id_list[chunk_start:chunk_start + IMAGE_CACHING_CHUNK_SIZE], summary)
+        if retry_entity_id_list or restart:
+            save_image_caching_retry_list(we_vote_settings_manager, retry_setting_name, [])
+
+        new_failed_entity_id_list = []
+        for chunk_start in range(0, len(entity_id_list), IMAGE_CACHING_CHUNK_SIZE):
+            chunk = entity_id_list[chunk_start:chunk_start + IMAGE_CACHING_CHUNK_SIZE]
+            chunk_failed_entity_id_list = cache_images_for_chunk(executor, cache_function, chunk, summary)
+            # An interrupted run can safely start after every entity we are done with
+            if chunk_failed_entity_id_list:
+                new_failed_entity_id_list += chunk_failed_entity_id_list
+                save_image_caching_retry_list(we_vote_settings_manager, retry_setting_name,
+                                              new_failed_entity_id_list)
+            summary['last_entity_id'] = chunk[-1]
+            we_vote_settings_manager.save_setting(cursor_setting_name, chunk[-1])
+            logger.info("cache_images_in_worker_pool {job_name}: {summary}".format(
+                job_name=job_name, summary=summarize_image_caching_run(summary, time_started)))
+
+    if not positive_value_exists(limit) or len(entity_id_list) < limit:
+        # We reached the end, so the next run is a full refresh again, which tries every failed entity anyway
+        we_vote_settings_manager.save_setting(cursor_setting_name, 0)
+        if new_failed_entity_id_list:
+            save_image_caching_retry_list(we_vote_settings_manager, retry_setting_name, [])
+        summary['finished'] = True
+
+    summary = summarize_image_caching_run(summary, time_started)
+    logger.info("cache_images_in_worker_pool {job_name} done: {summary}".format(job_name=job_name, summary=summary))
+    return summary
@@ -2,10 +2,11 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
-from .functions import analyze_remote_url, analyze_image_file
+from .functions import analyze_remote_url, analyze_image_file, image_host_request_slot, \
+    IMAGE_REQUEST_TIMEOUT_SECONDS
 from .models import WeVoteImageManager, WeVoteImage, FACEBOOK_PROFILE_IMAGE_NAME, FACEBOOK_BACKGROUND_IMAGE_NAME, \
     TWITTER_PROFILE_IMAGE_NAME, TWITTER_BACKGROUND_IMAGE_NAME, TWITTER_BANNER_IMAGE_NAME, MAPLIGHT_IMAGE_NAME, \
-    VOTE_SMART_IMAGE_NAME, MASTER_IMAGE, ISSUE_IMAGE_NAME
+    VOTE_SMART_IMAGE_NAME, MASTER_IMAGE, ISSUE_IMAGE_NAME, fetch_we_vote_image_url
 from ballot.controllers import choose_election_from_existing_data
 from candidate.models import CandidateCampaignManager
 from config.base import get_environment_variable
@@ -27,6 +28,7 @@ import wevote_functions.admin
 logger = wevote_functions.admin.get_logger(__name__)
 HTTP_OK = 200
 TWITTER = "twitter"
+TWITTER_API_HOST = "api.twitter.com"
 FACEBOOK = "facebook"
 MAPLIGHT = "maplight"
 VOTE_SMART = "vote_smart"
@@ -53,7 +55,6 @@ ISSUES_IMAGE_MEDIUM_WIDTH = convert_to_int(get_environment_variable("ISSUES_IMAG
 ISSUES_IMAGE_MEDIUM_HEIGHT = convert_to_int(get_environment_variable("ISSUES_IMAGE_MEDIUM_HEIGHT"))
 ISSUES_IMAGE_TINY_WIDTH = convert_to_int(get_environment_variable("ISSUES_IMAGE_TINY_WIDTH"))
 ISSUES_IMAGE_TINY_HEIGHT = convert_to_int(get_environment_variable("ISSUES_IMAGE_TINY_HEIGHT"))
-AWS_STORAGE_BUCKET_NAME = get_environment_variable("AWS_STORAGE_BUCKET_NAME")
 
 try:
     SOCIAL_BACKGROUND_IMAGE_WIDTH = convert_to_int(get_environment_variable("SOCIAL_BACKGROUND_IMAGE_WIDTH"))
@@ -647,8 +648,9 @@ def cache_image_locally(google_civic_election_id, image_url_https, voter_we_vote
         else:
             we_vote_image_file_location = we_vote_image_file_name
 
-        image_stored_locally = we_vote_image_manager.store_image_locally(
-            analyze_source_images_results['image_url_https'], we_vote_image_file_name)
+        # analyze_remote_url already downloaded the image, so we upload those bytes rather than fetching it again
+        image_content = analyze_source_images_results['analyze_image_url_results']['image_content']
+        image_stored_locally = image_content is not None
 
         if not image_stored_locally:
             error_results = {
@@ -664,8 +666,8 @@ def cache_image_locally(google_civic_election_id, image_url_https, voter_we_vote
             return error_results
 
         status += " IMAGE_STORED_LOCALLY"
-        image_stored_to_aws = we_vote_image_manager.store_image_to_aws(
-            we_vote_image_file_name, we_vote_image_file_location,
+        image_stored_to_aws = we_vote_image_manager.store_image_content_to_aws(
+            image_content, we_vote_image_file_location,
             analyze_source_images_results['analyze_image_url_results']['image_format'])
         if not image_stored_to_aws:
             error_results = {
@@ -679,9 +681,7 @@ def cache_image_locally(google_civic_election_id, image_url_https, voter_we_vote
             }
             delete_we_vote_image_results = we_vote_image_manager.delete_we_vote_image(we_vote_image)
             return error_results
-        we_vote_image_url = "https://{bucket_name}.s3.amazonaws.com/{we_vote_image_file_location}" \
-                            "".format(bucket_name=AWS_STORAGE_BUCKET_NAME,
-                                      we_vote_image_file_location=we_vote_image_file_location)
+        we_vote_image_url = fetch_we_vote_image_url(we_vote_image_file_location)
         save_aws_info = we_vote_image_manager.save_we_vote_image_aws_info(we_vote_image, we_vote_image_url,
                                                                           we_vote_image_file_location,
                                                                           we_vote_parent_image_id, is_active_version)
@@ -739,7 +739,8 @@ def retrieve_facebook_image_url(facebook_user_id):
 
     get_url = "https://graph.facebook.com/v2.7/{facebook_user_id}/picture?width=200&height=200"\
         .format(facebook_user_id=facebook_user_id)
-    response = requests.get(get_url)
+    with image_host_request_slot(get_url):
+        response = requests.get(get_url, timeout=IMAGE_REQUEST_TIMEOUT_SECONDS)
     if response.status_code == HTTP_OK:
         # new facebook profile image url found
         results['facebook_profile_image_url'] = response.url
@@ -787,7 +788,8 @@ def retrieve_image_urls_from_twitter(twitter_id):
     latest_twitter_background_image_url = None
     latest_twitter_banner_image_url = None
 
-    twitter_user_info_results = retrieve_twitter_user_info(twitter_id, twitter_handle='')
+    with image_host_request_slot(TWITTER_API_HOST):
+        twitter_user_info_results = retrieve_twitter_user_info(twitter_id, twitter_handle='')
     if 'profile_image_url_https' in twitter_user_info_results['twitter_json'] \
             and twitter_user_info_results['twitter_json']['profile_image_url_https']:
         # new twitter image url found
@@ -1397,6 +1399,20 @@ def create_resized_image_if_not_created(we_vote_image):
         kind_of_image_maplight=kind_of_image_maplight,
         kind_of_image_vote_smart=kind_of_image_vote_smart
     )
+    medium_and_tiny_images_wanted = we_vote_image.kind_of_image_twitter_profile or \
+        we_vote_image.kind_of_image_facebook_profile or we_vote_image.kind_of_image_maplight or \
+        we_vote_image.kind_of_image_vote_smart
+    resized_image_needed = not resized_version_exists_results['large_image_version_exists'] or \
+        (medium_and_tiny_images_wanted and (not resized_version_exists_results['medium_image_version_exists'] or
+                                            not resized_version_exists_results['tiny_image_version_exists']))
+    source_image = None
+    if resized_image_needed:
+        # Download and decode the source once, and make every missing size from that one image
+        we_vote_image_manager = WeVoteImageManager()
+        source_image = we_vote_image_manager.retrieve_image_into_memory(image_url_https)
+        if source_image is None:
+            return create_resized_image_results
+
     if not resized_version_exists_results['large_image_version_exists']:
         # Large version does not exist so create resize image and cache it
         cache_resized_image_locally_results = cache_resized_image_locally(
@@ -1410,14 +1426,14 @@ def create_resized_image_if_not_created(we_vote_image):
             kind_of_image_facebook_profile=kind_of_image_facebook_profile,
             kind_of_image_facebook_background=kind_of_image_facebook_background,
             kind_of_image_maplight=kind_of_image_maplight, kind_of_image_vote_smart=kind_of_image_vote_smart,
-            kind_of_image_large=True, image_offset_x=image_offset_x, image_offset_y=image_offset_y)
+            kind_of_image_large=True, image_offset_x=image_offset_x, image_offset_y=image_offset_y,
+            source_image=source_image)
         create_resized_image_results['cached_large_image'] = \
             cache_resized_image_locally_results['success']
     else:
         create_resized_image_results['cached_large_image'] = IMAGE_ALREADY_CACHED
 
-    if we_vote_image.kind_of_image_twitter_profile or we_vote_image.kind_of_image_facebook_profile or \
-            we_vote_image.kind_of_image_maplight or we_vote_image.kind_of_image_vote_smart:
+    if medium_and_tiny_images_wanted:
         if not resized_version_exists_results['medium_image_version_exists']:
             # Medium version does not exist so create resize image and cache it
             cache_resized_image_locally_results = cache_resized_image_locally(
@@ -1431,7 +1447,8 @@ def create_resized_image_if_not_created(we_vote_image):
                 kind_of_image_facebook_profile=kind_of_image_facebook_profile,
                 kind_of_image_facebook_background=kind_of_image_facebook_background,
                 kind_of_image_maplight=kind_of_image_maplight, kind_of_image_vote_smart=kind_of_image_vote_smart,
-                kind_of_image_medium=True, image_offset_x=image_offset_x, image_offset_y=image_offset_y)
+                kind_of_image_medium=True, image_offset_x=image_offset_x, image_offset_y=image_offset_y,
+                source_image=source_image)
             create_resized_image_results['cached_medium_image'] = \
                 cache_resized_image_locally_results['success']
         else:
@@ -1450,7 +1467,8 @@ def create_resized_image_if_not_created(we_vote_image):
                 kind_of_image_facebook_profile=kind_of_image_facebook_profile,
                 kind_of_image_facebook_background=kind_of_image_facebook_background,
                 kind_of_image_maplight=kind_of_image_maplight, kind_of_image_vote_smart=kind_of_image_vote_smart,
-                kind_of_image_tiny=True, image_offset_x=image_offset_x, image_offset_y=image_offset_y)
+                kind_of_image_tiny=True, image_offset_x=image_offset_x, image_offset_y=image_offset_y,
+                source_image=source_image)
             create_resized_image_results['cached_tiny_image'] = \
                 cache_resized_image_locally_results['success']
         else:
@@ -1543,9 +1561,11 @@ def cache_resized_image_locally(google_civic_election_id, image_url_https, we_vo
                                 kind_of_image_maplight=False, kind_of_image_vote_smart=False,
                                 kind_of_image_issue=False,
                                 kind_of_image_original=False, kind_of_image_large=False, kind_of_image_medium=False,
-                                kind_of_image_tiny=False, image_offset_x=0, image_offset_y=0):
+                                kind_of_image_tiny=False, image_offset_x=0, image_offset_y=0, source_image=None):
     """
-    Resize the image as per image version and cache the same
+    Resize the image as per image version and cache the same. The image is downloaded, resized and uploaded in
+    memory. Pass in source_image when making more than one size from the same image, so it is only downloaded and
+    decoded once.
     :param google_civic_election_id:
     :param image_url_https:
     :param we_vote_parent_image_id:
@@ -1575,6 +1595,7 @@ def cache_resized_image_locally(google_civic_election_id, image_url_https, we_vo
     :param kind_of_image_tiny:
     :param image_offset_x:                      # For Facebook background
     :param image_offset_y:                      # For Facebook background
+    :param source_image:                        # PIL Image already retrieved from image_url_https
     :return:
     """
 
@@ -1734,12 +1755,12 @@ def cache_resized_image_locally(google_civic_election_id, image_url_https, we_vo
         elif issue_we_vote_id:
             we_vote_image_file_location = issue_we_vote_id + "/" + we_vote_image_file_name
 
-        image_stored_locally = we_vote_image_manager.store_image_locally(
-                image_url_https, we_vote_image_file_name)
-        if not image_stored_locally:
+        if source_image is None:
+            source_image = we_vote_image_manager.retrieve_image_into_memory(image_url_https)
+        if source_image is None:
             error_results = {
                 'success':                      success,
-                'status':                       status + " IMAGE_NOT_STORED_LOCALLY",
+                'status':                       status + " IMAGE_NOT_RETRIEVED_FROM_SOURCE",
                 'we_vote_image_created':        we_vote_image_created,
                 'image_stored_from_source':     image_stored_from_source,
                 'image_stored_locally':         False,
@@ -1749,13 +1770,15 @@ def cache_resized_image_locally(google_civic_election_id, image_url_https, we_vo
             delete_we_vote_image_results = we_vote_image_manager.delete_we_vote_image(we_vote_image)
             return error_results
 
-        status += " IMAGE_STORED_LOCALLY"
-        resized_image_created = we_vote_image_manager.resize_we_vote_master_image(
-            we_vote_image_file_name, image_width, image_height, image_type, image_offset_x, image_offset_y)
-        if not resized_image_created:
+        # The image is only held in memory now, but we keep the image_stored_locally key for existing callers
+        image_stored_locally = True
+        status += " IMAGE_RETRIEVED_FROM_SOURCE"
+        resized_image = we_vote_image_manager.resize_we_vote_image_in_memory(
+            source_image, image_width, image_height, image_type, image_offset_x, image_offset_y)
+        if resized_image is None:
             error_results = {
                 'success':                      success,
-                'status':                       status + " IMAGE_NOT_STORED_LOCALLY",
+                'status':                       status + " RESIZED_IMAGE_NOT_CREATED",
                 'we_vote_image_created':        we_vote_image_created,
                 'image_stored_from_source':     image_stored_from_source,
                 'image_stored_locally':         image_stored_locally,
@@ -1765,9 +1788,10 @@ def cache_resized_image_locally(google_civic_election_id, image_url_https, we_vo
             delete_we_vote_image_results = we_vote_image_manager.delete_we_vote_image(we_vote_image)
             return error_results
 
+        resized_image_created = True
         status += " RESIZED_IMAGE_CREATED"
-        image_stored_to_aws = we_vote_image_manager.store_image_to_aws(we_vote_image_file_name,
-                                                                       we_vote_image_file_location, image_format)
+        image_stored_to_aws = we_vote_image_manager.store_image_in_memory_to_aws(
+            resized_image, we_vote_image_file_location, image_format)
         if not image_stored_to_aws:
             error_results = {
                 'success':                      success,
@@ -1781,9 +1805,7 @@ def cache_resized_image_locally(google_civic_election_id, image_url_https, we_vo
             delete_we_vote_image_results = we_vote_image_manager.delete_we_vote_image(we_vote_image)
             return error_results
 
-        we_vote_image_url = "https://{bucket_name}.s3.amazonaws.com/{we_vote_image_file_location}" \
-                            "".format(bucket_name=AWS_STORAGE_BUCKET_NAME,
-                                      we_vote_image_file_location=we_vote_image_file_location)
+        we_vote_image_url = fetch_we_vote_image_url(we_vote_image_file_location)
         # if we_vote_image_url is not empty then save we_vote_image_wes_info else delete we_vote_image entry
         if we_vote_image_url is not None and we_vote_image_url != "":
             save_aws_info = we_vote_image_manager.save_we_vote_image_aws_info(we_vote_image, we_vote_image_url,
@@ -2382,9 +2404,7 @@ def cache_issue_image_master(google_civic_election_id, issue_image_file, issue_w
         delete_we_vote_image_results = we_vote_image_manager.delete_we_vote_image(we_vote_image)
         return error_results
 
-    we_vote_image_url = "https://{bucket_name}.s3.amazonaws.com/{we_vote_image_file_location}" \
-                        "".format(bucket_name=AWS_STORAGE_BUCKET_NAME,
-                                  we_vote_image_file_location=we_vote_image_file_location)
+    we_vote_image_url = fetch_we_vote_image_url(we_vote_image_file_location)
     save_aws_info = we_vote_image_manager.save_we_vote_image_aws_info(we_vote_image, we_vote_image_url,
                                                                       we_vote_image_file_location,
                                                                       we_vote_parent_image_id, is_active_version)
@@ -2,19 +2,119 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+from contextlib import contextmanager
 from exception.models import handle_exception
 from io import BytesIO
 from PIL import Image
-from urllib.request import Request, urlopen
+from urllib.parse import urlparse
 import requests
+import threading
+import time
 import wevote_functions.admin
 
 logger = wevote_functions.admin.get_logger(__name__)
 
+# No matter how many threads are caching images, we only have this many requests open to any one host
+IMAGE_REQUESTS_PER_HOST = 4
+IMAGE_REQUEST_TIMEOUT_SECONDS = 30
+IMAGE_REQUEST_RETRY_COUNT = 3
+# Wait this long before the first retry, and twice as long before each retry after that
+IMAGE_REQUEST_RETRY_BACKOFF_SECONDS = 1.0
+# Status codes that mean "try again later" rather than "this image is gone"
+IMAGE_REQUEST_RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+_image_host_semaphores = {}
+_image_host_semaphores_lock = threading.Lock()
+# Counters for the image downloads made by this thread, so a bulk caching run can report what each worker did
+_image_download_statistics = threading.local()
+
+
+def fetch_image_host_semaphore(host):
+    with _image_host_semaphores_lock:
+        host_semaphore = _image_host_semaphores.get(host)
+        if host_semaphore is None:
+            host_semaphore = threading.BoundedSemaphore(IMAGE_REQUESTS_PER_HOST)
+            _image_host_semaphores[host] = host_semaphore
+    return host_semaphore
+
+
+@contextmanager
+def image_host_request_slot(url):
+    """
+    Wait for one of the IMAGE_REQUESTS_PER_HOST request slots for the host of url
+    :param url: a full url, or just a host name like "api.twitter.com"
+    """
+    host = urlparse(url).netloc or url
+    host_semaphore = fetch_image_host_semaphore(host.lower())
+    with host_semaphore:
+        yield
+
+
+def start_image_download_statistics():
+    _image_download_statistics.bytes_downloaded = 0
+    _image_download_statistics.requests_made = 0
+    _image_download_statistics.requests_retried = 0
+
+
+def fetch_image_download_statistics():
+    return {
+        'bytes_downloaded':     getattr(_image_download_statistics, 'bytes_downloaded', 0),
+        'requests_made':        getattr(_image_download_statistics, 'requests_made', 0),
+        'requests_retried':     getattr(_image_download_statistics, 'requests_retried', 0),
+    }
+
+
+def record_image_download(bytes_downloaded=0, retried=False):
+    _image_download_statistics.bytes_downloaded = \
+        getattr(_image_download_statistics, 'bytes_downloaded', 0) + bytes_downloaded
+    _image_download_statistics.requests_made = getattr(_image_download_statistics, 'requests_made', 0) + 1
+    if retried:
+        _image_download_statistics.requests_retried = getattr(_image_download_statistics, 'requests_retried', 0) + 1
+
+
+def retrieve_image_content_from_url(image_url_https):
+    """
+    Download an image, waiting for a free request slot on its host. Connection errors, timeouts and "try again
+    later" responses are retried with exponential backoff.
+    :param image_url_https:
+    :return: the image bytes, or None if we could not download it
+    """
+    if not image_url_https:
+        return None
+
+    for attempt in range(IMAGE_REQUEST_RETRY_COUNT + 1):
+        if attempt:
+            # Sleep outside of the host slot, so other threads can use it while we wait
+            time.sleep(IMAGE_REQUEST_RETRY_BACKOFF_SECONDS * (2 ** (attempt - 1)))
+        try:
+            with image_host_request_slot(image_url_https):
+                response = requests.get(image_url_https, timeout=IMAGE_REQUEST_TIMEOUT_SECONDS)
+                content = response.content
+        except requests.RequestException as e:
+            record_image_download(retried=attempt > 0)
+            if attempt == IMAGE_REQUEST_RETRY_COUNT:
+                exception_message = "retrieve_image_content_from_url: could not download {image_url_https}"\
+                    .format(image_url_https=image_url_https)
+                handle_exception(e, logger=logger, exception_message=exception_message)
+            continue
+
+        record_image_download(bytes_downloaded=len(content), retried=attempt > 0)
+        if response.status_code == 200:
+            return content
+        if response.status_code not in IMAGE_REQUEST_RETRY_STATUS_CODES:
+            logger.info("retrieve_image_content_from_url: {image_url_https} returned {status_code}".format(
+                image_url_https=image_url_https, status_code=response.status_code))
+            return None
+
+    logger.error("retrieve_image_content_from_url: gave up on {image_url_https} after {retry_count} retries".format(
+        image_url_https=image_url_https, retry_count=IMAGE_REQUEST_RETRY_COUNT))
+    return None
+
 
 def analyze_remote_url(image_url_https):
     """
-    Validate url and get image properties
+    Validate url and get image properties. The image is downloaded once, and returned as image_content so the
+    caller can store it without downloading it again.
     :param image_url_https:
     :return:
     """
@@ -22,27 +122,25 @@ def analyze_remote_url(image_url_https):
     image_height = None
     image_width = None
     image_url_valid = False
-    try:
-        if image_url_https is not None:
-            urlopen(Request(image_url_https))
+    image_content = retrieve_image_content_from_url(image_url_https)
+    if image_content is not None:
+        try:
+            image = Image.open(BytesIO(image_content))
+            image_width, image_height = image.size
+            image_format = image.format
             image_url_valid = True
-    except Exception as e:
-        image_url_valid = False
-        exception_message = "analyze_remote_url: image url {image_url_https} is not valid."\
-            .format(image_url_https=image_url_https)
-        handle_exception(e, logger=logger, exception_message=exception_message)
-
-    if image_url_valid:
-        response = requests.get(image_url_https)
-        image = Image.open(BytesIO(response.content))
-        image_width, image_height = image.size
-        image_format = image.format
+        except Exception as e:
+            image_content = None
+            exception_message = "analyze_remote_url: image url {image_url_https} is not valid."\
+                .format(image_url_https=image_url_https)
+            handle_exception(e, logger=logger, exception_message=exception_message)
 
     results = {
         'image_url_valid':              image_url_valid,
         'image_width':                  image_width,
         'image_height':                 image_height,
-        'image_format':                 image_format.lower() if image_format is not None else image_format
+        'image_format':                 image_format.lower() if image_format is not None else image_format,
+        'image_content':                image_content,
     }
     return results
 
@@ -0,0 +1,25 @@
+# image/management/commands/cache_images.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.core.management.base import BaseCommand
+from image.bulk_cache import cache_images_in_worker_pool, IMAGE_CACHING_JOBS, IMAGE_CACHING_WORKER_COUNT
+import json
+
+
+class Command(BaseCommand):
+    help = 'Caches the master or resized images for all organizations or voters with a pool of worker threads. ' \
+           'An interrupted run continues from where it stopped unless --restart is given. Entities with a failed ' \
+           'image are tried once more at the start of the next run.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('job_name', choices=sorted(IMAGE_CACHING_JOBS.keys()))
+        parser.add_argument('--workers', type=int, default=IMAGE_CACHING_WORKER_COUNT)
+        parser.add_argument('--restart', action='store_true', default=False,
+                            help='Start from the first entity instead of where the last run stopped')
+        parser.add_argument('--limit', type=int, default=0, help='Stop after this many entities')
+
+    def handle(self, *args, **options):
+        summary = cache_images_in_worker_pool(options['job_name'], worker_count=options['workers'],
+                                              restart=options['restart'], limit=options['limit'])
+        self.stdout.write(json.dumps(summary, indent=2, sort_keys=True))
@@ -2,16 +2,20 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+from .functions import retrieve_image_content_from_url
 from config.base import get_environment_variable
 from datetime import date
+from django.core.exceptions import ImproperlyConfigured
 from django.db import models
 from exception.models import handle_record_found_more_than_one_exception, handle_exception, \
     handle_record_not_saved_exception, handle_record_not_deleted_exception
+from io import BytesIO
 from PIL import Image, ImageOps
 from urllib.request import urlretrieve
 from urllib.error import HTTPError
 from wevote_functions.functions import convert_to_int, positive_value_exists
 import boto3
+import threading
 import wevote_functions.admin
 
 # naming convention stored at aws
@@ -30,10 +34,57 @@ AWS_SECRET_ACCESS_KEY = get_environment_variable("AWS_SECRET_ACCESS_KEY")
 AWS_REGION_NAME = get_environment_variable("AWS_REGION_NAME")
 AWS_STORAGE_BUCKET_NAME = get_environment_variable("AWS_STORAGE_BUCKET_NAME")
 AWS_STORAGE_SERVICE = "s3"
+try:
+    # Point this at an S3-compatible server (ex/ a local minio) to cache images somewhere other than Amazon
+    AWS_S3_ENDPOINT_URL = get_environment_variable("AWS_S3_ENDPOINT_URL")
+except ImproperlyConfigured:
+    AWS_S3_ENDPOINT_URL = ""
+
+# One S3 client per process. boto3 clients are thread safe, and reusing one keeps its pool of open connections.
+_aws_s3_client = None
+_aws_s3_client_lock = threading.Lock()
 
 logger = wevote_functions.admin.get_logger(__name__)
 
 
+def fetch_aws_s3_client():
+    global _aws_s3_client
+    if _aws_s3_client is None:
+        with _aws_s3_client_lock:
+            if _aws_s3_client is None:
+                _aws_s3_client = boto3.client(AWS_STORAGE_SERVICE, region_name=AWS_REGION_NAME,
+                                              aws_access_key_id=AWS_ACCESS_KEY_ID,
+                                              aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                                              endpoint_url=AWS_S3_ENDPOINT_URL if AWS_S3_ENDPOINT_URL else None)
+    return _aws_s3_client
+
+
+def fetch_we_vote_image_url(we_vote_image_file_location):
+    """
+    The public url of an image we have stored at we_vote_image_file_location in our bucket
+    :param we_vote_image_file_location:
+    :return:
+    """
+    if AWS_S3_ENDPOINT_URL:
+        return "{endpoint_url}/{bucket_name}/{we_vote_image_file_location}".format(
+            endpoint_url=AWS_S3_ENDPOINT_URL.rstrip("/"), bucket_name=AWS_STORAGE_BUCKET_NAME,
+            we_vote_image_file_location=we_vote_image_file_location)
+    return "https://{bucket_name}.s3.amazonaws.com/{we_vote_image_file_location}" \
+           "".format(bucket_name=AWS_STORAGE_BUCKET_NAME, we_vote_image_file_location=we_vote_image_file_location)
+
+
+def fetch_pil_image_format(image_format, default_image_format=None):
+    """
+    "jpg" -> "JPEG", the name PIL needs when saving to a buffer instead of a file with an extension
+    :param image_format: file extension
+    :param default_image_format: used when PIL doesn't know the extension, normally the format of the source image
+    :return:
+    """
+    Image.init()
+    pil_image_format = Image.EXTENSION.get("." + str(image_format).lower()) if image_format else None
+    return pil_image_format if pil_image_format else default_image_format
+
+
 class WeVoteImage(models.Model):
     """
     We cache we vote images info for one handle here.
@@ -228,9 +279,7 @@ class WeVoteImageManager(models.Model):
         """
         try:
 
-            client = boto3.client(AWS_STORAGE_SERVICE, region_name=AWS_REGION_NAME,
-                                  aws_access_key_id=AWS_ACCESS_KEY_ID,
-                                  aws_secret_access_key=AWS_SECRET_ACCESS_KEY)
+            client = fetch_aws_s3_client()
             client.delete_object(Bucket=AWS_STORAGE_BUCKET_NAME, Key=we_vote_image_file_location)
             image_deleted_from_aws = True
         except Exception as e:
@@ -1049,8 +1098,6 @@ class WeVoteImageManager(models.Model):
                                     image_offset_x, image_offset_y):
         """
         Resize image and save it to the same location
-        Note re the facebook background:  We are scaling and sizing here to match the size of the html pane on the
-        client, which is driven by the aspect ratio of the twitter banner.
         :param image_local_path:
         :param image_width:
         :param image_height:
@@ -1062,15 +1109,10 @@ class WeVoteImageManager(models.Model):
         try:
             image_local_path = "/tmp/" + image_local_path
             image = Image.open(image_local_path)
-            if image_type == TWITTER_BACKGROUND_IMAGE_NAME or image_type == TWITTER_BANNER_IMAGE_NAME:
-                image = image.resize((image_width, image_height), Image.ANTIALIAS)
-            elif image_type == FACEBOOK_BACKGROUND_IMAGE_NAME:
-                centering_x = 0.5
-                centering_y = ((image.height - image_offset_y) * 0.5) / image.height
-                image = ImageOps.fit(image, (image_width, image_height), Image.ANTIALIAS,
-                                     centering=(centering_x, centering_y))
-            else:
-                image = ImageOps.fit(image, (image_width, image_height), Image.ANTIALIAS, centering=(0.5, 0.5))
+            image = self.resize_we_vote_image_in_memory(image, image_width, image_height, image_type,
+                                                        image_offset_x, image_offset_y)
+            if image is None:
+                return False
             image.save(image_local_path)
             resized_image_created = True
         except Exception as e:
@@ -1080,6 +1122,41 @@ class WeVoteImageManager(models.Model):
 
         return resized_image_created
 
+    def resize_we_vote_image_in_memory(self, source_image, image_width, image_height, image_type,
+                                       image_offset_x, image_offset_y):
+        """
+        Return a resized copy of source_image. source_image itself is not changed, so one decoded image can be used
+        for every size we need.
+        Note re the facebook background:  We are scaling and sizing here to match the size of the html pane on the
+        client, which is driven by the aspect ratio of the twitter banner.
+        :param source_image: PIL Image
+        :param image_width:
+        :param image_height:
+        :param image_type:
+        :param image_offset_x:
+        :param image_offset_y:
+        :return: PIL Image, or None if the image could not be resized
+        """
+        try:
+            if image_type == TWITTER_BACKGROUND_IMAGE_NAME or image_type == TWITTER_BANNER_IMAGE_NAME:
+                image = source_image.resize((image_width, image_height), Image.ANTIALIAS)
+            elif image_type == FACEBOOK_BACKGROUND_IMAGE_NAME:
+                centering_x = 0.5
+                centering_y = ((source_image.height - image_offset_y) * 0.5) / source_image.height
+                image = ImageOps.fit(source_image, (image_width, image_height), Image.ANTIALIAS,
+                                     centering=(centering_x, centering_y))
+            else:
+                image = ImageOps.fit(source_image, (image_width, image_height), Image.ANTIALIAS,
+                                     centering=(0.5, 0.5))
+            # ImageOps.fit and resize don't carry the format over, and we need it when saving to a buffer
+            image.format = source_image.format
+        except Exception as e:
+            image = None
+            exception_message = "resize_we_vote_image_in_memory failed"
+            handle_exception(e, logger=logger, exception_message=exception_message)
+
+        return image
+
     def store_image_locally(self, image_url_https, image_local_path):
         """
         Save image locally at /tmp/ folder
@@ -1102,6 +1179,72 @@ class WeVoteImageManager(models.Model):
 
         return image_stored
 
+    def retrieve_image_into_memory(self, image_url_https):
+        """
+        Download an image and decode it, without writing it to disk
+        :param image_url_https:
+        :return: PIL Image, or None if the image could not be downloaded or decoded
+        """
+        image_content = retrieve_image_content_from_url(image_url_https)
+        if image_content is None:
+            return None
+        try:
+            image = Image.open(BytesIO(image_content))
+            # Decode now, so a broken image fails here and not once for each size we make from it
+            image.load()
+        except Exception as e:
+            image = None
+            exception_message = "retrieve_image_into_memory failed"
+            handle_exception(e, logger=logger, exception_message=exception_message)
+
+        return image
+
+    def store_image_content_to_aws(self, image_content, we_vote_image_file_location, image_format):
+        """
+        Upload image bytes we already have in memory to aws, exactly as we downloaded them
+        :param image_content:
+        :param we_vote_image_file_location:
+        :param image_format:
+        :return:
+        """
+        try:
+            content_type = "image/{image_format}".format(image_format=image_format)
+            fetch_aws_s3_client().upload_fileobj(BytesIO(image_content), AWS_STORAGE_BUCKET_NAME,
+                                                 we_vote_image_file_location, ExtraArgs={'ContentType': content_type})
+            image_stored_to_aws = True
+        except Exception as e:
+            image_stored_to_aws = False
+            exception_message = "store_image_content_to_aws failed"
+            handle_exception(e, logger=logger, exception_message=exception_message)
+
+        return image_stored_to_aws
+
+    def store_image_in_memory_to_aws(self, image, we_vote_image_file_location, image_format):
+        """
+        Encode a PIL Image into a memory buffer and upload that buffer to aws
+        :param image:
+        :param we_vote_image_file_location:
+        :param image_format: file extension, ex/ "png"
+        :return:
+        """
+        try:
+            pil_image_format = fetch_pil_image_format(image_format, image.format)
+            if pil_image_format == "JPEG" and image.mode not in ("RGB", "L", "CMYK"):
+                image = image.convert("RGB")
+            image_buffer = BytesIO()
+            image.save(image_buffer, format=pil_image_format)
+            image_buffer.seek(0)
+            content_type = "image/{image_format}".format(image_format=image_format)
+            fetch_aws_s3_client().upload_fileobj(image_buffer, AWS_STORAGE_BUCKET_NAME, we_vote_image_file_location,
+                                                 ExtraArgs={'ContentType': content_type})
+            image_stored_to_aws = True
+        except Exception as e:
+            image_stored_to_aws = False
+            exception_message = "store_image_in_memory_to_aws failed"
+            handle_exception(e, logger=logger, exception_message=exception_message)
+
+        return image_stored_to_aws
+
     def store_image_to_aws(self, we_vote_image_file_name, we_vote_image_file_location, image_format):
         """
         Upload image to aws
@@ -1111,9 +1254,7 @@ class WeVoteImageManager(models.Model):
         :return:
         """
         try:
-            client = boto3.client(AWS_STORAGE_SERVICE, region_name=AWS_REGION_NAME,
-                                  aws_access_key_id=AWS_ACCESS_KEY_ID,
-                                  aws_secret_access_key=AWS_SECRET_ACCESS_KEY)
+            client = fetch_aws_s3_client()
             upload_image_from_location = "/tmp/" + we_vote_image_file_name
             content_type = "image/{image_format}".format(image_format=image_format)
             client.upload_file(upload_image_from_location, AWS_STORAGE_BUCKET_NAME, we_vote_image_file_location,
@@ -1134,12 +1275,8 @@ class WeVoteImageManager(models.Model):
         :return:
         """
         try:
-            session = boto3.session.Session(region_name=AWS_REGION_NAME,
-                                            aws_access_key_id=AWS_ACCESS_KEY_ID,
-                                            aws_secret_access_key=AWS_SECRET_ACCESS_KEY)
-            s3 = session.resource(AWS_STORAGE_SERVICE)
-            s3.Bucket(AWS_STORAGE_BUCKET_NAME).put_object(Key=we_vote_image_file_location,
-                                                          Body=image_file)
+            client = fetch_aws_s3_client()
+            client.put_object(Bucket=AWS_STORAGE_BUCKET_NAME, Key=we_vote_image_file_location, Body=image_file)
             image_stored_to_aws = True
         except Exception as e:
             image_stored_to_aws = False
@@ -1155,9 +1292,7 @@ class WeVoteImageManager(models.Model):
         :return:
         """
         try:
-            client = boto3.client(AWS_STORAGE_SERVICE, region_name=AWS_REGION_NAME,
-                                  aws_access_key_id=AWS_ACCESS_KEY_ID,
-                                  aws_secret_access_key=AWS_SECRET_ACCESS_KEY)
+            client = fetch_aws_s3_client()
             download_image_at_location = "/tmp/" + we_vote_image_file_location
             client.download_file(AWS_STORAGE_BUCKET_NAME, we_vote_image_file_location, download_image_at_location)
             image_retrieved_from_aws = True
@@ -0,0 +1,213 @@
+# image/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+from image.bulk_cache import cache_images_in_worker_pool, IMAGE_CACHING_CURSOR_SETTING_PREFIX, IMAGE_CACHING_JOBS, \
+    IMAGE_CACHING_RETRY_SETTING_PREFIX
+from image.controllers import TWITTER
+from image.functions import fetch_image_download_statistics, image_host_request_slot, \
+    IMAGE_REQUEST_RETRY_BACKOFF_SECONDS, IMAGE_REQUEST_RETRY_COUNT, retrieve_image_content_from_url, \
+    start_image_download_statistics
+from image.models import fetch_pil_image_format, TWITTER_BANNER_IMAGE_NAME, TWITTER_PROFILE_IMAGE_NAME, \
+    WeVoteImageManager
+from io import BytesIO
+from PIL import Image
+import requests
+import threading
+from voter.models import Voter, VoterManager
+from wevote_settings.models import WeVoteSettingsManager
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code, content=b''):
+        self.status_code = status_code
+        self.content = content
+
+
+class ImageHostRequestSlotTestCase(SimpleTestCase):
+
+    def test_requests_to_one_host_are_limited(self):
+        requests_open = {'now': 0, 'most': 0}
+        requests_open_lock = threading.Lock()
+        all_threads_started = threading.Barrier(6)
+
+        def make_request(url):
+            all_threads_started.wait()
+            with image_host_request_slot(url):
+                with requests_open_lock:
+                    requests_open['now'] += 1
+                    requests_open['most'] = max(requests_open['most'], requests_open['now'])
+                # Give the other threads a chance to get in
+                threading.Event().wait(0.05)
+                with requests_open_lock:
+                    requests_open['now'] -= 1
+
+        with mock.patch('image.functions.IMAGE_REQUESTS_PER_HOST', 2), \
+                mock.patch('image.functions._image_host_semaphores', {}):
+            thread_list = [threading.Thread(target=make_request, args=("https://pbs.example.com/image.jpg",))
+                           for _ in range(6)]
+            for one_thread in thread_list:
+                one_thread.start()
+            for one_thread in thread_list:
+                one_thread.join()
+        self.assertEqual(requests_open['most'], 2)
+
+    def test_hosts_have_their_own_slots(self):
+        with mock.patch('image.functions.IMAGE_REQUESTS_PER_HOST', 1), \
+                mock.patch('image.functions._image_host_semaphores', {}):
+            with image_host_request_slot("https://pbs.example.com/image.jpg"):
+                # Would block forever if both hosts shared the one slot
+                with image_host_request_slot("graph.example.com"):
+                    pass
+
+
+class RetrieveImageContentTestCase(SimpleTestCase):
+
+    def setUp(self):
+        start_image_download_statistics()
+
+    def test_try_again_later_is_retried_with_backoff(self):
+        response_list = [FakeResponse(503), FakeResponse(429), FakeResponse(200, b'image bytes')]
+        with mock.patch('image.functions.requests.get', side_effect=response_list) as mock_get, \
+                mock.patch('image.functions.time.sleep') as mock_sleep:
+            self.assertEqual(retrieve_image_content_from_url("https://pbs.example.com/image.jpg"), b'image bytes')
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertEqual([one_call[0][0] for one_call in mock_sleep.call_args_list],
+                         [IMAGE_REQUEST_RETRY_BACKOFF_SECONDS, IMAGE_REQUEST_RETRY_BACKOFF_SECONDS * 2])
+        download_statistics = fetch_image_download_statistics()
+        self.assertEqual(download_statistics['requests_made'], 3)
+        self.assertEqual(download_statistics['requests_retried'], 2)
+        self.assertEqual(download_statistics['bytes_downloaded'], len(b'image bytes'))
+
+    def test_missing_image_is_not_retried(self):
+        with mock.patch('image.functions.requests.get', return_value=FakeResponse(404)) as mock_get, \
+                mock.patch('image.functions.time.sleep') as mock_sleep:
+            self.assertIsNone(retrieve_image_content_from_url("https://pbs.example.com/image.jpg"))
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertFalse(mock_sleep.called)
+
+    def test_connection_errors_give_up_after_retry_count(self):
+        with mock.patch('image.functions.requests.get', side_effect=requests.ConnectionError) as mock_get, \
+                mock.patch('image.functions.time.sleep') as mock_sleep:
+            self.assertIsNone(retrieve_image_content_from_url("https://pbs.example.com/image.jpg"))
+        self.assertEqual(mock_get.call_count, IMAGE_REQUEST_RETRY_COUNT + 1)
+        self.assertEqual([one_call[0][0] for one_call in mock_sleep.call_args_list],
+                         [IMAGE_REQUEST_RETRY_BACKOFF_SECONDS * (2 ** retry)
+                          for retry in range(IMAGE_REQUEST_RETRY_COUNT)])
+        self.assertEqual(fetch_image_download_statistics()['requests_retried'], IMAGE_REQUEST_RETRY_COUNT)
+
+
+class ImageInMemoryTestCase(SimpleTestCase):
+
+    def setUp(self):
+        # A small png, wider than it is tall, with a transparent background
+        image_buffer = BytesIO()
+        Image.new("RGBA", (40, 20), (255, 0, 0, 0)).save(image_buffer, format="PNG")
+        self.image_content = image_buffer.getvalue()
+
+    def retrieve_image_into_memory(self):
+        with mock.patch('image.models.retrieve_image_content_from_url', return_value=self.image_content):
+            return WeVoteImageManager().retrieve_image_into_memory("https://pbs.example.com/image.png")
+
+    def test_fetch_pil_image_format(self):
+        self.assertEqual(fetch_pil_image_format("jpg"), "JPEG")
+        self.assertEqual(fetch_pil_image_format("JPEG"), "JPEG")
+        self.assertEqual(fetch_pil_image_format("png"), "PNG")
+        self.assertEqual(fetch_pil_image_format("not_an_image_extension", "GIF"), "GIF")
+        self.assertEqual(fetch_pil_image_format("", "PNG"), "PNG")
+        self.assertIsNone(fetch_pil_image_format(None))
+
+    def test_resize_leaves_source_image_as_it_was(self):
+        we_vote_image_manager = WeVoteImageManager()
+        source_image = self.retrieve_image_into_memory()
+        self.assertEqual(source_image.size, (40, 20))
+
+        profile_image = we_vote_image_manager.resize_we_vote_image_in_memory(
+            source_image, 10, 10, TWITTER_PROFILE_IMAGE_NAME, 0, 0)
+        banner_image = we_vote_image_manager.resize_we_vote_image_in_memory(
+            source_image, 30, 5, TWITTER_BANNER_IMAGE_NAME, 0, 0)
+        self.assertEqual(profile_image.size, (10, 10))
+        self.assertEqual(banner_image.size, (30, 5))
+        self.assertEqual(profile_image.format, "PNG")
+        self.assertEqual(source_image.size, (40, 20))
+
+    def test_resize_failure_returns_none(self):
+        self.assertIsNone(WeVoteImageManager().resize_we_vote_image_in_memory(
+            None, 10, 10, TWITTER_PROFILE_IMAGE_NAME, 0, 0))
+
+    def test_broken_image_is_not_decoded(self):
+        self.image_content = self.image_content[:30]
+        self.assertIsNone(self.retrieve_image_into_memory())
+
+    def test_resized_image_is_uploaded_in_requested_format(self):
+        we_vote_image_manager = WeVoteImageManager()
+        resized_image = we_vote_image_manager.resize_we_vote_image_in_memory(
+            self.retrieve_image_into_memory(), 10, 10, TWITTER_PROFILE_IMAGE_NAME, 0, 0)
+        uploaded_content_list = []
+
+        def upload_fileobj(image_buffer, bucket_name, we_vote_image_file_location, ExtraArgs):
+            uploaded_content_list.append((image_buffer.read(), ExtraArgs['ContentType']))
+
+        with mock.patch('image.models.fetch_aws_s3_client') as mock_fetch_aws_s3_client:
+            mock_fetch_aws_s3_client.return_value.upload_fileobj.side_effect = upload_fileobj
+            # jpg has no transparency, so the image is converted on the way
+            self.assertTrue(we_vote_image_manager.store_image_in_memory_to_aws(
+                resized_image, "wv01voter1/image.jpg", "jpg"))
+            self.assertTrue(we_vote_image_manager.store_image_in_memory_to_aws(
+                resized_image, "wv01voter1/image.png", "png"))
+
+        uploaded_image_list = [(Image.open(BytesIO(image_content)), content_type)
+                               for image_content, content_type in uploaded_content_list]
+        self.assertEqual([(uploaded_image.format, uploaded_image.size, content_type)
+                          for uploaded_image, content_type in uploaded_image_list],
+                         [("JPEG", (10, 10), "image/jpg"), ("PNG", (10, 10), "image/png")])
+
+
+class CacheImagesInWorkerPoolTestCase(TestCase):
+
+    def test_failed_entities_are_retried_without_holding_the_cursor_back(self):
+        voter_manager = VoterManager()
+        voter_id_list = [voter_manager.create_voter()['voter'].id for _ in range(6)]
+        # Like a dead Twitter image url, this voter fails every time
+        failing_voter_id = voter_id_list[1]
+        cached_voter_id_list = []
+
+        def cache_one_voter(voter_id):
+            cached_voter_id_list.append(voter_id)
+            return [(TWITTER, voter_id != failing_voter_id)]
+
+        def cache_images(**kwargs):
+            with mock.patch.dict(IMAGE_CACHING_JOBS,
+                                 {'test_voter_images': (lambda: Voter.objects.all(), cache_one_voter)}):
+                return cache_images_in_worker_pool('test_voter_images', worker_count=2, limit=3, **kwargs)
+
+        we_vote_settings_manager = WeVoteSettingsManager()
+        summary = cache_images(restart=True)
+        self.assertEqual(summary['images_cached'], 2)
+        self.assertEqual(summary['failed_entity_id_list'], [failing_voter_id])
+        self.assertFalse(summary['finished'])
+        # The cursor moves past the failed entity, which is saved to be tried again
+        self.assertEqual(we_vote_settings_manager.fetch_setting(
+            IMAGE_CACHING_CURSOR_SETTING_PREFIX + 'test_voter_images'), voter_id_list[2])
+        self.assertEqual(we_vote_settings_manager.fetch_setting(
+            IMAGE_CACHING_RETRY_SETTING_PREFIX + 'test_voter_images'), str(failing_voter_id))
+
+        # The next run tries the failed entity once more, then goes on with the entities it hasn't seen yet
+        del cached_voter_id_list[:]
+        summary = cache_images()
+        self.assertEqual(summary['entities_retried'], 1)
+        self.assertEqual(sorted(cached_voter_id_list), [failing_voter_id] + voter_id_list[3:])
+        self.assertEqual(summary['failed_entity_id_list'], [failing_voter_id])
+        self.assertEqual(we_vote_settings_manager.fetch_setting(
+            IMAGE_CACHING_CURSOR_SETTING_PREFIX + 'test_voter_images'), voter_id_list[5])
+        # It failed again, so it waits for the next full pass
+        self.assertEqual(we_vote_settings_manager.fetch_setting(
+            IMAGE_CACHING_RETRY_SETTING_PREFIX + 'test_voter_images'), '')
+
+        summary = cache_images()
+        self.assertEqual(summary['entities_processed'], 0)
+        self.assertTrue(summary['finished'])
@@ -4,11 +4,13 @@
 
 from ballot.models import MEASURE, CANDIDATE, POLITICIAN
 from party.controllers import retrieve_all_party_names_and_ids_api, party_import_from_xml_data
-from electoral_district.controllers import electoral_district_import_from_xml_data
-from import_export_ctcl.controllers import create_candidate_selection_rows, retrieve_candidate_from_candidate_selection
+from electoral_district.controllers import electoral_district_import_from_xml_data, \
+    ELECTORAL_DISTRICT_IMPORT_LIMIT_FOR_TESTING
+from import_export_ctcl.models import CandidateSelection
 import codecs
 import csv
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from organization.models import ORGANIZATION_TYPE_CHOICES, UNKNOWN, alphanumeric
 from position.models import POSITION, POSITION_CHOICES, NO_STANCE
 from politician.models import GENDER_CHOICES, UNKNOWN
@@ -19,7 +21,10 @@ from wevote_functions.functions import positive_value_exists, LANGUAGE_CODE_ENGL
 import urllib
 from exception.models import handle_exception
 import magic
+import tempfile
+import time
 from datetime import date
+import json
 
 import xml.etree.ElementTree as ElementTree
 
@@ -55,6 +60,97 @@ KIND_OF_ACTION_CHOICES = (
 
 BATCH_SET_SOURCE_CTCL = 'CTCL'
 
+# When importing a CSV, we save this many BatchRow entries with each bulk insert, and commit after each one
+BATCH_ROW_IMPORT_CHUNK_SIZE = 1000
+# BatchRow has columns batch_row_000 through batch_row_050
+BATCH_ROW_COLUMN_COUNT = 51
+
+# Kinds of VIP XML elements we import that aren't a kind_of_batch in KIND_OF_BATCH_CHOICES
+VIP_XML_STATE = 'STATE'
+VIP_XML_ELECTION = 'ELECTION'
+VIP_XML_SOURCE = 'SOURCE'
+VIP_XML_CANDIDATE_SELECTION = 'CANDIDATE_SELECTION'
+VIP_XML_ELECTORAL_DISTRICT = 'ELECTORAL_DISTRICT'
+VIP_XML_PARTY = 'PARTY'
+
+# While we are testing the CTCL import, we only keep the first few rows of each kind. 0 imports every row.
+VIP_XML_ROWS_PER_KIND_LIMIT = 5
+# Electoral districts, parties and candidate selections are saved this many at a time
+VIP_XML_REFERENCE_CHUNK_SIZE = 500
+
+# For each kind of batch we create from VIP XML: the tag of the VipObject child element it comes from, and the
+# batch_header_column and batch_header_map values for the BatchHeader and BatchHeaderMap
+VIP_XML_BATCH_DEFINITIONS = {
+    MEASURE: {
+        'tag':                  'BallotMeasureContest',
+        'header_column_list':   ['id', 'BallotSubTitle', 'BallotTitle', 'ElectoralDistrictId', 'other::ctcl-uuid',
+                                 'Name'],
+        'header_map_list':      ['measure_batch_id', 'measure_sub_title', 'measure_title', 'electoral_district_id',
+                                 'measure_ctcl_uuid', 'measure_name'],
+    },
+    ELECTED_OFFICE: {
+        'tag':                  'Office',
+        'header_column_list':   ['id', 'NameEnglish', 'NameSpanish', 'DescriptionEnglish', 'DescriptionSpanish',
+                                 'ElectoralDistrictId', 'IsPartisan', 'other::ctcl-uuid'],
+        'header_map_list':      ['elected_office_batch_id', 'elected_office_name', 'elected_office_name_es',
+                                 'elected_office_description', 'elected_office_description_es',
+                                 'electoral_district_id', 'elected_office_is_partisan', 'elected_office_ctcl_uuid'],
+    },
+    CONTEST_OFFICE: {
+        'tag':                  'CandidateContest',
+        'header_column_list':   ['id', 'Name', 'OfficeIds', 'ElectoralDistrictId', 'VotesAllowed', 'NumberElected',
+                                 'other::ctcl-uuid'] +
+                                ['CandidateSelectionId' + str(number) for number in range(1, 11)],
+        'header_map_list':      ['contest_office_batch_id', 'contest_office_name', 'elected_office_id',
+                                 'electoral_district_id', 'contest_office_votes_allowed',
+                                 'contest_office_number_elected', 'contest_office_ctcl_uuid'] +
+                                ['candidate_selection_id' + str(number) for number in range(1, 11)],
+    },
+    POLITICIAN: {
+        'tag':                  'Person',
+        'header_column_list':   ['id', 'FullName', 'FirstName', 'MiddleName', 'LastName', 'PartyName', 'Email',
+                                 'Phone', 'uri::website', 'uri::facebook', 'uri::twitter', 'uri::youtube',
+                                 'uri::googleplus', 'other::ctcl-uuid'],
+        'header_map_list':      ['politician_batch_id', 'politician_full_name', 'politician_first_name',
+                                 'politician_middle_name', 'politician_last_name', 'politician_party_name',
+                                 'politician_email_address', 'politician_phone_number', 'politician_website_url',
+                                 'politician_facebook_id', 'politician_twitter_url', 'politician_youtube_id',
+                                 'politician_googleplus_id', 'politician_ctcl_uuid'],
+        # The incoming PartyId is replaced with the party name once all parties have been imported
+        'party_column_index':   5,
+    },
+    CANDIDATE: {
+        'tag':                  'Candidate',
+        'header_column_list':   ['id', 'PersonId', 'Name', 'PartyName', 'IsTopTicket', 'other::ctcl-uuid',
+                                 'other::CandidateSelectionId'],
+        'header_map_list':      ['candidate_batch_id', 'candidate_person_id', 'candidate_name', 'candidate_party_name',
+                                 'candidate_is_top_ticket', 'candidate_ctcl_uuid', 'candidate_selection_id'],
+        'party_column_index':   3,
+    },
+    VIP_XML_STATE: {
+        'tag':                  'State',
+        'header_column_list':   ['id', 'Name', 'other::ocd-id'],
+        'header_map_list':      ['state_id', 'state_name', 'ocd_id'],
+    },
+    VIP_XML_ELECTION: {
+        'tag':                  'Election',
+        'header_column_list':   ['id', 'Date', 'StateId'],
+        'header_map_list':      ['election_id', 'election_date', 'state_id'],
+        'first_element_only':   True,
+    },
+    VIP_XML_SOURCE: {
+        'tag':                  'Source',
+        'header_column_list':   ['id', 'DateTime', 'Name', 'OrganizationUri', 'VipId'],
+        'header_map_list':      ['source_id', 'source_datetime', 'source_name', 'organization_uri', 'vip_id'],
+        'first_element_only':   True,
+    },
+}
+VIP_XML_REFERENCE_TAGS = {
+    VIP_XML_CANDIDATE_SELECTION:    'CandidateSelection',
+    VIP_XML_ELECTORAL_DISTRICT:     'ElectoralDistrict',
+    VIP_XML_PARTY:                  'Party',
+}
+
 
 BATCH_IMPORT_KEYS_ACCEPTED_FOR_CANDIDATES = {
     'candidate_name': 'candidate_name',
@@ -206,6 +302,39 @@ def get_header_map_value_if_index_in_list(incoming_list, index, kind_of_batch=""
         return ""
 
 
+def iterate_vip_xml_top_level_elements(xml_file):
+    """
+    Parse a VIP XML document incrementally, yielding each direct child of VipObject as soon as its closing tag has
+    been read. Each element is detached from the document before the next one is read, so the parsed tree never
+    holds more than one of them.
+    :param xml_file: file name or file-like object, like the response from urlopen
+    :return:
+    """
+    root = None
+    depth = 0
+    for event, element in ElementTree.iterparse(xml_file, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = element
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 1:
+                yield element
+                root.remove(element)
+
+
+def get_vip_xml_node_text(element, path):
+    node = element.find(path)
+    if node is not None:
+        return node.text
+    return ''
+
+
+def get_vip_xml_ctcl_uuid(element):
+    return get_vip_xml_node_text(element, "./ExternalIdentifiers/ExternalIdentifier/[OtherType='ctcl-uuid']/Value")
+
+
 class BatchManager(models.Model):
 
     def __unicode__(self):
@@ -256,6 +385,10 @@ class BatchManager(models.Model):
 
         batch_header_id = 0
         batch_header_map_id = 0
+        # csv_data is read one line at a time, and we only hold on to one chunk of unsaved BatchRow entries
+        batch_row_list = []
+        batch_row_save_failed = False
+        import_started = time.time()
         for line in csv_data:
             if first_line:
                 first_line = False
@@ -312,6 +445,7 @@ class BatchManager(models.Model):
                         batch_header_column_048=get_value_if_index_in_list(line, 48),
                         batch_header_column_049=get_value_if_index_in_list(line, 49),
                         batch_header_column_050=get_value_if_index_in_list(line, 50),
+                        date_import_started=timezone.now(),
                         )
                     batch_header_id = batch_header.id
 
@@ -405,66 +539,27 @@ class BatchManager(models.Model):
                 # if number_of_batch_rows >= limit_for_testing:
                 #     break
                 if positive_value_exists(batch_header_id):
-                    try:
-                        batch_row = BatchRow.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_row_000=get_value_if_index_in_list(line, 0),
-                            batch_row_001=get_value_if_index_in_list(line, 1),
-                            batch_row_002=get_value_if_index_in_list(line, 2),
-                            batch_row_003=get_value_if_index_in_list(line, 3),
-                            batch_row_004=get_value_if_index_in_list(line, 4),
-                            batch_row_005=get_value_if_index_in_list(line, 5),
-                            batch_row_006=get_value_if_index_in_list(line, 6),
-                            batch_row_007=get_value_if_index_in_list(line, 7),
-                            batch_row_008=get_value_if_index_in_list(line, 8),
-                            batch_row_009=get_value_if_index_in_list(line, 9),
-                            batch_row_010=get_value_if_index_in_list(line, 10),
-                            batch_row_011=get_value_if_index_in_list(line, 11),
-                            batch_row_012=get_value_if_index_in_list(line, 12),
-                            batch_row_013=get_value_if_index_in_list(line, 13),
-                            batch_row_014=get_value_if_index_in_list(line, 14),
-                            batch_row_015=get_value_if_index_in_list(line, 15),
-                            batch_row_016=get_value_if_index_in_list(line, 16),
-                            batch_row_017=get_value_if_index_in_list(line, 17),
-                            batch_row_018=get_value_if_index_in_list(line, 18),
-                            batch_row_019=get_value_if_index_in_list(line, 19),
-                            batch_row_020=get_value_if_index_in_list(line, 20),
-                            batch_row_021=get_value_if_index_in_list(line, 21),
-                            batch_row_022=get_value_if_index_in_list(line, 22),
-                            batch_row_023=get_value_if_index_in_list(line, 23),
-                            batch_row_024=get_value_if_index_in_list(line, 24),
-                            batch_row_025=get_value_if_index_in_list(line, 25),
-                            batch_row_026=get_value_if_index_in_list(line, 26),
-                            batch_row_027=get_value_if_index_in_list(line, 27),
-                            batch_row_028=get_value_if_index_in_list(line, 28),
-                            batch_row_029=get_value_if_index_in_list(line, 29),
-                            batch_row_030=get_value_if_index_in_list(line, 30),
-                            batch_row_031=get_value_if_index_in_list(line, 31),
-                            batch_row_032=get_value_if_index_in_list(line, 32),
-                            batch_row_033=get_value_if_index_in_list(line, 33),
-                            batch_row_034=get_value_if_index_in_list(line, 34),
-                            batch_row_035=get_value_if_index_in_list(line, 35),
-                            batch_row_036=get_value_if_index_in_list(line, 36),
-                            batch_row_037=get_value_if_index_in_list(line, 37),
-                            batch_row_038=get_value_if_index_in_list(line, 38),
-                            batch_row_039=get_value_if_index_in_list(line, 39),
-                            batch_row_040=get_value_if_index_in_list(line, 40),
-                            batch_row_041=get_value_if_index_in_list(line, 41),
-                            batch_row_042=get_value_if_index_in_list(line, 42),
-                            batch_row_043=get_value_if_index_in_list(line, 43),
-                            batch_row_044=get_value_if_index_in_list(line, 44),
-                            batch_row_045=get_value_if_index_in_list(line, 45),
-                            batch_row_046=get_value_if_index_in_list(line, 46),
-                            batch_row_047=get_value_if_index_in_list(line, 47),
-                            batch_row_048=get_value_if_index_in_list(line, 48),
-                            batch_row_049=get_value_if_index_in_list(line, 49),
-                            batch_row_050=get_value_if_index_in_list(line, 50),
-                        )
-                        number_of_batch_rows += 1
-                    except Exception as e:
-                        # Stop trying to save rows -- break out of the for loop
-                        status += "EXCEPTION_BATCH_ROW "
-                        break
+                    batch_row_list.append(self.generate_batch_row_from_csv_line(batch_header_id, line))
+                    if len(batch_row_list) >= BATCH_ROW_IMPORT_CHUNK_SIZE:
+                        chunk_results = self.save_batch_row_chunk(
+                            batch_header_id, batch_row_list, number_of_batch_rows, import_started)
+                        if not chunk_results['success']:
+                            # Stop trying to save rows -- break out of the for loop
+                            status += chunk_results['status']
+                            batch_row_save_failed = True
+                            break
+                        number_of_batch_rows += len(batch_row_list)
+                        batch_row_list = []
+
+        if positive_value_exists(batch_header_id) and not batch_row_save_failed:
+            # Save the last partial chunk, and mark the import as finished
+            chunk_results = self.save_batch_row_chunk(
+                batch_header_id, batch_row_list, number_of_batch_rows, import_started, import_finished=True)
+            if chunk_results['success']:
+                number_of_batch_rows += len(batch_row_list)
+            else:
+                status += chunk_results['status']
+        status += "BATCH_ROWS_SAVED: " + str(number_of_batch_rows) + " "
 
         results = {
             'success':              success,
@@ -475,6 +570,56 @@ class BatchManager(models.Model):
         }
         return results
 
+    def generate_batch_row_from_csv_line(self, batch_header_id, line):
+        """
+        An unsaved BatchRow with one CSV line in batch_row_000 through batch_row_050
+        :param batch_header_id:
+        :param line: list of values from csv.reader
+        :return:
+        """
+        batch_row_values = {}
+        for index in range(BATCH_ROW_COLUMN_COUNT):
+            batch_row_values['batch_row_{index:03d}'.format(index=index)] = get_value_if_index_in_list(line, index)
+        return BatchRow(batch_header_id=batch_header_id, **batch_row_values)
+
+    def save_batch_row_chunk(self, batch_header_id, batch_row_list, number_of_batch_rows_already_saved,
+                             import_started, import_finished=False):
+        """
+        Save one chunk of BatchRow entries with a single bulk insert, and record the import progress on the
+        BatchHeader in the same transaction, so the progress shown always matches the rows that are committed.
+        :param batch_header_id:
+        :param batch_row_list: unsaved BatchRow entries
+        :param number_of_batch_rows_already_saved:
+        :param import_started: time.time() when the import started
+        :param import_finished: True when this is the last chunk
+        :return:
+        """
+        batch_rows_imported = number_of_batch_rows_already_saved + len(batch_row_list)
+        seconds_elapsed = time.time() - import_started
+        import_rows_per_second = batch_rows_imported / seconds_elapsed if seconds_elapsed > 0 else 0
+        try:
+            with transaction.atomic():
+                if len(batch_row_list):
+                    BatchRow.objects.bulk_create(batch_row_list)
+                BatchHeader.objects.filter(id=batch_header_id).update(
+                    batch_rows_imported=batch_rows_imported,
+                    import_rows_per_second=import_rows_per_second,
+                    date_import_progress_updated=timezone.now(),
+                    import_finished=import_finished,
+                )
+            success = True
+            status = "BATCH_ROW_CHUNK_SAVED "
+        except Exception as e:
+            success = False
+            status = "EXCEPTION_BATCH_ROW "
+            handle_exception(e, logger=logger, exception_message=status)
+
+        results = {
+            'success':  success,
+            'status':   status,
+        }
+        return results
+
     def create_batch_header_translation_suggestion(
             self, kind_of_batch, header_value_recognized_by_we_vote, incoming_alternate_header_value):
         """
@@ -1012,39 +1157,43 @@ class BatchManager(models.Model):
         :param organization_we_vote_id:
         :return:
         """
-        # Retrieve from XML
-        request = urllib.request.urlopen(batch_uri)
-        # xml_data = request.read()
-        # xml_data = xmltodict.parse(xml_data)
-        # # xml_data_list_json = list(xml_data)
-        # structured_json = json.dumps(xml_data)
+        if kind_of_batch not in (MEASURE, ELECTED_OFFICE, CONTEST_OFFICE, CANDIDATE, POLITICIAN):
+            results = {
+                'success': False,
+                'status': 'CREATE_BATCH_VIP_XML-KIND_OF_BATCH_NOT_SUPPORTED ',
+                'batch_header_id': 0,
+                'batch_saved': False,
+                'number_of_batch_rows': 0,
+            }
+            return results
 
-        xml_tree = ElementTree.parse(request)
-        request.close()
-        xml_root = xml_tree.getroot()
+        # Retrieve from XML, one element at a time
+        request = urllib.request.urlopen(batch_uri)
+        vip_xml_importer = VipXmlBatchImporter(batch_uri, google_civic_election_id, organization_we_vote_id,
+                                               kind_of_batch_list=[kind_of_batch])
+        try:
+            results = vip_xml_importer.import_elements(iterate_vip_xml_top_level_elements(request))
+        finally:
+            request.close()
+        return results[kind_of_batch]
 
-        if xml_root:
-            if kind_of_batch == MEASURE:
-                return self.store_measure_xml(batch_uri, google_civic_election_id, organization_we_vote_id, xml_root)
-            elif kind_of_batch == ELECTED_OFFICE:
-                return self.store_elected_office_xml(batch_uri, google_civic_election_id, organization_we_vote_id,
-                                                     xml_root)
-            elif kind_of_batch == CONTEST_OFFICE:
-                return self.store_contest_office_xml(batch_uri, google_civic_election_id, organization_we_vote_id,
-                                                     xml_root)
-            elif kind_of_batch == CANDIDATE:
-                return self.store_candidate_xml(batch_uri, google_civic_election_id, organization_we_vote_id, xml_root)
-            elif kind_of_batch == POLITICIAN:
-                return self.store_politician_xml(batch_uri, google_civic_election_id, organization_we_vote_id, xml_root)
-            else:
-                results = {
-                    'success': False,
-                    'status': '',
-                    'batch_header_id': 0,
-                    'batch_saved': False,
-                    'number_of_batch_rows': 0,
-                }
-                return results
+    def store_vip_xml_for_one_kind(self, kind_of_batch, batch_uri, google_civic_election_id, organization_we_vote_id,
+                                   xml_root, batch_set_id=0):
+        """
+        Create the batch for one kind of element from a VIP XML document that has already been parsed
+        :param kind_of_batch:
+        :param batch_uri:
+        :param google_civic_election_id:
+        :param organization_we_vote_id:
+        :param xml_root:
+        :param batch_set_id:
+        :return:
+        """
+        # The caller may still need the elements, so leave them as they are
+        vip_xml_importer = VipXmlBatchImporter(batch_uri, google_civic_election_id, organization_we_vote_id,
+                                               batch_set_id, [kind_of_batch], clear_elements=False)
+        results = vip_xml_importer.import_elements(iter(xml_root))
+        return results[kind_of_batch]
 
     def store_measure_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root, batch_set_id=0):
         """
@@ -1056,140 +1205,8 @@ class BatchManager(models.Model):
         :param batch_set_id:
         :return:
         """
-        # Process BallotMeasureContest data
-
-        number_of_batch_rows = 0
-        first_line = True
-        success = False
-        status = ''
-        limit_for_testing = 5
-        batch_header_id = 0
-
-        # Look for BallotMeasureContest and create the batch_header first. BallotMeasureContest is the direct child node
-        # of VipObject
-        ballot_measure_xml_node = xml_root.findall('BallotMeasureContest')
-        # if ballot_measure_xml_node is not None:
-        for one_ballot_measure in ballot_measure_xml_node:
-            if number_of_batch_rows >= limit_for_testing:
-                break
-
-            # look for relevant child nodes under BallotMeasureContest: id, BallotTitle, BallotSubTitle,
-            # ElectoralDistrictId, other::ctcl-uid
-            ballot_measure_id = one_ballot_measure.attrib['id']
-
-            ballot_measure_subtitle_node = one_ballot_measure.find('BallotSubTitle/Text')
-            if ballot_measure_subtitle_node is not None:
-                ballot_measure_subtitle = ballot_measure_subtitle_node.text
-            else:
-                ballot_measure_subtitle = ''
-
-            ballot_measure_title_node = one_ballot_measure.find('BallotTitle')
-            if ballot_measure_title_node is not None:
-                ballot_measure_title = one_ballot_measure.find('BallotTitle/Text').text
-            else:
-                ballot_measure_title = ''
-
-            electoral_district_id_node = one_ballot_measure.find('ElectoralDistrictId')
-            if electoral_district_id_node is not None:
-                electoral_district_id = electoral_district_id_node.text
-            else:
-                electoral_district_id = ''
-
-            ctcl_uuid_node = one_ballot_measure.find(
-                "./ExternalIdentifiers/ExternalIdentifier/[OtherType='ctcl-uuid']")
-            if ctcl_uuid_node is not None:
-                ctcl_uuid = one_ballot_measure.find(
-                    "./ExternalIdentifiers/ExternalIdentifier/[OtherType='ctcl-uuid']/Value").text
-            else:
-                ctcl_uuid = ''
-
-            ballot_measure_name_node = one_ballot_measure.find('Name')
-            if ballot_measure_name_node is not None:
-                ballot_measure_name = ballot_measure_name_node.text
-            else:
-                ballot_measure_name = ''
-
-            if first_line:
-                first_line = False
-                try:
-                    batch_header = BatchHeader.objects.create(
-                        batch_header_column_000='id',
-                        batch_header_column_001='BallotSubTitle',
-                        batch_header_column_002='BallotTitle',
-                        batch_header_column_003='ElectoralDistrictId',
-                        batch_header_column_004='other::ctcl-uuid',
-                        batch_header_column_005='Name',
-                    )
-                    batch_header_id = batch_header.id
-
-                    if positive_value_exists(batch_header_id):
-                        # Save an initial BatchHeaderMap
-                        batch_header_map = BatchHeaderMap.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_000='measure_batch_id',
-                            batch_header_map_001='measure_sub_title',
-                            batch_header_map_002='measure_title',
-                            batch_header_map_003='electoral_district_id',
-                            batch_header_map_004='measure_ctcl_uuid',
-                            batch_header_map_005='measure_name'
-                        )
-                        batch_header_map_id = batch_header_map.id
-                        status += " BATCH_HEADER_MAP_SAVED"
-
-                    if positive_value_exists(batch_header_id) and positive_value_exists(batch_header_map_id):
-                        # Now save the BatchDescription
-                        batch_name = "MEASURE " + " batch_header_id: " + str(batch_header_id)
-                        batch_description_text = ""
-                        batch_description = BatchDescription.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_id=batch_header_map_id,
-                            batch_name=batch_name,
-                            batch_description_text=batch_description_text,
-                            google_civic_election_id=google_civic_election_id,
-                            kind_of_batch='MEASURE',
-                            organization_we_vote_id=organization_we_vote_id,
-                            source_uri=batch_uri,
-                            batch_set_id=batch_set_id,
-                        )
-                        status += " BATCH_DESCRIPTION_SAVED"
-                        success = True
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    batch_header_id = 0
-                    status += " EXCEPTION_BATCH_HEADER"
-                    handle_exception(e, logger=logger, exception_message=status)
-                    break
-            if not positive_value_exists(batch_header_id):
-                break
-
-            # check for measure_id, title OR subtitle or name AND ctcl_uuid
-            if (positive_value_exists(ballot_measure_id) and positive_value_exists(ctcl_uuid) and
-                    (positive_value_exists(ballot_measure_subtitle) or positive_value_exists(ballot_measure_title) or
-                         positive_value_exists(ballot_measure_name))):
-
-                try:
-                    batch_row = BatchRow.objects.create(
-                        batch_header_id=batch_header_id,
-                        batch_row_000=ballot_measure_id,
-                        batch_row_001=ballot_measure_subtitle,
-                        batch_row_002=ballot_measure_title,
-                        batch_row_003=electoral_district_id,
-                        batch_row_004=ctcl_uuid,
-                        batch_row_005=ballot_measure_name
-                    )
-                    number_of_batch_rows += 1
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    status += " EXCEPTION_BATCH_ROW"
-                    break
-        results = {
-            'success': success,
-            'status': status,
-            'batch_header_id': batch_header_id,
-            'batch_saved': success,
-            'number_of_batch_rows': number_of_batch_rows,
-        }
-        return results
+        return self.store_vip_xml_for_one_kind(MEASURE, batch_uri, google_civic_election_id, organization_we_vote_id,
+                                               xml_root, batch_set_id)
 
     def store_elected_office_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
                                  batch_set_id=0):
@@ -1202,148 +1219,8 @@ class BatchManager(models.Model):
         :param batch_set_id
         :return:
         """
-        # Process VIP Office data
-        number_of_batch_rows = 0
-        first_line = True
-        success = False
-        status = ''
-        limit_for_testing = 5
-        batch_header_id = 0
-
-        # Look for Office and create the batch_header first. Office is the direct child node
-        # of VipObject
-        elected_office_xml_node = xml_root.findall('Office')
-        # if ballot_measure_xml_node is not None:
-        for one_elected_office in elected_office_xml_node:
-            if number_of_batch_rows >= limit_for_testing:
-                break
-
-            elected_office_description = ''
-            elected_office_description_es = ''
-            elected_office_is_partisan = ''
-            # look for relevant child nodes under Office: id, Name, Description, ElectoralDistrictId,
-            # IsPartisan, other::ctcl-uid
-            elected_office_id = one_elected_office.attrib['id']
-
-            elected_office_name_node = one_elected_office.find("./Name/Text/[@language='"+LANGUAGE_CODE_ENGLISH+"']")
-            if elected_office_name_node is not None:
-                elected_office_name = elected_office_name_node.text
-
-            elected_office_name_es_node = one_elected_office.find("./Name/Text/[@language='"+LANGUAGE_CODE_SPANISH+"']")
-            if elected_office_name_es_node is not None:
-                elected_office_name_es = elected_office_name_es_node.text
-
-            elected_office_description_node = one_elected_office.find(
-                "Description/Text/[@language='"+LANGUAGE_CODE_ENGLISH+"']")
-            if elected_office_description_node is not None:
-                elected_office_description = elected_office_description_node.text
-
-            elected_office_description_es_node = one_elected_office.find(
-                "Description/Text/[@language='"+LANGUAGE_CODE_SPANISH+"']")
-            if elected_office_description_es_node is not None:
-                elected_office_description_es = elected_office_description_es_node.text
-
-            electoral_district_id_node = one_elected_office.find('ElectoralDistrictId')
-            if electoral_district_id_node is not None:
-                electoral_district_id = electoral_district_id_node.text
-
-            elected_office_is_partisan_node = one_elected_office.find('IsPartisan')
-            if elected_office_is_partisan_node is not None:
-                elected_office_is_partisan = elected_office_is_partisan_node.text
-
-            ctcl_uuid_node = one_elected_office.find(
-                "./ExternalIdentifiers/ExternalIdentifier/[OtherType='ctcl-uuid']")
-            if ctcl_uuid_node is not None:
-                ctcl_uuid = one_elected_office.find(
-                    "./ExternalIdentifiers/ExternalIdentifier/[OtherType='ctcl-uuid']/Value").text
-
-            if first_line:
-                first_line = False
-                try:
-                    batch_header = BatchHeader.objects.create(
-                        batch_header_column_000='id',
-                        batch_header_column_001='NameEnglish',
-                        batch_header_column_002='NameSpanish',
-                        batch_header_column_003='DescriptionEnglish',
-                        batch_header_column_004='DescriptionSpanish',
-                        batch_header_column_005='ElectoralDistrictId',
-                        batch_header_column_006='IsPartisan',
-                        batch_header_column_007='other::ctcl-uuid',
-                    )
-                    batch_header_id = batch_header.id
-
-                    if positive_value_exists(batch_header_id):
-                        # Save an initial BatchHeaderMap
-                        batch_header_map = BatchHeaderMap.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_000='elected_office_batch_id',
-                            batch_header_map_001='elected_office_name',
-                            batch_header_map_002='elected_office_name_es',
-                            batch_header_map_003='elected_office_description',
-                            batch_header_map_004='elected_office_description_es',
-                            batch_header_map_005='electoral_district_id',
-                            batch_header_map_006='elected_office_is_partisan',
-                            batch_header_map_007='elected_office_ctcl_uuid',
-                        )
-                        batch_header_map_id = batch_header_map.id
-                        status += " BATCH_HEADER_MAP_SAVED"
-
-                    if positive_value_exists(batch_header_id) and positive_value_exists(batch_header_map_id):
-                        # Now save the BatchDescription
-                        batch_name = "ELECTED_OFFICE " + " batch_header_id: " + str(batch_header_id)
-                        batch_description_text = ""
-                        batch_description = BatchDescription.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_id=batch_header_map_id,
-                            batch_name=batch_name,
-                            batch_description_text=batch_description_text,
-                            google_civic_election_id=google_civic_election_id,
-                            kind_of_batch='ELECTED_OFFICE',
-                            organization_we_vote_id=organization_we_vote_id,
-                            source_uri=batch_uri,
-                            batch_set_id=batch_set_id,
-                        )
-                        status += " BATCH_DESCRIPTION_SAVED"
-                        success = True
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    batch_header_id = 0
-                    status += " EXCEPTION_BATCH_HEADER"
-                    handle_exception(e, logger=logger, exception_message=status)
-                    break
-            if not positive_value_exists(batch_header_id):
-                break
-
-            # check for office_batch_id or electoral_district or name AND ctcl_uuid
-            if positive_value_exists(elected_office_id) and positive_value_exists(ctcl_uuid) and \
-                    (positive_value_exists(electoral_district_id) or positive_value_exists(elected_office_name)) or \
-                    positive_value_exists(elected_office_name_es):
-                try:
-                    batch_row = BatchRow.objects.create(
-                        batch_header_id=batch_header_id,
-                        batch_row_000=elected_office_id,
-                        batch_row_001=elected_office_name,
-                        batch_row_002=elected_office_name_es,
-                        batch_row_003=elected_office_description,
-                        batch_row_004=elected_office_description_es,
-                        batch_row_005=electoral_district_id,
-                        batch_row_006=elected_office_is_partisan,
-                        batch_row_007=ctcl_uuid
-                    )
-                    number_of_batch_rows += 1
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    status += " EXCEPTION_BATCH_ROW"
-                    handle_exception(e, logger=logger, exception_message=status)
-                    break
-        results = {
-            'success': success,
-            'status': status,
-            'batch_header_id': batch_header_id,
-            'batch_saved': success,
-            'number_of_batch_rows': number_of_batch_rows,
-        }
-        return results
+        return self.store_vip_xml_for_one_kind(ELECTED_OFFICE, batch_uri, google_civic_election_id,
+                                               organization_we_vote_id, xml_root, batch_set_id)
 
     def store_contest_office_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
                                  batch_set_id=0):
@@ -1356,192 +1233,8 @@ class BatchManager(models.Model):
         :param batch_set_id
         :return:
         """
-        # Process VIP CandidateContest data
-        number_of_batch_rows = 0
-        first_line = True
-        success = False
-        status = ''
-        limit_for_testing = 5
-        batch_header_id = 0
-
-        candidate_selection_id_key_list = ['candidate_selection_id_1', 'candidate_selection_id_2', 'candidate_selection_id_3',
-                                    'candidate_selection_id_4', 'candidate_selection_id_5', 'candidate_selection_id_6',
-                                    'candidate_selection_id_7', 'candidate_selection_id_8', 'candidate_selection_id_9',
-                                    'candidate_selection_id_10']
-        # Look for CandidateContest and create the batch_header first. CandidateContest is the direct child node
-        # of VipObject
-        contest_office_xml_node = xml_root.findall('CandidateContest')
-        # if contest_office_xml_node is not None:
-        for one_contest_office in contest_office_xml_node:
-            if number_of_batch_rows >= limit_for_testing:
-                break
-
-            contest_office_number_elected = ''
-            contest_office_votes_allowed = ''
-            elected_office_id = ''
-
-            # look for relevant child nodes under CandidateContest: id, Name, OfficeId, ElectoralDistrictId,
-            # other::ctcl-uid, VotesAllowed, NumberElected
-            contest_office_id = one_contest_office.attrib['id']
-
-            contest_office_name_node = one_contest_office.find('Name')
-            if contest_office_name_node is not None:
-                contest_office_name = contest_office_name_node.text
-
-            contest_office_number_elected_node = one_contest_office.find('NumberElected')
-            if contest_office_number_elected_node is not None:
-                contest_office_number_elected = contest_office_number_elected_node.text
-
-            electoral_district_id_node = one_contest_office.find('ElectoralDistrictId')
-            if electoral_district_id_node is not None:
-                electoral_district_id = electoral_district_id_node.text
-
-            contest_office_votes_allowed_node = one_contest_office.find('VotesAllowed')
-            if contest_office_votes_allowed_node is not None:
-                contest_office_votes_allowed = contest_office_votes_allowed_node.text
-
-            elected_office_id_node = one_contest_office.find('OfficeIds')
-            if elected_office_id_node is not None:
-                elected_office_id = elected_office_id_node.text
-
-            ctcl_uuid_node = one_contest_office.find(
-                "./ExternalIdentifiers/ExternalIdentifier/[OtherType='ctcl-uuid']")
-            if ctcl_uuid_node is not None:
-                ctcl_uuid = one_contest_office.find(
-                    "./ExternalIdentifiers/ExternalIdentifier/[OtherType='ctcl-uuid']/Value").text
-
-            ballot_selection_ids_node = one_contest_office.find('./BallotSelectionIds')
-            if ballot_selection_ids_node is not None:
-                ballot_selection_ids_str = ballot_selection_ids_node.text
-                if ballot_selection_ids_str:
-                    ballot_selection_ids_value_list = ballot_selection_ids_str.split()
-                    # for len in ballot_selection_ids_list words,
-                    # Assuming that there are maximum 10 ballot selection ids for a given contest office
-                    ballot_selection_ids_dict = dict(zip(candidate_selection_id_key_list, ballot_selection_ids_value_list))
-
-                    # move this to batchrowactionContestOffice create if we run into performance/load issue
-                    candidate_selection_list = []
-                    for key, value in ballot_selection_ids_dict.items():
-                        results = retrieve_candidate_from_candidate_selection(value, batch_set_id)
-                        if results['candidate_id_found']:
-                            candidate_selection_item = results['candidate_selection']
-                            candidate_value = candidate_selection_item.contest_office_id
-                            candidate_selection_list.append(candidate_value)
-
-                    candidate_selection_ids_dict = dict(zip(candidate_selection_id_key_list, candidate_selection_list))
-            if first_line:
-                first_line = False
-                try:
-                    batch_header = BatchHeader.objects.create(
-                        batch_header_column_000='id',
-                        batch_header_column_001='Name',
-                        batch_header_column_002='OfficeIds',
-                        batch_header_column_003='ElectoralDistrictId',
-                        batch_header_column_004='VotesAllowed',
-                        batch_header_column_005='NumberElected',
-                        batch_header_column_006='other::ctcl-uuid',
-                        batch_header_column_007='CandidateSelectionId1',
-                        batch_header_column_008='CandidateSelectionId2',
-                        batch_header_column_009='CandidateSelectionId3',
-                        batch_header_column_010='CandidateSelectionId4',
-                        batch_header_column_011='CandidateSelectionId5',
-                        batch_header_column_012='CandidateSelectionId6',
-                        batch_header_column_013='CandidateSelectionId7',
-                        batch_header_column_014='CandidateSelectionId8',
-                        batch_header_column_015='CandidateSelectionId9',
-                        batch_header_column_016='CandidateSelectionId10',
-                    )
-                    batch_header_id = batch_header.id
-
-                    if positive_value_exists(batch_header_id):
-                        # Save an initial BatchHeaderMap
-                        batch_header_map = BatchHeaderMap.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_000='contest_office_batch_id',
-                            batch_header_map_001='contest_office_name',
-                            batch_header_map_002='elected_office_id',
-                            batch_header_map_003='electoral_district_id',
-                            batch_header_map_004='contest_office_votes_allowed',
-                            batch_header_map_005='contest_office_number_elected',
-                            batch_header_map_006='contest_office_ctcl_uuid',
-                            batch_header_map_007='candidate_selection_id1',
-                            batch_header_map_008='candidate_selection_id2',
-                            batch_header_map_009='candidate_selection_id3',
-                            batch_header_map_010='candidate_selection_id4',
-                            batch_header_map_011='candidate_selection_id5',
-                            batch_header_map_012='candidate_selection_id6',
-                            batch_header_map_013='candidate_selection_id7',
-                            batch_header_map_014='candidate_selection_id8',
-                            batch_header_map_015='candidate_selection_id9',
-                            batch_header_map_016='candidate_selection_id10',
-                        )
-                        batch_header_map_id = batch_header_map.id
-                        status += " BATCH_HEADER_MAP_SAVED"
-
-                    if positive_value_exists(batch_header_id) and positive_value_exists(batch_header_map_id):
-                        # Now save the BatchDescription
-                        batch_name = "CONTEST_OFFICE " + " batch_header_id: " + str(batch_header_id)
-                        batch_description_text = ""
-                        batch_description = BatchDescription.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_id=batch_header_map_id,
-                            batch_name=batch_name,
-                            batch_description_text=batch_description_text,
-                            google_civic_election_id=google_civic_election_id,
-                            kind_of_batch='CONTEST_OFFICE',
-                            organization_we_vote_id=organization_we_vote_id,
-                            source_uri=batch_uri,
-                            batch_set_id=batch_set_id,
-                        )
-                        status += " BATCH_DESCRIPTION_SAVED"
-                        success = True
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    batch_header_id = 0
-                    status += " EXCEPTION_BATCH_HEADER"
-                    handle_exception(e, logger=logger, exception_message=status)
-                    break
-            if not positive_value_exists(batch_header_id):
-                break
-
-            # check for contest_office_batch_id or electoral_district or name AND ctcl_uuid
-            if positive_value_exists(contest_office_id) and positive_value_exists(ctcl_uuid) and \
-                    (positive_value_exists(electoral_district_id) or positive_value_exists(contest_office_name)):
-                try:
-                    batch_row = BatchRow.objects.create(
-                        batch_header_id=batch_header_id,
-                        batch_row_000=contest_office_id,
-                        batch_row_001=contest_office_name,
-                        batch_row_002=elected_office_id,
-                        batch_row_003=electoral_district_id,
-                        batch_row_004=contest_office_votes_allowed,
-                        batch_row_005=contest_office_number_elected,
-                        batch_row_006=ctcl_uuid,
-                        batch_row_007=candidate_selection_ids_dict.get('candidate_selection_id_1', ''),
-                        batch_row_008=candidate_selection_ids_dict.get('candidate_selection_id_2',''),
-                        batch_row_009=candidate_selection_ids_dict.get('candidate_selection_id_3',''),
-                        batch_row_010=candidate_selection_ids_dict.get('candidate_selection_id_4',''),
-                        batch_row_011=candidate_selection_ids_dict.get('candidate_selection_id_5',''),
-                        batch_row_012=candidate_selection_ids_dict.get('candidate_selection_id_6',''),
-                        batch_row_013=candidate_selection_ids_dict.get('candidate_selection_id_7',''),
-                        batch_row_014=candidate_selection_ids_dict.get('candidate_selection_id_8',''),
-                        batch_row_015=candidate_selection_ids_dict.get('candidate_selection_id_9',''),
-                        batch_row_016=candidate_selection_ids_dict.get('candidate_selection_id_10',''),
-                    )
-                    number_of_batch_rows += 1
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    status += " EXCEPTION_BATCH_ROW"
-                    handle_exception(e, logger=logger, exception_message=status)
-                    break
-        results = {
-            'success': success,
-            'status': status,
-            'batch_header_id': batch_header_id,
-            'batch_saved': success,
-            'number_of_batch_rows': number_of_batch_rows,
-        }
-        return results
+        return self.store_vip_xml_for_one_kind(CONTEST_OFFICE, batch_uri, google_civic_election_id,
+                                               organization_we_vote_id, xml_root, batch_set_id)
 
     def store_politician_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
                              batch_set_id=0):
@@ -1554,224 +1247,57 @@ class BatchManager(models.Model):
         :param batch_set_id
         :return:
         """
-        # Process VIP Person data
-        number_of_batch_rows = 0
-        first_line = True
-        success = False
-        status = ''
-        limit_for_testing = 5
-        batch_header_id = 0
+        return self.store_vip_xml_for_one_kind(POLITICIAN, batch_uri, google_civic_election_id,
+                                               organization_we_vote_id, xml_root, batch_set_id)
 
-        # Get party names and their corresponding party ids
-        party_details_list = retrieve_all_party_names_and_ids_api()
+    def store_candidate_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
+                            batch_set_id=0):
+        """
+        Retrieves Candidate data from CTCL xml file
+        :param batch_uri:
+        :param google_civic_election_id:
+        :param organization_we_vote_id:
+        :param xml_root:
+        :param batch_set_id
+        :return:
+        """
+        return self.store_vip_xml_for_one_kind(CANDIDATE, batch_uri, google_civic_election_id,
+                                               organization_we_vote_id, xml_root, batch_set_id)
 
-        # Look for Person and create the batch_header first. Person is the direct child node
-        # of VipObject
-        person_xml_node = xml_root.findall('Person')
-        for one_person in person_xml_node:
-            if number_of_batch_rows >= limit_for_testing:
-                break
+    def store_state_data_from_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
+                                  batch_set_id=0):
+        """
+        Retrieves state data from CTCL xml file
+        :param batch_uri:
+        :param google_civic_election_id:
+        :param organization_we_vote_id:
+        :param xml_root:
+        :param batch_set_id
+        :return:
+        """
+        # This state is not used right now. Parsing it for future reference
+        return self.store_vip_xml_for_one_kind(VIP_XML_STATE, batch_uri, google_civic_election_id,
+                                               organization_we_vote_id, xml_root, batch_set_id)
 
-            person_party_name = ''
-            # look for relevant child nodes under Person: id, FullName, FirstName, LastName, MiddleName, PartyId, Email,
-            # PhoneNumber, Website, Twitter, ctcl-uuid
-            person_id = one_person.attrib['id']
+    def store_election_metadata_from_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
+                                         batch_set_id=0):
+        """
+        Retrieves election metadata from CTCL xml file
+        :param batch_uri:
+        :param google_civic_election_id:
+        :param organization_we_vote_id:
+        :param xml_root:
+        :param batch_set_id
+        :return:
+        """
+        # This election metadata is not used right now. Parsing it for future reference
+        return self.store_vip_xml_for_one_kind(VIP_XML_ELECTION, batch_uri, google_civic_election_id,
+                                               organization_we_vote_id, xml_root, batch_set_id)
 
-            person_full_name_node = one_person.find("./FullName/Text/[@language='"+LANGUAGE_CODE_ENGLISH+"']")
-            if person_full_name_node is not None:
-                person_full_name = person_full_name_node.text
-            else:
-                person_full_name = ''
-
-            person_first_name_node = one_person.find('FirstName')
-            if person_first_name_node is not None:
-                person_first_name = person_first_name_node.text
-            else:
-                person_first_name = ''
-
-            person_middle_name_node = one_person.find('MiddleName')
-            if person_middle_name_node is not None:
-                person_middle_name = person_middle_name_node.text
-            else:
-                person_middle_name = ''
-
-            person_last_name_node = one_person.find('LastName')
-            if person_last_name_node is not None:
-                person_last_name = person_last_name_node.text
-            else:
-                person_last_name = ''
-
-            person_party_id_node = one_person.find('PartyId')
-            if person_party_id_node is not None:
-                person_party_id = person_party_id_node.text
-                # get party name from candidate_party_id
-                if party_details_list is not None:
-                    # party_details_dict =  [entry for entry in party_details_list]
-                    for one_party in party_details_list:
-                        # get the party name matching person_party_id
-                        if person_party_id == one_party.get('party_id_temp'):
-                            person_party_name = one_party.get('party_name')
-                            break
-
-            person_email_id_node = one_person.find('./ContactInformation/Email')
-            if person_email_id_node is not None:
-                person_email_id = person_email_id_node.text
-            else:
-                person_email_id = ''
-
-            person_phone_number_node = one_person.find('./ContactInformation/Phone')
-            if person_phone_number_node is not None:
-                person_phone_number = person_phone_number_node.text
-            else:
-                person_phone_number = ''
-
-            person_website_url_node = one_person.find("./ContactInformation/Uri/[@annotation='website']")
-            if person_website_url_node is not None:
-                person_website_url = person_website_url_node.text
-            else:
-                person_website_url = ''
-
-            person_facebook_id_node = one_person.find("./ContactInformation/Uri/[@annotation='facebook']")
-            if person_facebook_id_node is not None:
-                person_facebook_id = person_facebook_id_node.text
-            else:
-                person_facebook_id = ''
-
-            person_twitter_id_node = one_person.find("./ContactInformation/Uri/[@annotation='twitter']")
-            if person_twitter_id_node is not None:
-                person_twitter_id = person_twitter_id_node.text
-            else:
-                person_twitter_id = ''
-
-            person_youtube_id_node = one_person.find("./ContactInformation/Uri/[@annotation='youtube']")
-            if person_youtube_id_node is not None:
-                person_youtube_id = person_youtube_id_node.text
-            else:
-                person_youtube_id = ''
-
-            person_googleplus_id_node = one_person.find("./ContactInformation/Uri/[@annotation='googleplus']")
-            if person_googleplus_id_node is not None:
-                person_googleplus_id = person_googleplus_id_node.text
-            else:
-                person_googleplus_id = ''
-
-            ctcl_uuid_node = one_person.find(
-                "./ExternalIdentifiers/ExternalIdentifier/[OtherType='ctcl-uuid']")
-            if ctcl_uuid_node is not None:
-                ctcl_uuid = one_person.find(
-                    "./ExternalIdentifiers/ExternalIdentifier/[OtherType='ctcl-uuid']/Value").text
-
-            if first_line:
-                first_line = False
-                try:
-                    batch_header = BatchHeader.objects.create(
-                        batch_header_column_000='id',
-                        batch_header_column_001='FullName',
-                        batch_header_column_002='FirstName',
-                        batch_header_column_003='MiddleName',
-                        batch_header_column_004='LastName',
-                        batch_header_column_005='PartyName',
-                        batch_header_column_006='Email',
-                        batch_header_column_007='Phone',
-                        batch_header_column_008='uri::website',
-                        batch_header_column_009='uri::facebook',
-                        batch_header_column_010='uri::twitter',
-                        batch_header_column_011='uri::youtube',
-                        batch_header_column_012='uri::googleplus',
-                        batch_header_column_013='other::ctcl-uuid',
-                    )
-                    batch_header_id = batch_header.id
-
-                    if positive_value_exists(batch_header_id):
-                        # Save an initial BatchHeaderMap
-                        batch_header_map = BatchHeaderMap.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_000='politician_batch_id',
-                            batch_header_map_001='politician_full_name',
-                            batch_header_map_002='politician_first_name',
-                            batch_header_map_003='politician_middle_name',
-                            batch_header_map_004='politician_last_name',
-                            batch_header_map_005='politician_party_name',
-                            batch_header_map_006='politician_email_address',
-                            batch_header_map_007='politician_phone_number',
-                            batch_header_map_008='politician_website_url',
-                            batch_header_map_009='politician_facebook_id',
-                            batch_header_map_010='politician_twitter_url',
-                            batch_header_map_011='politician_youtube_id',
-                            batch_header_map_012='politician_googleplus_id',
-                            batch_header_map_013='politician_ctcl_uuid',
-                        )
-                        batch_header_map_id = batch_header_map.id
-                        status += " BATCH_HEADER_MAP_SAVED"
-
-                    if positive_value_exists(batch_header_id) and positive_value_exists(batch_header_map_id):
-                        # Now save the BatchDescription
-                        batch_name = "POLITICIAN " + " batch_header_id: " + str(batch_header_id)
-                        batch_description_text = ""
-                        batch_description = BatchDescription.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_id=batch_header_map_id,
-                            batch_name=batch_name,
-                            batch_description_text=batch_description_text,
-                            google_civic_election_id=google_civic_election_id,
-                            kind_of_batch='POLITICIAN',
-                            organization_we_vote_id=organization_we_vote_id,
-                            source_uri=batch_uri,
-                            batch_set_id=batch_set_id,
-                        )
-                        status += " BATCH_DESCRIPTION_SAVED"
-                        success = True
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    batch_header_id = 0
-                    status += " EXCEPTION_BATCH_HEADER"
-                    handle_exception(e, logger=logger, exception_message=status)
-                    break
-            if not positive_value_exists(batch_header_id):
-                break
-
-            # check for office_batch_id or electoral_district or name AND ctcl_uuid
-            # if positive_value_exists(person_id) and ctcl_uuid is not None or person_full_name is not None or \
-            #                 person_first_name is not None:
-            if positive_value_exists(person_id) and positive_value_exists(ctcl_uuid) and \
-                    (positive_value_exists(person_full_name) or positive_value_exists(person_first_name)):
-                try:
-                    batch_row = BatchRow.objects.create(
-                        batch_header_id=batch_header_id,
-                        batch_row_000=person_id,
-                        batch_row_001=person_full_name,
-                        batch_row_002=person_first_name,
-                        batch_row_003=person_middle_name,
-                        batch_row_004=person_last_name,
-                        batch_row_005=person_party_name,
-                        batch_row_006=person_email_id,
-                        batch_row_007=person_phone_number,
-                        batch_row_008=person_website_url,
-                        batch_row_009=person_facebook_id,
-                        batch_row_010=person_twitter_id,
-                        batch_row_011=person_youtube_id,
-                        batch_row_012=person_googleplus_id,
-                        batch_row_013=ctcl_uuid,
-                    )
-                    number_of_batch_rows += 1
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    status += " EXCEPTION_BATCH_ROW"
-                    handle_exception(e, logger=logger, exception_message=status)
-                    break
-        results = {
-            'success': success,
-            'status': status,
-            'batch_header_id': batch_header_id,
-            'batch_saved': success,
-            'number_of_batch_rows': number_of_batch_rows,
-        }
-        return results
-
-    def store_candidate_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
-                            batch_set_id=0):
+    def store_source_metadata_from_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
+                                       batch_set_id=0):
         """
-        Retrieves Candidate data from CTCL xml file
+        Retrieves source metadata from CTCL xml file
         :param batch_uri:
         :param google_civic_election_id:
         :param organization_we_vote_id:
@@ -1779,497 +1305,187 @@ class BatchManager(models.Model):
         :param batch_set_id
         :return:
         """
-        # Process VIP Candidate data
-        number_of_batch_rows = 0
-        first_line = True
-        success = False
-        status = ''
-        limit_for_testing = 5
-        batch_header_id = 0
-
-        # Call party api to get corresponding party name from party id
-        party_details_list = retrieve_all_party_names_and_ids_api()
-
-        # Look for Candidate and create the batch_header first. Candidate is the direct child node
-        # of VipObject
-        candidate_xml_node = xml_root.findall('Candidate')
-        for one_candidate in candidate_xml_node:
-            candidate_party_name = None
-            if number_of_batch_rows >= limit_for_testing:
-                break
-
-            # look for relevant child nodes under Candidate: id, BallotName, personId, PartyId, isTopTicket,
-            # other::ctcl-uid
-            candidate_id = one_candidate.attrib['id']
-
-            candidate_selection_id = one_candidate.find("./BallotSelectionIds")
-            candidate_name_node = one_candidate.find("./BallotName/Text/[@language='"+LANGUAGE_CODE_ENGLISH+"']")
-            if candidate_name_node is not None:
-                candidate_name = candidate_name_node.text
-
-            candidate_person_id_node = one_candidate.find('./PersonId')
-            if candidate_person_id_node is not None:
-                candidate_person_id = candidate_person_id_node.text
-
-            candidate_party_id_node = one_candidate.find('./PartyId')
-            if candidate_party_id_node is not None:
-                candidate_party_id = candidate_party_id_node.text
-                # get party name from candidate_party_id
-                if party_details_list is not None:
-                    # party_details_dict =  [entry for entry in party_details_list]
-                    for one_party in party_details_list:
-                        # get the candidate party name matching candidate_party_id
-                        if candidate_party_id == one_party.get('party_id_temp'):
-                            candidate_party_name = one_party.get('party_name')
-                            break
-            else:
-                candidate_party_name = ''
-
-            candidate_is_top_ticket_node = one_candidate.find('IsTopTicket')
-            if candidate_is_top_ticket_node is not None:
-                candidate_is_top_ticket = candidate_is_top_ticket_node.text
-            else:
-                candidate_is_top_ticket = ''
-
-            ctcl_uuid_node = one_candidate.find(
-                "./ExternalIdentifiers/ExternalIdentifier/[OtherType='ctcl-uuid']")
-            if ctcl_uuid_node is not None:
-                ctcl_uuid = one_candidate.find(
-                    "./ExternalIdentifiers/ExternalIdentifier/[OtherType='ctcl-uuid']/Value").text
-
-            if first_line:
-                first_line = False
-                try:
-                    batch_header = BatchHeader.objects.create(
-                        batch_header_column_000='id',
-                        batch_header_column_001='PersonId',
-                        batch_header_column_002='Name',
-                        batch_header_column_003='PartyName',
-                        batch_header_column_004='IsTopTicket',
-                        batch_header_column_005='other::ctcl-uuid',
-                        batch_header_column_006='other::CandidateSelectionId',
-                    )
-                    batch_header_id = batch_header.id
-
-                    if positive_value_exists(batch_header_id):
-                        # Save an initial BatchHeaderMap
-                        batch_header_map = BatchHeaderMap.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_000='candidate_batch_id',
-                            batch_header_map_001='candidate_person_id',
-                            batch_header_map_002='candidate_name',
-                            batch_header_map_003='candidate_party_name',
-                            batch_header_map_004='candidate_is_top_ticket',
-                            batch_header_map_005='candidate_ctcl_uuid',
-                            batch_header_map_006='candidate_selection_id',
-                        )
-                        batch_header_map_id = batch_header_map.id
-                        status += " BATCH_HEADER_MAP_SAVED"
-
-                    if positive_value_exists(batch_header_id) and positive_value_exists(batch_header_map_id):
-                        # Now save the BatchDescription
-                        batch_name = "CANDIDATE " + " batch_header_id: " + str(batch_header_id)
-                        batch_description_text = ""
-                        batch_description = BatchDescription.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_id=batch_header_map_id,
-                            batch_name=batch_name,
-                            batch_description_text=batch_description_text,
-                            google_civic_election_id=google_civic_election_id,
-                            kind_of_batch='CANDIDATE',
-                            organization_we_vote_id=organization_we_vote_id,
-                            source_uri=batch_uri,
-                            batch_set_id=batch_set_id,
-                        )
-                        status += " BATCH_DESCRIPTION_SAVED"
-                        success = True
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    batch_header_id = 0
-                    status += " EXCEPTION_BATCH_HEADER"
-                    handle_exception(e, logger=logger, exception_message=status)
-                    break
-            if not positive_value_exists(batch_header_id):
-                break
-
-            # check for candidate_id or candidate_person_id or name AND ctcl_uuid
-            if positive_value_exists(candidate_id) and positive_value_exists(ctcl_uuid) and \
-                    (positive_value_exists(candidate_person_id) or positive_value_exists(candidate_name)):
-                try:
-                    batch_row = BatchRow.objects.create(
-                        batch_header_id=batch_header_id,
-                        batch_row_000=candidate_id,
-                        batch_row_001=candidate_person_id,
-                        batch_row_002=candidate_name,
-                        batch_row_003=candidate_party_name,
-                        batch_row_004=candidate_is_top_ticket,
-                        batch_row_005=ctcl_uuid,
-                        batch_row_006=candidate_selection_id
-                    )
-                    number_of_batch_rows += 1
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    status += " EXCEPTION_BATCH_ROW"
-                    handle_exception(e, logger=logger, exception_message=status)
-                    success = False
-
-                    break
-        results = {
-            'success': success,
-            'status': status,
-            'batch_header_id': batch_header_id,
-            'batch_saved': success,
-            'number_of_batch_rows': number_of_batch_rows,
-        }
-        return results
+        # This source data is not used for now. Parsing it for future reference
+        return self.store_vip_xml_for_one_kind(VIP_XML_SOURCE, batch_uri, google_civic_election_id,
+                                               organization_we_vote_id, xml_root, batch_set_id)
 
-    def store_state_data_from_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
-                                  batch_set_id=0):
+    def generate_measure_batch_row_from_xml(self, one_ballot_measure):
         """
-        Retrieves state data from CTCL xml file
-        :param batch_uri:
-        :param google_civic_election_id:
-        :param organization_we_vote_id:
-        :param xml_root:
-        :param batch_set_id
-        :return:
+        Look for relevant child nodes under BallotMeasureContest: id, BallotTitle, BallotSubTitle,
+        ElectoralDistrictId, other::ctcl-uid
+        :param one_ballot_measure:
+        :return: the batch_row values, or None if the minimum required values are missing
         """
-        # This state is not used right now. Parsing it for future reference
-        # Process VIP State data
-        number_of_batch_rows = 0
-        first_line = True
-        success = False
-        status = ''
-        limit_for_testing = 5
-        batch_header_id = 0
-
-        # Look for State and create the batch_header first. State is the direct child node of VipObject
-        # TODO Will this be a single node object or will there be multiple state nodes in a CTCL XML?
-        state_xml_node = xml_root.findall('State')
-        for one_state in state_xml_node:
-            state_name = None
-            if number_of_batch_rows >= limit_for_testing:
-                break
-
-            # look for relevant child nodes under State: id, ocd-id, Name
-            state_id = one_state.attrib['id']
-
-            state_name_node = one_state.find('./Name')
-            if state_name_node is not None:
-                state_name = state_name_node.text
-
-            ocd_id_node = one_state.find("./ExternalIdentifiers/ExternalIdentifier/[Type='ocd-id']")
-            if ocd_id_node is not None:
-                ocd_id = one_state.find("./ExternalIdentifiers/ExternalIdentifier/[Type='ocd-id']/Value").text
-            else:
-                ocd_id = ''
-
-            if first_line:
-                first_line = False
-                try:
-                    batch_header = BatchHeader.objects.create(
-                        batch_header_column_000='id',
-                        batch_header_column_001='Name',
-                        batch_header_column_002='other::ocd-id',
-                    )
-                    batch_header_id = batch_header.id
-
-                    if positive_value_exists(batch_header_id):
-                        # Save an initial BatchHeaderMap
-                        batch_header_map = BatchHeaderMap.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_000='state_id',
-                            batch_header_map_001='state_name',
-                            batch_header_map_002='ocd_id',
-                        )
-                        batch_header_map_id = batch_header_map.id
-                        status += " BATCH_HEADER_MAP_SAVED"
-
-                    if positive_value_exists(batch_header_id) and positive_value_exists(batch_header_map_id):
-                        # Now save the BatchDescription
-                        batch_name = "STATE " + " batch_header_id: " + str(batch_header_id)
-                        batch_description_text = ""
-                        batch_description = BatchDescription.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_id=batch_header_map_id,
-                            batch_name=batch_name,
-                            batch_description_text=batch_description_text,
-                            google_civic_election_id=google_civic_election_id,
-                            kind_of_batch='STATE',
-                            organization_we_vote_id=organization_we_vote_id,
-                            source_uri=batch_uri,
-                            batch_set_id=batch_set_id,
-                        )
-                        status += " BATCH_DESCRIPTION_SAVED"
-                        success = True
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    batch_header_id = 0
-                    status += " EXCEPTION_BATCH_HEADER"
-                    handle_exception(e, logger=logger, exception_message=status)
-                    break
-            if not positive_value_exists(batch_header_id):
-                break
-
-            # check for state_id or name AND ocd_id
-            if positive_value_exists(state_id) and (positive_value_exists(state_name)):
-                try:
-                    batch_row = BatchRow.objects.create(
-                        batch_header_id=batch_header_id,
-                        batch_row_000=state_id,
-                        batch_row_001=state_name,
-                        batch_row_002=ocd_id,
-                    )
-                    number_of_batch_rows += 1
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    status += " EXCEPTION_BATCH_ROW"
-                    handle_exception(e, logger=logger, exception_message=status)
-                    success = False
-
-                    break
-        results = {
-            'success': success,
-            'status': status,
-            'batch_header_id': batch_header_id,
-            'batch_saved': success,
-            'number_of_batch_rows': number_of_batch_rows,
-        }
-        return results
-
-    def store_election_metadata_from_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
-                                         batch_set_id=0):
+        ballot_measure_id = one_ballot_measure.get('id', '')
+        ballot_measure_subtitle = get_vip_xml_node_text(one_ballot_measure, 'BallotSubTitle/Text')
+        ballot_measure_title = get_vip_xml_node_text(one_ballot_measure, 'BallotTitle/Text')
+        electoral_district_id = get_vip_xml_node_text(one_ballot_measure, 'ElectoralDistrictId')
+        ctcl_uuid = get_vip_xml_ctcl_uuid(one_ballot_measure)
+        ballot_measure_name = get_vip_xml_node_text(one_ballot_measure, 'Name')
+
+        # check for measure_id, title OR subtitle or name AND ctcl_uuid
+        if not (positive_value_exists(ballot_measure_id) and positive_value_exists(ctcl_uuid) and
+                (positive_value_exists(ballot_measure_subtitle) or positive_value_exists(ballot_measure_title) or
+                 positive_value_exists(ballot_measure_name))):
+            return None
+        return [ballot_measure_id, ballot_measure_subtitle, ballot_measure_title, electoral_district_id, ctcl_uuid,
+                ballot_measure_name]
+
+    def generate_elected_office_batch_row_from_xml(self, one_elected_office):
         """
-        Retrieves election metadata from CTCL xml file
-        :param batch_uri:
-        :param google_civic_election_id:
-        :param organization_we_vote_id:
-        :param xml_root:
-        :param batch_set_id
-        :return:
+        Look for relevant child nodes under Office: id, Name, Description, ElectoralDistrictId, IsPartisan,
+        other::ctcl-uid
+        :param one_elected_office:
+        :return: the batch_row values, or None if the minimum required values are missing
         """
-        # This election metadata is not used right now. Parsing it for future reference
-        # Process VIP Election metadata
-        success = False
-        status = ''
-        batch_header_id = 0
-
-        # Look for Election and create the batch_header first. Election is the direct child node of VipObject
-        election_xml_node = xml_root.find('Election')
-        election_date_str = None
-
-        # look for relevant child nodes under Election: id, Date, StateId
-        if not election_xml_node:
-            results = {
-                'success': success,
-                'status': "STORE_ELECTION_METADATA_FROM_XML-ELECTION_NODE_NOT_FOUND",
-                'batch_header_id': batch_header_id,
-                'batch_saved': success,
-            }
-            return results
-
-        election_id = election_xml_node.attrib['id']
-
-        election_date_xml_node = election_xml_node.find('./Date')
-        if election_date_xml_node is not None:
-            election_date = election_date_xml_node.text
-
-        state_id_node = election_xml_node.find("./StateId")
-        if state_id_node is not None:
-            state_id = state_id_node.text
-        else:
-            state_id = ''
-
-        try:
-            batch_header = BatchHeader.objects.create(
-                batch_header_column_000='id',
-                batch_header_column_001='Date',
-                batch_header_column_002='StateId',
-            )
-            batch_header_id = batch_header.id
-
-            if positive_value_exists(batch_header_id):
-                # Save an initial BatchHeaderMap
-                batch_header_map = BatchHeaderMap.objects.create(
-                    batch_header_id=batch_header_id,
-                    batch_header_map_000='election_id',
-                    batch_header_map_001='election_date',
-                    batch_header_map_002='state_id',
-                )
-                batch_header_map_id = batch_header_map.id
-                status += " BATCH_HEADER_MAP_SAVED"
-
-            if positive_value_exists(batch_header_id) and positive_value_exists(batch_header_map_id):
-                # Now save the BatchDescription
-                batch_name = "ELECTION " + " batch_header_id: " + str(batch_header_id)
-                batch_description_text = ""
-                batch_description = BatchDescription.objects.create(
-                    batch_header_id=batch_header_id,
-                    batch_header_map_id=batch_header_map_id,
-                    batch_name=batch_name,
-                    batch_description_text=batch_description_text,
-                    google_civic_election_id=google_civic_election_id,
-                    kind_of_batch='ELECTION',
-                    organization_we_vote_id=organization_we_vote_id,
-                    source_uri=batch_uri,
-                    batch_set_id=batch_set_id,
-                )
-                status += " BATCH_DESCRIPTION_SAVED"
-                success = True
-        except Exception as e:
-            # Stop trying to save rows -- break out of the for loop
-            batch_header_id = 0
-            status += " EXCEPTION_BATCH_HEADER"
-            handle_exception(e, logger=logger, exception_message=status)
-
-        # check for state_id or name AND ocd_id
-        if positive_value_exists(election_id) and positive_value_exists(election_date) and \
-                positive_value_exists(state_id):
-            try:
-                batch_row = BatchRow.objects.create(
-                    batch_header_id=batch_header_id,
-                    batch_row_000=election_id,
-                    batch_row_001=election_date,
-                    batch_row_002=state_id,
-                )
-            except Exception as e:
-                # Stop trying to save rows -- break out of the for loop
-                status += " EXCEPTION_BATCH_ROW"
-                handle_exception(e, logger=logger, exception_message=status)
-                success = False
-
-        results = {
-            'success': success,
-            'status': status,
-            'batch_header_id': batch_header_id,
-            'batch_saved': success,
-        }
-        return results
-
-    def store_source_metadata_from_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
-                                         batch_set_id=0):
+        elected_office_id = one_elected_office.get('id', '')
+        elected_office_name = get_vip_xml_node_text(
+            one_elected_office, "./Name/Text/[@language='" + LANGUAGE_CODE_ENGLISH + "']")
+        elected_office_name_es = get_vip_xml_node_text(
+            one_elected_office, "./Name/Text/[@language='" + LANGUAGE_CODE_SPANISH + "']")
+        elected_office_description = get_vip_xml_node_text(
+            one_elected_office, "Description/Text/[@language='" + LANGUAGE_CODE_ENGLISH + "']")
+        elected_office_description_es = get_vip_xml_node_text(
+            one_elected_office, "Description/Text/[@language='" + LANGUAGE_CODE_SPANISH + "']")
+        electoral_district_id = get_vip_xml_node_text(one_elected_office, 'ElectoralDistrictId')
+        elected_office_is_partisan = get_vip_xml_node_text(one_elected_office, 'IsPartisan')
+        ctcl_uuid = get_vip_xml_ctcl_uuid(one_elected_office)
+
+        # check for office_batch_id or electoral_district or name AND ctcl_uuid
+        if not (positive_value_exists(elected_office_id) and positive_value_exists(ctcl_uuid) and
+                (positive_value_exists(electoral_district_id) or positive_value_exists(elected_office_name)) or
+                positive_value_exists(elected_office_name_es)):
+            return None
+        return [elected_office_id, elected_office_name, elected_office_name_es, elected_office_description,
+                elected_office_description_es, electoral_district_id, elected_office_is_partisan, ctcl_uuid]
+
+    def generate_contest_office_batch_row_from_xml(self, one_contest_office):
         """
-        Retrieves source metadata from CTCL xml file
-        :param batch_uri:
-        :param google_civic_election_id:
-        :param organization_we_vote_id:
-        :param xml_root:
-        :param batch_set_id
-        :return:
+        Look for relevant child nodes under CandidateContest: id, Name, OfficeId, ElectoralDistrictId,
+        other::ctcl-uid, VotesAllowed, NumberElected, BallotSelectionIds
+        :param one_contest_office:
+        :return: the batch_row values, ending with the list of BallotSelectionIds that still need to be translated
+          with the CandidateSelection entries. None if the minimum required values are missing.
         """
-        # This source data is not used for now. Parsing it for future reference
-        # Process VIP Source metadata
-        success = False
-        status = ''
-        batch_header_id = 0
-
-        # Look for Source and create the batch_header first. Election is the direct child node of VipObject
-        source_xml_node = xml_root.find('Source')
-        source_date_str = None
-
-        if not source_xml_node:
-            results = {
-                'success': success,
-                'status': "STORE_SOURCE_METADATA_FROM_XML-SOURCE_NODE_NOT_FOUND",
-                'batch_header_id': batch_header_id,
-                'batch_saved': success,
-            }
-            return results
-
-        # look for relevant child nodes under Source: id, DateTime, Name, OrganizationUri, VipId
-        source_id = source_xml_node.attrib['id']
-
-        source_datetime_xml_node = source_xml_node.find('./DateTime')
-        if source_datetime_xml_node is not None:
-            source_datetime = source_datetime_xml_node.text
-
-        source_name_node = source_xml_node.find("./Name")
-        if source_name_node is not None:
-            source_name = source_xml_node.text
-        else:
-            source_name = ''
+        contest_office_id = one_contest_office.get('id', '')
+        contest_office_name = get_vip_xml_node_text(one_contest_office, 'Name')
+        contest_office_number_elected = get_vip_xml_node_text(one_contest_office, 'NumberElected')
+        electoral_district_id = get_vip_xml_node_text(one_contest_office, 'ElectoralDistrictId')
+        contest_office_votes_allowed = get_vip_xml_node_text(one_contest_office, 'VotesAllowed')
+        elected_office_id = get_vip_xml_node_text(one_contest_office, 'OfficeIds')
+        ctcl_uuid = get_vip_xml_ctcl_uuid(one_contest_office)
+        ballot_selection_ids_str = get_vip_xml_node_text(one_contest_office, './BallotSelectionIds')
+        # Assuming that there are maximum 10 ballot selection ids for a given contest office
+        ballot_selection_id_list = ballot_selection_ids_str.split()[:10] if ballot_selection_ids_str else []
+
+        # check for contest_office_batch_id or electoral_district or name AND ctcl_uuid
+        if not (positive_value_exists(contest_office_id) and positive_value_exists(ctcl_uuid) and
+                (positive_value_exists(electoral_district_id) or positive_value_exists(contest_office_name))):
+            return None
+        return [contest_office_id, contest_office_name, elected_office_id, electoral_district_id,
+                contest_office_votes_allowed, contest_office_number_elected, ctcl_uuid, ballot_selection_id_list]
+
+    def generate_politician_batch_row_from_xml(self, one_person):
+        """
+        Look for relevant child nodes under Person: id, FullName, FirstName, LastName, MiddleName, PartyId, Email,
+        PhoneNumber, Website, Twitter, ctcl-uuid
+        :param one_person:
+        :return: the batch_row values with the PartyId where the party name goes, or None if the minimum required
+          values are missing
+        """
+        person_id = one_person.get('id', '')
+        person_full_name = get_vip_xml_node_text(
+            one_person, "./FullName/Text/[@language='" + LANGUAGE_CODE_ENGLISH + "']")
+        person_first_name = get_vip_xml_node_text(one_person, 'FirstName')
+        person_middle_name = get_vip_xml_node_text(one_person, 'MiddleName')
+        person_last_name = get_vip_xml_node_text(one_person, 'LastName')
+        person_party_id = get_vip_xml_node_text(one_person, 'PartyId')
+        person_email_id = get_vip_xml_node_text(one_person, './ContactInformation/Email')
+        person_phone_number = get_vip_xml_node_text(one_person, './ContactInformation/Phone')
+        person_website_url = get_vip_xml_node_text(one_person, "./ContactInformation/Uri/[@annotation='website']")
+        person_facebook_id = get_vip_xml_node_text(one_person, "./ContactInformation/Uri/[@annotation='facebook']")
+        person_twitter_id = get_vip_xml_node_text(one_person, "./ContactInformation/Uri/[@annotation='twitter']")
+        person_youtube_id = get_vip_xml_node_text(one_person, "./ContactInformation/Uri/[@annotation='youtube']")
+        person_googleplus_id = get_vip_xml_node_text(
+            one_person, "./ContactInformation/Uri/[@annotation='googleplus']")
+        ctcl_uuid = get_vip_xml_ctcl_uuid(one_person)
+
+        if not (positive_value_exists(person_id) and positive_value_exists(ctcl_uuid) and
+                (positive_value_exists(person_full_name) or positive_value_exists(person_first_name))):
+            return None
+        return [person_id, person_full_name, person_first_name, person_middle_name, person_last_name,
+                person_party_id, person_email_id, person_phone_number, person_website_url, person_facebook_id,
+                person_twitter_id, person_youtube_id, person_googleplus_id, ctcl_uuid]
+
+    def generate_candidate_batch_row_from_xml(self, one_candidate):
+        """
+        Look for relevant child nodes under Candidate: id, BallotName, personId, PartyId, isTopTicket,
+        other::ctcl-uid, BallotSelectionIds
+        :param one_candidate:
+        :return: the batch_row values with the PartyId where the party name goes, or None if the minimum required
+          values are missing
+        """
+        candidate_id = one_candidate.get('id', '')
+        candidate_selection_id = get_vip_xml_node_text(one_candidate, './BallotSelectionIds')
+        candidate_name = get_vip_xml_node_text(
+            one_candidate, "./BallotName/Text/[@language='" + LANGUAGE_CODE_ENGLISH + "']")
+        candidate_person_id = get_vip_xml_node_text(one_candidate, './PersonId')
+        candidate_party_id = get_vip_xml_node_text(one_candidate, './PartyId')
+        candidate_is_top_ticket = get_vip_xml_node_text(one_candidate, 'IsTopTicket')
+        ctcl_uuid = get_vip_xml_ctcl_uuid(one_candidate)
+
+        # check for candidate_id or candidate_person_id or name AND ctcl_uuid
+        if not (positive_value_exists(candidate_id) and positive_value_exists(ctcl_uuid) and
+                (positive_value_exists(candidate_person_id) or positive_value_exists(candidate_name))):
+            return None
+        return [candidate_id, candidate_person_id, candidate_name, candidate_party_id, candidate_is_top_ticket,
+                ctcl_uuid, candidate_selection_id]
+
+    def generate_state_batch_row_from_xml(self, one_state):
+        """
+        Look for relevant child nodes under State: id, ocd-id, Name
+        :param one_state:
+        :return: the batch_row values, or None if the minimum required values are missing
+        """
+        state_id = one_state.get('id', '')
+        state_name = get_vip_xml_node_text(one_state, './Name')
+        ocd_id = get_vip_xml_node_text(one_state, "./ExternalIdentifiers/ExternalIdentifier/[Type='ocd-id']/Value")
 
-        organization_uri_node = source_xml_node.find("./OrganizationUri")
-        if organization_uri_node is not None:
-            organization_uri = source_xml_node.text
+        if not (positive_value_exists(state_id) and positive_value_exists(state_name)):
+            return None
+        return [state_id, state_name, ocd_id]
 
-        vip_id_node = source_xml_node.find("./VipId")
-        if vip_id_node is not None:
-            vip_id = source_xml_node.text
-        else:
-            vip_id = ''
+    def generate_election_batch_row_from_xml(self, election_xml_node):
+        """
+        Look for relevant child nodes under Election: id, Date, StateId
+        :param election_xml_node:
+        :return: the batch_row values, or None if the minimum required values are missing
+        """
+        election_id = election_xml_node.get('id', '')
+        election_date = get_vip_xml_node_text(election_xml_node, './Date')
+        state_id = get_vip_xml_node_text(election_xml_node, './StateId')
 
-        try:
-            batch_header = BatchHeader.objects.create(
-                batch_header_column_000='id',
-                batch_header_column_001='DateTime',
-                batch_header_column_002='Name',
-                batch_header_column_003='OrganizationUri',
-                batch_header_column_004='VipId',
-            )
-            batch_header_id = batch_header.id
-
-            if positive_value_exists(batch_header_id):
-                # Save an initial BatchHeaderMap
-                batch_header_map = BatchHeaderMap.objects.create(
-                    batch_header_id=batch_header_id,
-                    batch_header_map_000='source_id',
-                    batch_header_map_001='source_datetime',
-                    batch_header_map_002='source_name',
-                    batch_header_map_003='organization_uri',
-                    batch_header_map_004='vip_id'
-                )
-                batch_header_map_id = batch_header_map.id
-                status += " BATCH_HEADER_MAP_SAVED"
-
-            if positive_value_exists(batch_header_id) and positive_value_exists(batch_header_map_id):
-                # Now save the BatchDescription
-                batch_name = "SOURCE " + " batch_header_id: " + str(batch_header_id)
-                batch_description_text = ""
-                batch_description = BatchDescription.objects.create(
-                    batch_header_id=batch_header_id,
-                    batch_header_map_id=batch_header_map_id,
-                    batch_name=batch_name,
-                    batch_description_text=batch_description_text,
-                    google_civic_election_id=google_civic_election_id,
-                    kind_of_batch='SOURCE',
-                    organization_we_vote_id=organization_we_vote_id,
-                    source_uri=batch_uri,
-                    batch_set_id=batch_set_id,
-                )
-                status += " BATCH_DESCRIPTION_SAVED"
-                success = True
-        except Exception as e:
-            # Stop trying to save rows -- break out of the for loop
-            batch_header_id = 0
-            status += " EXCEPTION_BATCH_HEADER"
-            handle_exception(e, logger=logger, exception_message=status)
+        if not (positive_value_exists(election_id) and positive_value_exists(election_date) and
+                positive_value_exists(state_id)):
+            return None
+        return [election_id, election_date, state_id]
 
-        # check for state_id or name AND ocd_id
-        if positive_value_exists(source_id) and positive_value_exists(source_datetime) and \
-                positive_value_exists(source_name) and positive_value_exists(organization_uri):
-            try:
-                batch_row = BatchRow.objects.create(
-                    batch_header_id=batch_header_id,
-                    batch_row_000=source_id,
-                    batch_row_001=source_datetime,
-                    batch_row_002=source_name,
-                    batch_row_003=organization_uri,
-                    batch_row_004=vip_id
-                )
-            except Exception as e:
-                # Stop trying to save rows -- break out of the for loop
-                status += " EXCEPTION_BATCH_ROW"
-                handle_exception(e, logger=logger, exception_message=status)
-                success = False
+    def generate_source_batch_row_from_xml(self, source_xml_node):
+        """
+        Look for relevant child nodes under Source: id, DateTime, Name, OrganizationUri, VipId
+        :param source_xml_node:
+        :return: the batch_row values, or None if the minimum required values are missing
+        """
+        source_id = source_xml_node.get('id', '')
+        source_datetime = get_vip_xml_node_text(source_xml_node, './DateTime')
+        source_name = get_vip_xml_node_text(source_xml_node, './Name')
+        organization_uri = get_vip_xml_node_text(source_xml_node, './OrganizationUri')
+        vip_id = get_vip_xml_node_text(source_xml_node, './VipId')
 
-        results = {
-            'success': success,
-            'status': status,
-            'batch_header_id': batch_header_id,
-            'batch_saved': success,
-        }
-        return results
+        if not (positive_value_exists(source_id) and positive_value_exists(source_datetime) and
+                positive_value_exists(source_name) and positive_value_exists(organization_uri)):
+            return None
+        return [source_id, source_datetime, source_name, organization_uri, vip_id]
 
     def create_batch_set_vip_xml(self, batch_uri, google_civic_election_id, organization_we_vote_id):
         """
@@ -2279,158 +1495,75 @@ class BatchManager(models.Model):
         :param organization_we_vote_id:
         :return:
         """
-        # Retrieve from XML
-        request = urllib.request.urlopen(batch_uri)
-        # xml_data = request.read()
-        # xml_data = xmltodict.parse(xml_data)
-        # # xml_data_list_json = list(xml_data)
-        # structured_json = json.dumps(xml_data)
-
-        xml_tree = ElementTree.parse(request)
-        request.close()
-        xml_root = xml_tree.getroot()
-
         status = ''
         success = False
         number_of_batch_rows = 0
         batch_set_id = 0
 
-        if xml_root:
-
-            # set batch_set_name as file_name
-            batch_set_name_list = batch_uri.split('/')
-            # get the file name
-            batch_set_name = batch_set_name_list[len(batch_set_name_list) - 1]
-            import_date = date.today()
-            # create batch_set object
-            try:
-                batch_set = BatchSet.objects.create(batch_set_description_text="", batch_set_name=batch_set_name,
-                                                       batch_set_source=BATCH_SET_SOURCE_CTCL,
-                                                       google_civic_election_id=google_civic_election_id,
-                                                       source_uri=batch_uri, import_date=import_date)
-                batch_set_id = batch_set.id
-                if positive_value_exists(batch_set_id):
-                    status += " BATCH_SET_SAVED"
-                    success = True
-            except Exception as e:
-                # Stop trying to save rows -- break out of the for loop
-                batch_set_id = 0
-                status += " EXCEPTION_BATCH_SET"
-                handle_exception(e, logger=logger, exception_message=status)
-
-            # import Electoral District
-            electoral_district_list_found = False
-            electoral_district_item_list = xml_root.findall('ElectoralDistrict')
-            if len(electoral_district_item_list):
-                results = electoral_district_import_from_xml_data(electoral_district_item_list)
-                if results['success']:
-                    status += "CREATE_BATCH_SET_ELECTORAL_DISTRICT_IMPORTED"
-                    number_of_batch_rows += results['saved']
-                    # TODO check this whether it should be only saved or updated Electoral districts
-                    number_of_batch_rows += results['updated']
-                    success = True
-                    electoral_district_list_found = True
-
-            # import Party
-            party_list_found = False
-            party_item_list = xml_root.findall('Party')
-            if len(party_item_list):
-                results = party_import_from_xml_data(party_item_list)
-                if results['success']:
-                    status += "CREATE_BATCH_SET_PARTY_IMPORTED"
-                    number_of_batch_rows += results['saved']
-                    number_of_batch_rows += results['updated']
-                    # TODO check this whether it should be only saved or updated Electoral districts
-                    success = True
-                    party_list_found = True
-            # A given data source may not always have electoral district and/or party data, but the referenced electoral
-            # district id or party id might be already present in the master database tables, hence commenting out
-            # below code
-            # if not electoral_district_list_found or not party_list_found:
-            #     results = {
-            #         'success': False,
-            #         'status': status,
-            #         'batch_header_id': 0,
-            #         'batch_saved': False,
-            #         'number_of_batch_rows': 0,
-            #     }
-            #     return results
-
-            # look for different data sets in the XML file - ElectedOffice, ContestOffice, Candidate, Politician,
-            # Measure
-            results = self.store_elected_office_xml(batch_uri, google_civic_election_id, organization_we_vote_id,
-                                                    xml_root, batch_set_id)
-            if results['success']:
-                # Elected Office data found
-                status += 'CREATE_BATCH_SET_ELECTED_OFFICE_DATA_FOUND'
-                number_of_batch_rows += results['number_of_batch_rows']
-
-            results = create_candidate_selection_rows(xml_root, batch_set_id)
-            if results['success']:
-                # Elected Office data found
-                status += 'CREATE_BATCH_SET_CANDIDATE_SELECTION_DATA_FOUND'
-                number_of_batch_rows += results['number_of_batch_rows']
-
-            results = self.store_contest_office_xml(batch_uri, google_civic_election_id, organization_we_vote_id,
-                                                    xml_root, batch_set_id)
-            if results['success']:
-                # Contest Office data found
-                status += 'CREATE_BATCH_SET_CONTEST_OFFICE_DATA_FOUND'
-                number_of_batch_rows += results['number_of_batch_rows']
-
-            results = self.store_politician_xml(batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
-                                                batch_set_id)
-            if results['success']:
-                # Politician data found
-                status += 'CREATE_BATCH_SET_POLITICIAN_DATA_FOUND'
-                number_of_batch_rows += results['number_of_batch_rows']
-
-            results = self.store_candidate_xml(batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
-                                               batch_set_id)
-            if results['success']:
-                # Candidate data found
-                status += 'CREATE_BATCH_SET_CANDIDATE_DATA_FOUND'
-                number_of_batch_rows += results['number_of_batch_rows']
-
-            results = self.store_measure_xml(batch_uri, google_civic_election_id, organization_we_vote_id, xml_root,
-                                             batch_set_id)
-            if results['success']:
-                # Measure data found
-                status += 'CREATE_BATCH_SET_MEASURE_DATA_FOUND'
-                number_of_batch_rows += results['number_of_batch_rows']
+        # set batch_set_name as file_name
+        batch_set_name_list = batch_uri.split('/')
+        # get the file name
+        batch_set_name = batch_set_name_list[len(batch_set_name_list) - 1]
+        import_date = date.today()
+        # create batch_set object
+        try:
+            batch_set = BatchSet.objects.create(batch_set_description_text="", batch_set_name=batch_set_name,
+                                                batch_set_source=BATCH_SET_SOURCE_CTCL,
+                                                google_civic_election_id=google_civic_election_id,
+                                                source_uri=batch_uri, import_date=import_date)
+            batch_set_id = batch_set.id
+            if positive_value_exists(batch_set_id):
+                status += " BATCH_SET_SAVED"
                 success = True
+        except Exception as e:
+            # Stop trying to save rows -- break out of the for loop
+            batch_set_id = 0
+            status += " EXCEPTION_BATCH_SET"
+            handle_exception(e, logger=logger, exception_message=status)
 
-            results = self.store_state_data_from_xml(batch_uri, google_civic_election_id, organization_we_vote_id,
-                                                     xml_root, batch_set_id)
+        # Read the XML one element at a time, and look for all of the different data sets in one pass -
+        # ElectoralDistrict, Party, ElectedOffice, CandidateSelection, ContestOffice, Candidate, Politician, Measure,
+        # State, Election, Source
+        kind_of_batch_list = [VIP_XML_ELECTORAL_DISTRICT, VIP_XML_PARTY, ELECTED_OFFICE, VIP_XML_CANDIDATE_SELECTION,
+                              CONTEST_OFFICE, POLITICIAN, CANDIDATE, MEASURE, VIP_XML_STATE, VIP_XML_ELECTION,
+                              VIP_XML_SOURCE]
+        request = urllib.request.urlopen(batch_uri)
+        vip_xml_importer = VipXmlBatchImporter(batch_uri, google_civic_election_id, organization_we_vote_id,
+                                               batch_set_id, kind_of_batch_list)
+        try:
+            results_by_kind = vip_xml_importer.import_elements(iterate_vip_xml_top_level_elements(request))
+        finally:
+            request.close()
+
+        # A given data source may not always have electoral district and/or party data, but the referenced electoral
+        # district id or party id might be already present in the master database tables
+        for kind_of_batch, status_when_found in (
+                (VIP_XML_ELECTORAL_DISTRICT, "CREATE_BATCH_SET_ELECTORAL_DISTRICT_IMPORTED"),
+                (VIP_XML_PARTY, "CREATE_BATCH_SET_PARTY_IMPORTED"),
+                (ELECTED_OFFICE, "CREATE_BATCH_SET_ELECTED_OFFICE_DATA_FOUND"),
+                (VIP_XML_CANDIDATE_SELECTION, "CREATE_BATCH_SET_CANDIDATE_SELECTION_DATA_FOUND"),
+                (CONTEST_OFFICE, "CREATE_BATCH_SET_CONTEST_OFFICE_DATA_FOUND"),
+                (POLITICIAN, "CREATE_BATCH_SET_POLITICIAN_DATA_FOUND"),
+                (CANDIDATE, "CREATE_BATCH_SET_CANDIDATE_DATA_FOUND"),
+                (MEASURE, "CREATE_BATCH_SET_MEASURE_DATA_FOUND"),
+                (VIP_XML_STATE, "CREATE_BATCH_SET_STATE_DATA_FOUND"),
+                (VIP_XML_ELECTION, "CREATE_BATCH_SET_ELECTION_METADATA_FOUND"),
+                (VIP_XML_SOURCE, "CREATE_BATCH_SET_SOURCE_METADATA_FOUND")):
+            results = results_by_kind[kind_of_batch]
             if results['success']:
-                # Measure data found
-                status += 'CREATE_BATCH_SET_STATE_DATA_FOUND'
+                status += status_when_found
                 number_of_batch_rows += results['number_of_batch_rows']
                 success = True
 
-            results = self.store_election_metadata_from_xml(batch_uri, google_civic_election_id,
-                                                            organization_we_vote_id, xml_root, batch_set_id)
-            if results['success']:
-                # Measure data found
-                status += 'CREATE_BATCH_SET_ELECTION_METADATA_FOUND'
-                number_of_batch_rows += 1
-                success = True
-            results = self.store_source_metadata_from_xml(batch_uri, google_civic_election_id, organization_we_vote_id,
-                                                          xml_root, batch_set_id)
-            if results['success']:
-                # Measure data found
-                status += 'CREATE_BATCH_SET_SOURCE_METADATA_FOUND'
-                number_of_batch_rows += 1
-                success = True
-            else:
-                results = {
-                    'success': False,
-                    'status': '',
-                    'batch_header_id': 0,
-                    'batch_saved': False,
-                    'number_of_batch_rows': 0,
-                }
-                return results
+        if not results_by_kind[VIP_XML_SOURCE]['success']:
+            results = {
+                'success': False,
+                'status': status + results_by_kind[VIP_XML_SOURCE]['status'],
+                'batch_header_id': 0,
+                'batch_saved': False,
+                'number_of_batch_rows': 0,
+            }
+            return results
 
         results = {
             'success':                  success,
@@ -2567,6 +1700,411 @@ class BatchManager(models.Model):
         return state_code
 
 
+class VipXmlBatchWriter(object):
+    """
+    Creates the batch for one kind of VIP XML element. The BatchHeader, BatchHeaderMap and BatchDescription are
+    created when the first element of this kind arrives, and the BatchRow entries are saved in bulk.
+    """
+
+    def __init__(self, kind_of_batch, batch_uri, google_civic_election_id, organization_we_vote_id, batch_set_id=0,
+                 finish_row_function=None):
+        """
+        :param kind_of_batch: one of the keys of VIP_XML_BATCH_DEFINITIONS
+        :param batch_uri:
+        :param google_civic_election_id:
+        :param organization_we_vote_id:
+        :param batch_set_id:
+        :param finish_row_function: If the row values can't be completed until the whole document has been read,
+          the rows are written to a temporary file until finish, and then passed through this function a chunk at a
+          time
+        """
+        self.kind_of_batch = kind_of_batch
+        self.batch_uri = batch_uri
+        self.google_civic_election_id = google_civic_election_id
+        self.organization_we_vote_id = organization_we_vote_id
+        self.batch_set_id = batch_set_id
+        self.finish_row_function = finish_row_function
+        self.batch_manager = BatchManager()
+        self.batch_header_id = 0
+        self.batch_header_attempted = False
+        self.batch_row_list = []
+        self.unfinished_row_file = None
+        self.number_of_rows_accepted = 0
+        self.number_of_batch_rows = 0
+        self.import_started = time.time()
+        self.stopped = False
+        self.success = False
+        self.status = ''
+
+    def is_full(self):
+        return positive_value_exists(VIP_XML_ROWS_PER_KIND_LIMIT) and \
+            self.number_of_rows_accepted >= VIP_XML_ROWS_PER_KIND_LIMIT
+
+    def create_batch_header(self):
+        self.batch_header_attempted = True
+        batch_definition = VIP_XML_BATCH_DEFINITIONS[self.kind_of_batch]
+        batch_header_values = {}
+        for index, header_column in enumerate(batch_definition['header_column_list']):
+            batch_header_values['batch_header_column_{index:03d}'.format(index=index)] = header_column
+        batch_header_map_values = {}
+        for index, header_map in enumerate(batch_definition['header_map_list']):
+            batch_header_map_values['batch_header_map_{index:03d}'.format(index=index)] = header_map
+        try:
+            batch_header = BatchHeader.objects.create(date_import_started=timezone.now(), **batch_header_values)
+            batch_header_map = BatchHeaderMap.objects.create(batch_header_id=batch_header.id, **batch_header_map_values)
+            self.status += " BATCH_HEADER_MAP_SAVED"
+
+            # Now save the BatchDescription
+            batch_name = self.kind_of_batch + "  batch_header_id: " + str(batch_header.id)
+            BatchDescription.objects.create(
+                batch_header_id=batch_header.id,
+                batch_header_map_id=batch_header_map.id,
+                batch_name=batch_name,
+                batch_description_text="",
+                google_civic_election_id=self.google_civic_election_id,
+                kind_of_batch=self.kind_of_batch,
+                organization_we_vote_id=self.organization_we_vote_id,
+                source_uri=self.batch_uri,
+                batch_set_id=self.batch_set_id,
+            )
+            self.status += " BATCH_DESCRIPTION_SAVED"
+            self.batch_header_id = batch_header.id
+            self.success = True
+        except Exception as e:
+            # Stop trying to save rows for this kind of element
+            self.stopped = True
+            self.status += " EXCEPTION_BATCH_HEADER"
+            handle_exception(e, logger=logger, exception_message=self.status)
+
+    def add_row(self, batch_row_values):
+        """
+        :param batch_row_values: None if the element didn't have the minimum required values. We still create the
+          batch header in that case.
+        :return:
+        """
+        if self.stopped:
+            return
+        if not self.batch_header_attempted:
+            self.create_batch_header()
+            if self.stopped:
+                return
+        if batch_row_values is None:
+            return
+
+        self.number_of_rows_accepted += 1
+        if self.finish_row_function is not None:
+            if self.unfinished_row_file is None:
+                self.unfinished_row_file = tempfile.TemporaryFile(mode='w+')
+            self.unfinished_row_file.write(json.dumps(batch_row_values) + "\n")
+            return
+        self.batch_row_list.append(self.generate_batch_row(batch_row_values))
+        if len(self.batch_row_list) >= BATCH_ROW_IMPORT_CHUNK_SIZE:
+            self.save_batch_rows()
+
+    def generate_batch_row(self, batch_row_values):
+        batch_row = BatchRow(batch_header_id=self.batch_header_id)
+        for index, value in enumerate(batch_row_values):
+            setattr(batch_row, 'batch_row_{index:03d}'.format(index=index), value)
+        return batch_row
+
+    def save_batch_rows(self, import_finished=False):
+        results = self.batch_manager.save_batch_row_chunk(
+            self.batch_header_id, self.batch_row_list, self.number_of_batch_rows, self.import_started,
+            import_finished)
+        if results['success']:
+            self.number_of_batch_rows += len(self.batch_row_list)
+        else:
+            self.status += " " + results['status']
+            self.success = False
+            self.stopped = True
+        self.batch_row_list = []
+
+    def replace_values_in_column(self, column_index, replacement_values):
+        """
+        Once the whole document has been read, replace placeholder values (like a PartyId) in one column of the
+        rows we saved
+        :param column_index:
+        :param replacement_values: dict with the placeholder value as key
+        :return:
+        """
+        if not positive_value_exists(self.batch_header_id):
+            return
+        column_name = 'batch_row_{index:03d}'.format(index=column_index)
+        try:
+            for placeholder_value, final_value in replacement_values.items():
+                BatchRow.objects.filter(batch_header_id=self.batch_header_id, **{column_name: placeholder_value})\
+                    .update(**{column_name: final_value})
+        except Exception as e:
+            self.status += " EXCEPTION_BATCH_ROW_UPDATE"
+            handle_exception(e, logger=logger, exception_message=self.status)
+
+    def finish_unfinished_rows(self):
+        if self.unfinished_row_file is None:
+            return
+        try:
+            self.unfinished_row_file.seek(0)
+            unfinished_row_values_list = []
+            for line in self.unfinished_row_file:
+                unfinished_row_values_list.append(json.loads(line))
+                if len(unfinished_row_values_list) >= BATCH_ROW_IMPORT_CHUNK_SIZE:
+                    self.save_finished_rows(unfinished_row_values_list)
+                    unfinished_row_values_list = []
+                    if self.stopped:
+                        return
+            self.save_finished_rows(unfinished_row_values_list)
+        finally:
+            self.unfinished_row_file.close()
+            self.unfinished_row_file = None
+
+    def save_finished_rows(self, unfinished_row_values_list):
+        for batch_row_values in self.finish_row_function(unfinished_row_values_list):
+            self.batch_row_list.append(self.generate_batch_row(batch_row_values))
+        if len(self.batch_row_list) >= BATCH_ROW_IMPORT_CHUNK_SIZE:
+            self.save_batch_rows()
+
+    def finish(self):
+        if positive_value_exists(self.batch_header_id) and not self.stopped:
+            self.finish_unfinished_rows()
+            if not self.stopped:
+                self.save_batch_rows(import_finished=True)
+        elif not self.batch_header_attempted:
+            self.status += " NO_" + VIP_XML_BATCH_DEFINITIONS[self.kind_of_batch]['tag'].upper() + "_FOUND"
+
+        results = {
+            'success':              self.success,
+            'status':               self.status,
+            'batch_header_id':      self.batch_header_id,
+            'batch_saved':          self.success,
+            'number_of_batch_rows': self.number_of_batch_rows,
+        }
+        return results
+
+
+class VipXmlBatchImporter(object):
+    """
+    Imports the direct children of VipObject from a VIP XML document in a single pass. Each element is handed to
+    the handler for its kind as soon as it has been read, and is cleared afterwards. Values that depend on elements
+    later in the document are filled in once the whole document has been read: party names replace the PartyIds in
+    the saved rows, and the CandidateContest rows wait in a temporary file until the CandidateSelection entries they
+    refer to have been saved. The only thing we keep in memory for the whole document is the set of PartyIds used.
+    """
+
+    def __init__(self, batch_uri, google_civic_election_id, organization_we_vote_id, batch_set_id=0,
+                 kind_of_batch_list=None, clear_elements=True):
+        """
+        :param batch_uri:
+        :param google_civic_election_id:
+        :param organization_we_vote_id:
+        :param batch_set_id:
+        :param kind_of_batch_list: The kinds of elements to import. Keys of VIP_XML_BATCH_DEFINITIONS or
+          VIP_XML_REFERENCE_TAGS.
+        :param clear_elements: False when the caller still needs the elements after we are done with them
+        """
+        self.batch_set_id = batch_set_id
+        self.clear_elements = clear_elements
+        self.batch_manager = BatchManager()
+        self.status = ''
+        self.kind_of_batch_by_tag = {}
+        self.writer_by_kind = {}
+        self.generate_row_function_by_kind = {
+            MEASURE:            self.batch_manager.generate_measure_batch_row_from_xml,
+            ELECTED_OFFICE:     self.batch_manager.generate_elected_office_batch_row_from_xml,
+            CONTEST_OFFICE:     self.batch_manager.generate_contest_office_batch_row_from_xml,
+            POLITICIAN:         self.batch_manager.generate_politician_batch_row_from_xml,
+            CANDIDATE:          self.batch_manager.generate_candidate_batch_row_from_xml,
+            VIP_XML_STATE:      self.batch_manager.generate_state_batch_row_from_xml,
+            VIP_XML_ELECTION:   self.batch_manager.generate_election_batch_row_from_xml,
+            VIP_XML_SOURCE:     self.batch_manager.generate_source_batch_row_from_xml,
+        }
+        # PartyIds used by the rows of each kind that has a party column
+        self.party_id_set_by_kind = {}
+        # Elements waiting to be saved in bulk, and the results so far, for the kinds that aren't BatchRows
+        self.reference_element_list_by_kind = {}
+        self.reference_results_by_kind = {}
+        # electoral_district_import_from_xml_data only imports its limit_for_testing, counted across all the chunks
+        self.electoral_districts_processed = 0
+
+        for kind_of_batch in kind_of_batch_list or []:
+            if kind_of_batch in VIP_XML_REFERENCE_TAGS:
+                self.kind_of_batch_by_tag[VIP_XML_REFERENCE_TAGS[kind_of_batch]] = kind_of_batch
+                self.reference_element_list_by_kind[kind_of_batch] = []
+                self.reference_results_by_kind[kind_of_batch] = {
+                    'success':              False,
+                    'status':               '',
+                    'number_of_batch_rows': 0,
+                }
+                continue
+            batch_definition = VIP_XML_BATCH_DEFINITIONS[kind_of_batch]
+            self.kind_of_batch_by_tag[batch_definition['tag']] = kind_of_batch
+            finish_row_function = self.finish_contest_office_rows if kind_of_batch == CONTEST_OFFICE else None
+            self.writer_by_kind[kind_of_batch] = VipXmlBatchWriter(
+                kind_of_batch, batch_uri, google_civic_election_id, organization_we_vote_id, batch_set_id,
+                finish_row_function)
+            if 'party_column_index' in batch_definition:
+                self.party_id_set_by_kind[kind_of_batch] = set()
+
+    def import_elements(self, element_iterator):
+        """
+        :param element_iterator: the direct children of VipObject, like iterate_vip_xml_top_level_elements returns
+        :return: dict with the results for each kind_of_batch
+        """
+        try:
+            for one_element in element_iterator:
+                kind_of_batch = self.kind_of_batch_by_tag.get(one_element.tag)
+                element_kept = False
+                if kind_of_batch in self.writer_by_kind:
+                    self.handle_batch_row_element(kind_of_batch, one_element)
+                elif kind_of_batch is not None:
+                    element_kept = self.handle_reference_element(kind_of_batch, one_element)
+                if self.clear_elements and not element_kept:
+                    one_element.clear()
+        except ElementTree.ParseError as e:
+            self.status += " VIP_XML_PARSE_ERROR"
+            handle_exception(e, logger=logger, exception_message=self.status)
+
+        return self.finish()
+
+    def handle_batch_row_element(self, kind_of_batch, one_element):
+        writer = self.writer_by_kind[kind_of_batch]
+        if writer.is_full() or writer.stopped:
+            return
+        if VIP_XML_BATCH_DEFINITIONS[kind_of_batch].get('first_element_only') and writer.batch_header_attempted:
+            return
+        batch_row_values = self.generate_row_function_by_kind[kind_of_batch](one_element)
+        writer.add_row(batch_row_values)
+        if batch_row_values is not None and kind_of_batch in self.party_id_set_by_kind:
+            party_id = batch_row_values[VIP_XML_BATCH_DEFINITIONS[kind_of_batch]['party_column_index']]
+            if positive_value_exists(party_id):
+                self.party_id_set_by_kind[kind_of_batch].add(party_id)
+
+    def handle_reference_element(self, kind_of_batch, one_element):
+        """
+        Electoral districts, parties and candidate selections are saved in chunks
+        :param kind_of_batch:
+        :param one_element:
+        :return: True if we are holding on to the element until its chunk is saved
+        """
+        if kind_of_batch == VIP_XML_CANDIDATE_SELECTION:
+            candidate_selection_id = one_element.get('id', '')
+            candidate_ids = get_vip_xml_node_text(one_element, './CandidateIds')
+            if not positive_value_exists(candidate_ids):
+                self.reference_results_by_kind[kind_of_batch]['status'] += \
+                    " CANDIDATE_SELECTION_CANDIDATE_IDS_NOT_FOUND"
+                return False
+            self.reference_element_list_by_kind[kind_of_batch].append(CandidateSelection(
+                batch_set_id=self.batch_set_id, candidate_selection_id=candidate_selection_id,
+                contest_office_id=candidate_ids))
+            element_kept = False
+        else:
+            self.reference_element_list_by_kind[kind_of_batch].append(one_element)
+            element_kept = True
+
+        if len(self.reference_element_list_by_kind[kind_of_batch]) >= VIP_XML_REFERENCE_CHUNK_SIZE:
+            self.save_reference_elements(kind_of_batch)
+        return element_kept
+
+    def save_reference_elements(self, kind_of_batch):
+        element_list = self.reference_element_list_by_kind[kind_of_batch]
+        self.reference_element_list_by_kind[kind_of_batch] = []
+        if not len(element_list):
+            return
+        reference_results = self.reference_results_by_kind[kind_of_batch]
+        if kind_of_batch == VIP_XML_CANDIDATE_SELECTION:
+            try:
+                CandidateSelection.objects.bulk_create(element_list)
+                reference_results['number_of_batch_rows'] += len(element_list)
+                reference_results['success'] = True
+                reference_results['status'] = " CANDIDATE_SELECTION_CREATED"
+            except Exception as e:
+                reference_results['status'] += " CANDIDATE_SELECTION_NOT_CREATED"
+                handle_exception(e, logger=logger, exception_message=reference_results['status'])
+            return
+
+        if kind_of_batch == VIP_XML_ELECTORAL_DISTRICT:
+            limit_for_testing = ELECTORAL_DISTRICT_IMPORT_LIMIT_FOR_TESTING - self.electoral_districts_processed
+            if limit_for_testing <= 0:
+                if self.clear_elements:
+                    for one_element in element_list:
+                        one_element.clear()
+                return
+            results = electoral_district_import_from_xml_data(element_list, limit_for_testing=limit_for_testing)
+            self.electoral_districts_processed += results['saved'] + results['updated'] + results['not_processed']
+        else:
+            results = party_import_from_xml_data(element_list)
+        if results['success']:
+            reference_results['success'] = True
+            # TODO check this whether it should be only saved or updated
+            reference_results['number_of_batch_rows'] += results['saved'] + results['updated']
+        reference_results['status'] += " " + results['status']
+        if self.clear_elements:
+            for one_element in element_list:
+                one_element.clear()
+
+    def finish_contest_office_rows(self, batch_row_values_list):
+        """
+        Replace the BallotSelectionIds at the end of each contest office row with the CandidateIds from the matching
+        CandidateSelection entries, which are retrieved with one query for the whole chunk of rows
+        :param batch_row_values_list:
+        :return:
+        """
+        ballot_selection_id_set = set()
+        for batch_row_values in batch_row_values_list:
+            ballot_selection_id_set.update(batch_row_values[-1])
+        candidate_ids_by_candidate_selection_id = {}
+        if positive_value_exists(self.batch_set_id) and ballot_selection_id_set:
+            try:
+                candidate_selection_query = CandidateSelection.objects.filter(
+                    batch_set_id=self.batch_set_id, candidate_selection_id__in=list(ballot_selection_id_set))
+                candidate_ids_by_candidate_selection_id = dict(candidate_selection_query.values_list(
+                    'candidate_selection_id', 'contest_office_id'))
+            except Exception as e:
+                self.status += " CANDIDATE_SELECTION_RETRIEVE_FAILED"
+                handle_exception(e, logger=logger, exception_message=self.status)
+
+        finished_row_values_list = []
+        for batch_row_values in batch_row_values_list:
+            candidate_selection_list = [candidate_ids_by_candidate_selection_id[ballot_selection_id]
+                                        for ballot_selection_id in batch_row_values[-1]
+                                        if ballot_selection_id in candidate_ids_by_candidate_selection_id]
+            candidate_selection_list += [''] * (10 - len(candidate_selection_list))
+            finished_row_values_list.append(batch_row_values[:-1] + candidate_selection_list)
+        return finished_row_values_list
+
+    def finish(self):
+        # Parties and candidate selections need to be saved before we can finish the rows that refer to them
+        for kind_of_batch in self.reference_element_list_by_kind:
+            self.save_reference_elements(kind_of_batch)
+
+        results_by_kind = {}
+        for kind_of_batch, writer in self.writer_by_kind.items():
+            results_by_kind[kind_of_batch] = writer.finish()
+
+        if any(self.party_id_set_by_kind.values()):
+            party_name_by_party_id = {}
+            party_details_list = retrieve_all_party_names_and_ids_api()
+            if party_details_list and not isinstance(party_details_list, dict):
+                for one_party in party_details_list:
+                    party_name_by_party_id[one_party.get('party_id_temp')] = one_party.get('party_name')
+            for kind_of_batch, party_id_set in self.party_id_set_by_kind.items():
+                replacement_values = {party_id: party_name_by_party_id.get(party_id, '') for party_id in party_id_set}
+                self.writer_by_kind[kind_of_batch].replace_values_in_column(
+                    VIP_XML_BATCH_DEFINITIONS[kind_of_batch]['party_column_index'], replacement_values)
+
+        for kind_of_batch, reference_results in self.reference_results_by_kind.items():
+            results_by_kind[kind_of_batch] = {
+                'success':              reference_results['success'],
+                'status':               reference_results['status'],
+                'batch_header_id':      0,
+                'batch_saved':          reference_results['success'],
+                'number_of_batch_rows': reference_results['number_of_batch_rows'],
+            }
+
+        if positive_value_exists(self.status):
+            for results in results_by_kind.values():
+                results['status'] += self.status
+        return results_by_kind
+
+
 class BatchSet(models.Model):
     """
     We call each imported CSV or JSON a “batch set”, and store basic information about it in this table.
@@ -2657,6 +2195,14 @@ class BatchHeader(models.Model):
     batch_header_column_049 = models.TextField(null=True, blank=True)
     batch_header_column_050 = models.TextField(null=True, blank=True)
 
+    # Progress of the CSV import that is creating the BatchRow entries for this header
+    batch_rows_imported = models.PositiveIntegerField(verbose_name="rows committed so far", default=0)
+    import_rows_per_second = models.FloatField(verbose_name="import throughput", default=0)
+    date_import_started = models.DateTimeField(verbose_name="date import started", null=True, blank=True)
+    date_import_progress_updated = models.DateTimeField(verbose_name="date import progress updated", null=True,
+                                                        blank=True)
+    import_finished = models.BooleanField(verbose_name="all rows have been imported", default=False)
+
 
 class BatchHeaderMap(models.Model):
     """
@@ -0,0 +1,207 @@
+# import_export_batches/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.db import DatabaseError
+from django.test import TestCase
+from electoral_district.models import ElectoralDistrict
+from import_export_batches.models import BatchDescription, BatchHeader, BatchManager, BatchRow, CANDIDATE, \
+    CONTEST_OFFICE, MEASURE, VIP_XML_ELECTORAL_DISTRICT, VipXmlBatchImporter
+import os
+import tempfile
+from unittest import mock
+import xml.etree.ElementTree as ElementTree
+
+# The CandidateContest comes before the CandidateSelection entries it refers to
+VIP_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<VipObject>
+  <Source id="src1">
+    <DateTime>2017-10-01T12:00:00</DateTime>
+    <Name>Test Source</Name>
+    <OrganizationUri>https://example.com</OrganizationUri>
+    <VipId>51</VipId>
+  </Source>
+  <Election id="ele1">
+    <Date>2017-11-07</Date>
+    <StateId>st51</StateId>
+  </Election>
+  <State id="st51">
+    <Name>Virginia</Name>
+  </State>
+  <BallotMeasureContest id="bmc1">
+    <BallotSubTitle><Text language="en">Question 1</Text></BallotSubTitle>
+    <BallotTitle><Text language="en">Bond Issue</Text></BallotTitle>
+    <ElectoralDistrictId>ed1</ElectoralDistrictId>
+    <ExternalIdentifiers>
+      <ExternalIdentifier><Type>other</Type><OtherType>ctcl-uuid</OtherType><Value>uuid-bmc1</Value>
+      </ExternalIdentifier>
+    </ExternalIdentifiers>
+    <Name>Bond Issue Question</Name>
+  </BallotMeasureContest>
+  <BallotMeasureContest id="bmc2">
+    <BallotTitle><Text language="en">Measure Without A ctcl-uuid</Text></BallotTitle>
+  </BallotMeasureContest>
+  <CandidateContest id="cc1">
+    <BallotSelectionIds>cs1 cs2 cs9</BallotSelectionIds>
+    <ElectoralDistrictId>ed1</ElectoralDistrictId>
+    <ExternalIdentifiers>
+      <ExternalIdentifier><Type>other</Type><OtherType>ctcl-uuid</OtherType><Value>uuid-cc1</Value>
+      </ExternalIdentifier>
+    </ExternalIdentifiers>
+    <Name>Governor</Name>
+    <NumberElected>1</NumberElected>
+    <OfficeIds>off1</OfficeIds>
+    <VotesAllowed>1</VotesAllowed>
+  </CandidateContest>
+  <CandidateSelection id="cs1">
+    <CandidateIds>can1</CandidateIds>
+  </CandidateSelection>
+  <CandidateSelection id="cs2">
+    <CandidateIds>can2</CandidateIds>
+  </CandidateSelection>
+  <Candidate id="can1">
+    <BallotName><Text language="en">Jane Doe</Text></BallotName>
+    <BallotSelectionIds>cs1</BallotSelectionIds>
+    <ExternalIdentifiers>
+      <ExternalIdentifier><Type>other</Type><OtherType>ctcl-uuid</OtherType><Value>uuid-can1</Value>
+      </ExternalIdentifier>
+    </ExternalIdentifiers>
+    <IsTopTicket>true</IsTopTicket>
+    <PersonId>per1</PersonId>
+  </Candidate>
+</VipObject>
+"""
+
+ELECTORAL_DISTRICT_XML = """<ElectoralDistrict id="ed{number}">
+  <ExternalIdentifiers>
+    <ExternalIdentifier><Type>ocd-id</Type><Value>ocd-division/country:us/state:ca/cd:{number}</Value>
+    </ExternalIdentifier>
+  </ExternalIdentifiers>
+  <Name>District {number}</Name>
+  <Type>congressional</Type>
+</ElectoralDistrict>
+"""
+
+
+class VipXmlBatchTestCase(TestCase):
+
+    def setUp(self):
+        xml_file_descriptor, self.xml_file_path = tempfile.mkstemp(suffix='.xml')
+        with os.fdopen(xml_file_descriptor, 'w') as xml_file:
+            xml_file.write(VIP_XML)
+        self.batch_uri = 'file://' + self.xml_file_path
+
+    def tearDown(self):
+        os.remove(self.xml_file_path)
+
+    def fetch_batch(self, kind_of_batch, number_of_columns):
+        batch_description = BatchDescription.objects.get(kind_of_batch=kind_of_batch)
+        batch_header = BatchHeader.objects.get(id=batch_description.batch_header_id)
+        header_column_list = [getattr(batch_header, 'batch_header_column_{index:03d}'.format(index=index))
+                              for index in range(number_of_columns)]
+        batch_row_values_list = [[getattr(batch_row, 'batch_row_{index:03d}'.format(index=index))
+                                  for index in range(number_of_columns)]
+                                 for batch_row in BatchRow.objects.filter(batch_header_id=batch_header.id)
+                                 .order_by('id')]
+        return batch_header, header_column_list, batch_row_values_list
+
+    def test_batch_set_matches_rows_from_parsed_document(self):
+        """
+        These are the BatchHeader and BatchRow values the store_*_xml methods created when they walked a fully
+        parsed document, one kind of element at a time
+        """
+        batch_manager = BatchManager()
+        results = batch_manager.create_batch_set_vip_xml(self.batch_uri, 1000, 'wv01org1')
+        self.assertTrue(results['success'])
+
+        batch_header, header_column_list, batch_row_values_list = self.fetch_batch(MEASURE, 6)
+        self.assertEqual(header_column_list,
+                         ['id', 'BallotSubTitle', 'BallotTitle', 'ElectoralDistrictId', 'other::ctcl-uuid', 'Name'])
+        self.assertEqual(batch_row_values_list,
+                         [['bmc1', 'Question 1', 'Bond Issue', 'ed1', 'uuid-bmc1', 'Bond Issue Question']])
+        self.assertTrue(batch_header.import_finished)
+        self.assertEqual(batch_header.batch_rows_imported, 1)
+
+        batch_header, header_column_list, batch_row_values_list = self.fetch_batch(CONTEST_OFFICE, 17)
+        self.assertEqual(header_column_list[:8],
+                         ['id', 'Name', 'OfficeIds', 'ElectoralDistrictId', 'VotesAllowed', 'NumberElected',
+                          'other::ctcl-uuid', 'CandidateSelectionId1'])
+        # cs9 isn't in the document, so the CandidateIds we found move up and the rest of the columns are empty
+        self.assertEqual(batch_row_values_list,
+                         [['cc1', 'Governor', 'off1', 'ed1', '1', '1', 'uuid-cc1', 'can1', 'can2'] + [''] * 8])
+        self.assertTrue(batch_header.import_finished)
+
+        batch_header, header_column_list, batch_row_values_list = self.fetch_batch(CANDIDATE, 7)
+        self.assertEqual(batch_row_values_list, [['can1', 'per1', 'Jane Doe', '', 'true', 'uuid-can1', 'cs1']])
+
+    def test_batch_for_one_kind_matches_parsed_document(self):
+        batch_manager = BatchManager()
+        results = batch_manager.create_batch_vip_xml(self.batch_uri, MEASURE, 1000, 'wv01org1')
+        self.assertTrue(results['success'])
+        self.assertEqual(results['number_of_batch_rows'], 1)
+        streamed_batch_row_values_list = self.fetch_batch(MEASURE, 6)[2]
+        BatchDescription.objects.all().delete()
+
+        xml_root = ElementTree.fromstring(VIP_XML)
+        results = batch_manager.store_measure_xml(self.batch_uri, 1000, 'wv01org1', xml_root)
+        self.assertTrue(results['success'])
+        self.assertEqual(self.fetch_batch(MEASURE, 6)[2], streamed_batch_row_values_list)
+        # The caller's parsed document is left as it was
+        self.assertEqual(len(xml_root.findall('BallotMeasureContest')), 2)
+
+    def test_electoral_district_limit_is_counted_across_chunks(self):
+        importer = VipXmlBatchImporter(self.batch_uri, 1000, 'wv01org1',
+                                       kind_of_batch_list=[VIP_XML_ELECTORAL_DISTRICT])
+        for chunk_start in (1, 4, 7):
+            for number in range(chunk_start, chunk_start + 3):
+                importer.handle_reference_element(VIP_XML_ELECTORAL_DISTRICT, ElementTree.fromstring(
+                    ELECTORAL_DISTRICT_XML.format(number=number)))
+            importer.save_reference_elements(VIP_XML_ELECTORAL_DISTRICT)
+        # electoral_district_import_from_xml_data stops at 5 for testing, which is 5 for the whole import and
+        # not 5 for each chunk
+        self.assertEqual(sorted(ElectoralDistrict.objects.values_list('ctcl_id_temp', flat=True)),
+                         ['ed1', 'ed2', 'ed3', 'ed4', 'ed5'])
+
+
+class CsvBatchTestCase(TestCase):
+
+    def create_batch_from_csv_rows(self, number_of_rows):
+        csv_data = [['candidate_name', 'state_code']] + \
+            [['Candidate {number}'.format(number=number), 'va'] for number in range(number_of_rows)]
+        batch_manager = BatchManager()
+        return batch_manager.create_batch_from_csv_data('candidates.csv', iter(csv_data), CANDIDATE, 1000, 'wv01org1')
+
+    def test_rows_are_saved_in_chunks(self):
+        # 7 rows are saved as chunks of 3, 3 and 1. 6 rows end with an empty last chunk.
+        for number_of_rows in [7, 6]:
+            with mock.patch('import_export_batches.models.BATCH_ROW_IMPORT_CHUNK_SIZE', 3):
+                results = self.create_batch_from_csv_rows(number_of_rows)
+            self.assertTrue(results['success'])
+            self.assertEqual(results['number_of_batch_rows'], number_of_rows)
+            batch_header = BatchHeader.objects.get(id=results['batch_header_id'])
+            self.assertEqual(batch_header.batch_header_column_000, 'candidate_name')
+            self.assertEqual(batch_header.batch_rows_imported, number_of_rows)
+            self.assertTrue(batch_header.import_finished)
+            self.assertEqual(list(BatchRow.objects.filter(batch_header_id=batch_header.id).order_by('id')
+                                  .values_list('batch_row_000', 'batch_row_001')),
+                             [('Candidate {number}'.format(number=number), 'va') for number in range(number_of_rows)])
+
+    def test_failed_chunk_leaves_import_unfinished(self):
+        bulk_create_function = BatchRow.objects.bulk_create
+        chunks_saved = []
+
+        def bulk_create_one_chunk(batch_row_list):
+            if chunks_saved:
+                raise DatabaseError("Second chunk fails")
+            chunks_saved.append(len(batch_row_list))
+            return bulk_create_function(batch_row_list)
+
+        with mock.patch('import_export_batches.models.BATCH_ROW_IMPORT_CHUNK_SIZE', 3), \
+                mock.patch.object(BatchRow.objects, 'bulk_create', side_effect=bulk_create_one_chunk):
+            results = self.create_batch_from_csv_rows(7)
+        self.assertEqual(results['number_of_batch_rows'], 3)
+        batch_header = BatchHeader.objects.get(id=results['batch_header_id'])
+        # The progress matches the rows that were committed
+        self.assertEqual(batch_header.batch_rows_imported, 3)
+        self.assertFalse(batch_header.import_finished)
+        self.assertEqual(BatchRow.objects.filter(batch_header_id=batch_header.id).count(), 3)
@@ -13,7 +13,8 @@ from follow.models import FollowIssueList, FOLLOWING
 from issue.models import OrganizationLinkToIssueList
 from voter.models import fetch_voter_we_vote_id_from_voter_device_link
 import wevote_functions.admin
-from wevote_functions.functions import positive_value_exists, process_request_from_master
+from wevote_functions.functions import positive_value_exists
+from wevote_functions.master_sync import import_from_master_server_in_chunks
 
 logger = wevote_functions.admin.get_logger(__name__)
 
@@ -27,17 +28,12 @@ def issues_import_from_master_server(request):
     Get the json data, and either create new entries or update existing
     :return:
     """
-    import_results, structured_json = process_request_from_master(
+    return import_from_master_server_in_chunks(
         request, "Loading Issues from We Vote Master servers",
         ISSUES_SYNC_URL, {
             "key": WE_VOTE_API_KEY,
-        }
-    )
-
-    if import_results['success']:
-        import_results = issues_import_from_structured_json(structured_json)
-
-    return import_results
+        },
+        issues_import_from_structured_json, 'issues')
 
 
 def issues_import_from_structured_json(structured_json):
@@ -370,17 +366,12 @@ def organization_link_to_issue_import_from_master_server(request):
     Get the json data, and either create new entries or update existing
     :return:
     """
-    import_results, structured_json = process_request_from_master(
+    return import_from_master_server_in_chunks(
         request, "Loading Organization's Links To Issues data from We Vote Master servers",
         ORGANIZATION_LINK_TO_ISSUE_SYNC_URL, {
             "key": WE_VOTE_API_KEY,
-        }
-    )
-
-    if import_results['success']:
-        import_results = organization_link_to_issue_import_from_structured_json(structured_json)
-
-    return import_results
+        },
+        organization_link_to_issue_import_from_structured_json, 'organization_link_to_issue')
 
 
 def organization_link_to_issue_import_from_structured_json(structured_json):
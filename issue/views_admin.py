@@ -20,6 +20,7 @@ from position.models import PositionListManager
 from voter.models import voter_has_authority
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, positive_value_exists, get_voter_device_id
+from wevote_functions.master_sync import fetch_sync_out_changed_since, fetch_sync_out_watermark, sync_out_response
 from django.http import HttpResponse
 import json
 
@@ -30,9 +31,13 @@ logger = wevote_functions.admin.get_logger(__name__)
 # This page does not need to be protected.
 def issues_sync_out_view(request):  # issuesSyncOut
     issue_search = request.GET.get('issue_search', '')
+    changed_since = fetch_sync_out_changed_since(request)
+    sync_watermark = fetch_sync_out_watermark()
 
     try:
         issue_list = Issue.objects.all()
+        if changed_since is not None:
+            issue_list = issue_list.filter(date_last_changed__gte=changed_since)
         filters = []
         if positive_value_exists(issue_search):
             new_filter = Q(issue_name__icontains=issue_search)
@@ -54,13 +59,12 @@ def issues_sync_out_view(request):  # issuesSyncOut
 
                 issue_list = issue_list.filter(final_filters)
 
-        issue_list_dict = issue_list.values('we_vote_id', 'issue_name', 'issue_description', 'issue_image_url',
-                                            'issue_followers_count', 'linked_organization_count',
-                                            'we_vote_hosted_image_url_large', 'we_vote_hosted_image_url_medium',
-                                            'we_vote_hosted_image_url_tiny')
-        if issue_list_dict:
-            issue_list_json = list(issue_list_dict)
-            return HttpResponse(json.dumps(issue_list_json), content_type='application/json')
+        response = sync_out_response(request, issue_list, [
+            'we_vote_id', 'issue_name', 'issue_description', 'issue_image_url', 'issue_followers_count',
+            'linked_organization_count', 'we_vote_hosted_image_url_large', 'we_vote_hosted_image_url_medium',
+            'we_vote_hosted_image_url_tiny'], sync_watermark)
+        if response is not None:
+            return response
     except Exception as e:
         pass
 
@@ -335,10 +339,12 @@ def issue_edit_process_view(request):
                 we_vote_parent_image_id = cached_master_we_vote_image.id
                 image_format = cached_master_we_vote_image.we_vote_image_file_location.split(".")[-1]
                 master_we_vote_hosted_image_url = cached_master_we_vote_image.we_vote_image_url
+                # Download the master once, and make all three sizes from it
+                master_image = we_vote_image_manager.retrieve_image_into_memory(master_we_vote_hosted_image_url)
                 cache_large_resized_image_results = cache_resized_image_locally(
                     google_civic_election_id, master_we_vote_hosted_image_url, we_vote_parent_image_id,
                     issue_we_vote_id=issue_we_vote_id, image_format=image_format,
-                    kind_of_image_issue=True, kind_of_image_large=True)
+                    kind_of_image_issue=True, kind_of_image_large=True, source_image=master_image)
                 if cache_large_resized_image_results['success']:
                     cached_resized_image_results = we_vote_image_manager.retrieve_we_vote_image_from_url(
                         issue_we_vote_id=issue_we_vote_id, issue_image_url_https=master_we_vote_hosted_image_url,
@@ -350,7 +356,7 @@ def issue_edit_process_view(request):
                 cache_medium_resized_image_results = cache_resized_image_locally(
                     google_civic_election_id, master_we_vote_hosted_image_url, we_vote_parent_image_id,
                     issue_we_vote_id=issue_we_vote_id, image_format=image_format,
-                    kind_of_image_issue=True, kind_of_image_medium=True)
+                    kind_of_image_issue=True, kind_of_image_medium=True, source_image=master_image)
                 if cache_medium_resized_image_results['success']:
                     cached_resized_image_results = we_vote_image_manager.retrieve_we_vote_image_from_url(
                         issue_we_vote_id=issue_we_vote_id, issue_image_url_https=master_we_vote_hosted_image_url,
@@ -362,7 +368,7 @@ def issue_edit_process_view(request):
                 cache_tiny_resized_image_results = cache_resized_image_locally(
                     google_civic_election_id, master_we_vote_hosted_image_url, we_vote_parent_image_id,
                     issue_we_vote_id=issue_we_vote_id, image_format=image_format,
-                    kind_of_image_issue=True, kind_of_image_tiny=True)
+                    kind_of_image_issue=True, kind_of_image_tiny=True, source_image=master_image)
                 if cache_tiny_resized_image_results['success']:
                     cached_resized_image_results = we_vote_image_manager.retrieve_we_vote_image_from_url(
                         issue_we_vote_id=issue_we_vote_id, issue_image_url_https=master_we_vote_hosted_image_url,
@@ -589,9 +595,13 @@ def organization_link_to_issue_import_from_master_server_view(request):
 # This page does not need to be protected.
 def organization_link_to_issue_sync_out_view(request):  # organizationLinkToIssueSyncOut
     issue_search = request.GET.get('issue_search', '')
+    changed_since = fetch_sync_out_changed_since(request)
+    sync_watermark = fetch_sync_out_watermark()
 
     try:
         issue_list = OrganizationLinkToIssue.objects.all()
+        if changed_since is not None:
+            issue_list = issue_list.filter(date_last_changed__gte=changed_since)
         # filters = []
         # if positive_value_exists(issue_search):
         #     new_filter = Q(issue_name__icontains=issue_search)
@@ -613,11 +623,11 @@ def organization_link_to_issue_sync_out_view(request):  # organizationLinkToIssu
         #
         #         issue_list = issue_list.filter(final_filters)
 
-        issue_list_dict = issue_list.values('issue_we_vote_id', 'organization_we_vote_id',
-                                            'link_active', 'reason_for_link', 'link_blocked', 'reason_link_is_blocked')
-        if issue_list_dict:
-            issue_list_json = list(issue_list_dict)
-            return HttpResponse(json.dumps(issue_list_json), content_type='application/json')
+        response = sync_out_response(request, issue_list, [
+            'issue_we_vote_id', 'organization_we_vote_id', 'link_active', 'reason_for_link', 'link_blocked',
+            'reason_link_is_blocked'], sync_watermark)
+        if response is not None:
+            return response
     except Exception as e:
         pass
 
@@ -27,7 +27,7 @@ class WeVoteTasks(TaskSet):
                                    voter_device_id, name="voterRetrieve")
         response = self.client.get("/apis/v1/voterAddressRetrieve/?voter_device_id=%s" %
                                    voter_device_id, name="voterAddressRetrieve")
-        response = self.client.get("/apis/v1/searchAll/?voter_device_id=%s" %
+        response = self.client.get("/apis/v1/searchAll/?voter_device_id=%s&text_from_search_field=kamala" %
                                    voter_device_id, name="searchAll")
         response = self.client.get("/apis/v1/voterAllPositionsRetrieve/?voter_device_id=%s" %
                                    voter_device_id, name="voterAllPositionsRetrieve")
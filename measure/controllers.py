@@ -12,8 +12,8 @@ import json
 from position.controllers import update_all_position_details_from_contest_measure
 import requests
 import wevote_functions.admin
-from wevote_functions.functions import convert_state_code_to_state_text, positive_value_exists, \
-    process_request_from_master
+from wevote_functions.functions import convert_state_code_to_state_text, positive_value_exists
+from wevote_functions.master_sync import import_from_master_server_in_chunks
 
 logger = wevote_functions.admin.get_logger(__name__)
 
@@ -111,40 +111,46 @@ def measures_import_from_master_server(request, google_civic_election_id, state_
     Get the json data, and either create new entries or update existing
     :return:
     """
-    import_results, structured_json = process_request_from_master(
+    duplicate_index_by_election = {}
+
+    def import_measures_chunk(structured_json):
+        results = filter_measures_structured_json_for_local_duplicates(structured_json, duplicate_index_by_election)
+        import_results = measures_import_from_structured_json(results['structured_json'])
+        import_results['duplicates_removed'] = results['duplicates_removed']
+        return import_results
+
+    import_results = import_from_master_server_in_chunks(
         request, "Loading Measures from We Vote Master servers",
         MEASURES_SYNC_URL, {
             "key": WE_VOTE_API_KEY,
             "format": 'json',
             "google_civic_election_id": str(google_civic_election_id),
             "state_code": state_code,
-        }
-    )
+        },
+        import_measures_chunk, 'measures')
 
-    if import_results['success']:
-        results = filter_measures_structured_json_for_local_duplicates(structured_json)
-        filtered_structured_json = results['structured_json']
-        duplicates_removed = results['duplicates_removed']
-
-        import_results = measures_import_from_structured_json(filtered_structured_json)
-        import_results['duplicates_removed'] = duplicates_removed
-    else:
+    if not import_results['success']:
         if "MISSING" in import_results['status']:
             import_results['status'] += ", This election may not have any measures."
 
     return import_results
 
 
-def filter_measures_structured_json_for_local_duplicates(structured_json):
+def filter_measures_structured_json_for_local_duplicates(structured_json, duplicate_index_by_election=None):
     """
     With this function, we remove candidates that seem to be duplicates, but have different we_vote_id's.
     We do not check to see if we have a matching office this routine -- that is done elsewhere.
     :param structured_json:
+    :param duplicate_index_by_election: when importing in chunks, pass the same dict with each chunk so we only load
+     the local entries once
     :return:
     """
     duplicates_removed = 0
     filtered_structured_json = []
     measure_list_manager = ContestMeasureList()
+    # We load the local measures for each election once, instead of running a query for every incoming measure
+    if duplicate_index_by_election is None:
+        duplicate_index_by_election = {}
     for one_measure in structured_json:
         measure_title = one_measure['measure_title'] if 'measure_title' in one_measure else ''
         we_vote_id = one_measure['we_vote_id'] if 'we_vote_id' in one_measure else ''
@@ -157,11 +163,14 @@ def filter_measures_structured_json_for_local_duplicates(structured_json):
         # Check to see if there is an entry that matches in all critical ways, minus the we_vote_id
         we_vote_id_from_master = we_vote_id
 
-        results = measure_list_manager.retrieve_possible_duplicate_measures(
-            measure_title, google_civic_election_id, measure_url, maplight_id, vote_smart_id,
-            we_vote_id_from_master)
+        election_key = str(google_civic_election_id)
+        if election_key not in duplicate_index_by_election:
+            duplicate_index_by_election[election_key] = \
+                measure_list_manager.retrieve_possible_duplicate_measures_index(google_civic_election_id)
 
-        if results['measure_list_found']:
+        if measure_list_manager.is_possible_duplicate_measure(
+                duplicate_index_by_election[election_key], measure_title, measure_url, maplight_id, vote_smart_id,
+                we_vote_id_from_master):
             # There seems to be a duplicate already in this database using a different we_vote_id
             duplicates_removed += 1
         else:
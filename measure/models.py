@@ -8,7 +8,8 @@ from exception.models import handle_exception, handle_record_found_more_than_one
 from wevote_settings.models import fetch_next_we_vote_id_contest_measure_integer, \
     fetch_next_we_vote_id_measure_campaign_integer, fetch_site_unique_id_prefix
 import wevote_functions.admin
-from wevote_functions.functions import convert_to_int, extract_state_from_ocd_division_id, positive_value_exists
+from wevote_functions.functions import canonicalize_we_vote_id, canonicalize_we_vote_id_list, convert_to_int, \
+    extract_state_from_ocd_division_id, fetch_duplicate_index_value, LocalDuplicateIndex, positive_value_exists
 
 
 logger = wevote_functions.admin.get_logger(__name__)
@@ -71,6 +72,8 @@ class ContestMeasure(models.Model):
     ballotpedia_photo_url = models.URLField(verbose_name='url of ballotpedia logo', blank=True, null=True)
     ctcl_uuid = models.CharField(verbose_name="ctcl uuid", max_length=80, null=True, blank=True)
 
+    date_last_changed = models.DateTimeField(verbose_name='date last changed', null=True, auto_now=True)
+
     def get_measure_state(self):
         if positive_value_exists(self.state_code):
             return self.state_code
@@ -417,6 +420,18 @@ class ContestMeasureManager(models.Model):
 
         return contest_measure_id
 
+    def fetch_contest_measure_id_dict_from_we_vote_id_list(self, contest_measure_we_vote_id_list):
+        """
+        Like fetch_contest_measure_id_from_we_vote_id, for a list of measures in one query
+        :param contest_measure_we_vote_id_list:
+        :return: contest_measure_we_vote_id -> contest_measure_id, for the measures we have in this database
+        """
+        contest_measure_we_vote_id_list = canonicalize_we_vote_id_list(contest_measure_we_vote_id_list)
+        if not contest_measure_we_vote_id_list:
+            return {}
+        return dict(ContestMeasure.objects.filter(we_vote_id__in=contest_measure_we_vote_id_list)
+                    .values_list('we_vote_id', 'id'))
+
     def fetch_state_code_from_we_vote_id(self, contest_measure_we_vote_id):
         """
         Take in contest_measure_we_vote_id and return return the state_code
@@ -715,3 +730,48 @@ class ContestMeasureList(models.Model):
             'measure_list':             measure_list_objects,
         }
         return results
+
+    def retrieve_possible_duplicate_measures_index(self, google_civic_election_id):
+        """
+        Load every measure in this election into a LocalDuplicateIndex, so is_possible_duplicate_measure can do the
+        retrieve_possible_duplicate_measures check without a query per measure
+        :param google_civic_election_id:
+        :return:
+        """
+        duplicate_index = LocalDuplicateIndex()
+        try:
+            measure_queryset = ContestMeasure.objects.filter(google_civic_election_id=google_civic_election_id)
+            for we_vote_id, measure_title, measure_url, maplight_id, vote_smart_id in measure_queryset.values_list(
+                    'we_vote_id', 'measure_title', 'measure_url', 'maplight_id', 'vote_smart_id').iterator():
+                duplicate_index.add_entry([
+                    ('measure_title', fetch_duplicate_index_value(measure_title)),
+                    ('measure_url', fetch_duplicate_index_value(measure_url)),
+                    ('maplight_id', fetch_duplicate_index_value(maplight_id, False)),
+                    ('vote_smart_id', fetch_duplicate_index_value(vote_smart_id, False)),
+                ], canonicalize_we_vote_id(we_vote_id))
+        except Exception as e:
+            handle_exception(e, logger=logger, exception_message="retrieve_possible_duplicate_measures_index failed")
+        return duplicate_index
+
+    def is_possible_duplicate_measure(self, duplicate_index, measure_title, measure_url, maplight_id, vote_smart_id,
+                                      we_vote_id_from_master=''):
+        """
+        The same test as retrieve_possible_duplicate_measures, against an index from
+        retrieve_possible_duplicate_measures_index
+        """
+        key_list = []
+        if positive_value_exists(measure_title):
+            key_list.append(('measure_title', fetch_duplicate_index_value(measure_title)))
+        if positive_value_exists(measure_url):
+            key_list.append(('measure_url', fetch_duplicate_index_value(measure_url)))
+        if positive_value_exists(maplight_id):
+            key_list.append(('maplight_id', fetch_duplicate_index_value(maplight_id, False)))
+        if positive_value_exists(vote_smart_id):
+            key_list.append(('vote_smart_id', fetch_duplicate_index_value(vote_smart_id, False)))
+        if not len(key_list):
+            key_list.append(LocalDuplicateIndex.ANY_ENTRY)
+
+        identity_to_ignore = canonicalize_we_vote_id(we_vote_id_from_master) \
+            if positive_value_exists(we_vote_id_from_master) else None
+        return duplicate_index.has_duplicate(key_list, identity_to_ignore)
+
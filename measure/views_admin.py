@@ -20,6 +20,7 @@ from position.models import OPPOSE, PositionListManager, SUPPORT
 from voter.models import voter_has_authority
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, positive_value_exists, STATE_CODE_MAP
+from wevote_functions.master_sync import fetch_sync_out_changed_since, fetch_sync_out_watermark, sync_out_response
 from django.http import HttpResponse
 import json
 
@@ -32,27 +33,26 @@ logger = wevote_functions.admin.get_logger(__name__)
 def measures_sync_out_view(request):  # measuresSyncOut
     google_civic_election_id = convert_to_int(request.GET.get('google_civic_election_id', 0))
     state_code = request.GET.get('state_code', '')
+    changed_since = fetch_sync_out_changed_since(request)
+    sync_watermark = fetch_sync_out_watermark()
 
     try:
         contest_measure_list = ContestMeasure.objects.all()
+        if changed_since is not None:
+            contest_measure_list = contest_measure_list.filter(date_last_changed__gte=changed_since)
         if positive_value_exists(google_civic_election_id):
             contest_measure_list = contest_measure_list.filter(google_civic_election_id=google_civic_election_id)
         if positive_value_exists(state_code):
             contest_measure_list = contest_measure_list.filter(state_code__iexact=state_code)
         # serializer = ContestMeasureSerializer(contest_measure_list, many=True)
         # return Response(serializer.data)
-        contest_measure_list_dict = contest_measure_list.values('we_vote_id', 'maplight_id', 'vote_smart_id',
-                                                                'measure_title', 'measure_subtitle',
-                                                                'measure_text', 'measure_url',
-                                                                'google_civic_election_id', 'ocd_division_id',
-                                                                'primary_party', 'district_name',
-                                                                'district_scope', 'district_id', 'state_code',
-                                                                'wikipedia_page_id', 'wikipedia_page_title',
-                                                                'wikipedia_photo_url', 'ballotpedia_page_title',
-                                                                'ballotpedia_photo_url')
-        if contest_measure_list_dict:
-            contest_measure_list_json = list(contest_measure_list_dict)
-            return HttpResponse(json.dumps(contest_measure_list_json), content_type='application/json')
+        response = sync_out_response(request, contest_measure_list, [
+            'we_vote_id', 'maplight_id', 'vote_smart_id', 'measure_title', 'measure_subtitle', 'measure_text',
+            'measure_url', 'google_civic_election_id', 'ocd_division_id', 'primary_party', 'district_name',
+            'district_scope', 'district_id', 'state_code', 'wikipedia_page_id', 'wikipedia_page_title',
+            'wikipedia_photo_url', 'ballotpedia_page_title', 'ballotpedia_photo_url'], sync_watermark)
+        if response is not None:
+            return response
     except Exception as e:
         pass
 
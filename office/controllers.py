@@ -11,7 +11,8 @@ import json
 from position.controllers import update_all_position_details_from_contest_office
 import requests
 import wevote_functions.admin
-from wevote_functions.functions import positive_value_exists, process_request_from_master
+from wevote_functions.functions import positive_value_exists
+from wevote_functions.master_sync import import_from_master_server_in_chunks
 
 logger = wevote_functions.admin.get_logger(__name__)
 
@@ -35,37 +36,40 @@ def offices_import_from_master_server(request, google_civic_election_id='', stat
     Get the json data, and either create new entries or update existing
     :return:
     """
+    duplicate_index_by_election = {}
+
+    def import_offices_chunk(structured_json):
+        results = filter_offices_structured_json_for_local_duplicates(structured_json, duplicate_index_by_election)
+        import_results = offices_import_from_structured_json(results['structured_json'])
+        import_results['duplicates_removed'] = results['duplicates_removed']
+        return import_results
+
     # Request json file from We Vote servers
-    import_results, structured_json = process_request_from_master(
+    return import_from_master_server_in_chunks(
         request, "Loading Contest Offices from We Vote Master servers",
         OFFICES_SYNC_URL, {
             "key": WE_VOTE_API_KEY,
             "format": 'json',
             "google_civic_election_id": str(google_civic_election_id),
             "state_code": state_code,
-        }
-    )
-
-    if import_results['success']:
-        results = filter_offices_structured_json_for_local_duplicates(structured_json)
-        filtered_structured_json = results['structured_json']
-        duplicates_removed = results['duplicates_removed']
-
-        import_results = offices_import_from_structured_json(filtered_structured_json)
-        import_results['duplicates_removed'] = duplicates_removed
-
-    return import_results
+        },
+        import_offices_chunk, 'offices')
 
 
-def filter_offices_structured_json_for_local_duplicates(structured_json):
+def filter_offices_structured_json_for_local_duplicates(structured_json, duplicate_index_by_election=None):
     """
     With this function, we remove offices that seem to be duplicates, but have different we_vote_id's
     :param structured_json:
+    :param duplicate_index_by_election: when importing in chunks, pass the same dict with each chunk so we only load
+     the local entries once
     :return:
     """
     office_manager_list = ContestOfficeListManager()
     duplicates_removed = 0
     filtered_structured_json = []
+    # We load the local offices for each election once, instead of running a query for every incoming office
+    if duplicate_index_by_election is None:
+        duplicate_index_by_election = {}
     for one_office in structured_json:
         google_civic_election_id = one_office['google_civic_election_id'] \
             if 'google_civic_election_id' in one_office else 0
@@ -93,10 +97,13 @@ def filter_offices_structured_json_for_local_duplicates(structured_json):
         # Check to see if there is an entry that matches in all critical ways, minus the we_vote_id
         we_vote_id_from_master = we_vote_id
 
-        results = office_manager_list.retrieve_possible_duplicate_offices(google_civic_election_id, state_code,
-                                                                          office_name, we_vote_id_from_master)
+        election_key = str(google_civic_election_id)
+        if election_key not in duplicate_index_by_election:
+            duplicate_index_by_election[election_key] = \
+                office_manager_list.retrieve_possible_duplicate_offices_index(google_civic_election_id)
 
-        if results['office_list_found']:
+        if office_manager_list.is_possible_duplicate_office(duplicate_index_by_election[election_key], state_code,
+                                                            office_name, we_vote_id_from_master):
             # There seems to be a duplicate already in this database using a different we_vote_id
             duplicates_removed += 1
         else:
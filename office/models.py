@@ -8,7 +8,8 @@ from exception.models import handle_exception, handle_record_found_more_than_one
 from wevote_settings.models import fetch_next_we_vote_id_contest_office_integer, fetch_site_unique_id_prefix, \
     fetch_next_we_vote_id_elected_office_integer
 import wevote_functions.admin
-from wevote_functions.functions import convert_to_int, extract_state_from_ocd_division_id, positive_value_exists
+from wevote_functions.functions import canonicalize_we_vote_id, canonicalize_we_vote_id_list, convert_to_int, \
+    extract_state_from_ocd_division_id, fetch_duplicate_index_value, LocalDuplicateIndex, positive_value_exists
 
 
 logger = wevote_functions.admin.get_logger(__name__)
@@ -84,6 +85,8 @@ class ContestOffice(models.Model):
     elected_office_name = models.CharField(verbose_name="name of the elected office", max_length=255, null=True,
                                            blank=True, default=None)
 
+    date_last_changed = models.DateTimeField(verbose_name='date last changed', null=True, auto_now=True)
+
     def get_office_state(self):
         if positive_value_exists(self.state_code):
             return self.state_code
@@ -398,6 +401,18 @@ class ContestOfficeManager(models.Model):
 
         return contest_office_id
 
+    def fetch_contest_office_id_dict_from_we_vote_id_list(self, contest_office_we_vote_id_list):
+        """
+        Like fetch_contest_office_id_from_we_vote_id, for a list of offices in one query
+        :param contest_office_we_vote_id_list:
+        :return: contest_office_we_vote_id -> contest_office_id, for the offices we have in this database
+        """
+        contest_office_we_vote_id_list = canonicalize_we_vote_id_list(contest_office_we_vote_id_list)
+        if not contest_office_we_vote_id_list:
+            return {}
+        return dict(ContestOffice.objects.filter(we_vote_id__in=contest_office_we_vote_id_list)
+                    .values_list('we_vote_id', 'id'))
+
     def fetch_state_code_from_we_vote_id(self, contest_office_we_vote_id):
         """
         Take in contest_office_we_vote_id and return the state_code
@@ -650,6 +665,41 @@ class ContestOfficeListManager(models.Model):
         }
         return results
 
+    def retrieve_possible_duplicate_offices_index(self, google_civic_election_id):
+        """
+        Load every office in this election into a LocalDuplicateIndex, so is_possible_duplicate_office can do the
+        retrieve_possible_duplicate_offices check without a query per office
+        :param google_civic_election_id:
+        :return:
+        """
+        duplicate_index = LocalDuplicateIndex()
+        try:
+            office_queryset = ContestOffice.objects.filter(google_civic_election_id=google_civic_election_id)
+            for we_vote_id, office_name, state_code in office_queryset.values_list(
+                    'we_vote_id', 'office_name', 'state_code').iterator():
+                office_name = fetch_duplicate_index_value(office_name)
+                duplicate_index.add_entry([
+                    ('office_name', office_name),
+                    ('office_name_and_state_code', office_name, fetch_duplicate_index_value(state_code)),
+                ], canonicalize_we_vote_id(we_vote_id))
+        except Exception as e:
+            handle_exception(e, logger=logger, exception_message="retrieve_possible_duplicate_offices_index failed")
+        return duplicate_index
+
+    def is_possible_duplicate_office(self, duplicate_index, state_code, office_name, we_vote_id_from_master=''):
+        """
+        The same test as retrieve_possible_duplicate_offices, against an index from
+        retrieve_possible_duplicate_offices_index
+        """
+        if positive_value_exists(state_code):
+            key = ('office_name_and_state_code', fetch_duplicate_index_value(office_name),
+                   fetch_duplicate_index_value(state_code))
+        else:
+            key = ('office_name', fetch_duplicate_index_value(office_name))
+        identity_to_ignore = canonicalize_we_vote_id(we_vote_id_from_master) \
+            if positive_value_exists(we_vote_id_from_master) else None
+        return duplicate_index.has_duplicate([key], identity_to_ignore)
+
     def retrieve_contest_offices_from_non_unique_identifiers(
             self, contest_office_name, google_civic_election_id, state_code):
         keep_looking_for_duplicates = True
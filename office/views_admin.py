@@ -21,6 +21,7 @@ from position.models import OPPOSE, PositionListManager, SUPPORT
 from voter.models import voter_has_authority
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, positive_value_exists, STATE_CODE_MAP
+from wevote_functions.master_sync import fetch_sync_out_changed_since, fetch_sync_out_watermark, sync_out_response
 from django.http import HttpResponse
 import json
 
@@ -34,9 +35,13 @@ logger = wevote_functions.admin.get_logger(__name__)
 def offices_sync_out_view(request):  # officesSyncOut
     google_civic_election_id = convert_to_int(request.GET.get('google_civic_election_id', 0))
     state_code = request.GET.get('state_code', '')
+    changed_since = fetch_sync_out_changed_since(request)
+    sync_watermark = fetch_sync_out_watermark()
 
     try:
         contest_office_list = ContestOffice.objects.all()
+        if changed_since is not None:
+            contest_office_list = contest_office_list.filter(date_last_changed__gte=changed_since)
         if positive_value_exists(google_civic_election_id):
             contest_office_list = contest_office_list.filter(google_civic_election_id=google_civic_election_id)
         if positive_value_exists(state_code):
@@ -44,16 +49,13 @@ def offices_sync_out_view(request):  # officesSyncOut
         # serializer = ContestOfficeSerializer(contest_office_list, many=True)
         # return Response(serializer.data)
         # get the data using values_list
-        contest_office_list_dict = contest_office_list.values('we_vote_id', 'office_name', 'google_civic_election_id',
-                                                              'ocd_division_id', 'maplight_id', 'ballotpedia_id',
-                                                              'wikipedia_id', 'number_voting_for', 'number_elected',
-                                                              'state_code', 'primary_party', 'district_name',
-                                                              'district_scope', 'district_id', 'contest_level0',
-                                                              'contest_level1', 'contest_level2',
-                                                              'electorate_specifications', 'special', 'state_code')
-        if contest_office_list_dict:
-            contest_office_list_json = list(contest_office_list_dict)
-            return HttpResponse(json.dumps(contest_office_list_json), content_type='application/json')
+        response = sync_out_response(request, contest_office_list, [
+            'we_vote_id', 'office_name', 'google_civic_election_id', 'ocd_division_id', 'maplight_id',
+            'ballotpedia_id', 'wikipedia_id', 'number_voting_for', 'number_elected', 'state_code', 'primary_party',
+            'district_name', 'district_scope', 'district_id', 'contest_level0', 'contest_level1', 'contest_level2',
+            'electorate_specifications', 'special', 'state_code'], sync_watermark)
+        if response is not None:
+            return response
     except ContestOffice.DoesNotExist:
         pass
 
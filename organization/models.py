@@ -12,7 +12,8 @@ from import_export_twitter.functions import retrieve_twitter_user_info
 from twitter.models import TwitterLinkToOrganization, TwitterLinkToVoter, TwitterUserManager
 from voter.models import VoterManager
 import wevote_functions.admin
-from wevote_functions.functions import convert_to_int, extract_twitter_handle_from_text_string, positive_value_exists
+from wevote_functions.functions import canonicalize_we_vote_id, canonicalize_we_vote_id_list, convert_to_int, \
+    extract_twitter_handle_from_text_string, fetch_duplicate_index_value, LocalDuplicateIndex, positive_value_exists
 from wevote_settings.models import fetch_next_we_vote_id_org_integer, fetch_site_unique_id_prefix
 
 CORPORATION = 'C'
@@ -378,6 +379,17 @@ class OrganizationManager(models.Manager):
                 return results['organization_id']
         return 0
 
+    def fetch_organization_id_dict_from_we_vote_id_list(self, we_vote_id_list):
+        """
+        Like fetch_organization_id, for a list of organizations in one query
+        :param we_vote_id_list:
+        :return: we_vote_id -> organization_id, for the organizations we have in this database
+        """
+        we_vote_id_list = canonicalize_we_vote_id_list(we_vote_id_list)
+        if not we_vote_id_list:
+            return {}
+        return dict(Organization.objects.filter(we_vote_id__in=we_vote_id_list).values_list('we_vote_id', 'id'))
+
     def fetch_twitter_id_from_organization_we_vote_id(self, organization_we_vote_id):
         if positive_value_exists(organization_we_vote_id):
             twitter_user_manager = TwitterUserManager()
@@ -1821,6 +1833,47 @@ class OrganizationListManager(models.Manager):
         }
         return results
 
+    def retrieve_possible_duplicate_organizations_index(self):
+        """
+        Load every organization into a LocalDuplicateIndex, so is_possible_duplicate_organization can do the
+        retrieve_possible_duplicate_organizations check without a query per organization
+        :return:
+        """
+        duplicate_index = LocalDuplicateIndex()
+        try:
+            for we_vote_id, organization_name, organization_twitter_handle, vote_smart_id in \
+                    Organization.objects.values_list('we_vote_id', 'organization_name', 'organization_twitter_handle',
+                                                     'vote_smart_id').iterator():
+                duplicate_index.add_entry([
+                    ('organization_name', fetch_duplicate_index_value(organization_name)),
+                    ('organization_twitter_handle', fetch_duplicate_index_value(organization_twitter_handle)),
+                    ('vote_smart_id', fetch_duplicate_index_value(vote_smart_id, False)),
+                ], canonicalize_we_vote_id(we_vote_id))
+        except Exception as e:
+            handle_exception(e, logger=logger,
+                             exception_message="retrieve_possible_duplicate_organizations_index failed")
+        return duplicate_index
+
+    def is_possible_duplicate_organization(self, duplicate_index, organization_name, organization_twitter_handle,
+                                           vote_smart_id, we_vote_id_from_master=''):
+        """
+        The same test as retrieve_possible_duplicate_organizations, against an index from
+        retrieve_possible_duplicate_organizations_index
+        """
+        key_list = []
+        if positive_value_exists(organization_name):
+            key_list.append(('organization_name', fetch_duplicate_index_value(organization_name)))
+        if positive_value_exists(organization_twitter_handle):
+            key_list.append(('organization_twitter_handle', fetch_duplicate_index_value(organization_twitter_handle)))
+        if positive_value_exists(vote_smart_id):
+            key_list.append(('vote_smart_id', fetch_duplicate_index_value(vote_smart_id, False)))
+        if not len(key_list):
+            key_list.append(LocalDuplicateIndex.ANY_ENTRY)
+
+        identity_to_ignore = canonicalize_we_vote_id(we_vote_id_from_master) \
+            if positive_value_exists(we_vote_id_from_master) else None
+        return duplicate_index.has_duplicate(key_list, identity_to_ignore)
+
     def retrieve_organizations_by_organization_we_vote_id_list(self, list_of_organization_we_vote_ids):
         organization_list = []
         organization_list_found = False
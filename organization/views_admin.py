@@ -28,6 +28,7 @@ from voter_guide.models import VoterGuideManager
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, extract_twitter_handle_from_text_string, positive_value_exists, \
     STATE_CODE_MAP
+from wevote_functions.master_sync import fetch_sync_out_changed_since, fetch_sync_out_watermark, sync_out_response
 from django.http import HttpResponse
 import json
 
@@ -45,33 +46,27 @@ logger = wevote_functions.admin.get_logger(__name__)
 # This page does not need to be protected.
 def organizations_sync_out_view(request):  # organizationsSyncOut
     state_served_code = request.GET.get('state_served_code', '')
+    changed_since = fetch_sync_out_changed_since(request)
+    sync_watermark = fetch_sync_out_watermark()
 
     try:
         organization_list = Organization.objects.all()
+        if changed_since is not None:
+            organization_list = organization_list.filter(date_last_changed__gte=changed_since)
         if positive_value_exists(state_served_code):
             organization_list = organization_list.filter(state_served_code__iexact=state_served_code)
-        organization_list_dict = organization_list.values(
-            'we_vote_id', 'organization_name', 'organization_type',
-            'organization_description', 'state_served_code',
-            'organization_website', 'organization_email',
-            'organization_image', 'organization_twitter_handle',
-            'twitter_user_id', 'twitter_followers_count',
-            'twitter_description', 'twitter_location', 'twitter_name',
-            'twitter_profile_image_url_https',
-            'twitter_profile_background_image_url_https',
-            'twitter_profile_banner_url_https', 'organization_facebook',
-            'vote_smart_id', 'organization_contact_name',
-            'organization_address', 'organization_city',
-            'organization_state', 'organization_zip',
-            'organization_phone1', 'organization_phone2',
-            'organization_fax', 'wikipedia_page_title',
-            'wikipedia_page_id', 'wikipedia_photo_url',
-            'wikipedia_thumbnail_url', 'wikipedia_thumbnail_width',
-            'wikipedia_thumbnail_height', 'ballotpedia_page_title',
-            'ballotpedia_photo_url')
-        if organization_list_dict:
-            organization_list_json = list(organization_list_dict)
-            return HttpResponse(json.dumps(organization_list_json), content_type='application/json')
+        response = sync_out_response(request, organization_list, [
+            'we_vote_id', 'organization_name', 'organization_type', 'organization_description', 'state_served_code',
+            'organization_website', 'organization_email', 'organization_image', 'organization_twitter_handle',
+            'twitter_user_id', 'twitter_followers_count', 'twitter_description', 'twitter_location', 'twitter_name',
+            'twitter_profile_image_url_https', 'twitter_profile_background_image_url_https',
+            'twitter_profile_banner_url_https', 'organization_facebook', 'vote_smart_id', 'organization_contact_name',
+            'organization_address', 'organization_city', 'organization_state', 'organization_zip',
+            'organization_phone1', 'organization_phone2', 'organization_fax', 'wikipedia_page_title',
+            'wikipedia_page_id', 'wikipedia_photo_url', 'wikipedia_thumbnail_url', 'wikipedia_thumbnail_width',
+            'wikipedia_thumbnail_height', 'ballotpedia_page_title', 'ballotpedia_photo_url'], sync_watermark)
+        if response is not None:
+            return response
     except Exception as e:
         pass
 
@@ -9,7 +9,8 @@ import glob
 import json
 import requests
 import wevote_functions.admin
-from wevote_functions.functions import positive_value_exists, process_request_from_master
+from wevote_functions.functions import positive_value_exists
+from wevote_functions.master_sync import import_from_master_server_in_chunks
 import xml.etree.ElementTree as MyElementTree
 
 logger = wevote_functions.admin.get_logger(__name__)
@@ -23,35 +24,38 @@ def polling_locations_import_from_master_server(request, state_code):
     Get the json data, and either create new entries or update existing
     :return:
     """
-    import_results, structured_json = process_request_from_master(
+    polling_location_list_manager = PollingLocationListManager()
+    duplicate_index = polling_location_list_manager.retrieve_possible_duplicate_polling_locations_index()
+
+    def import_polling_locations_chunk(structured_json):
+        results = filter_polling_locations_structured_json_for_local_duplicates(structured_json, duplicate_index)
+        import_results = polling_locations_import_from_structured_json(results['structured_json'])
+        import_results['duplicates_removed'] = results['duplicates_removed']
+        return import_results
+
+    return import_from_master_server_in_chunks(
         request, "Loading Polling Locations from We Vote Master servers",
         POLLING_LOCATIONS_SYNC_URL, {
             "key":    WE_VOTE_API_KEY,  # This comes from an environment variable
             "format": 'json',
             "state":  state_code,
-        }
-    )
+        },
+        import_polling_locations_chunk, 'polling_locations')
 
-    if import_results['success']:
-        results = filter_polling_locations_structured_json_for_local_duplicates(structured_json)
-        filtered_structured_json = results['structured_json']
-        duplicates_removed = results['duplicates_removed']
 
-        import_results = polling_locations_import_from_structured_json(filtered_structured_json)
-        import_results['duplicates_removed'] = duplicates_removed
-
-    return import_results
-
-
-def filter_polling_locations_structured_json_for_local_duplicates(structured_json):
+def filter_polling_locations_structured_json_for_local_duplicates(structured_json, duplicate_index=None):
     """
     With this function, we remove polling_locations that seem to be duplicates, but have different we_vote_id's.
     :param structured_json:
+    :param duplicate_index: when importing in chunks, pass the same index with each chunk
     :return:
     """
     duplicates_removed = 0
     filtered_structured_json = []
     polling_location_list_manager = PollingLocationListManager()
+    # One pass over our polling locations, instead of a query for every incoming polling location
+    if duplicate_index is None:
+        duplicate_index = polling_location_list_manager.retrieve_possible_duplicate_polling_locations_index()
     for one_polling_location in structured_json:
         polling_location_id = one_polling_location['polling_location_id'] \
             if 'polling_location_id' in one_polling_location else ''
@@ -64,11 +68,9 @@ def filter_polling_locations_structured_json_for_local_duplicates(structured_jso
         # Check to see if there is an entry that matches in all critical ways, minus the we_vote_id
         we_vote_id_from_master = we_vote_id
 
-        results = polling_location_list_manager.retrieve_possible_duplicate_polling_locations(
-            polling_location_id, state, location_name, line1, zip_long,
-            we_vote_id_from_master)
-
-        if results['polling_location_list_found']:
+        if polling_location_list_manager.is_possible_duplicate_polling_location(
+                duplicate_index, polling_location_id, state, location_name, line1, zip_long,
+                we_vote_id_from_master):
             # There seems to be a duplicate already in this database using a different we_vote_id
             duplicates_removed += 1
         else:
@@ -4,9 +4,10 @@
 
 from django.db import models
 from django.db.models import Q
-from exception.models import handle_record_found_more_than_one_exception
+from exception.models import handle_exception, handle_record_found_more_than_one_exception
 import wevote_functions.admin
-from wevote_functions.functions import extract_zip_formatted_from_zip9, positive_value_exists
+from wevote_functions.functions import canonicalize_we_vote_id, extract_zip_formatted_from_zip9, \
+    fetch_duplicate_index_value, LocalDuplicateIndex, positive_value_exists
 from wevote_settings.models import fetch_next_we_vote_id_polling_location_integer, fetch_site_unique_id_prefix
 
 
@@ -37,6 +38,8 @@ class PollingLocation(models.Model):
     latitude = models.FloatField(null=True, verbose_name='latitude returned from Google')
     longitude = models.FloatField(null=True, verbose_name='longitude returned from Google')
 
+    date_last_changed = models.DateTimeField(verbose_name='date last changed', null=True, auto_now=True)
+
     def get_formatted_zip(self):
         return extract_zip_formatted_from_zip9(self.zip_long)
 
@@ -368,3 +371,56 @@ class PollingLocationListManager(models.Model):
         }
         return results
 
+    def retrieve_possible_duplicate_polling_locations_index(self):
+        """
+        Load every polling location into a LocalDuplicateIndex, so is_possible_duplicate_polling_location can do the
+        retrieve_possible_duplicate_polling_locations check without a query per polling location
+        :return:
+        """
+        duplicate_index = LocalDuplicateIndex()
+        try:
+            for we_vote_id, polling_location_id, state, location_name, line1, zip_long in \
+                    PollingLocation.objects.values_list('we_vote_id', 'polling_location_id', 'state',
+                                                        'location_name', 'line1', 'zip_long').iterator():
+                state = fetch_duplicate_index_value(state)
+                duplicate_index.add_entry([
+                    ('polling_location_id_and_state', fetch_duplicate_index_value(polling_location_id), state),
+                    ('location_name_and_state', fetch_duplicate_index_value(location_name), state),
+                    ('line1_and_zip_long', fetch_duplicate_index_value(line1), fetch_duplicate_index_value(zip_long)),
+                ], canonicalize_we_vote_id(we_vote_id))
+        except Exception as e:
+            handle_exception(e, logger=logger,
+                             exception_message="retrieve_possible_duplicate_polling_locations_index failed")
+        return duplicate_index
+
+    def is_possible_duplicate_polling_location(self, duplicate_index, polling_location_id, state, location_name,
+                                               line1, zip_long, we_vote_id_from_master=''):
+        """
+        The same test as retrieve_possible_duplicate_polling_locations, against an index from
+        retrieve_possible_duplicate_polling_locations_index
+        """
+        if not (positive_value_exists(polling_location_id) or positive_value_exists(location_name)) \
+                and not positive_value_exists(state) \
+                and not positive_value_exists(line1) \
+                and not positive_value_exists(zip_long):
+            return False
+
+        key_list = []
+        if positive_value_exists(polling_location_id) and positive_value_exists(state):
+            key_list.append(('polling_location_id_and_state', fetch_duplicate_index_value(polling_location_id),
+                             fetch_duplicate_index_value(state)))
+        if positive_value_exists(location_name) and positive_value_exists(state):
+            key_list.append(('location_name_and_state', fetch_duplicate_index_value(location_name),
+                             fetch_duplicate_index_value(state)))
+        # Same as retrieve_possible_duplicate_polling_locations, we only use line1 and zip when neither of the above
+        #  are used
+        if not len(key_list) and positive_value_exists(line1) and positive_value_exists(zip_long):
+            key_list.append(('line1_and_zip_long', fetch_duplicate_index_value(line1),
+                             fetch_duplicate_index_value(zip_long)))
+        if not len(key_list):
+            key_list.append(LocalDuplicateIndex.ANY_ENTRY)
+
+        identity_to_ignore = canonicalize_we_vote_id(we_vote_id_from_master) \
+            if positive_value_exists(we_vote_id_from_master) else None
+        return duplicate_index.has_duplicate(key_list, identity_to_ignore)
+
@@ -16,6 +16,7 @@ from exception.models import handle_record_found_more_than_one_exception, handle
     handle_record_not_saved_exception
 from voter.models import voter_has_authority
 from wevote_functions.functions import convert_to_int, positive_value_exists
+from wevote_functions.master_sync import fetch_sync_out_changed_since, fetch_sync_out_watermark, sync_out_response
 import wevote_functions.admin
 from django.http import HttpResponse
 import json
@@ -87,18 +88,21 @@ STATE_LIST_IMPORT = {
 # This page does not need to be protected.
 def polling_locations_sync_out_view(request):  # pollingLocationsSyncOut
     state = request.GET.get('state', '')
+    changed_since = fetch_sync_out_changed_since(request)
+    sync_watermark = fetch_sync_out_watermark()
 
     try:
         polling_location_list = PollingLocation.objects.all()
+        if changed_since is not None:
+            polling_location_list = polling_location_list.filter(date_last_changed__gte=changed_since)
         if positive_value_exists(state):
             polling_location_list = polling_location_list.filter(state__iexact=state)
 
-        polling_location_list_dict = polling_location_list.values('we_vote_id', 'city', 'directions_text', 'line1',
-                                                                  'line2', 'location_name', 'polling_hours_text',
-                                                                  'polling_location_id', 'state', 'zip_long')
-        if polling_location_list_dict:
-            polling_location_list_json = list(polling_location_list_dict)
-            return HttpResponse(json.dumps(polling_location_list_json), content_type='application/json')
+        response = sync_out_response(request, polling_location_list, [
+            'we_vote_id', 'city', 'directions_text', 'line1', 'line2', 'location_name', 'polling_hours_text',
+            'polling_location_id', 'state', 'zip_long'], sync_watermark)
+        if response is not None:
+            return response
     except Exception as e:
         pass
 
@@ -24,8 +24,10 @@ import requests
 from voter.models import fetch_voter_id_from_voter_device_link, VoterManager
 from voter_guide.models import ORGANIZATION, PUBLIC_FIGURE, VOTER, UNKNOWN_VOTER_GUIDE, VoterGuideManager
 import wevote_functions.admin
-from wevote_functions.functions import is_voter_device_id_valid, positive_value_exists, process_request_from_master, \
+from wevote_functions.bulk_upsert import bulk_upsert
+from wevote_functions.functions import canonicalize_we_vote_id, is_voter_device_id_valid, positive_value_exists, \
     convert_to_int
+from wevote_functions.master_sync import import_from_master_server_in_chunks
 
 logger = wevote_functions.admin.get_logger(__name__)
 
@@ -39,7 +41,7 @@ def find_organizations_referenced_in_positions_for_this_voter(voter):
     position_filters = []
     final_position_filters = []
     if positive_value_exists(voter.we_vote_id):
-        new_position_filter = Q(voter_we_vote_id__iexact=voter.we_vote_id)
+        new_position_filter = Q(voter_we_vote_id=canonicalize_we_vote_id(voter.we_vote_id))
         position_filters.append(new_position_filter)
     if positive_value_exists(voter.id):
         new_position_filter = Q(voter_id=voter.id)
@@ -1876,37 +1878,39 @@ def positions_import_from_master_server(request, google_civic_election_id=''):
     Get the json data, and either create new entries or update existing
     :return:
     """
+    duplicate_index_by_election = {}
 
-    import_results, structured_json = process_request_from_master(
+    def import_positions_chunk(structured_json):
+        results = filter_positions_structured_json_for_local_duplicates(structured_json, duplicate_index_by_election)
+        import_results = positions_import_from_structured_json(results['structured_json'])
+        import_results['duplicates_removed'] = results['duplicates_removed']
+        return import_results
+
+    return import_from_master_server_in_chunks(
         request, "Loading Positions from We Vote Master servers",
         POSITIONS_SYNC_URL, {
             "key":                      WE_VOTE_API_KEY,  # This comes from an environment variable
             "format":                   'json',
             "google_civic_election_id": str(google_civic_election_id),
-        }
-    )
-
-    if import_results['success']:
-        results = filter_positions_structured_json_for_local_duplicates(structured_json)
-        filtered_structured_json = results['structured_json']
-        duplicates_removed = results['duplicates_removed']
+        },
+        import_positions_chunk, 'positions')
 
-        import_results = positions_import_from_structured_json(filtered_structured_json)
-        import_results['duplicates_removed'] = duplicates_removed
 
-    return import_results
-
-
-def filter_positions_structured_json_for_local_duplicates(structured_json):
+def filter_positions_structured_json_for_local_duplicates(structured_json, duplicate_index_by_election=None):
     """
     With this function, we remove positions that seem to be duplicates, but have different we_vote_id's.
     We do not check to see if we have a matching office this routine -- that is done elsewhere.
     :param structured_json:
+    :param duplicate_index_by_election: when importing in chunks, pass the same dict with each chunk so we only load
+     the local entries once
     :return:
     """
     duplicates_removed = 0
     filtered_structured_json = []
     position_list_manager = PositionListManager()
+    # We load the local positions for each election once, instead of running a query for every incoming position
+    if duplicate_index_by_election is None:
+        duplicate_index_by_election = {}
     for one_position in structured_json:
         we_vote_id = one_position['we_vote_id'] if 'we_vote_id' in one_position else ''
         google_civic_election_id = \
@@ -1921,12 +1925,14 @@ def filter_positions_structured_json_for_local_duplicates(structured_json):
         # Check to see if there is an entry that matches in all critical ways, minus the we_vote_id
         we_vote_id_from_master = we_vote_id
 
-        results = position_list_manager.retrieve_possible_duplicate_positions(
-            google_civic_election_id, organization_we_vote_id,
-            candidate_campaign_we_vote_id, contest_measure_we_vote_id,
-            we_vote_id_from_master)
+        election_key = str(google_civic_election_id)
+        if election_key not in duplicate_index_by_election:
+            duplicate_index_by_election[election_key] = \
+                position_list_manager.retrieve_possible_duplicate_positions_index(google_civic_election_id)
 
-        if results['position_list_found']:
+        if position_list_manager.is_possible_duplicate_position(
+                duplicate_index_by_election[election_key], organization_we_vote_id,
+                candidate_campaign_we_vote_id, contest_measure_we_vote_id, we_vote_id_from_master):
             # There seems to be a duplicate already in this database using a different we_vote_id
             duplicates_removed += 1
         else:
@@ -1942,9 +1948,26 @@ def filter_positions_structured_json_for_local_duplicates(structured_json):
 
 
 def positions_import_from_structured_json(structured_json):
-    positions_saved = 0
-    positions_updated = 0
+    """
+    Positions are matched on we_vote_id and written with bulk_upsert, a batch at a time
+    :param structured_json:
+    :return:
+    """
     positions_not_processed = 0
+
+    # We need to look up the local organization_id, candidate_campaign_id and contest_measure_id and store them for
+    #  internal use. One query each for the whole list.
+    organization_manager = OrganizationManager()
+    organization_id_dict = organization_manager.fetch_organization_id_dict_from_we_vote_id_list(
+        [one_position.get('organization_we_vote_id') for one_position in structured_json])
+    candidate_campaign_manager = CandidateCampaignManager()
+    candidate_campaign_dict = candidate_campaign_manager.fetch_candidate_campaign_id_and_name_dict_from_we_vote_id_list(
+        [one_position.get('candidate_campaign_we_vote_id') for one_position in structured_json])
+    contest_measure_manager = ContestMeasureManager()
+    contest_measure_id_dict = contest_measure_manager.fetch_contest_measure_id_dict_from_we_vote_id_list(
+        [one_position.get('contest_measure_we_vote_id') for one_position in structured_json])
+
+    position_values_list = []
     for one_position in structured_json:
         # Make sure we have the minimum required variables
         if positive_value_exists(one_position["we_vote_id"]) \
@@ -1964,25 +1987,10 @@ def positions_import_from_structured_json(structured_json):
             positions_not_processed += 1
             continue
 
-        # Check to see if this position had been imported previously
-        position_on_stage_found = False
-        try:
-            if len(one_position["we_vote_id"]) > 0:
-                position_query = PositionEntered.objects.filter(we_vote_id=one_position["we_vote_id"])
-                if len(position_query):
-                    position_on_stage = position_query[0]
-                    position_on_stage_found = True
-        except PositionEntered.DoesNotExist as e:
-            pass
-        except Exception as e:
-            print("exception thrown in positions_import_from_structured_json" + e)
-            pass
-
-        # We need to look up the local organization_id and store for internal use
         organization_id = 0
         if positive_value_exists(one_position["organization_we_vote_id"]):
-            organization_manager = OrganizationManager()
-            organization_id = organization_manager.fetch_organization_id(one_position["organization_we_vote_id"])
+            organization_id = organization_id_dict.get(
+                canonicalize_we_vote_id(one_position["organization_we_vote_id"]), 0)
             if not positive_value_exists(organization_id):
                 # If an id does not exist, then we don't have this organization locally
                 positions_not_processed += 1
@@ -1991,13 +1999,12 @@ def positions_import_from_structured_json(structured_json):
             # TODO Build this for public_figure - skip for now
             continue
 
-        candidate_campaign_manager = CandidateCampaignManager()
         candidate_campaign_id = 0
         contest_measure_id = 0
+        google_civic_candidate_name = ''
         if positive_value_exists(one_position["candidate_campaign_we_vote_id"]):
-            # We need to look up the local candidate_campaign_id and store for internal use
-            candidate_campaign_id = candidate_campaign_manager.fetch_candidate_campaign_id_from_we_vote_id(
-                one_position["candidate_campaign_we_vote_id"])
+            candidate_campaign_id, google_civic_candidate_name = candidate_campaign_dict.get(
+                canonicalize_we_vote_id(one_position["candidate_campaign_we_vote_id"]), (0, ''))
             if not positive_value_exists(candidate_campaign_id):
                 # If an id does not exist, then we don't have this candidate locally
                 print("positions_import did not find a candidate_campaign_id for candidate_campaign_we_vote_id: " +
@@ -2005,9 +2012,8 @@ def positions_import_from_structured_json(structured_json):
                 positions_not_processed += 1
                 continue
         elif positive_value_exists(one_position["contest_measure_we_vote_id"]):
-            contest_measure_manager = ContestMeasureManager()
-            contest_measure_id = contest_measure_manager.fetch_contest_measure_id_from_we_vote_id(
-                one_position["contest_measure_we_vote_id"])
+            contest_measure_id = contest_measure_id_dict.get(
+                canonicalize_we_vote_id(one_position["contest_measure_we_vote_id"]), 0)
             if not positive_value_exists(contest_measure_id):
                 # If an id does not exist, then we don't have this measure locally
                 print("positions_import did not find a contest_measure_id for contest_measure_we_vote_id: " +
@@ -2031,94 +2037,61 @@ def positions_import_from_structured_json(structured_json):
             pass
 
         # Find the google_civic_candidate_name so we have a backup way to link position if the we_vote_id is lost
-        google_civic_candidate_name = one_position["google_civic_candidate_name"] if \
-            "google_civic_candidate_name" in one_position else ''
-        if not positive_value_exists(google_civic_candidate_name):
-            google_civic_candidate_name = candidate_campaign_manager.fetch_google_civic_candidate_name_from_we_vote_id(
-                one_position["candidate_campaign_we_vote_id"])
+        if positive_value_exists(one_position.get("google_civic_candidate_name")):
+            google_civic_candidate_name = one_position["google_civic_candidate_name"]
 
         try:
-            if position_on_stage_found:
-                # Update
-                position_on_stage.we_vote_id = one_position["we_vote_id"]
-                position_on_stage.candidate_campaign_id = candidate_campaign_id
-                position_on_stage.candidate_campaign_we_vote_id = one_position["candidate_campaign_we_vote_id"]
-                position_on_stage.contest_measure_id = contest_measure_id
-                position_on_stage.contest_measure_we_vote_id = one_position["contest_measure_we_vote_id"]
-                position_on_stage.contest_office_id = contest_office_id
-                position_on_stage.contest_office_we_vote_id = one_position["contest_office_we_vote_id"]
-                position_on_stage.date_entered = one_position["date_entered"]
-                position_on_stage.google_civic_candidate_name = google_civic_candidate_name
-                position_on_stage.google_civic_election_id = one_position["google_civic_election_id"]
-                position_on_stage.state_code = one_position["state_code"]
-                position_on_stage.more_info_url = one_position["more_info_url"]
-                position_on_stage.organization_id = organization_id
-                position_on_stage.organization_we_vote_id = one_position["organization_we_vote_id"]
-                position_on_stage.stance = one_position["stance"]
-                position_on_stage.statement_text = one_position["statement_text"]
-                position_on_stage.statement_html = one_position["statement_html"]
-            else:
-                # Create new
-                position_on_stage = PositionEntered(
-                    we_vote_id=one_position["we_vote_id"],
-                    candidate_campaign_id=candidate_campaign_id,
-                    candidate_campaign_we_vote_id=one_position["candidate_campaign_we_vote_id"],
-                    contest_measure_id=contest_measure_id,
-                    contest_measure_we_vote_id=one_position["contest_measure_we_vote_id"],
-                    contest_office_id=contest_office_id,
-                    contest_office_we_vote_id=one_position["contest_office_we_vote_id"],
-                    date_entered=one_position["date_entered"],
-                    google_civic_candidate_name=google_civic_candidate_name,
-                    google_civic_election_id=one_position["google_civic_election_id"],
-                    state_code=one_position["state_code"],
-                    more_info_url=one_position["more_info_url"],
-                    organization_id=organization_id,
-                    organization_we_vote_id=one_position["organization_we_vote_id"],
-                    stance=one_position["stance"],
-                    statement_html=one_position["statement_html"],
-                    statement_text=one_position["statement_text"],
-                )
-
-            position_on_stage.ballot_item_display_name = one_position["ballot_item_display_name"]
-            position_on_stage.ballot_item_image_url_https = one_position["ballot_item_image_url_https"]
-            position_on_stage.ballot_item_twitter_handle = one_position["ballot_item_twitter_handle"]
-            position_on_stage.from_scraper = one_position["from_scraper"]
-            position_on_stage.date_last_changed = one_position["date_last_changed"]
-            position_on_stage.organization_certified = one_position["organization_certified"]
-            position_on_stage.politician_id = politician_id
-            position_on_stage.politician_we_vote_id = one_position["politician_we_vote_id"]
-            position_on_stage.public_figure_we_vote_id = one_position["public_figure_we_vote_id"]
-            position_on_stage.speaker_display_name = one_position["speaker_display_name"]
-            position_on_stage.speaker_image_url_https = one_position["speaker_image_url_https"]
-            position_on_stage.speaker_twitter_handle = one_position["speaker_twitter_handle"]
-            position_on_stage.tweet_source_id = one_position["tweet_source_id"]
-            position_on_stage.twitter_user_entered_position = one_position["twitter_user_entered_position"]
-            position_on_stage.volunteer_certified = one_position["volunteer_certified"]
-            position_on_stage.vote_smart_rating = one_position["vote_smart_rating"]
-            position_on_stage.vote_smart_rating_id = one_position["vote_smart_rating_id"]
-            position_on_stage.vote_smart_rating_name = one_position["vote_smart_rating_name"]
-            position_on_stage.vote_smart_time_span = one_position["vote_smart_time_span"]
-            position_on_stage.voter_entering_position = one_position["voter_entering_position"]
-            position_on_stage.voter_id = voter_id
-            position_on_stage.voter_we_vote_id = one_position["voter_we_vote_id"]
-
-            position_on_stage.save()
-            if position_on_stage_found:
-                # Update
-                positions_updated += 1
-            else:
-                # New
-                positions_saved += 1
-        except Exception as e:
+            position_values_list.append({
+                'we_vote_id':                       one_position["we_vote_id"],
+                'candidate_campaign_id':            candidate_campaign_id,
+                'candidate_campaign_we_vote_id':    one_position["candidate_campaign_we_vote_id"],
+                'contest_measure_id':               contest_measure_id,
+                'contest_measure_we_vote_id':       one_position["contest_measure_we_vote_id"],
+                'contest_office_id':                contest_office_id,
+                'contest_office_we_vote_id':        one_position["contest_office_we_vote_id"],
+                'google_civic_candidate_name':      google_civic_candidate_name,
+                'google_civic_election_id':         one_position["google_civic_election_id"],
+                'state_code':                       one_position["state_code"],
+                'more_info_url':                    one_position["more_info_url"],
+                'organization_id':                  organization_id,
+                'organization_we_vote_id':          one_position["organization_we_vote_id"],
+                'stance':                           one_position["stance"],
+                'statement_text':                   one_position["statement_text"],
+                'statement_html':                   one_position["statement_html"],
+                'ballot_item_display_name':         one_position["ballot_item_display_name"],
+                'ballot_item_image_url_https':      one_position["ballot_item_image_url_https"],
+                'ballot_item_twitter_handle':       one_position["ballot_item_twitter_handle"],
+                'from_scraper':                     one_position["from_scraper"],
+                'organization_certified':           one_position["organization_certified"],
+                'politician_id':                    politician_id,
+                'politician_we_vote_id':            one_position["politician_we_vote_id"],
+                'public_figure_we_vote_id':         one_position["public_figure_we_vote_id"],
+                'speaker_display_name':             one_position["speaker_display_name"],
+                'speaker_image_url_https':          one_position["speaker_image_url_https"],
+                'speaker_twitter_handle':           one_position["speaker_twitter_handle"],
+                'tweet_source_id':                  one_position["tweet_source_id"],
+                'twitter_user_entered_position':    one_position["twitter_user_entered_position"],
+                'volunteer_certified':              one_position["volunteer_certified"],
+                'vote_smart_rating':                one_position["vote_smart_rating"],
+                'vote_smart_rating_id':             one_position["vote_smart_rating_id"],
+                'vote_smart_rating_name':           one_position["vote_smart_rating_name"],
+                'vote_smart_time_span':             one_position["vote_smart_time_span"],
+                'voter_entering_position':          one_position["voter_entering_position"],
+                'voter_id':                         voter_id,
+                'voter_we_vote_id':                 one_position["voter_we_vote_id"],
+            })
+        except KeyError as e:
             handle_record_not_saved_exception(e, logger=logger)
             positions_not_processed += 1
 
+    results = bulk_upsert(PositionEntered, position_values_list)
+
     positions_results = {
         'success': True,
-        'status': "POSITIONS_IMPORT_PROCESS_COMPLETE",
-        'saved': positions_saved,
-        'updated': positions_updated,
-        'not_processed': positions_not_processed,
+        'status': "POSITIONS_IMPORT_PROCESS_COMPLETE " + results['status'],
+        'saved': results['saved'],
+        'updated': results['updated'],
+        'not_processed': positions_not_processed + results['not_processed'],
     }
     return positions_results
 
@@ -2955,6 +2928,32 @@ def retrieve_ballot_item_we_vote_ids_for_organizations_to_follow(voter_id,
     return results
 
 
+def retrieve_ballot_item_we_vote_ids_for_organization_list_to_follow(organization_we_vote_id_list,
+                                                                     stance_we_are_looking_for=SUPPORT,
+                                                                     google_civic_election_id=0):
+    """
+    Batched version of retrieve_ballot_item_we_vote_ids_for_organizations_to_follow, for when we already know the
+    organizations exist and that the voter isn't following or ignoring them (as with voter guides to follow).
+    One query returns the ballot items for every organization.
+    :param organization_we_vote_id_list:
+    :param stance_we_are_looking_for:
+    :param google_civic_election_id:
+    :return: ballot_item_we_vote_ids_by_organization has the lower case organization_we_vote_id as key
+    """
+    position_list_manager = PositionListManager()
+    ballot_item_we_vote_ids_by_organization = \
+        position_list_manager.retrieve_public_ballot_item_we_vote_ids_for_organization_list(
+            organization_we_vote_id_list, stance_we_are_looking_for, google_civic_election_id)
+
+    results = {
+        'status':                                   'RETRIEVE_BALLOT_ITEM_WE_VOTE_IDS_FOR_ORGANIZATION_LIST ',
+        'success':                                  True,
+        'google_civic_election_id':                 google_civic_election_id,
+        'ballot_item_we_vote_ids_by_organization':  ballot_item_we_vote_ids_by_organization,
+    }
+    return results
+
+
 def reset_all_position_image_details_from_candidate(candidate_campaign, twitter_profile_image_url_https):
     """
     Reset all position image urls PositionEntered and PositionForFriends from candidate details
@@ -7,9 +7,13 @@ from analytics.models import ACTION_ORGANIZATION_AUTO_FOLLOW, ACTION_POSITION_TA
     AnalyticsAction, AnalyticsManager
 from candidate.models import CandidateCampaign, CandidateCampaignManager, CandidateCampaignListManager
 from ballot.controllers import figure_out_google_civic_election_id_voter_is_watching
+from collections import namedtuple
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
-from django.db import models
-from django.db.models import Q
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, F, Q, When
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
 from election.models import Election
 from exception.models import handle_exception, handle_record_found_more_than_one_exception,\
     handle_record_not_found_exception, handle_record_not_saved_exception
@@ -18,11 +22,14 @@ from measure.models import ContestMeasure, ContestMeasureList, ContestMeasureMan
 from office.models import ContestOfficeManager
 from organization.models import Organization, OrganizationManager
 import robot_detection
+from support_oppose_deciding.models import SupportOpposeTallyManager
 from twitter.models import TwitterUser
 from voter.models import fetch_voter_id_from_voter_we_vote_id, fetch_voter_we_vote_id_from_voter_id, Voter, VoterManager
 from voter_guide.models import VoterGuideManager
 import wevote_functions.admin
-from wevote_functions.functions import convert_to_int, positive_value_exists
+from wevote_functions.bulk_upsert import fetch_bulk_upsert_google_civic_election_id_set, post_bulk_upsert
+from wevote_functions.functions import canonicalize_we_vote_id, canonicalize_we_vote_id_fields, \
+    canonicalize_we_vote_id_list, convert_to_int, LocalDuplicateIndex, positive_value_exists
 from wevote_settings.models import fetch_next_we_vote_id_position_integer, fetch_site_unique_id_prefix
 
 
@@ -56,9 +63,64 @@ ALL_ELECTIONS = 'ALL_ELECTIONS'
 
 POSITION = 'POSITION'
 
+# How long an election's public position index is kept in the cache. Changes are picked up on the next request
+#  through PublicPositionIndexVersion, so this only limits how long an unused index takes up memory.
+PUBLIC_POSITION_INDEX_CACHE_TIMEOUT = 300
+
+# One public position, with only the fields we need to figure out which voter guides to offer a voter
+PublicPositionIndexEntry = namedtuple('PublicPositionIndexEntry', [
+    'organization_id', 'organization_we_vote_id', 'ballot_item_we_vote_id', 'stance', 'vote_smart_time_span'])
+
 logger = wevote_functions.admin.get_logger(__name__)
 
 
+def fetch_public_position_index_cache_key(google_civic_election_id):
+    google_civic_election_id = convert_to_int(google_civic_election_id)
+    index_version = 0
+    try:
+        index_version = PublicPositionIndexVersion.objects.filter(google_civic_election_id=google_civic_election_id)\
+            .values_list('index_version', flat=True).first() or 0
+    except Exception as e:
+        handle_record_not_found_exception(e, logger=logger)
+    return "public_position_index_{id}_{version}".format(id=google_civic_election_id, version=index_version)
+
+
+def clear_public_position_index_for_election(google_civic_election_id):
+    """
+    A public position changed in this election, so stop serving the position index cached for it. The version is
+    kept in the database, so every server process stops serving its copy on its next request.
+    :param google_civic_election_id:
+    :return:
+    """
+    google_civic_election_id = convert_to_int(google_civic_election_id)
+    if not positive_value_exists(google_civic_election_id):
+        return
+    version_query = PublicPositionIndexVersion.objects.filter(google_civic_election_id=google_civic_election_id)
+    try:
+        if version_query.update(index_version=F('index_version') + 1):
+            return
+        try:
+            with transaction.atomic():
+                PublicPositionIndexVersion.objects.create(google_civic_election_id=google_civic_election_id,
+                                                          index_version=1)
+        except IntegrityError:
+            # Another process created it first
+            version_query.update(index_version=F('index_version') + 1)
+    except Exception as e:
+        handle_record_not_saved_exception(e, logger=logger)
+
+
+def clear_public_position_index_for_all_elections():
+    """
+    For changes made with QuerySet.update, which doesn't send the model signals
+    :return:
+    """
+    try:
+        PublicPositionIndexVersion.objects.all().update(index_version=F('index_version') + 1)
+    except Exception as e:
+        handle_record_not_saved_exception(e, logger=logger)
+
+
 # TODO DALE Consider adding vote_smart_sig_id and vote_smart_candidate_id fields so we can export them and to prevent
 # duplicate position entries from Vote Smart
 
@@ -118,7 +180,7 @@ class PositionEntered(models.Model):
     organization_id = models.BigIntegerField(null=True, blank=True)
     organization_we_vote_id = models.CharField(
         verbose_name="we vote permanent id for the organization", max_length=255, null=True,
-        blank=True, unique=False)
+        blank=True, unique=False, db_index=True)
 
     # The voter expressing the opinion
     # Note that for organizations who have friends, the voter_we_vote_id is what we use to link to the friends
@@ -128,7 +190,7 @@ class PositionEntered(models.Model):
     voter_id = models.BigIntegerField(null=True, blank=True)
     voter_we_vote_id = models.CharField(
         verbose_name="we vote permanent id for the voter expressing the opinion", max_length=255, null=True,
-        blank=True, unique=False)
+        blank=True, unique=False, db_index=True)
 
     # The unique id of the public figure expressing the opinion. May be null if position is from org or voter
     # instead of public figure.
@@ -166,7 +228,8 @@ class PositionEntered(models.Model):
     #  Either contest_measure is filled, contest_office OR candidate_campaign, but not all three
     contest_office_id = models.BigIntegerField(verbose_name='id of contest_office', null=True, blank=True)
     contest_office_we_vote_id = models.CharField(
-        verbose_name="we vote permanent id for the contest_office", max_length=255, null=True, blank=True, unique=False)
+        verbose_name="we vote permanent id for the contest_office", max_length=255, null=True, blank=True, unique=False,
+        db_index=True)
     contest_office_name = models.CharField(verbose_name="name of the office", max_length=255, null=True, blank=True)
 
     # This is the candidate/politician that the position refers to.
@@ -174,7 +237,7 @@ class PositionEntered(models.Model):
     candidate_campaign_id = models.BigIntegerField(verbose_name='id of candidate_campaign', null=True, blank=True)
     candidate_campaign_we_vote_id = models.CharField(
         verbose_name="we vote permanent id for the candidate_campaign", max_length=255, null=True,
-        blank=True, unique=False)
+        blank=True, unique=False, db_index=True)
     # The candidate's name as passed over by Google Civic. We save this so we can match to this candidate if an import
     # doesn't include a we_vote_id we recognize.
     google_civic_candidate_name = models.CharField(verbose_name="candidate name exactly as received from google civic",
@@ -195,7 +258,7 @@ class PositionEntered(models.Model):
     contest_measure_id = models.BigIntegerField(verbose_name='id of contest_measure', null=True, blank=True)
     contest_measure_we_vote_id = models.CharField(
         verbose_name="we vote permanent id for the contest_measure", max_length=255, null=True,
-        blank=True, unique=False)
+        blank=True, unique=False, db_index=True)
 
     # Strategic denormalization - this is redundant but will make generating the voter guide easier.
     # geo = models.ForeignKey(Geo, null=True, related_name='pos_geo')
@@ -240,6 +303,7 @@ class PositionEntered(models.Model):
             self.we_vote_id = self.we_vote_id.strip().lower()
         if self.we_vote_id == "" or self.we_vote_id is None:  # If there isn't a value...
             self.generate_new_we_vote_id()
+        canonicalize_we_vote_id_fields(self)
         super(PositionEntered, self).save(*args, **kwargs)
 
     def generate_new_we_vote_id(self):
@@ -462,7 +526,7 @@ class PositionForFriends(models.Model):
     organization_id = models.BigIntegerField(null=True, blank=True)
     organization_we_vote_id = models.CharField(
         verbose_name="we vote permanent id for the organization", max_length=255, null=True,
-        blank=True, unique=False)
+        blank=True, unique=False, db_index=True)
 
     # The voter expressing the opinion
     # Note that for organizations who have friends, the voter_we_vote_id is what we use to link to the friends.
@@ -471,7 +535,7 @@ class PositionForFriends(models.Model):
     voter_id = models.BigIntegerField(null=True, blank=True)
     voter_we_vote_id = models.CharField(
         verbose_name="we vote permanent id for the voter expressing the opinion", max_length=255, null=True,
-        blank=True, unique=False)
+        blank=True, unique=False, db_index=True)
 
     # The unique id of the public figure expressing the opinion. May be null if position is from org or voter
     # instead of public figure.
@@ -508,7 +572,7 @@ class PositionForFriends(models.Model):
     contest_office_id = models.BigIntegerField(verbose_name='id of contest_office', null=True, blank=True)
     contest_office_we_vote_id = models.CharField(
         verbose_name="we vote permanent id for the contest_office", max_length=255, null=True, blank=True,
-        unique=False)
+        unique=False, db_index=True)
     contest_office_name = models.CharField(verbose_name="name of the office", max_length=255, null=True, blank=True)
 
     # This is the candidate/politician that the position refers to.
@@ -516,7 +580,7 @@ class PositionForFriends(models.Model):
     candidate_campaign_id = models.BigIntegerField(verbose_name='id of candidate_campaign', null=True, blank=True)
     candidate_campaign_we_vote_id = models.CharField(
         verbose_name="we vote permanent id for the candidate_campaign", max_length=255, null=True,
-        blank=True, unique=False)
+        blank=True, unique=False, db_index=True)
     # The candidate's name as passed over by Google Civic. We save this so we can match to this candidate if an import
     # doesn't include a we_vote_id we recognize.
     google_civic_candidate_name = models.CharField(
@@ -534,7 +598,7 @@ class PositionForFriends(models.Model):
     contest_measure_id = models.BigIntegerField(verbose_name='id of contest_measure', null=True, blank=True)
     contest_measure_we_vote_id = models.CharField(
         verbose_name="we vote permanent id for the contest_measure", max_length=255, null=True,
-        blank=True, unique=False)
+        blank=True, unique=False, db_index=True)
     # The measure's title as passed over by Google Civic. We save this so we can match to this measure if an import
     # doesn't include a we_vote_id we recognize.
     google_civic_measure_title = models.CharField(verbose_name="measure title exactly as received from google civic",
@@ -593,6 +657,7 @@ class PositionForFriends(models.Model):
                 site_unique_id_prefix=site_unique_id_prefix,
                 next_integer=next_local_integer,
             )
+        canonicalize_we_vote_id_fields(self)
         super(PositionForFriends, self).save(*args, **kwargs)
 
     # Is the position is an actual endorsement?
@@ -743,6 +808,16 @@ class PositionForFriends(models.Model):
         return voter
 
 
+class PublicPositionIndexVersion(models.Model):
+    """
+    The version of each election's cached public position index (see retrieve_public_position_index_for_election).
+    Every write to a PositionEntered in the election moves it forward.
+    """
+    google_civic_election_id = models.PositiveIntegerField(
+        verbose_name="google civic election id", unique=True, db_index=True)
+    index_version = models.PositiveIntegerField(verbose_name="public position index version", default=0)
+
+
 class PositionListManager(models.Model):
     def add_is_public_position(self, incoming_position_list, is_public_position):
         outgoing_position_list = []
@@ -833,7 +908,7 @@ class PositionListManager(models.Model):
                 public_position_list = public_position_list.filter(candidate_campaign_id=candidate_campaign_id)
             else:
                 public_position_list = public_position_list.filter(
-                    candidate_campaign_we_vote_id__iexact=candidate_campaign_we_vote_id)
+                    candidate_campaign_we_vote_id=canonicalize_we_vote_id(candidate_campaign_we_vote_id))
             # SUPPORT, STILL_DECIDING, INFORMATION_ONLY, NO_STANCE, OPPOSE, PERCENT_RATING
             if stance_we_are_looking_for != ANY_STANCE:
                 # If we passed in the stance "ANY_STANCE" it means we want to not filter down the list
@@ -875,7 +950,7 @@ class PositionListManager(models.Model):
                     candidate_campaign_id=candidate_campaign_id)
             else:
                 friends_only_position_list = friends_only_position_list.filter(
-                    candidate_campaign_we_vote_id__iexact=candidate_campaign_we_vote_id)
+                    candidate_campaign_we_vote_id=canonicalize_we_vote_id(candidate_campaign_we_vote_id))
             # SUPPORT, STILL_DECIDING, INFORMATION_ONLY, NO_STANCE, OPPOSE, PERCENT_RATING
             if stance_we_are_looking_for != ANY_STANCE:
                 # If we passed in the stance "ANY_STANCE" it means we want to not filter down the list
@@ -940,7 +1015,7 @@ class PositionListManager(models.Model):
                 public_position_list = public_position_list.filter(contest_measure_id=contest_measure_id)
             else:
                 public_position_list = public_position_list.filter(
-                    contest_measure_we_vote_id__iexact=contest_measure_we_vote_id)
+                    contest_measure_we_vote_id=canonicalize_we_vote_id(contest_measure_we_vote_id))
             # SUPPORT, STILL_DECIDING, INFORMATION_ONLY, NO_STANCE, OPPOSE, PERCENT_RATING
             if stance_we_are_looking_for != ANY_STANCE:
                 # If we passed in the stance "ANY_STANCE" it means we want to not filter down the list
@@ -981,7 +1056,7 @@ class PositionListManager(models.Model):
                 friends_only_position_list = friends_only_position_list.filter(contest_measure_id=contest_measure_id)
             else:
                 friends_only_position_list = friends_only_position_list.filter(
-                    contest_measure_we_vote_id__iexact=contest_measure_we_vote_id)
+                    contest_measure_we_vote_id=canonicalize_we_vote_id(contest_measure_we_vote_id))
             # SUPPORT, STILL_DECIDING, INFORMATION_ONLY, NO_STANCE, OPPOSE, PERCENT_RATING
             if stance_we_are_looking_for != ANY_STANCE:
                 # If we passed in the stance "ANY_STANCE" it means we want to not filter down the list
@@ -1040,7 +1115,8 @@ class PositionListManager(models.Model):
                 position_on_stage = PositionForFriends()
 
             position_list = position_on_stage_starter.objects.order_by('date_entered')
-            position_list = position_list.filter(organization_we_vote_id__iexact=organization_we_vote_id)
+            position_list = position_list.filter(
+                organization_we_vote_id=canonicalize_we_vote_id(organization_we_vote_id))
             position_list = position_list.filter(google_civic_election_id=google_civic_election_id)
             # SUPPORT, STILL_DECIDING, INFORMATION_ONLY, NO_STANCE, OPPOSE, PERCENT_RATING
             if stance_we_are_looking_for != ANY_STANCE:
@@ -1076,7 +1152,7 @@ class PositionListManager(models.Model):
             position_on_stage_starter = PositionForFriends
 
             position_list = position_on_stage_starter.objects.all()
-            position_list = position_list.filter(voter_we_vote_id__iexact=voter_we_vote_id)
+            position_list = position_list.filter(voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id))
             position_count = position_list.count()
         except Exception as e:
             pass
@@ -1088,7 +1164,7 @@ class PositionListManager(models.Model):
             position_on_stage_starter = PositionEntered
 
             position_list = position_on_stage_starter.objects.all()
-            position_list = position_list.filter(voter_we_vote_id__iexact=voter_we_vote_id)
+            position_list = position_list.filter(voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id))
             position_count = position_list.count()
         except Exception as e:
             pass
@@ -1186,8 +1262,8 @@ class PositionListManager(models.Model):
             # Find any positions with any of the identifiers associated with this voter
             public_positions_list_query = public_positions_list_query.filter(
                 Q(voter_id=voter_id) |
-                Q(voter_we_vote_id__iexact=voter_we_vote_id) |
-                Q(organization_we_vote_id__iexact=organization_we_vote_id) |
+                Q(voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id)) |
+                Q(organization_we_vote_id=canonicalize_we_vote_id(organization_we_vote_id)) |
                 Q(organization_id=organization_id))
 
             public_positions_list = list(public_positions_list_query)  # Force the query to run
@@ -1227,8 +1303,8 @@ class PositionListManager(models.Model):
             friends_positions_list_query = PositionForFriends.objects.all()
             friends_positions_list_query = friends_positions_list_query.filter(
                 Q(voter_id=voter_id) |
-                Q(voter_we_vote_id__iexact=voter_we_vote_id) |
-                Q(organization_we_vote_id__iexact=organization_we_vote_id) |
+                Q(voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id)) |
+                Q(organization_we_vote_id=canonicalize_we_vote_id(organization_we_vote_id)) |
                 Q(organization_id=organization_id))
 
             friends_positions_list = list(friends_positions_list_query)  # Force the query to run
@@ -1331,7 +1407,7 @@ class PositionListManager(models.Model):
                 position_list = position_list.filter(candidate_campaign_id=candidate_campaign_id)
             else:
                 position_list = position_list.filter(
-                    candidate_campaign_we_vote_id__iexact=candidate_campaign_we_vote_id)
+                    candidate_campaign_we_vote_id=canonicalize_we_vote_id(candidate_campaign_we_vote_id))
             # SUPPORT, STILL_DECIDING, INFORMATION_ONLY, NO_STANCE, OPPOSE, PERCENT_RATING
             if stance_we_are_looking_for != ANY_STANCE:
                 # If we passed in the stance "ANY_STANCE" it means we want to not filter down the list
@@ -1341,11 +1417,9 @@ class PositionListManager(models.Model):
                 else:
                     position_list = position_list.filter(stance=stance_we_are_looking_for)
             if retrieve_friends_positions and friends_we_vote_id_list is not False:
-                # Find positions from friends. Look for we_vote_id case insensitive.
-                we_vote_id_filter = Q()
-                for we_vote_id in friends_we_vote_id_list:
-                    we_vote_id_filter |= Q(voter_we_vote_id__iexact=we_vote_id)
-                position_list = position_list.filter(we_vote_id_filter)
+                # Find positions from friends. we_vote_ids are stored in lower case, so one IN lookup uses the index
+                position_list = position_list.filter(
+                    voter_we_vote_id__in=canonicalize_we_vote_id_list(friends_we_vote_id_list))
             # Limit to positions in the last x years - currently we are not limiting
             # position_list = position_list.filter(election_id=election_id)
 
@@ -1427,7 +1501,8 @@ class PositionListManager(models.Model):
             if positive_value_exists(contest_measure_id):
                 position_list = position_list.filter(contest_measure_id=contest_measure_id)
             else:
-                position_list = position_list.filter(contest_measure_we_vote_id__iexact=contest_measure_we_vote_id)
+                position_list = position_list.filter(
+                    contest_measure_we_vote_id=canonicalize_we_vote_id(contest_measure_we_vote_id))
             # SUPPORT, STILL_DECIDING, INFORMATION_ONLY, NO_STANCE, OPPOSE, PERCENT_RATING
             if stance_we_are_looking_for != ANY_STANCE:
                 # If we passed in the stance "ANY" it means we want to not filter down the list
@@ -1437,11 +1512,9 @@ class PositionListManager(models.Model):
                 # for contest_measure (like we do for candidate_campaign) because we don't have to deal with
                 # PERCENT_RATING data with measures
             if retrieve_friends_positions and friends_we_vote_id_list is not False:
-                # Find positions from friends. Look for we_vote_id case insensitive.
-                we_vote_id_filter = Q()
-                for we_vote_id in friends_we_vote_id_list:
-                    we_vote_id_filter |= Q(voter_we_vote_id__iexact=we_vote_id)
-                position_list = position_list.filter(we_vote_id_filter)
+                # Find positions from friends. we_vote_ids are stored in lower case, so one IN lookup uses the index
+                position_list = position_list.filter(
+                    voter_we_vote_id__in=canonicalize_we_vote_id_list(friends_we_vote_id_list))
             # Limit to positions in the last x years - currently we are not limiting
             # position_list = position_list.filter(election_id=election_id)
 
@@ -1506,7 +1579,8 @@ class PositionListManager(models.Model):
                 retrieve_friends_positions = True
 
             if positive_value_exists(contest_office_we_vote_id):
-                position_list = position_list.filter(contest_office_we_vote_id__iexact=contest_office_we_vote_id)
+                position_list = position_list.filter(
+                    contest_office_we_vote_id=canonicalize_we_vote_id(contest_office_we_vote_id))
             else:
                 position_list = position_list.filter(contest_office_id=contest_office_id)
             # SUPPORT, STILL_DECIDING, INFORMATION_ONLY, NO_STANCE, OPPOSE, PERCENT_RATING
@@ -1518,11 +1592,9 @@ class PositionListManager(models.Model):
                 # for contest_office (like we do for candidate_campaign) because we don't have to deal with
                 # PERCENT_RATING data with measures
             if retrieve_friends_positions and friends_we_vote_id_list is not False:
-                # Find positions from friends. Look for we_vote_id case insensitive.
-                we_vote_id_filter = Q()
-                for we_vote_id in friends_we_vote_id_list:
-                    we_vote_id_filter |= Q(voter_we_vote_id__iexact=we_vote_id)
-                position_list = position_list.filter(we_vote_id_filter)
+                # Find positions from friends. we_vote_ids are stored in lower case, so one IN lookup uses the index
+                position_list = position_list.filter(
+                    voter_we_vote_id__in=canonicalize_we_vote_id_list(friends_we_vote_id_list))
             # Limit to positions in the last x years - currently we are not limiting
             # position_list = position_list.filter(election_id=election_id)
 
@@ -1552,7 +1624,8 @@ class PositionListManager(models.Model):
     def refresh_cached_position_info_for_organization(self, organization_we_vote_id):
         position_manager = PositionManager()
         public_positions_list = PositionEntered.objects.all()
-        public_positions_list = public_positions_list.filter(organization_we_vote_id__iexact=organization_we_vote_id)
+        public_positions_list = public_positions_list.filter(
+            organization_we_vote_id=canonicalize_we_vote_id(organization_we_vote_id))
         force_update = True
         for one_position in public_positions_list:
             position_manager.refresh_cached_position_info(one_position, force_update)
@@ -1609,7 +1682,7 @@ class PositionListManager(models.Model):
                     public_positions_list = public_positions_list.filter(organization_id=organization_id)
                 else:
                     public_positions_list = public_positions_list.filter(
-                        organization_we_vote_id__iexact=organization_we_vote_id)
+                        organization_we_vote_id=canonicalize_we_vote_id(organization_we_vote_id))
                 # SUPPORT, STILL_DECIDING, INFORMATION_ONLY, NO_STANCE, OPPOSE, PERCENT_RATING
                 if stance_we_are_looking_for != ANY_STANCE:
                     # If we passed in the stance "ANY_STANCE" it means we want to not filter down the list
@@ -1726,7 +1799,7 @@ class PositionListManager(models.Model):
                             voter_id=organization_voter_local_id)
                     else:
                         friends_positions_list = friends_positions_list.filter(
-                            voter_we_vote_id__iexact=organization_voter_we_vote_id)
+                            voter_we_vote_id=canonicalize_we_vote_id(organization_voter_we_vote_id))
 
                     # SUPPORT, STILL_DECIDING, INFORMATION_ONLY, NO_STANCE, OPPOSE, PERCENT_RATING
                     if stance_we_are_looking_for != ANY_STANCE:
@@ -1903,7 +1976,7 @@ class PositionListManager(models.Model):
                     public_positions_list_query = public_positions_list_query.filter(voter_id=voter_id)
                 elif positive_value_exists(voter_we_vote_id):
                     public_positions_list_query = public_positions_list_query.filter(
-                        voter_we_vote_id__iexact=voter_we_vote_id)
+                        voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id))
                 if retrieve_this_election_only:
                     public_positions_list_query = public_positions_list_query.filter(
                         google_civic_election_id=google_civic_election_id)
@@ -1945,7 +2018,7 @@ class PositionListManager(models.Model):
                     friends_positions_list_query = friends_positions_list_query.filter(voter_id=voter_id)
                 elif positive_value_exists(voter_we_vote_id):
                     friends_positions_list_query = friends_positions_list_query.filter(
-                        voter_we_vote_id__iexact=voter_we_vote_id)
+                        voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id))
                 if retrieve_this_election_only:
                     friends_positions_list_query = friends_positions_list_query.filter(
                         google_civic_election_id=google_civic_election_id)
@@ -2074,7 +2147,7 @@ class PositionListManager(models.Model):
                 public_positions_list_query = public_positions_list_query.filter(voter_id=voter_id)
             elif positive_value_exists(voter_we_vote_id):
                 public_positions_list_query = public_positions_list_query.filter(
-                    voter_we_vote_id__iexact=voter_we_vote_id)
+                    voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id))
             if positive_value_exists(google_civic_election_id):
                 public_positions_list_query = public_positions_list_query.filter(
                     google_civic_election_id=google_civic_election_id)
@@ -2099,7 +2172,7 @@ class PositionListManager(models.Model):
                 friends_positions_list_query = friends_positions_list_query.filter(voter_id=voter_id)
             elif positive_value_exists(voter_we_vote_id):
                 friends_positions_list_query = friends_positions_list_query.filter(
-                    voter_we_vote_id__iexact=voter_we_vote_id)
+                    voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id))
             if positive_value_exists(google_civic_election_id):
                 friends_positions_list_query = friends_positions_list_query.filter(
                     google_civic_election_id=google_civic_election_id)
@@ -2245,6 +2318,108 @@ class PositionListManager(models.Model):
             position_list = []
             return position_list
 
+    def retrieve_public_position_index_for_election(self, google_civic_election_id):
+        """
+        A compact version of retrieve_all_positions_for_election(google_civic_election_id, ANY_STANCE, True): one
+        PublicPositionIndexEntry per public position in the election, oldest first. Built with a single values_list
+        query and cached per election until a public position in the election is saved or deleted.
+        :param google_civic_election_id:
+        :return:
+        """
+        if not positive_value_exists(google_civic_election_id):
+            return []
+
+        cache_key = fetch_public_position_index_cache_key(google_civic_election_id)
+        position_index = cache.get(cache_key)
+        if position_index is not None:
+            return position_index
+
+        position_index = []
+        try:
+            position_query = PositionEntered.objects.order_by('date_entered')
+            position_query = position_query.filter(google_civic_election_id=google_civic_election_id)
+            position_values_list = position_query.values_list(
+                'organization_id', 'organization_we_vote_id', 'candidate_campaign_we_vote_id',
+                'contest_measure_we_vote_id', 'stance', 'vote_smart_time_span')
+            for organization_id, organization_we_vote_id, candidate_campaign_we_vote_id, \
+                    contest_measure_we_vote_id, stance, vote_smart_time_span in position_values_list:
+                if positive_value_exists(candidate_campaign_we_vote_id):
+                    ballot_item_we_vote_id = candidate_campaign_we_vote_id
+                else:
+                    ballot_item_we_vote_id = contest_measure_we_vote_id
+                position_index.append(PublicPositionIndexEntry(
+                    organization_id, organization_we_vote_id, ballot_item_we_vote_id, stance, vote_smart_time_span))
+        except Exception as e:
+            handle_record_not_found_exception(e, logger=logger)
+            return position_index
+
+        cache.set(cache_key, position_index, PUBLIC_POSITION_INDEX_CACHE_TIMEOUT)
+        return position_index
+
+    def retrieve_public_ballot_item_we_vote_ids_for_organization_list(
+            self, organization_we_vote_id_list, stance_we_are_looking_for=SUPPORT, google_civic_election_id=0):
+        """
+        The ballot items each of these organizations has a public position about, from one query. Matches what
+        retrieve_all_positions_for_organization returns for each organization with PUBLIC_ONLY: SUPPORT and OPPOSE
+        also include ratings, and ballot items are in ballot_item_display_name order.
+        :param organization_we_vote_id_list:
+        :param stance_we_are_looking_for:
+        :param google_civic_election_id:
+        :return: dict with the lower case organization_we_vote_id as key, and a list of ballot item we_vote_ids as value
+        """
+        ballot_item_we_vote_ids_by_organization = {}
+        if stance_we_are_looking_for not \
+                in(ANY_STANCE, SUPPORT, STILL_DECIDING, INFORMATION_ONLY, NO_STANCE, OPPOSE, PERCENT_RATING):
+            return ballot_item_we_vote_ids_by_organization
+
+        organization_we_vote_id_list = [one_we_vote_id for one_we_vote_id in organization_we_vote_id_list
+                                        if positive_value_exists(one_we_vote_id)]
+        if not len(organization_we_vote_id_list):
+            return ballot_item_we_vote_ids_by_organization
+        # We match organization_we_vote_id without regard to case, so look for the lower case version as well
+        organization_we_vote_ids_to_match = set(organization_we_vote_id_list)
+        organization_we_vote_ids_to_match.update(one_we_vote_id.lower()
+                                                 for one_we_vote_id in organization_we_vote_id_list)
+        for one_we_vote_id in organization_we_vote_id_list:
+            ballot_item_we_vote_ids_by_organization[one_we_vote_id.lower()] = []
+
+        try:
+            position_query = PositionEntered.objects.order_by('ballot_item_display_name', '-vote_smart_time_span',
+                                                              '-google_civic_election_id')
+            position_query = position_query.filter(organization_we_vote_id__in=organization_we_vote_ids_to_match)
+            if stance_we_are_looking_for != ANY_STANCE:
+                if stance_we_are_looking_for == SUPPORT or stance_we_are_looking_for == OPPOSE:
+                    position_query = position_query.filter(
+                        Q(stance=stance_we_are_looking_for) | Q(stance=PERCENT_RATING))
+                else:
+                    position_query = position_query.filter(stance=stance_we_are_looking_for)
+            if positive_value_exists(google_civic_election_id):
+                position_query = position_query.filter(google_civic_election_id=google_civic_election_id)
+            position_query = position_query.exclude(
+                Q(stance__iexact=NO_STANCE) &
+                (Q(statement_text__isnull=True) | Q(statement_text__exact='')) &
+                (Q(statement_html__isnull=True) | Q(statement_html__exact=''))
+            )
+            position_values_list = position_query.values_list(
+                'organization_we_vote_id', 'candidate_campaign_we_vote_id', 'contest_measure_we_vote_id',
+                'contest_office_we_vote_id')
+            for organization_we_vote_id, candidate_campaign_we_vote_id, contest_measure_we_vote_id, \
+                    contest_office_we_vote_id in position_values_list:
+                if positive_value_exists(candidate_campaign_we_vote_id):
+                    ballot_item_we_vote_id = candidate_campaign_we_vote_id
+                elif positive_value_exists(contest_measure_we_vote_id):
+                    ballot_item_we_vote_id = contest_measure_we_vote_id
+                elif positive_value_exists(contest_office_we_vote_id):
+                    ballot_item_we_vote_id = contest_office_we_vote_id
+                else:
+                    continue
+                ballot_item_we_vote_ids_by_organization[organization_we_vote_id.lower()].append(
+                    ballot_item_we_vote_id)
+        except Exception as e:
+            handle_record_not_found_exception(e, logger=logger)
+
+        return ballot_item_we_vote_ids_by_organization
+
     def remove_older_positions_for_each_org(self, position_list):
         # If we have multiple positions for one org, we only want to show the most recent
         organization_already_reviewed = []
@@ -2307,7 +2482,7 @@ class PositionListManager(models.Model):
                 position_list = position_list.filter(candidate_campaign_id=candidate_campaign_id)
             else:
                 position_list = position_list.filter(
-                    candidate_campaign_we_vote_id__iexact=candidate_campaign_we_vote_id)
+                    candidate_campaign_we_vote_id=canonicalize_we_vote_id(candidate_campaign_we_vote_id))
             # SUPPORT, STILL_DECIDING, INFORMATION_ONLY, NO_STANCE, OPPOSE, PERCENT_RATING
             if stance_we_are_looking_for != ANY_STANCE:
                 # If we passed in the stance "ANY_STANCE" it means we want to not filter down the list
@@ -2354,7 +2529,7 @@ class PositionListManager(models.Model):
                 position_list = position_list.filter(contest_measure_id=contest_measure_id)
             else:
                 position_list = position_list.filter(
-                    contest_measure_we_vote_id__iexact=contest_measure_we_vote_id)
+                    contest_measure_we_vote_id=canonicalize_we_vote_id(contest_measure_we_vote_id))
             # SUPPORT, STILL_DECIDING, INFORMATION_ONLY, NO_STANCE, OPPOSE, PERCENT_RATING
             if stance_we_are_looking_for != ANY_STANCE:
                 # If we passed in the stance "ANY" it means we want to not filter down the list
@@ -2383,18 +2558,19 @@ class PositionListManager(models.Model):
 
             # Ignore entries with we_vote_id coming in from master server
             if positive_value_exists(we_vote_id_from_master):
-                position_queryset = position_queryset.filter(~Q(we_vote_id__iexact=we_vote_id_from_master))
+                position_queryset = position_queryset.filter(
+                    ~Q(we_vote_id=canonicalize_we_vote_id(we_vote_id_from_master)))
 
             # Situation 1 organization_we_vote_id + candidate_we_vote_id matches an entry already in the db
             if positive_value_exists(organization_we_vote_id) and positive_value_exists(candidate_we_vote_id):
-                new_filter = (Q(organization_we_vote_id__iexact=organization_we_vote_id) &
-                              Q(candidate_campaign_we_vote_id__iexact=candidate_we_vote_id))
+                new_filter = (Q(organization_we_vote_id=canonicalize_we_vote_id(organization_we_vote_id)) &
+                              Q(candidate_campaign_we_vote_id=canonicalize_we_vote_id(candidate_we_vote_id)))
                 filters.append(new_filter)
 
             # Situation 2 organization_we_vote_id + measure_we_vote_id matches an entry already in the db
             if positive_value_exists(organization_we_vote_id) and positive_value_exists(measure_we_vote_id):
-                new_filter = (Q(organization_we_vote_id__iexact=organization_we_vote_id) &
-                              Q(contest_measure_we_vote_id__iexact=measure_we_vote_id))
+                new_filter = (Q(organization_we_vote_id=canonicalize_we_vote_id(organization_we_vote_id)) &
+                              Q(contest_measure_we_vote_id=canonicalize_we_vote_id(measure_we_vote_id)))
                 filters.append(new_filter)
 
             # Add the first query
@@ -2436,6 +2612,51 @@ class PositionListManager(models.Model):
         }
         return results
 
+    def retrieve_possible_duplicate_positions_index(self, google_civic_election_id):
+        """
+        Load every public position in this election into a LocalDuplicateIndex, so is_possible_duplicate_position
+        can do the retrieve_possible_duplicate_positions check without a query per position
+        :param google_civic_election_id:
+        :return:
+        """
+        duplicate_index = LocalDuplicateIndex()
+        try:
+            position_queryset = PositionEntered.objects.filter(google_civic_election_id=google_civic_election_id)
+            for we_vote_id, organization_we_vote_id, candidate_campaign_we_vote_id, contest_measure_we_vote_id \
+                    in position_queryset.values_list('we_vote_id', 'organization_we_vote_id',
+                                                     'candidate_campaign_we_vote_id',
+                                                     'contest_measure_we_vote_id').iterator():
+                organization_we_vote_id = canonicalize_we_vote_id(organization_we_vote_id)
+                duplicate_index.add_entry([
+                    ('organization_and_candidate', organization_we_vote_id,
+                     canonicalize_we_vote_id(candidate_campaign_we_vote_id)),
+                    ('organization_and_measure', organization_we_vote_id,
+                     canonicalize_we_vote_id(contest_measure_we_vote_id)),
+                ], canonicalize_we_vote_id(we_vote_id))
+        except Exception as e:
+            handle_exception(e, logger=logger, exception_message="retrieve_possible_duplicate_positions_index failed")
+        return duplicate_index
+
+    def is_possible_duplicate_position(self, duplicate_index, organization_we_vote_id, candidate_we_vote_id,
+                                       measure_we_vote_id, we_vote_id_from_master=''):
+        """
+        The same test as retrieve_possible_duplicate_positions, against an index from
+        retrieve_possible_duplicate_positions_index
+        """
+        key_list = []
+        if positive_value_exists(organization_we_vote_id) and positive_value_exists(candidate_we_vote_id):
+            key_list.append(('organization_and_candidate', canonicalize_we_vote_id(organization_we_vote_id),
+                             canonicalize_we_vote_id(candidate_we_vote_id)))
+        if positive_value_exists(organization_we_vote_id) and positive_value_exists(measure_we_vote_id):
+            key_list.append(('organization_and_measure', canonicalize_we_vote_id(organization_we_vote_id),
+                             canonicalize_we_vote_id(measure_we_vote_id)))
+        if not len(key_list):
+            key_list.append(LocalDuplicateIndex.ANY_ENTRY)
+
+        identity_to_ignore = canonicalize_we_vote_id(we_vote_id_from_master) \
+            if positive_value_exists(we_vote_id_from_master) else None
+        return duplicate_index.has_duplicate(key_list, identity_to_ignore)
+
 
 class PositionManager(models.Model):
 
@@ -2945,7 +3166,7 @@ class PositionManager(models.Model):
             if positive_value_exists(position_we_vote_id):
                 status += "MERGE_POSITION_DUPLICATES_WITH_WE_VOTE_ID "
                 duplicates_list = duplicates_list_starter.objects.filter(
-                    we_vote_id__iexact=position_we_vote_id)
+                    we_vote_id=canonicalize_we_vote_id(position_we_vote_id))
                 duplicates_count = len(duplicates_list)
                 duplicates_found = True if duplicates_count > 1 else False
                 success = True
@@ -3010,7 +3231,7 @@ class PositionManager(models.Model):
                     status += "MERGE_POSITION_DUPLICATES_WITH_ORG_CANDIDATE_WE_VOTE_ID_AND_ELECTION "
                     duplicates_list = duplicates_list_starter.objects.filter(
                         organization_id=organization_id,
-                        candidate_campaign_we_vote_id__iexact=candidate_campaign_we_vote_id,
+                        candidate_campaign_we_vote_id=canonicalize_we_vote_id(candidate_campaign_we_vote_id),
                         google_civic_election_id=google_civic_election_id)
                     # If still here, we found an existing position
                     duplicates_count = len(duplicates_list)
@@ -3020,7 +3241,7 @@ class PositionManager(models.Model):
                     status += "MERGE_POSITION_DUPLICATES_WITH_ORG_CANDIDATE_WE_VOTE_ID_AND_VOTE_SMART_TIME_SPAN "
                     duplicates_list = duplicates_list_starter.objects.filter(
                         organization_id=organization_id,
-                        candidate_campaign_we_vote_id__iexact=candidate_campaign_we_vote_id,
+                        candidate_campaign_we_vote_id=canonicalize_we_vote_id(candidate_campaign_we_vote_id),
                         vote_smart_time_span__iexact=vote_smart_time_span)
                     # If still here, we found an existing position
                     duplicates_count = len(duplicates_list)
@@ -3030,7 +3251,7 @@ class PositionManager(models.Model):
                     status += "MERGE_POSITION_DUPLICATES_WITH_ORG_AND_CANDIDATE_WE_VOTE_ID "
                     duplicates_list = duplicates_list_starter.objects.filter(
                         organization_id=organization_id,
-                        candidate_campaign_we_vote_id__iexact=candidate_campaign_we_vote_id)
+                        candidate_campaign_we_vote_id=canonicalize_we_vote_id(candidate_campaign_we_vote_id))
                     # If still here, we found an existing position
                     duplicates_count = len(duplicates_list)
                     duplicates_found = True if duplicates_count > 1 else False
@@ -3066,7 +3287,7 @@ class PositionManager(models.Model):
                     status += "MERGE_POSITION_DUPLICATES_WITH_ORG_MEASURE_WE_VOTE_ID_AND_ELECTION "
                     duplicates_list = duplicates_list_starter.objects.filter(
                         organization_id=organization_id,
-                        contest_measure_we_vote_id__iexact=contest_measure_we_vote_id,
+                        contest_measure_we_vote_id=canonicalize_we_vote_id(contest_measure_we_vote_id),
                         google_civic_election_id=google_civic_election_id)
                     # If still here, we found an existing position
                     duplicates_count = len(duplicates_list)
@@ -3076,7 +3297,7 @@ class PositionManager(models.Model):
                     status += "MERGE_POSITION_DUPLICATES_WITH_ORG_MEASURE_WE_VOTE_ID_AND_VOTE_SMART_TIME_SPAN "
                     duplicates_list = duplicates_list_starter.objects.filter(
                         organization_id=organization_id,
-                        contest_measure_we_vote_id__iexact=contest_measure_we_vote_id,
+                        contest_measure_we_vote_id=canonicalize_we_vote_id(contest_measure_we_vote_id),
                         vote_smart_time_span__iexact=vote_smart_time_span)
                     # If still here, we found an existing position
                     duplicates_count = len(duplicates_list)
@@ -3085,7 +3306,8 @@ class PositionManager(models.Model):
                 else:
                     status += "MERGE_POSITION_DUPLICATES_WITH_ORG_AND_MEASURE_WE_VOTE_ID "
                     duplicates_list = duplicates_list_starter.objects.filter(
-                        organization_id=organization_id, contest_measure_we_vote_id__iexact=contest_measure_we_vote_id)
+                        organization_id=organization_id,
+                        contest_measure_we_vote_id=canonicalize_we_vote_id(contest_measure_we_vote_id))
                     duplicates_count = len(duplicates_list)
                     duplicates_found = True if duplicates_count > 1 else False
                     success = True
@@ -3101,7 +3323,7 @@ class PositionManager(models.Model):
             elif positive_value_exists(voter_id) and positive_value_exists(contest_office_we_vote_id):
                 status += "MERGE_POSITION_DUPLICATES_WITH_VOTER_AND_OFFICE_WE_VOTE_ID "
                 duplicates_list = duplicates_list_starter.objects.filter(
-                    voter_id=voter_id, contest_office_we_vote_id__iexact=contest_office_we_vote_id)
+                    voter_id=voter_id, contest_office_we_vote_id=canonicalize_we_vote_id(contest_office_we_vote_id))
                 duplicates_count = len(duplicates_list)
                 duplicates_found = True if duplicates_count > 1 else False
                 success = True
@@ -3115,7 +3337,8 @@ class PositionManager(models.Model):
             elif positive_value_exists(voter_id) and positive_value_exists(candidate_campaign_we_vote_id):
                 status += "MERGE_POSITION_DUPLICATES_WITH_VOTER_AND_CANDIDATE_WE_VOTE_ID "
                 duplicates_list = duplicates_list_starter.objects.filter(
-                    voter_id=voter_id, candidate_campaign_we_vote_id__iexact=candidate_campaign_we_vote_id)
+                    voter_id=voter_id,
+                    candidate_campaign_we_vote_id=canonicalize_we_vote_id(candidate_campaign_we_vote_id))
                 duplicates_count = len(duplicates_list)
                 duplicates_found = True if duplicates_count > 1 else False
                 success = True
@@ -3129,7 +3352,7 @@ class PositionManager(models.Model):
             elif positive_value_exists(voter_id) and positive_value_exists(contest_measure_we_vote_id):
                 status += "MERGE_POSITION_DUPLICATES_WITH_VOTER_AND_MEASURE_WE_VOTE_ID "
                 duplicates_list = duplicates_list_starter.objects.filter(
-                    voter_id=voter_id, contest_measure_we_vote_id__iexact=contest_measure_we_vote_id)
+                    voter_id=voter_id, contest_measure_we_vote_id=canonicalize_we_vote_id(contest_measure_we_vote_id))
                 duplicates_count = len(duplicates_list)
                 duplicates_found = True if duplicates_count > 1 else False
                 success = True
@@ -3217,7 +3440,8 @@ class PositionManager(models.Model):
         try:
             if positive_value_exists(position_we_vote_id):
                 status += "RETRIEVE_POSITION_FOUND_WITH_WE_VOTE_ID "
-                position_on_stage = position_on_stage_starter.objects.get(we_vote_id__iexact=position_we_vote_id)
+                position_on_stage = position_on_stage_starter.objects.get(
+                    we_vote_id=canonicalize_we_vote_id(position_we_vote_id))
                 position_found = True
                 success = True
             # ###############################
@@ -3275,7 +3499,7 @@ class PositionManager(models.Model):
                     status += "RETRIEVE_POSITION_FOUND_WITH_ORG_CANDIDATE_WE_VOTE_ID_AND_ELECTION "
                     position_on_stage = position_on_stage_starter.objects.get(
                         organization_id=organization_id,
-                        candidate_campaign_we_vote_id__iexact=candidate_campaign_we_vote_id,
+                        candidate_campaign_we_vote_id=canonicalize_we_vote_id(candidate_campaign_we_vote_id),
                         google_civic_election_id=google_civic_election_id)
                     # If still here, we found an existing position
                     position_found = True
@@ -3284,7 +3508,7 @@ class PositionManager(models.Model):
                     status += "RETRIEVE_POSITION_FOUND_WITH_ORG_CANDIDATE_WE_VOTE_ID_AND_VOTE_SMART_TIME_SPAN "
                     position_on_stage = position_on_stage_starter.objects.get(
                         organization_id=organization_id,
-                        candidate_campaign_we_vote_id__iexact=candidate_campaign_we_vote_id,
+                        candidate_campaign_we_vote_id=canonicalize_we_vote_id(candidate_campaign_we_vote_id),
                         vote_smart_time_span__iexact=vote_smart_time_span)
                     # If still here, we found an existing position
                     position_found = True
@@ -3293,7 +3517,7 @@ class PositionManager(models.Model):
                     status += "RETRIEVE_POSITION_FOUND_WITH_ORG_AND_CANDIDATE_WE_VOTE_ID "
                     position_on_stage = position_on_stage_starter.objects.get(
                         organization_id=organization_id,
-                        candidate_campaign_we_vote_id__iexact=candidate_campaign_we_vote_id)
+                        candidate_campaign_we_vote_id=canonicalize_we_vote_id(candidate_campaign_we_vote_id))
                     # If still here, we found an existing position
                     position_found = True
                     success = True
@@ -3324,7 +3548,8 @@ class PositionManager(models.Model):
                 if positive_value_exists(google_civic_election_id):
                     status += "RETRIEVE_POSITION_FOUND_WITH_ORG_MEASURE_WE_VOTE_ID_AND_ELECTION "
                     position_on_stage = position_on_stage_starter.objects.get(
-                        organization_id=organization_id, contest_measure_we_vote_id__iexact=contest_measure_we_vote_id,
+                        organization_id=organization_id,
+                        contest_measure_we_vote_id=canonicalize_we_vote_id(contest_measure_we_vote_id),
                         google_civic_election_id=google_civic_election_id)
                     # If still here, we found an existing position
                     position_found = True
@@ -3332,7 +3557,8 @@ class PositionManager(models.Model):
                 elif positive_value_exists(vote_smart_time_span):
                     status += "RETRIEVE_POSITION_FOUND_WITH_ORG_MEASURE_WE_VOTE_ID_AND_VOTE_SMART_TIME_SPAN "
                     position_on_stage = position_on_stage_starter.objects.get(
-                        organization_id=organization_id, contest_measure_we_vote_id__iexact=contest_measure_we_vote_id,
+                        organization_id=organization_id,
+                        contest_measure_we_vote_id=canonicalize_we_vote_id(contest_measure_we_vote_id),
                         vote_smart_time_span__iexact=vote_smart_time_span)
                     # If still here, we found an existing position
                     position_found = True
@@ -3340,7 +3566,8 @@ class PositionManager(models.Model):
                 else:
                     status += "RETRIEVE_POSITION_FOUND_WITH_ORG_AND_MEASURE_WE_VOTE_ID "
                     position_on_stage = position_on_stage_starter.objects.get(
-                        organization_id=organization_id, contest_measure_we_vote_id__iexact=contest_measure_we_vote_id)
+                        organization_id=organization_id,
+                        contest_measure_we_vote_id=canonicalize_we_vote_id(contest_measure_we_vote_id))
                     position_found = True
                     success = True
             # ###############################
@@ -3354,7 +3581,7 @@ class PositionManager(models.Model):
             elif positive_value_exists(voter_id) and positive_value_exists(contest_office_we_vote_id):
                 status += "RETRIEVE_POSITION_FOUND_WITH_VOTER_AND_OFFICE_WE_VOTE_ID "
                 position_on_stage = position_on_stage_starter.objects.get(
-                    voter_id=voter_id, contest_office_we_vote_id__iexact=contest_office_we_vote_id)
+                    voter_id=voter_id, contest_office_we_vote_id=canonicalize_we_vote_id(contest_office_we_vote_id))
                 position_found = True
                 success = True
             elif positive_value_exists(voter_id) and positive_value_exists(candidate_campaign_id):
@@ -3366,7 +3593,8 @@ class PositionManager(models.Model):
             elif positive_value_exists(voter_id) and positive_value_exists(candidate_campaign_we_vote_id):
                 status += "RETRIEVE_POSITION_FOUND_WITH_VOTER_AND_CANDIDATE_WE_VOTE_ID "
                 position_on_stage = position_on_stage_starter.objects.get(
-                    voter_id=voter_id, candidate_campaign_we_vote_id__iexact=candidate_campaign_we_vote_id)
+                    voter_id=voter_id,
+                    candidate_campaign_we_vote_id=canonicalize_we_vote_id(candidate_campaign_we_vote_id))
                 position_found = True
                 success = True
             elif positive_value_exists(voter_id) and positive_value_exists(contest_measure_id):
@@ -3378,7 +3606,7 @@ class PositionManager(models.Model):
             elif positive_value_exists(voter_id) and positive_value_exists(contest_measure_we_vote_id):
                 status += "RETRIEVE_POSITION_FOUND_WITH_VOTER_AND_MEASURE_WE_VOTE_ID "
                 position_on_stage = position_on_stage_starter.objects.get(
-                    voter_id=voter_id, contest_measure_we_vote_id__iexact=contest_measure_we_vote_id)
+                    voter_id=voter_id, contest_measure_we_vote_id=canonicalize_we_vote_id(contest_measure_we_vote_id))
                 position_found = True
                 success = True
             else:
@@ -5899,7 +6127,7 @@ class PositionMetricsManager(models.Model):
         count_result = None
         try:
             count_query = PositionForFriends.objects.using('readonly').all()
-            count_query = count_query.filter(voter_we_vote_id__iexact=voter_we_vote_id)
+            count_query = count_query.filter(voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id))
             count_query = count_query.exclude(
                 (Q(statement_text__isnull=True) | Q(statement_text__exact='')) &
                 (Q(statement_html__isnull=True) | Q(statement_html__exact=''))
@@ -5913,7 +6141,7 @@ class PositionMetricsManager(models.Model):
         count_result = None
         try:
             count_query = PositionEntered.objects.using('readonly').all()
-            count_query = count_query.filter(voter_we_vote_id__iexact=voter_we_vote_id)
+            count_query = count_query.filter(voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id))
             count_query = count_query.exclude(
                 (Q(statement_text__isnull=True) | Q(statement_text__exact='')) &
                 (Q(statement_html__isnull=True) | Q(statement_html__exact=''))
@@ -5927,7 +6155,7 @@ class PositionMetricsManager(models.Model):
         count_result = None
         try:
             count_query = PositionForFriends.objects.using('readonly').all()
-            count_query = count_query.filter(voter_we_vote_id__iexact=voter_we_vote_id)
+            count_query = count_query.filter(voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id))
             count_result = count_query.count()
         except Exception as e:
             pass
@@ -5937,18 +6165,60 @@ class PositionMetricsManager(models.Model):
         count_result = None
         try:
             count_query = PositionEntered.objects.using('readonly').all()
-            count_query = count_query.filter(voter_we_vote_id__iexact=voter_we_vote_id)
+            count_query = count_query.filter(voter_we_vote_id=canonicalize_we_vote_id(voter_we_vote_id))
             count_result = count_query.count()
         except Exception as e:
             pass
         return count_result
 
+    def fetch_positions_and_comments_entered_by_voters(self, voter_we_vote_id_list):
+        """
+        The counts behind fetch_voter_positions_entered_public, fetch_voter_positions_entered_friends_only,
+        fetch_voter_comments_entered_public and fetch_voter_comments_entered_friends_only, for many voters with one
+        GROUP BY query per table
+        :param voter_we_vote_id_list:
+        :return: voter_we_vote_id (in canonical form) -> {positions_entered_public, positions_entered_friends_only,
+         comments_entered_public, comments_entered_friends_only}, or None if a query failed
+        """
+        voter_we_vote_id_list = list(set(canonicalize_we_vote_id(voter_we_vote_id)
+                                         for voter_we_vote_id in voter_we_vote_id_list
+                                         if positive_value_exists(voter_we_vote_id)))
+        voter_position_counts = {}
+        for voter_we_vote_id in voter_we_vote_id_list:
+            voter_position_counts[voter_we_vote_id] = {
+                'positions_entered_public':         0,
+                'positions_entered_friends_only':   0,
+                'comments_entered_public':          0,
+                'comments_entered_friends_only':    0,
+            }
+        if not voter_we_vote_id_list:
+            return voter_position_counts
+        # "> ''" is only true for text that is neither null nor empty
+        with_comment = Q(statement_text__gt='') | Q(statement_html__gt='')
+        try:
+            for position_model, visibility in ((PositionEntered, 'public'), (PositionForFriends, 'friends_only')):
+                count_query = position_model.objects.using('readonly').filter(
+                    voter_we_vote_id__in=voter_we_vote_id_list)
+                count_query = count_query.values('voter_we_vote_id').annotate(
+                    positions_entered=Count('id'),
+                    comments_entered=Count(Case(When(with_comment, then='id'))),
+                ).order_by()
+                for one_voter_counts in count_query:
+                    one_voter_position_counts = voter_position_counts[one_voter_counts['voter_we_vote_id']]
+                    one_voter_position_counts['positions_entered_' + visibility] = \
+                        one_voter_counts['positions_entered']
+                    one_voter_position_counts['comments_entered_' + visibility] = one_voter_counts['comments_entered']
+            return voter_position_counts
+        except Exception as e:
+            logger.error("fetch_positions_and_comments_entered_by_voters: {error}".format(error=e))
+            return None
+
     def fetch_positions_count_for_this_voter(self, voter):
 
         position_filters = []
         final_position_filters = []
         if positive_value_exists(voter.we_vote_id):
-            new_position_filter = Q(voter_we_vote_id__iexact=voter.we_vote_id)
+            new_position_filter = Q(voter_we_vote_id=canonicalize_we_vote_id(voter.we_vote_id))
             position_filters.append(new_position_filter)
         if positive_value_exists(voter.id):
             new_position_filter = Q(voter_id=voter.id)
@@ -5979,3 +6249,51 @@ class PositionMetricsManager(models.Model):
         total_positions_count = position_entered_count + position_for_friends_count
 
         return total_positions_count
+
+
+# Keep the support/oppose tallies and the cached public position index current for every way a position is
+#  written. save() and QuerySet.delete (which sends post_delete for each entry) are handled one position at a time.
+#  bulk_upsert sends post_bulk_upsert once for each batch, and we handle the whole batch at once.
+@receiver(pre_save, sender=PositionEntered)
+def pre_save_position_entered_signal(sender, instance, **kwargs):
+    # A position moved to another election also changes the public position index of the election it was in
+    if not instance.pk:
+        return
+    previous_google_civic_election_id = PositionEntered.objects.filter(pk=instance.pk)\
+        .values_list('google_civic_election_id', flat=True).first()
+    if convert_to_int(previous_google_civic_election_id) != convert_to_int(instance.google_civic_election_id):
+        clear_public_position_index_for_election(previous_google_civic_election_id)
+
+
+@receiver(post_save, sender=PositionEntered)
+def save_position_entered_signal(sender, instance, **kwargs):
+    SupportOpposeTallyManager().update_or_create_tally_from_position(instance, True)
+    clear_public_position_index_for_election(instance.google_civic_election_id)
+
+
+@receiver(post_delete, sender=PositionEntered)
+def delete_position_entered_signal(sender, instance, **kwargs):
+    SupportOpposeTallyManager().delete_tally_for_position(instance.we_vote_id, True)
+    clear_public_position_index_for_election(instance.google_civic_election_id)
+
+
+@receiver(post_bulk_upsert, sender=PositionEntered)
+def bulk_upsert_position_entered_signal(sender, created_entry_list, updated_entry_list, previous_values_by_pk,
+                                        **kwargs):
+    # One bulk upsert for the tallies of the whole batch
+    SupportOpposeTallyManager().update_or_create_tallies_from_position_list(
+        created_entry_list + updated_entry_list, True)
+    # One version bump for each election in the batch, instead of one for every position on the same hot row
+    for google_civic_election_id in fetch_bulk_upsert_google_civic_election_id_set(
+            created_entry_list, updated_entry_list, previous_values_by_pk):
+        clear_public_position_index_for_election(google_civic_election_id)
+
+
+@receiver(post_save, sender=PositionForFriends)
+def save_position_for_friends_signal(sender, instance, **kwargs):
+    SupportOpposeTallyManager().update_or_create_tally_from_position(instance, False)
+
+
+@receiver(post_delete, sender=PositionForFriends)
+def delete_position_for_friends_signal(sender, instance, **kwargs):
+    SupportOpposeTallyManager().delete_tally_for_position(instance.we_vote_id, False)
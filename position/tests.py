@@ -0,0 +1,74 @@
+# position/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.core.cache import cache
+from django.test import TestCase
+from position.models import PositionEntered, PositionListManager, PublicPositionIndexVersion, SUPPORT
+from wevote_functions.bulk_upsert import bulk_upsert
+
+GOOGLE_CIVIC_ELECTION_ID = 1000
+OTHER_GOOGLE_CIVIC_ELECTION_ID = 2000
+
+
+class PublicPositionIndexTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def fetch_organization_we_vote_ids_in_index(self, google_civic_election_id):
+        position_list_manager = PositionListManager()
+        return [position_index_entry.organization_we_vote_id for position_index_entry in
+                position_list_manager.retrieve_public_position_index_for_election(google_civic_election_id)]
+
+    def test_index_follows_every_write(self):
+        self.assertEqual(self.fetch_organization_we_vote_ids_in_index(GOOGLE_CIVIC_ELECTION_ID), [])
+
+        position = PositionEntered.objects.create(
+            candidate_campaign_we_vote_id="wv01cand1", google_civic_election_id=GOOGLE_CIVIC_ELECTION_ID,
+            organization_we_vote_id="wv01org1", stance=SUPPORT)
+        self.assertEqual(self.fetch_organization_we_vote_ids_in_index(GOOGLE_CIVIC_ELECTION_ID), ["wv01org1"])
+
+        # Moving the position to another election changes the index of both elections
+        self.assertEqual(self.fetch_organization_we_vote_ids_in_index(OTHER_GOOGLE_CIVIC_ELECTION_ID), [])
+        position.google_civic_election_id = OTHER_GOOGLE_CIVIC_ELECTION_ID
+        position.save()
+        self.assertEqual(self.fetch_organization_we_vote_ids_in_index(GOOGLE_CIVIC_ELECTION_ID), [])
+        self.assertEqual(self.fetch_organization_we_vote_ids_in_index(OTHER_GOOGLE_CIVIC_ELECTION_ID), ["wv01org1"])
+
+        # QuerySet.delete doesn't call delete() on each entry
+        PositionEntered.objects.filter(id=position.id).delete()
+        self.assertEqual(self.fetch_organization_we_vote_ids_in_index(OTHER_GOOGLE_CIVIC_ELECTION_ID), [])
+
+    def test_index_version_is_shared_through_the_database(self):
+        PositionEntered.objects.create(
+            candidate_campaign_we_vote_id="wv01cand1", google_civic_election_id=GOOGLE_CIVIC_ELECTION_ID,
+            organization_we_vote_id="wv01org1", stance=SUPPORT)
+        self.assertEqual(self.fetch_organization_we_vote_ids_in_index(GOOGLE_CIVIC_ELECTION_ID), ["wv01org1"])
+
+        # Another server process changes a position. Its cache isn't ours, but the version in the database is.
+        PositionEntered.objects.filter(google_civic_election_id=GOOGLE_CIVIC_ELECTION_ID)\
+            .update(organization_we_vote_id="wv01org2")
+        PublicPositionIndexVersion.objects.filter(google_civic_election_id=GOOGLE_CIVIC_ELECTION_ID)\
+            .update(index_version=99)
+        self.assertEqual(self.fetch_organization_we_vote_ids_in_index(GOOGLE_CIVIC_ELECTION_ID), ["wv01org2"])
+
+    def fetch_index_version(self, google_civic_election_id):
+        return PublicPositionIndexVersion.objects.filter(google_civic_election_id=google_civic_election_id)\
+            .values_list('index_version', flat=True).first() or 0
+
+    def test_index_version_moves_once_for_each_election_in_a_bulk_upsert(self):
+        bulk_upsert(PositionEntered, [
+            {'we_vote_id': 'wv01pos{number}'.format(number=number), 'candidate_campaign_we_vote_id': "wv01cand1",
+             'google_civic_election_id': GOOGLE_CIVIC_ELECTION_ID, 'stance': SUPPORT,
+             'organization_we_vote_id': 'wv01org{number}'.format(number=number)} for number in range(5)])
+        self.assertEqual(self.fetch_index_version(GOOGLE_CIVIC_ELECTION_ID), 1)
+        self.assertEqual(len(self.fetch_organization_we_vote_ids_in_index(GOOGLE_CIVIC_ELECTION_ID)), 5)
+
+        # Moving a position to another election changes the index of both elections
+        bulk_upsert(PositionEntered, [{'we_vote_id': 'wv01pos0',
+                                       'google_civic_election_id': OTHER_GOOGLE_CIVIC_ELECTION_ID}])
+        self.assertEqual(self.fetch_index_version(GOOGLE_CIVIC_ELECTION_ID), 2)
+        self.assertEqual(self.fetch_index_version(OTHER_GOOGLE_CIVIC_ELECTION_ID), 1)
+        self.assertEqual(len(self.fetch_organization_we_vote_ids_in_index(GOOGLE_CIVIC_ELECTION_ID)), 4)
+        self.assertEqual(self.fetch_organization_we_vote_ids_in_index(OTHER_GOOGLE_CIVIC_ELECTION_ID), ["wv01org0"])
@@ -24,6 +24,7 @@ from position.models import PositionListManager
 from voter.models import voter_has_authority
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, positive_value_exists
+from wevote_functions.master_sync import fetch_sync_out_changed_since, fetch_sync_out_watermark, sync_out_response
 from django.http import HttpResponse
 import json
 
@@ -33,41 +34,42 @@ logger = wevote_functions.admin.get_logger(__name__)
 # This page does not need to be protected.
 def positions_sync_out_view(request):  # positionsSyncOut
     google_civic_election_id = convert_to_int(request.GET.get('google_civic_election_id', 0))
+    changed_since = fetch_sync_out_changed_since(request)
+    sync_watermark = fetch_sync_out_watermark()
 
     position_list_manager = PositionListManager()
     public_only = True
     position_list = position_list_manager.retrieve_all_positions_for_election(google_civic_election_id, ANY_STANCE,
                                                                               public_only)
 
-    if position_list:
+    # We get a list (always empty) rather than a queryset when the election can't be used
+    if not isinstance(position_list, list):
+        if changed_since is not None:
+            position_list = position_list.filter(date_last_changed__gte=changed_since)
         # convert datetime to str for date_entered and date_last_changed columns
         position_list = position_list.extra(
             select={'date_entered': "to_char(date_entered, 'YYYY-MM-DD HH24:MI:SS')"})
         position_list = position_list.extra(
             select={'date_last_changed': "to_char(date_last_changed, 'YYYY-MM-DD HH24:MI:SS')"})
 
-        position_list_dict = position_list.values(
-            'we_vote_id', 'ballot_item_display_name', 'ballot_item_image_url_https',
-            'ballot_item_twitter_handle', 'speaker_display_name',
-            'speaker_image_url_https', 'speaker_twitter_handle', 'date_entered',
-            'date_last_changed', 'organization_we_vote_id', 'voter_we_vote_id',
-            'public_figure_we_vote_id', 'google_civic_election_id', 'state_code',
-            'vote_smart_rating_id', 'vote_smart_time_span', 'vote_smart_rating',
-            'vote_smart_rating_name', 'contest_office_we_vote_id',
-            'candidate_campaign_we_vote_id', 'google_civic_candidate_name',
-            'politician_we_vote_id', 'contest_measure_we_vote_id', 'stance',
-            'statement_text', 'statement_html', 'more_info_url', 'from_scraper',
-            'organization_certified', 'volunteer_certified', 'voter_entering_position',
-            'tweet_source_id', 'twitter_user_entered_position')
-        if position_list_dict:
-            position_list_json = list(position_list_dict)
-            return HttpResponse(json.dumps(position_list_json), content_type='application/json')
-    else:
-        json_data = {
-            'success': False,
-            'status': 'POSITION_LIST_MISSING'
-        }
-        return HttpResponse(json.dumps(json_data), content_type='application/json')
+        response = sync_out_response(request, position_list, [
+            'we_vote_id', 'ballot_item_display_name', 'ballot_item_image_url_https', 'ballot_item_twitter_handle',
+            'speaker_display_name', 'speaker_image_url_https', 'speaker_twitter_handle', 'date_entered',
+            'date_last_changed', 'organization_we_vote_id', 'voter_we_vote_id', 'public_figure_we_vote_id',
+            'google_civic_election_id', 'state_code', 'vote_smart_rating_id', 'vote_smart_time_span',
+            'vote_smart_rating', 'vote_smart_rating_name', 'contest_office_we_vote_id',
+            'candidate_campaign_we_vote_id', 'google_civic_candidate_name', 'politician_we_vote_id',
+            'contest_measure_we_vote_id', 'stance', 'statement_text', 'statement_html', 'more_info_url',
+            'from_scraper', 'organization_certified', 'volunteer_certified', 'voter_entering_position',
+            'tweet_source_id', 'twitter_user_entered_position'], sync_watermark)
+        if response is not None:
+            return response
+
+    json_data = {
+        'success': False,
+        'status': 'POSITION_LIST_MISSING'
+    }
+    return HttpResponse(json.dumps(json_data), content_type='application/json')
 
 
 @login_required
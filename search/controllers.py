@@ -2,25 +2,45 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
-from candidate.models import CandidateCampaignManager
-from config.base import get_environment_variable
-from elasticsearch import Elasticsearch
-from organization.models import OrganizationManager
+from .indexer import elastic_search_object
 from voter.models import fetch_voter_id_from_voter_device_link
 import wevote_functions.admin
-from wevote_functions.functions import is_voter_device_id_valid, positive_value_exists
+from wevote_functions.functions import convert_to_int, is_voter_device_id_valid, positive_value_exists
 
 logger = wevote_functions.admin.get_logger(__name__)
-ELASTIC_SEARCH_CONNECTION_STRING = get_environment_variable("ELASTIC_SEARCH_CONNECTION_STRING")
 
+SEARCH_ALL_DEFAULT_LIMIT = 10  # What Elastic Search returned when we didn't ask for a size
+SEARCH_ALL_MAXIMUM_LIMIT = 50
+# We never page further than this into the results, since every index has to return offset + limit hits
+SEARCH_ALL_MAXIMUM_WINDOW = 500
+
+# index name -> (doc_type, the fields we search in that index)
+# 2016-08-27 No longer searching politician table -- candidate only
+SEARCH_ALL_INDEX_QUERY_FIELDS = [
+    ('candidates', 'candidate', ["candidate_name", "candidate_twitter_handle", "twitter_name", "party"]),
+    ('measures', 'measure', ["measure_subtitle", "measure_text", "measure_title"]),
+    ('offices', 'office', ["office_name"]),
+    ('organizations', 'organization', ["organization_name", "organization_twitter_handle", "twitter_description"]),
+]
 
-def search_all_for_api(text_from_search_field, voter_device_id):
-    """
 
+def search_all_for_api(text_from_search_field, voter_device_id, search_results_limit=SEARCH_ALL_DEFAULT_LIMIT,
+                       search_results_offset=0):
+    """
+    Search every index with one msearch request. Each index gets a query on its own fields, and only returns the
+    hits that can be on the page asked for. Results are built from each hit's _source, without reading the database.
     :param text_from_search_field:
     :param voter_device_id:
+    :param search_results_limit: results per page, at most SEARCH_ALL_MAXIMUM_LIMIT
+    :param search_results_offset: the number of (best scoring) results to skip
     :return:
     """
+    search_results_limit = convert_to_int(search_results_limit)
+    if not 0 < search_results_limit <= SEARCH_ALL_MAXIMUM_LIMIT:
+        search_results_limit = SEARCH_ALL_DEFAULT_LIMIT if search_results_limit <= 0 else SEARCH_ALL_MAXIMUM_LIMIT
+    search_results_offset = max(convert_to_int(search_results_offset), 0)
+    search_results_offset = min(search_results_offset, SEARCH_ALL_MAXIMUM_WINDOW - search_results_limit)
+
     if not positive_value_exists(text_from_search_field):
         results = {
             'status':                   'TEXT_FROM_SEARCH_FIELD_MISSING',
@@ -29,10 +49,12 @@ def search_all_for_api(text_from_search_field, voter_device_id):
             'voter_device_id':          voter_device_id,
             'search_results_found':     False,
             'search_results':           [],
+            'search_results_total':     0,
+            'search_results_offset':    search_results_offset,
         }
         return results
 
-    if not positive_value_exists(ELASTIC_SEARCH_CONNECTION_STRING):
+    if elastic_search_object is None:
         results = {
             'status':                   'MISSING_ELASTIC_SEARCH_CONNECTION_STRING',
             'success':                  False,
@@ -40,6 +62,8 @@ def search_all_for_api(text_from_search_field, voter_device_id):
             'voter_device_id':          voter_device_id,
             'search_results_found':     False,
             'search_results':           [],
+            'search_results_total':     0,
+            'search_results_offset':    search_results_offset,
         }
         return results
 
@@ -53,6 +77,8 @@ def search_all_for_api(text_from_search_field, voter_device_id):
             'voter_device_id':          voter_device_id,
             'search_results_found':     False,
             'search_results':           [],
+            'search_results_total':     0,
+            'search_results_offset':    search_results_offset,
         }
         return results
 
@@ -65,146 +91,52 @@ def search_all_for_api(text_from_search_field, voter_device_id):
             'voter_device_id':          voter_device_id,
             'search_results_found':     False,
             'search_results':           [],
+            'search_results_total':     0,
+            'search_results_offset':    search_results_offset,
         }
         return results
 
-    elastic_search_object = Elasticsearch([ELASTIC_SEARCH_CONNECTION_STRING],
-                                          timeout=2, max_retries=1, retry_on_timeout=True)
-
-    # query = {"query": {"match": {"candidate_name": text_from_search_field}}}
-    # 2016-08-27 No longer searching politician table -- candidate only
-    query = {"query": {"multi_match": {"type": "phrase_prefix",
-                                       "query": text_from_search_field,
-                                       "fields": ["candidate_name",
-                                                  "candidate_twitter_handle", "twitter_name",
-                                                  "measure_subtitle", "measure_text", "measure_title",
-                                                  "office_name",
-                                                  "party", "organization_name", "organization_twitter_handle",
-                                                  "twitter_description"]}}}
-
-    # Example of querying ALL indexes
+    # Any result on this page is in the top (offset + limit) of its own index
+    msearch_body = []
+    for index_name, doc_type, query_field_list in SEARCH_ALL_INDEX_QUERY_FIELDS:
+        msearch_body.append({'index': index_name, 'type': doc_type})
+        msearch_body.append({
+            'query': {"multi_match": {"type": "phrase_prefix",
+                                      "query": text_from_search_field,
+                                      "fields": query_field_list}},
+            'from': 0,
+            'size': search_results_offset + search_results_limit,
+        })
+
     search_results = []
-    search_count = 0
-    candidate_manager = CandidateCampaignManager()
-    organization_manager = OrganizationManager()
+    search_results_total = 0
+    status = ""
     try:
-        res = elastic_search_object.search(body=query)
+        res = elastic_search_object.msearch(body=msearch_body)
         # See bottom of this file for example results from Elastic Search
 
-        search_results_elastic_search_raw = res['hits']['hits']
-
-        for hit in search_results_elastic_search_raw:
-            one_search_result_type = hit['_type']
-            one_search_result_id = hit['_id']
-            one_search_result_dict = hit['_source']
-            one_search_result_score = hit['_score']
-            if one_search_result_type == "office":
-                link_internal = "/office/" + one_search_result_dict['we_vote_id']
-
-                one_search_result = {
-                    'result_title':             one_search_result_dict['office_name'],
-                    'result_image':             "",
-                    'result_subtitle':          "",
-                    'result_summary':           "",
-                    'result_score':             one_search_result_score,
-                    'link_internal':            link_internal,
-                    'kind_of_owner':            "OFFICE",
-                    'google_civic_election_id': one_search_result_dict['google_civic_election_id'],
-                    'state_code':               one_search_result_dict['state_code'],
-                    'twitter_handle':           "",
-                    'we_vote_id':               one_search_result_dict['we_vote_id'],
-                    'local_id':                 one_search_result_id,
-                }
-                search_results.append(one_search_result)
-                search_count += 1
-            elif one_search_result_type == "candidate":
-                if positive_value_exists(one_search_result_dict['candidate_twitter_handle']):
-                    link_internal = "/" + one_search_result_dict['candidate_twitter_handle']
-                else:
-                    link_internal = "/candidate/" + one_search_result_dict['we_vote_id']
-
-                results = candidate_manager.retrieve_candidate_campaign_from_we_vote_id(
-                    one_search_result_dict['we_vote_id'])
-                if results['candidate_campaign_found']:
-                    candidate = results['candidate_campaign']
-                    result_image = candidate.candidate_photo_url()
-                else:
-                    result_image = ""
-
-                one_search_result = {
-                    'result_title':             one_search_result_dict['candidate_name'],
-                    'result_image':             result_image,
-                    'result_subtitle':          "",
-                    'result_summary':           "",
-                    'result_score':             one_search_result_score,
-                    'link_internal':            link_internal,
-                    'kind_of_owner':            "CANDIDATE",
-                    'google_civic_election_id': one_search_result_dict['google_civic_election_id'],
-                    'state_code':               one_search_result_dict['state_code'],
-                    'twitter_handle':           one_search_result_dict['candidate_twitter_handle'],
-                    'we_vote_id':               one_search_result_dict['we_vote_id'],
-                    'local_id':                 one_search_result_id,
-                }
-                search_results.append(one_search_result)
-                search_count += 1
-            elif one_search_result_type == "measure":
-                link_internal = "/measure/" + one_search_result_dict['we_vote_id']
-
-                one_search_result = {
-                    'result_title':             one_search_result_dict['measure_title'],
-                    'result_image':             "",
-                    'result_subtitle':          one_search_result_dict['measure_subtitle'],
-                    'result_summary':           one_search_result_dict['measure_text'],
-                    'result_score':             one_search_result_score,
-                    'link_internal':            link_internal,
-                    'kind_of_owner':            "MEASURE",
-                    'google_civic_election_id': one_search_result_dict['google_civic_election_id'],
-                    'state_code':               one_search_result_dict['state_code'],
-                    'twitter_handle':           "",
-                    'we_vote_id':               one_search_result_dict['we_vote_id'],
-                    'local_id':                 one_search_result_id,
-                }
-                search_results.append(one_search_result)
-                search_count += 1
-            elif one_search_result_type == "organization":
-                if 'organization_twitter_handle' in one_search_result_dict and \
-                        positive_value_exists(one_search_result_dict['organization_twitter_handle']):
-                    link_internal = "/" + one_search_result_dict['organization_twitter_handle']
-                else:
-                    link_internal = "/voterguide/" + one_search_result_dict['we_vote_id']
-
-                results = organization_manager.retrieve_organization_from_we_vote_id(
-                    one_search_result_dict['we_vote_id'])
-                if results['organization_found']:
-                    organization = results['organization']
-                    result_image = organization.organization_photo_url()
-                else:
-                    result_image = ""
-
-                one_search_result = {
-                    'result_title':             one_search_result_dict['organization_name'],
-                    'result_image':             result_image,
-                    'result_subtitle':          "",
-                    'result_summary':           one_search_result_dict['twitter_description'],
-                    'result_score':             one_search_result_score,
-                    'link_internal':            link_internal,
-                    'kind_of_owner':            "ORGANIZATION",
-                    'google_civic_election_id': 0,
-                    'state_code':               one_search_result_dict['state_served_code'],
-                    'twitter_handle':           one_search_result_dict['organization_twitter_handle'],
-                    'we_vote_id':               one_search_result_dict['we_vote_id'],
-                    'local_id':                 one_search_result_id,
-                }
-                search_results.append(one_search_result)
-                search_count += 1
-            elif one_search_result_type == "politician":
-                # If we are here, then we should skip out. We aren't displaying politicians
+        search_hit_list = []
+        for (index_name, doc_type, query_field_list), index_response in \
+                zip(SEARCH_ALL_INDEX_QUERY_FIELDS, res['responses']):
+            if 'error' in index_response:
+                # One index failing (it might not have been created yet) shouldn't hide results from the others
+                status += "ELASTIC_SEARCH_INDEX_ERROR {index_name} ".format(index_name=index_name)
+                logger.error("searchAll {index_name}: {error}".format(index_name=index_name,
+                                                                      error=index_response['error']))
                 continue
-        status = "SEARCH_ALL_COMPLETE"
+            search_results_total += index_response['hits']['total']
+            search_hit_list += index_response['hits']['hits']
+
+        search_hit_list.sort(key=lambda hit: hit['_score'], reverse=True)
+        for hit in search_hit_list[search_results_offset:search_results_offset + search_results_limit]:
+            one_search_result = fetch_search_result_from_hit(hit)
+            if one_search_result is not None:
+                search_results.append(one_search_result)
+        status += "SEARCH_ALL_COMPLETE"
         success = True
 
     except Exception as e:
-        status = 'ELASTIC_SEARCH_EXCEPTION'
+        status += 'ELASTIC_SEARCH_EXCEPTION {error} [type: {error_type}]'.format(error=e, error_type=type(e))
         success = False
 
     results = {
@@ -212,11 +144,105 @@ def search_all_for_api(text_from_search_field, voter_device_id):
         'success':                  success,
         'text_from_search_field':   text_from_search_field,
         'voter_device_id':          voter_device_id,
-        'search_results_found':     True if search_count > 0 else False,
+        'search_results_found':     True if len(search_results) > 0 else False,
         'search_results':           search_results,
+        'search_results_total':     search_results_total,
+        'search_results_offset':    search_results_offset,
     }
     return results
 
+
+def fetch_search_result_from_hit(hit):
+    """
+    Build one searchAll result from an Elastic Search hit, using only what we indexed in search/indexer.py
+    :param hit:
+    :return: None for a kind of hit we don't display
+    """
+    one_search_result_type = hit['_type']
+    one_search_result_id = hit['_id']
+    one_search_result_dict = hit['_source']
+    one_search_result_score = hit['_score']
+    if one_search_result_type == "office":
+        link_internal = "/office/" + one_search_result_dict['we_vote_id']
+
+        one_search_result = {
+            'result_title':             one_search_result_dict['office_name'],
+            'result_image':             "",
+            'result_subtitle':          "",
+            'result_summary':           "",
+            'result_score':             one_search_result_score,
+            'link_internal':            link_internal,
+            'kind_of_owner':            "OFFICE",
+            'google_civic_election_id': one_search_result_dict['google_civic_election_id'],
+            'state_code':               one_search_result_dict['state_code'],
+            'twitter_handle':           "",
+            'we_vote_id':               one_search_result_dict['we_vote_id'],
+            'local_id':                 one_search_result_id,
+        }
+    elif one_search_result_type == "candidate":
+        if positive_value_exists(one_search_result_dict['candidate_twitter_handle']):
+            link_internal = "/" + one_search_result_dict['candidate_twitter_handle']
+        else:
+            link_internal = "/candidate/" + one_search_result_dict['we_vote_id']
+
+        one_search_result = {
+            'result_title':             one_search_result_dict['candidate_name'],
+            # Documents indexed before candidate_photo_url was added don't have it, until reindex_search is run
+            'result_image':             one_search_result_dict.get('candidate_photo_url') or "",
+            'result_subtitle':          "",
+            'result_summary':           "",
+            'result_score':             one_search_result_score,
+            'link_internal':            link_internal,
+            'kind_of_owner':            "CANDIDATE",
+            'google_civic_election_id': one_search_result_dict['google_civic_election_id'],
+            'state_code':               one_search_result_dict['state_code'],
+            'twitter_handle':           one_search_result_dict['candidate_twitter_handle'],
+            'we_vote_id':               one_search_result_dict['we_vote_id'],
+            'local_id':                 one_search_result_id,
+        }
+    elif one_search_result_type == "measure":
+        link_internal = "/measure/" + one_search_result_dict['we_vote_id']
+
+        one_search_result = {
+            'result_title':             one_search_result_dict['measure_title'],
+            'result_image':             "",
+            'result_subtitle':          one_search_result_dict['measure_subtitle'],
+            'result_summary':           one_search_result_dict['measure_text'],
+            'result_score':             one_search_result_score,
+            'link_internal':            link_internal,
+            'kind_of_owner':            "MEASURE",
+            'google_civic_election_id': one_search_result_dict['google_civic_election_id'],
+            'state_code':               one_search_result_dict['state_code'],
+            'twitter_handle':           "",
+            'we_vote_id':               one_search_result_dict['we_vote_id'],
+            'local_id':                 one_search_result_id,
+        }
+    elif one_search_result_type == "organization":
+        if 'organization_twitter_handle' in one_search_result_dict and \
+                positive_value_exists(one_search_result_dict['organization_twitter_handle']):
+            link_internal = "/" + one_search_result_dict['organization_twitter_handle']
+        else:
+            link_internal = "/voterguide/" + one_search_result_dict['we_vote_id']
+
+        one_search_result = {
+            'result_title':             one_search_result_dict['organization_name'],
+            'result_image':             one_search_result_dict.get('organization_photo_url') or "",
+            'result_subtitle':          "",
+            'result_summary':           one_search_result_dict['twitter_description'],
+            'result_score':             one_search_result_score,
+            'link_internal':            link_internal,
+            'kind_of_owner':            "ORGANIZATION",
+            'google_civic_election_id': 0,
+            'state_code':               one_search_result_dict['state_served_code'],
+            'twitter_handle':           one_search_result_dict['organization_twitter_handle'],
+            'we_vote_id':               one_search_result_dict['we_vote_id'],
+            'local_id':                 one_search_result_id,
+        }
+    else:
+        # We aren't displaying politicians
+        return None
+    return one_search_result
+
 # ------------- RESULT --------------
 # _score: 1.3017262
 # _type: candidate
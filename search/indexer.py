@@ -0,0 +1,328 @@
+# search/indexer.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+# Keeping the Elastic Search indexes up to date without making every save wait on Elastic Search.
+# The post_save and post_delete receivers in search/models.py only add a document to search_indexer's buffer.
+# A background thread sends the buffer through the _bulk api once it holds ELASTIC_SEARCH_BULK_SIZE documents, or
+# once the oldest document has waited ELASTIC_SEARCH_FLUSH_SECONDS. If an entry is saved several times before the
+# buffer is sent (which is common during an import), only its latest document is sent.
+# bulk_reindex_search_index rebuilds a whole index from the database, for the reindex_search management command.
+
+import atexit
+from candidate.models import CandidateCampaign
+from collections import OrderedDict
+from config.base import get_environment_variable
+from elasticsearch import Elasticsearch
+import json
+from measure.models import ContestMeasure
+from office.models import ContestOffice
+from organization.models import Organization
+import os
+import threading
+import time
+import wevote_functions.admin
+from wevote_functions.functions import positive_value_exists
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+ELASTIC_SEARCH_CONNECTION_STRING = get_environment_variable("ELASTIC_SEARCH_CONNECTION_STRING")
+ELASTIC_SEARCH_BULK_SIZE = 500
+ELASTIC_SEARCH_FLUSH_SECONDS = 2
+ELASTIC_SEARCH_BULK_TIMEOUT_SECONDS = 30
+
+# index name -> (model, doc_type, the fields we copy into each document)
+# A method name in the list (like candidate_photo_url) is called, so searchAll can show the result without going back
+# to the database
+SEARCH_INDEXES = OrderedDict([
+    ('candidates', (CandidateCampaign, 'candidate', [
+        'candidate_name', 'candidate_twitter_handle', 'twitter_name', 'party', 'google_civic_election_id',
+        'state_code', 'we_vote_id', 'candidate_photo_url'])),
+    ('measures', (ContestMeasure, 'measure', [
+        'we_vote_id', 'measure_subtitle', 'measure_text', 'measure_title', 'google_civic_election_id',
+        'state_code'])),
+    ('offices', (ContestOffice, 'office', [
+        'we_vote_id', 'office_name', 'google_civic_election_id', 'state_code'])),
+    ('organizations', (Organization, 'organization', [
+        'we_vote_id', 'organization_name', 'organization_twitter_handle', 'organization_website',
+        'twitter_description', 'state_served_code', 'organization_photo_url'])),
+])
+
+# Used when reindexing with recreate_index. These match search/populate_data.py.
+SEARCH_INDEX_DEFAULT_SETTINGS = {'settings': {'number_of_shards': 3, 'number_of_replicas': 0}}
+SEARCH_INDEX_SETTINGS = {
+    'measures': {
+        'mappings': {
+            'measure': {
+                'properties': {
+                    'google_civic_election_id': {'type': 'string'},
+                    'measure_subtitle':         {'type': 'string', 'analyzer': 'measure_synonyms'},
+                    'measure_text':             {'type': 'string', 'analyzer': 'measure_synonyms'},
+                    'measure_title':            {'type': 'string', 'analyzer': 'measure_synonyms'},
+                    'state_code':               {'type': 'string'},
+                    'we_vote_id':               {'type': 'string'},
+                },
+            },
+        },
+        'settings': {
+            'index': {'number_of_shards': '3', 'number_of_replicas': '0'},
+            'analysis': {
+                'filter': {
+                    'measure_synonym_filter': {'type': 'synonym', 'synonyms': ['proposition,prop']},
+                },
+                'analyzer': {
+                    'measure_synonyms': {'tokenizer': 'standard', 'filter': ['lowercase', 'measure_synonym_filter']},
+                },
+            },
+        },
+    },
+}
+
+
+def fetch_search_index_name_for_model(model):
+    for index_name, (index_model, doc_type, field_names) in SEARCH_INDEXES.items():
+        if index_model is model:
+            return index_name
+    return None
+
+
+def fetch_search_document(model_instance, field_names):
+    search_document = {}
+    for field_name in field_names:
+        value = getattr(model_instance, field_name)
+        search_document[field_name] = value() if callable(value) else value
+    return search_document
+
+
+def send_search_bulk_actions(elastic_search_client, action_list):
+    """
+    Send index and delete actions to Elastic Search in one _bulk request
+    :param elastic_search_client:
+    :param action_list: ((index name, doc_type, document id), document) pairs. A document of None deletes.
+    :return: (number of actions that succeeded, number that failed)
+    """
+    if not action_list:
+        return 0, 0
+    body_line_list = []
+    for (index_name, doc_type, document_id), document in action_list:
+        action_metadata = {'_index': index_name, '_type': doc_type, '_id': document_id}
+        if document is None:
+            body_line_list.append(json.dumps({'delete': action_metadata}))
+        else:
+            body_line_list.append(json.dumps({'index': action_metadata}))
+            body_line_list.append(json.dumps(document, default=str))
+    try:
+        response = elastic_search_client.bulk(body="\n".join(body_line_list) + "\n",
+                                              request_timeout=ELASTIC_SEARCH_BULK_TIMEOUT_SECONDS)
+    except Exception as e:
+        logger.error("Elastic Search bulk request with {count} actions failed: {error}".format(
+            count=len(action_list), error=e))
+        return 0, len(action_list)
+
+    failed_count = 0
+    if response.get('errors'):
+        for item in response.get('items', []):
+            for action_name, item_result in item.items():
+                status = item_result.get('status', 200)
+                if action_name == 'delete' and status == 404:
+                    # It was never indexed, which is what we wanted anyway
+                    continue
+                if status >= 300:
+                    failed_count += 1
+                    logger.error("failed to {action_name} {index_name} {document_id}: {error}".format(
+                        action_name=action_name, index_name=item_result.get('_index'),
+                        document_id=item_result.get('_id'), error=item_result.get('error')))
+    return len(action_list) - failed_count, failed_count
+
+
+class BufferedSearchIndexer(object):
+    """
+    Collects index and delete actions from any thread, and sends them with send_search_bulk_actions from one
+    background thread per process
+    """
+
+    def __init__(self, elastic_search_client, bulk_size=ELASTIC_SEARCH_BULK_SIZE,
+                 flush_seconds=ELASTIC_SEARCH_FLUSH_SECONDS):
+        self.elastic_search_client = elastic_search_client
+        self.bulk_size = bulk_size
+        self.flush_seconds = flush_seconds
+        self.condition = threading.Condition()
+        # Held while taking actions from the buffer and sending them, so actions go out in the order they came in
+        self.send_lock = threading.Lock()
+        # (index name, doc_type, document id) -> document (None to delete), oldest first
+        self.pending_actions = OrderedDict()
+        self.oldest_pending_time = None
+        self.worker_thread = None
+        self.worker_pid = None
+        self.statistics = {
+            'actions_queued':   0,
+            'actions_sent':     0,
+            'actions_failed':   0,
+            'bulk_requests':    0,
+        }
+
+    def queue_index(self, index_name, doc_type, document_id, document):
+        self.queue_action((index_name, doc_type, str(document_id)), document)
+
+    def queue_delete(self, index_name, doc_type, document_id):
+        self.queue_action((index_name, doc_type, str(document_id)), None)
+
+    def queue_action(self, action_key, document):
+        with self.condition:
+            # Only the latest action for a document is sent
+            self.pending_actions.pop(action_key, None)
+            self.pending_actions[action_key] = document
+            self.statistics['actions_queued'] += 1
+            if self.oldest_pending_time is None:
+                self.oldest_pending_time = time.time()
+            self.start_worker_thread_if_needed()
+            if len(self.pending_actions) >= self.bulk_size:
+                self.condition.notify()
+
+    def start_worker_thread_if_needed(self):
+        # A forked server process doesn't get its parent's threads, so we start one per process
+        if self.worker_thread is not None and self.worker_pid == os.getpid() and self.worker_thread.is_alive():
+            return
+        self.worker_pid = os.getpid()
+        self.worker_thread = threading.Thread(target=self.run_worker, name="BufferedSearchIndexer")
+        self.worker_thread.daemon = True
+        self.worker_thread.start()
+
+    def run_worker(self):
+        while True:
+            try:
+                self.wait_until_ready_to_send()
+                self.send_pending_actions(self.bulk_size)
+            except Exception as e:
+                logger.error("BufferedSearchIndexer worker: {error}".format(error=e))
+
+    def wait_until_ready_to_send(self):
+        with self.condition:
+            while True:
+                if self.pending_actions:
+                    seconds_waited = time.time() - self.oldest_pending_time
+                    if len(self.pending_actions) >= self.bulk_size or seconds_waited >= self.flush_seconds:
+                        return
+                    self.condition.wait(self.flush_seconds - seconds_waited)
+                else:
+                    self.condition.wait()
+
+    def send_pending_actions(self, maximum_actions):
+        """
+        :param maximum_actions:
+        :return: False if there was nothing to send
+        """
+        with self.send_lock:
+            with self.condition:
+                action_list = []
+                while self.pending_actions and len(action_list) < maximum_actions:
+                    action_list.append(self.pending_actions.popitem(last=False))
+                self.oldest_pending_time = time.time() if self.pending_actions else None
+            if not action_list:
+                return False
+            sent_count, failed_count = send_search_bulk_actions(self.elastic_search_client, action_list)
+            with self.condition:
+                self.statistics['bulk_requests'] += 1
+                self.statistics['actions_sent'] += sent_count
+                self.statistics['actions_failed'] += failed_count
+            return True
+
+    def flush(self):
+        """
+        Send everything in the buffer now, from this thread. Called when the process exits.
+        """
+        while self.send_pending_actions(self.bulk_size):
+            pass
+
+
+search_indexer = None
+elastic_search_object = None
+if positive_value_exists(ELASTIC_SEARCH_CONNECTION_STRING):
+    elastic_search_object = Elasticsearch(
+        [ELASTIC_SEARCH_CONNECTION_STRING],
+        timeout=2, max_retries=2, retry_on_timeout=True,
+        maxsize=100
+    )
+    search_indexer = BufferedSearchIndexer(elastic_search_object)
+    atexit.register(search_indexer.flush)
+
+
+def queue_search_index(model_instance):
+    """
+    Called from the post_save receivers
+    :param model_instance:
+    :return:
+    """
+    if search_indexer is None:
+        return
+    index_name = fetch_search_index_name_for_model(type(model_instance))
+    model, doc_type, field_names = SEARCH_INDEXES[index_name]
+    search_indexer.queue_index(index_name, doc_type, model_instance.id,
+                               fetch_search_document(model_instance, field_names))
+
+
+def queue_search_delete(model_instance):
+    """
+    Called from the post_delete receivers
+    :param model_instance:
+    :return:
+    """
+    if search_indexer is None:
+        return
+    index_name = fetch_search_index_name_for_model(type(model_instance))
+    model, doc_type, field_names = SEARCH_INDEXES[index_name]
+    search_indexer.queue_delete(index_name, doc_type, model_instance.id)
+
+
+def bulk_reindex_search_index(index_name, recreate_index=False, bulk_size=ELASTIC_SEARCH_BULK_SIZE):
+    """
+    Index every entry of one model, reading them from the database with iterator() so they aren't all in memory
+    at once, and sending them bulk_size at a time
+    :param index_name: one of SEARCH_INDEXES
+    :param recreate_index: delete the index and create it again first, so entries that no longer exist go away
+    :param bulk_size:
+    :return:
+    """
+    if elastic_search_object is None:
+        return {
+            'success':              False,
+            'status':               "MISSING_ELASTIC_SEARCH_CONNECTION_STRING",
+            'documents_indexed':    0,
+            'documents_failed':     0,
+        }
+
+    model, doc_type, field_names = SEARCH_INDEXES[index_name]
+    status = ""
+    if recreate_index:
+        elastic_search_object.indices.delete(index=index_name, ignore=[400, 404])
+        elastic_search_object.indices.create(
+            index=index_name, body=SEARCH_INDEX_SETTINGS.get(index_name, SEARCH_INDEX_DEFAULT_SETTINGS))
+        status += "SEARCH_INDEX_RECREATED "
+
+    queryset = model.objects.order_by('id')
+    concrete_field_names = [field.name for field in model._meta.concrete_fields]
+    if all(field_name in concrete_field_names for field_name in field_names):
+        # Otherwise a method in field_names might need one of the fields we left out, costing a query per entry
+        queryset = queryset.only('id', *field_names)
+
+    documents_indexed = 0
+    documents_failed = 0
+    action_list = []
+    for model_instance in queryset.iterator():
+        action_list.append(((index_name, doc_type, str(model_instance.id)),
+                            fetch_search_document(model_instance, field_names)))
+        if len(action_list) >= bulk_size:
+            sent_count, failed_count = send_search_bulk_actions(elastic_search_object, action_list)
+            documents_indexed += sent_count
+            documents_failed += failed_count
+            action_list = []
+    sent_count, failed_count = send_search_bulk_actions(elastic_search_object, action_list)
+    documents_indexed += sent_count
+    documents_failed += failed_count
+
+    return {
+        'success':              not documents_failed,
+        'status':               status + "SEARCH_INDEX_REBUILT ",
+        'documents_indexed':    documents_indexed,
+        'documents_failed':     documents_failed,
+    }
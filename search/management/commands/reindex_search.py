@@ -0,0 +1,34 @@
+# search/management/commands/reindex_search.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.core.management.base import BaseCommand, CommandError
+from search.indexer import bulk_reindex_search_index, ELASTIC_SEARCH_BULK_SIZE, SEARCH_INDEXES
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds Elastic Search indexes from the database, sending documents through the _bulk api. ' \
+           'Reindexes every index unless index names are given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('index_names', nargs='*', help='Any of: ' + ', '.join(SEARCH_INDEXES.keys()))
+        parser.add_argument('--recreate', action='store_true', default=False,
+                            help='Delete and create each index first, so deleted entries are removed too')
+        parser.add_argument('--bulk-size', type=int, default=ELASTIC_SEARCH_BULK_SIZE)
+
+    def handle(self, *args, **options):
+        index_names = options['index_names'] or list(SEARCH_INDEXES.keys())
+        for index_name in index_names:
+            if index_name not in SEARCH_INDEXES:
+                raise CommandError('Unknown index: ' + index_name)
+        failed_index_names = []
+        for index_name in index_names:
+            results = bulk_reindex_search_index(index_name, recreate_index=options['recreate'],
+                                                bulk_size=options['bulk_size'])
+            self.stdout.write('{index_name}: {indexed} documents indexed, {failed} failed. {status}'.format(
+                index_name=index_name, indexed=results['documents_indexed'], failed=results['documents_failed'],
+                status=results['status']))
+            if not results['success']:
+                failed_index_names.append(index_name)
+        if failed_index_names:
+            raise CommandError('Reindexing failed for: ' + ', '.join(failed_index_names))
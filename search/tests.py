@@ -0,0 +1,137 @@
+# search/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.test import SimpleTestCase, TestCase
+import json
+from search.controllers import search_all_for_api, SEARCH_ALL_MAXIMUM_LIMIT, SEARCH_ALL_MAXIMUM_WINDOW
+from search.indexer import BufferedSearchIndexer
+from unittest import mock
+
+
+class RecordingElasticSearchClient(object):
+    """
+    Stands in for the Elasticsearch client, and keeps the body of each _bulk request
+    """
+
+    def __init__(self):
+        self.bulk_body_list = []
+
+    def bulk(self, body, **kwargs):
+        self.bulk_body_list.append(body)
+        return {'errors': False, 'items': []}
+
+
+class CannedMultiSearchClient(object):
+    """
+    Stands in for the Elasticsearch client. Keeps the body of each msearch request, and answers with the same
+    responses, one for each index in SEARCH_ALL_INDEX_QUERY_FIELDS order.
+    """
+
+    def __init__(self, response_list):
+        self.response_list = response_list
+        self.msearch_body_list = []
+
+    def msearch(self, body, **kwargs):
+        self.msearch_body_list.append(body)
+        return {'responses': self.response_list}
+
+
+def generate_index_response(hit_list, total=None):
+    return {'hits': {'total': len(hit_list) if total is None else total, 'hits': hit_list}}
+
+
+CANDIDATE_HIT = {'_type': 'candidate', '_id': '1', '_score': 3.0, '_source': {
+    'candidate_name': 'Jane Doe', 'candidate_twitter_handle': 'janedoe', 'google_civic_election_id': '4184',
+    'state_code': 'ms', 'we_vote_id': 'wv01cand1', 'candidate_photo_url': 'https://example.com/jane.jpg'}}
+# Indexed before candidate_photo_url was added to the documents
+OLD_CANDIDATE_HIT = {'_type': 'candidate', '_id': '2', '_score': 1.0, '_source': {
+    'candidate_name': 'John Doe', 'candidate_twitter_handle': None, 'google_civic_election_id': '4184',
+    'state_code': 'ms', 'we_vote_id': 'wv01cand2'}}
+OFFICE_HIT = {'_type': 'office', '_id': '3', '_score': 2.0, '_source': {
+    'office_name': 'Mayor', 'google_civic_election_id': '4184', 'state_code': 'ms', 'we_vote_id': 'wv01off3'}}
+ORGANIZATION_HIT = {'_type': 'organization', '_id': '4', '_score': 2.5, '_source': {
+    'organization_name': 'Doe Voters', 'organization_twitter_handle': '', 'twitter_description': 'For Doe',
+    'state_served_code': 'MS', 'we_vote_id': 'wv01org4'}}
+
+
+class SearchAllTestCase(SimpleTestCase):
+
+    def search_all(self, response_list, search_results_limit, search_results_offset):
+        elastic_search_client = CannedMultiSearchClient(response_list)
+        with mock.patch('search.controllers.elastic_search_object', elastic_search_client), \
+                mock.patch('search.controllers.is_voter_device_id_valid', return_value={'success': True}), \
+                mock.patch('search.controllers.fetch_voter_id_from_voter_device_link', return_value=1):
+            results = search_all_for_api("doe", "voter_device_id", search_results_limit, search_results_offset)
+        return results, elastic_search_client.msearch_body_list
+
+    def test_pages_through_every_index_by_score(self):
+        response_list = [
+            generate_index_response([CANDIDATE_HIT, OLD_CANDIDATE_HIT], total=12),
+            # The measures index hasn't been created yet
+            {'error': 'index_not_found_exception'},
+            generate_index_response([OFFICE_HIT]),
+            generate_index_response([ORGANIZATION_HIT], total=3),
+        ]
+        results, msearch_body_list = self.search_all(response_list, 2, 1)
+        self.assertTrue(results['success'])
+        self.assertIn("ELASTIC_SEARCH_INDEX_ERROR measures", results['status'])
+        # Every index returns the hits that could be on this page: offset + limit
+        self.assertEqual([one_line['size'] for one_line in msearch_body_list[0][1::2]], [3, 3, 3, 3])
+        self.assertEqual([one_line['index'] for one_line in msearch_body_list[0][0::2]],
+                         ['candidates', 'measures', 'offices', 'organizations'])
+        self.assertEqual(results['search_results_total'], 16)
+        self.assertEqual(results['search_results_offset'], 1)
+        # Ordered by score: candidate 3.0, organization 2.5, office 2.0, candidate 1.0
+        self.assertEqual([(one_result['kind_of_owner'], one_result['we_vote_id'], one_result['local_id'])
+                          for one_result in results['search_results']],
+                         [("ORGANIZATION", 'wv01org4', '4'), ("OFFICE", 'wv01off3', '3')])
+        self.assertEqual(results['search_results'][0]['link_internal'], "/voterguide/wv01org4")
+
+        results, msearch_body_list = self.search_all(response_list, 2, 2)
+        self.assertEqual([one_result['we_vote_id'] for one_result in results['search_results']],
+                         ['wv01off3', 'wv01cand2'])
+
+    def test_candidate_without_photo_url(self):
+        results, msearch_body_list = self.search_all([generate_index_response([CANDIDATE_HIT, OLD_CANDIDATE_HIT]),
+                                                      generate_index_response([]), generate_index_response([]),
+                                                      generate_index_response([])], 10, 0)
+        self.assertEqual([(one_result['result_image'], one_result['link_internal'])
+                          for one_result in results['search_results']],
+                         [('https://example.com/jane.jpg', "/janedoe"), ("", "/candidate/wv01cand2")])
+
+    def test_limit_and_offset_are_clamped(self):
+        empty_response_list = [generate_index_response([])] * 4
+        for search_results_limit, search_results_offset, expected_size, expected_offset in [
+                (0, -5, 10, 0),
+                ('not a number', 0, 10, 0),
+                (1000, 0, SEARCH_ALL_MAXIMUM_LIMIT, 0),
+                (SEARCH_ALL_MAXIMUM_LIMIT, 10000, SEARCH_ALL_MAXIMUM_WINDOW,
+                 SEARCH_ALL_MAXIMUM_WINDOW - SEARCH_ALL_MAXIMUM_LIMIT)]:
+            results, msearch_body_list = self.search_all(empty_response_list, search_results_limit,
+                                                         search_results_offset)
+            self.assertTrue(results['success'])
+            self.assertFalse(results['search_results_found'])
+            self.assertEqual(results['search_results_offset'], expected_offset)
+            self.assertEqual(msearch_body_list[0][1]['size'], expected_size)
+
+
+class BufferedSearchIndexerTestCase(TestCase):
+
+    def test_only_latest_action_for_each_document_is_sent(self):
+        elastic_search_client = RecordingElasticSearchClient()
+        search_indexer = BufferedSearchIndexer(elastic_search_client, bulk_size=10, flush_seconds=60)
+        search_indexer.queue_index('candidates', 'candidate', 1, {'candidate_name': 'Old name'})
+        search_indexer.queue_index('candidates', 'candidate', 2, {'candidate_name': 'Other candidate'})
+        search_indexer.queue_index('candidates', 'candidate', 1, {'candidate_name': 'New name'})
+        search_indexer.queue_delete('candidates', 'candidate', 2)
+        search_indexer.flush()
+
+        self.assertEqual(len(elastic_search_client.bulk_body_list), 1)
+        bulk_line_list = [json.loads(line) for line in elastic_search_client.bulk_body_list[0].splitlines()]
+        self.assertEqual(bulk_line_list, [
+            {'index': {'_index': 'candidates', '_type': 'candidate', '_id': '1'}},
+            {'candidate_name': 'New name'},
+            {'delete': {'_index': 'candidates', '_type': 'candidate', '_id': '2'}},
+        ])
+        self.assertEqual(search_indexer.statistics['actions_sent'], 2)
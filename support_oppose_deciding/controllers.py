@@ -5,13 +5,16 @@
 from ballot.controllers import figure_out_google_civic_election_id_voter_is_watching, \
     voter_ballot_items_retrieve_for_one_election_for_api
 from ballot.models import CANDIDATE, MEASURE, OFFICE
-from candidate.models import CandidateCampaignManager, CandidateCampaignListManager
+from candidate.models import CandidateCampaignManager
 from friend.models import FriendManager
 from measure.models import ContestMeasureManager
+from django.db.models import Q
 from django.http import HttpResponse
 from follow.models import FollowOrganizationList
 import json
-from position.models import SUPPORT, OPPOSE, PositionManager, PositionListManager
+from position.models import SUPPORT, OPPOSE, PositionEntered, PositionForFriends, PositionManager, \
+    PositionListManager
+from support_oppose_deciding.models import SupportOpposeTally, SupportOpposeTallyManager
 from voter.models import fetch_voter_id_from_voter_device_link, VoterManager
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, is_voter_device_id_valid, positive_value_exists
@@ -341,9 +344,6 @@ def positions_count_for_all_ballot_items_for_api(voter_device_id, google_civic_e
         }
         return json_data
 
-    position_list_manager = PositionListManager()
-    candidate_list_object = CandidateCampaignListManager()
-
     follow_organization_list_manager = FollowOrganizationList()
     organizations_followed_by_voter = \
         follow_organization_list_manager.retrieve_follow_organization_by_voter_id_simple_id_array(voter_id)
@@ -362,9 +362,6 @@ def positions_count_for_all_ballot_items_for_api(voter_device_id, google_civic_e
 
     ballot_item_list = ballot_item_results['ballot_item_list']
 
-    # The list where we capture results
-    position_counts_list_results = []
-
     friends_we_vote_id_list = []
     if positive_value_exists(voter_we_vote_id):
         friend_manager = FriendManager()
@@ -375,103 +372,20 @@ def positions_count_for_all_ballot_items_for_api(voter_device_id, google_civic_e
     # Add yourself as a friend so your opinions show up
     friends_we_vote_id_list.append(voter_we_vote_id)
 
-    # ballot_item_list is populated with contest_office and contest_measure entries
+    # ballot_item_list is populated with contest_office and contest_measure entries. The candidates under each office
+    #  are already attached, so we don't need to retrieve them again.
+    ballot_item_we_vote_id_list = []
     for one_ballot_item in ballot_item_list:
-        # Retrieve all positions for each ballot item
         if one_ballot_item['kind_of_ballot_item'] == OFFICE:
-            results = candidate_list_object.retrieve_all_candidates_for_office(0, one_ballot_item['we_vote_id'])
-            success = results['success']
-            candidate_list = results['candidate_list']
-
-            if success:
-                for candidate in candidate_list:
-                    # Loop through all candidates under this office
-
-                    # Public Positions
-                    retrieve_public_positions_now = True  # The alternate is positions for friends-only
-                    most_recent_only = True
-                    public_support_positions_list_for_one_ballot_item = \
-                        position_list_manager.retrieve_all_positions_for_candidate_campaign(
-                            retrieve_public_positions_now, 0, candidate.we_vote_id,
-                            SUPPORT, most_recent_only)
-                    public_oppose_positions_list_for_one_ballot_item = \
-                        position_list_manager.retrieve_all_positions_for_candidate_campaign(
-                            retrieve_public_positions_now, 0, candidate.we_vote_id,
-                            OPPOSE, most_recent_only)
-
-                    # Friend's-only Positions
-                    retrieve_public_positions_now = False  # Return friends-only positions counts
-                    most_recent_only = True
-                    friends_only_support_positions_list_for_one_ballot_item = \
-                        position_list_manager.retrieve_all_positions_for_candidate_campaign(
-                            retrieve_public_positions_now, 0, candidate.we_vote_id,
-                            SUPPORT, most_recent_only, friends_we_vote_id_list)
-                    friends_only_oppose_positions_list_for_one_ballot_item = \
-                        position_list_manager.retrieve_all_positions_for_candidate_campaign(
-                            retrieve_public_positions_now, 0, candidate.we_vote_id,
-                            OPPOSE, most_recent_only, friends_we_vote_id_list)
-
-                    support_positions_list_for_one_ballot_item = public_support_positions_list_for_one_ballot_item + \
-                        friends_only_support_positions_list_for_one_ballot_item
-                    oppose_positions_list_for_one_ballot_item = public_oppose_positions_list_for_one_ballot_item + \
-                        friends_only_oppose_positions_list_for_one_ballot_item
-
-                    finalize_results = finalize_support_and_oppose_positions_count(
-                        voter_id, show_positions_this_voter_follows,
-                        organizations_followed_by_voter, friends_we_vote_id_list,
-                        support_positions_list_for_one_ballot_item,
-                        oppose_positions_list_for_one_ballot_item)
-
-                    one_ballot_item_results = {
-                        'ballot_item_we_vote_id': candidate.we_vote_id,
-                        'support_count': finalize_results['support_positions_count'],
-                        'oppose_count': finalize_results['oppose_positions_count'],
-                    }
-                    position_counts_list_results.append(one_ballot_item_results)
+            for one_candidate in one_ballot_item.get('candidate_list', []):
+                ballot_item_we_vote_id_list.append(one_candidate['we_vote_id'])
         elif one_ballot_item['kind_of_ballot_item'] == MEASURE:
-            # Public Positions
-            retrieve_public_positions_now = True  # The alternate is positions for friends-only
-            most_recent_only = True
-            public_support_positions_list_for_one_ballot_item = \
-                position_list_manager.retrieve_all_positions_for_contest_measure(
-                    retrieve_public_positions_now, 0, one_ballot_item['we_vote_id'],
-                    SUPPORT, most_recent_only)
-            public_oppose_positions_list_for_one_ballot_item = \
-                position_list_manager.retrieve_all_positions_for_contest_measure(
-                    retrieve_public_positions_now, 0, one_ballot_item['we_vote_id'],
-                    OPPOSE, most_recent_only)
-
-            # Friend's-only Positions
-            retrieve_public_positions_now = False  # Return friends-only positions counts
-            most_recent_only = True
-            friends_support_positions_list_for_one_ballot_item = \
-                position_list_manager.retrieve_all_positions_for_contest_measure(
-                    retrieve_public_positions_now, 0, one_ballot_item['we_vote_id'],
-                    SUPPORT, most_recent_only, friends_we_vote_id_list)
-            friends_oppose_positions_list_for_one_ballot_item = \
-                position_list_manager.retrieve_all_positions_for_contest_measure(
-                    retrieve_public_positions_now, 0, one_ballot_item['we_vote_id'],
-                    OPPOSE, most_recent_only, friends_we_vote_id_list)
-
-            support_positions_list_for_one_ballot_item = public_support_positions_list_for_one_ballot_item + \
-                friends_support_positions_list_for_one_ballot_item
-            oppose_positions_list_for_one_ballot_item = public_oppose_positions_list_for_one_ballot_item + \
-                friends_oppose_positions_list_for_one_ballot_item
-
-            finalize_results = finalize_support_and_oppose_positions_count(
-                voter_id, show_positions_this_voter_follows,
-                organizations_followed_by_voter, friends_we_vote_id_list,
-                support_positions_list_for_one_ballot_item,
-                oppose_positions_list_for_one_ballot_item)
-            one_ballot_item_results = {
-                'ballot_item_we_vote_id': one_ballot_item['we_vote_id'],
-                'support_count': finalize_results['support_positions_count'],
-                'oppose_count': finalize_results['oppose_positions_count'],
-            }
-            position_counts_list_results.append(one_ballot_item_results)
-        else:
-            # Skip the rest of this loop
-            continue
+            ballot_item_we_vote_id_list.append(one_ballot_item['we_vote_id'])
+
+    # The list where we capture results
+    position_counts_list_results = support_and_oppose_counts_from_tallies(
+        voter_id, show_positions_this_voter_follows, organizations_followed_by_voter, friends_we_vote_id_list,
+        ballot_item_we_vote_id_list, ballot_item_results['google_civic_election_id'])
 
     json_data = {
         'success':                  True,
@@ -525,7 +439,6 @@ def positions_count_for_one_ballot_item_for_api(voter_device_id, ballot_item_we_
         }
         return json_data
 
-    position_list_manager = PositionListManager()
     show_positions_this_voter_follows = True
     position_counts_list_results = []
 
@@ -543,107 +456,122 @@ def positions_count_for_one_ballot_item_for_api(voter_device_id, ballot_item_we_
     # Add yourself as a friend so your opinions show up
     friends_we_vote_id_list.append(voter_we_vote_id)
 
-    # Figure out if this ballot_item is a candidate or measure
-    if "cand" in ballot_item_we_vote_id:  # Is a Candidate
-        # We don't need to retrieve the candidate
+    # Figure out if this ballot_item is a candidate or measure. We don't need to retrieve the ballot item itself.
+    if "cand" in ballot_item_we_vote_id or "meas" in ballot_item_we_vote_id:
+        position_counts_list_results = support_and_oppose_counts_from_tallies(
+            voter_id, show_positions_this_voter_follows, organizations_followed_by_voter, friends_we_vote_id_list,
+            [ballot_item_we_vote_id])
+        success = True
+    else:
+        # The ballot_item_we_vote_id is not for a candidate or measure
+        success = False
 
-        # Public Positions
-        retrieve_public_positions_now = True  # The alternate is positions for friends-only
-        most_recent_only = True
-        public_support_positions_list_for_one_ballot_item = \
-            position_list_manager.retrieve_all_positions_for_candidate_campaign(
-                retrieve_public_positions_now, 0, ballot_item_we_vote_id,
-                SUPPORT, most_recent_only)
-        public_oppose_positions_list_for_one_ballot_item = \
-            position_list_manager.retrieve_all_positions_for_candidate_campaign(
-                retrieve_public_positions_now, 0, ballot_item_we_vote_id,
-                OPPOSE, most_recent_only)
+    json_data = {
+        'success':                  success,
+        'status':                   "POSITIONS_COUNT_FOR_ONE_BALLOT_ITEM",
+        'ballot_item_we_vote_id':   ballot_item_we_vote_id,
+        'position_counts_list':     position_counts_list_results,
+    }
+    return json_data
 
-        # Friend's-only Positions
-        retrieve_public_positions_now = False  # Return friends-only positions counts
-        most_recent_only = True
-        friends_only_support_positions_list_for_one_ballot_item = \
-            position_list_manager.retrieve_all_positions_for_candidate_campaign(
-                retrieve_public_positions_now, 0, ballot_item_we_vote_id,
-                SUPPORT, most_recent_only, friends_we_vote_id_list)
-        friends_only_oppose_positions_list_for_one_ballot_item = \
-            position_list_manager.retrieve_all_positions_for_candidate_campaign(
-                retrieve_public_positions_now, 0, ballot_item_we_vote_id,
-                OPPOSE, most_recent_only, friends_we_vote_id_list)
 
-        support_positions_list_for_one_ballot_item = public_support_positions_list_for_one_ballot_item + \
-            friends_only_support_positions_list_for_one_ballot_item
-        oppose_positions_list_for_one_ballot_item = public_oppose_positions_list_for_one_ballot_item + \
-            friends_only_oppose_positions_list_for_one_ballot_item
+def generate_support_oppose_tally_list(position_filter):
+    """
+    Unsaved SupportOpposeTally entries for the public and friends only positions that match position_filter
+    :param position_filter: a Q object for PositionEntered and PositionForFriends
+    :return:
+    """
+    support_oppose_tally_manager = SupportOpposeTallyManager()
+    tally_list = []
+    for position_model, is_public_position in ((PositionEntered, True), (PositionForFriends, False)):
+        position_query = position_model.objects.filter(position_filter)
+        for tally_values in support_oppose_tally_manager.generate_tally_values_list_from_position_list(
+                position_query.iterator(), is_public_position):
+            tally_list.append(SupportOpposeTally(**tally_values))
+    return tally_list
 
-        finalize_results = finalize_support_and_oppose_positions_count(
-            voter_id, show_positions_this_voter_follows,
-            organizations_followed_by_voter, friends_we_vote_id_list,
-            support_positions_list_for_one_ballot_item,
-            oppose_positions_list_for_one_ballot_item)
 
-        one_ballot_item_results = {
-            'ballot_item_we_vote_id':   ballot_item_we_vote_id,
-            'support_count':            finalize_results['support_positions_count'],
-            'oppose_count':             finalize_results['oppose_positions_count'],
-        }
-        position_counts_list_results.append(one_ballot_item_results)
-        success = True
-    elif "meas" in ballot_item_we_vote_id:  # Is a measure
-        # We don't need to retrieve the measure
+def refresh_support_oppose_tallies_for_election(google_civic_election_id):
+    """
+    Rebuild the SupportOpposeTally entries for one election from the positions tables, and mark the election as
+    counted from its tallies. The receivers in position/models.py keep the tallies current after that, so this is
+    only needed once per election (or to repair one). Run it with the refresh_support_oppose_tallies management
+    command, since it reads every position in the election.
+    :param google_civic_election_id:
+    :return:
+    """
+    support_oppose_tally_manager = SupportOpposeTallyManager()
+    tally_list = generate_support_oppose_tally_list(Q(google_civic_election_id=google_civic_election_id))
+    return support_oppose_tally_manager.replace_tallies_for_election(google_civic_election_id, tally_list)
 
-        # Public Positions
-        retrieve_public_positions_now = True  # The alternate is positions for friends-only
-        most_recent_only = True
-        public_support_positions_list_for_one_ballot_item = \
-            position_list_manager.retrieve_all_positions_for_contest_measure(
-                retrieve_public_positions_now, 0, ballot_item_we_vote_id,
-                SUPPORT, most_recent_only)
-        public_oppose_positions_list_for_one_ballot_item = \
-            position_list_manager.retrieve_all_positions_for_contest_measure(
-                retrieve_public_positions_now, 0, ballot_item_we_vote_id,
-                OPPOSE, most_recent_only)
 
-        # Friend's-only Positions
-        retrieve_public_positions_now = False  # Return friends-only positions counts
-        most_recent_only = True
-        friends_support_positions_list_for_one_ballot_item = \
-            position_list_manager.retrieve_all_positions_for_contest_measure(
-                retrieve_public_positions_now, 0, ballot_item_we_vote_id,
-                SUPPORT, most_recent_only, friends_we_vote_id_list)
-        friends_oppose_positions_list_for_one_ballot_item = \
-            position_list_manager.retrieve_all_positions_for_contest_measure(
-                retrieve_public_positions_now, 0, ballot_item_we_vote_id,
-                OPPOSE, most_recent_only, friends_we_vote_id_list)
+def support_and_oppose_counts_from_tallies(voter_id, show_positions_this_voter_follows,
+                                           organizations_followed_by_voter, friends_we_vote_id_list,
+                                           ballot_item_we_vote_id_list, google_civic_election_id=0):
+    """
+    Count support and oppose positions for every ballot item in ballot_item_we_vote_id_list with a single query
+    against SupportOpposeTally. The follow and friend filters for this voter are applied in memory.
+    If the election's tallies haven't been refreshed yet (or we don't know the election), we build the same entries
+    from the positions about these ballot items instead, which is one query per positions table.
+    :return: list of dicts with ballot_item_we_vote_id, support_count and oppose_count
+    """
+    support_oppose_tally_manager = SupportOpposeTallyManager()
+    if support_oppose_tally_manager.tallies_refreshed_for_election(google_civic_election_id):
+        tally_dict = support_oppose_tally_manager.retrieve_tally_list_for_ballot_items(ballot_item_we_vote_id_list)
+    else:
+        ballot_item_we_vote_id_lower_list = [one_we_vote_id.lower() for one_we_vote_id in ballot_item_we_vote_id_list
+                                             if positive_value_exists(one_we_vote_id)]
+        tally_dict = {}
+        if len(ballot_item_we_vote_id_lower_list):
+            tally_list = generate_support_oppose_tally_list(
+                Q(candidate_campaign_we_vote_id__in=ballot_item_we_vote_id_lower_list) |
+                Q(contest_measure_we_vote_id__in=ballot_item_we_vote_id_lower_list))
+            for one_tally in tally_list:
+                tally_dict.setdefault(one_tally.ballot_item_we_vote_id, []).append(one_tally)
 
-        support_positions_list_for_one_ballot_item = public_support_positions_list_for_one_ballot_item + \
-            friends_support_positions_list_for_one_ballot_item
-        oppose_positions_list_for_one_ballot_item = public_oppose_positions_list_for_one_ballot_item + \
-            friends_oppose_positions_list_for_one_ballot_item
+    position_list_manager = PositionListManager()
+    friends_we_vote_id_set = set(one_we_vote_id.lower() for one_we_vote_id in friends_we_vote_id_list
+                                 if positive_value_exists(one_we_vote_id))
+    position_counts_list_results = []
+    for ballot_item_we_vote_id in ballot_item_we_vote_id_list:
+        public_support_list = []
+        public_oppose_list = []
+        friends_only_support_list = []
+        friends_only_oppose_list = []
+        for one_tally in tally_dict.get(ballot_item_we_vote_id.lower(), []):
+            if one_tally.is_public_position:
+                if one_tally.counts_as_support:
+                    public_support_list.append(one_tally)
+                elif one_tally.counts_as_oppose:
+                    public_oppose_list.append(one_tally)
+            elif one_tally.voter_we_vote_id in friends_we_vote_id_set:
+                if one_tally.counts_as_support:
+                    friends_only_support_list.append(one_tally)
+                elif one_tally.counts_as_oppose:
+                    friends_only_oppose_list.append(one_tally)
+
+        # If we have multiple positions for one org, we only want to count the most recent
+        support_positions_list_for_one_ballot_item = \
+            position_list_manager.remove_older_positions_for_each_org(public_support_list) + \
+            position_list_manager.remove_older_positions_for_each_org(friends_only_support_list)
+        oppose_positions_list_for_one_ballot_item = \
+            position_list_manager.remove_older_positions_for_each_org(public_oppose_list) + \
+            position_list_manager.remove_older_positions_for_each_org(friends_only_oppose_list)
 
         finalize_results = finalize_support_and_oppose_positions_count(
             voter_id, show_positions_this_voter_follows,
-            organizations_followed_by_voter, friends_we_vote_id_list,
+            organizations_followed_by_voter, friends_we_vote_id_set,
             support_positions_list_for_one_ballot_item,
             oppose_positions_list_for_one_ballot_item)
+
         one_ballot_item_results = {
             'ballot_item_we_vote_id':   ballot_item_we_vote_id,
             'support_count':            finalize_results['support_positions_count'],
             'oppose_count':             finalize_results['oppose_positions_count'],
         }
         position_counts_list_results.append(one_ballot_item_results)
-        success = True
-    else:
-        # The ballot_item_we_vote_id is not for a candidate or measure
-        success = False
 
-    json_data = {
-        'success':                  success,
-        'status':                   "POSITIONS_COUNT_FOR_ONE_BALLOT_ITEM",
-        'ballot_item_we_vote_id':   ballot_item_we_vote_id,
-        'position_counts_list':     position_counts_list_results,
-    }
-    return json_data
+    return position_counts_list_results
 
 
 def finalize_support_and_oppose_positions_count(voter_id, show_positions_this_voter_follows,
@@ -0,0 +1,40 @@
+# support_oppose_deciding/management/commands/refresh_support_oppose_tallies.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.core.management.base import BaseCommand, CommandError
+from position.models import PositionEntered, PositionForFriends
+from support_oppose_deciding.controllers import refresh_support_oppose_tallies_for_election
+from wevote_functions.functions import convert_to_int, positive_value_exists
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the SupportOpposeTally entries of each election from the positions tables, so positions saved ' \
+           'before the tallies existed are counted. Refreshes every election with positions unless election ids ' \
+           'are given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('google_civic_election_ids', nargs='*', type=int)
+
+    def handle(self, *args, **options):
+        google_civic_election_id_list = options['google_civic_election_ids']
+        if not google_civic_election_id_list:
+            google_civic_election_id_set = set()
+            for position_model in (PositionEntered, PositionForFriends):
+                # google_civic_election_id is a CharField in the positions tables
+                for google_civic_election_id in position_model.objects.values_list(
+                        'google_civic_election_id', flat=True).order_by().distinct():
+                    if positive_value_exists(convert_to_int(google_civic_election_id)):
+                        google_civic_election_id_set.add(convert_to_int(google_civic_election_id))
+            google_civic_election_id_list = sorted(google_civic_election_id_set)
+
+        failed_election_id_list = []
+        for google_civic_election_id in google_civic_election_id_list:
+            results = refresh_support_oppose_tallies_for_election(google_civic_election_id)
+            self.stdout.write('{google_civic_election_id}: {tally_count} tallies. {status}'.format(
+                google_civic_election_id=google_civic_election_id, tally_count=results['tally_count'],
+                status=results['status']))
+            if not results['success']:
+                failed_election_id_list.append(str(google_civic_election_id))
+        if failed_election_id_list:
+            raise CommandError('Refreshing tallies failed for elections: ' + ', '.join(failed_election_id_list))
@@ -4,3 +4,263 @@
 
 # Models for support_oppose_deciding methods are for the most part in 'position'
 
+from django.db import models, transaction
+from exception.models import handle_record_not_saved_exception
+import wevote_functions.admin
+from wevote_functions.bulk_upsert import bulk_upsert
+from wevote_functions.functions import convert_to_int, positive_value_exists
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+
+class SupportOpposeTally(models.Model):
+    """
+    A materialized, denormalized copy of the fields we need from PositionEntered and PositionForFriends in order
+    to count support and oppose positions for a ballot item. There is one entry per speaker per ballot item
+    (which is one entry per position). The signal receivers in position/models.py keep it current.
+    This lets positionsCountForAllBallotItems count a whole ballot with one query, and apply the voter-specific
+    follow and friend filters in memory.
+    """
+    # The position this entry mirrors. The same we_vote_id is kept when a position switches visibility.
+    position_we_vote_id = models.CharField(
+        verbose_name="we vote permanent id for the position", max_length=255, null=False, unique=True)
+    # Either the candidate_campaign_we_vote_id or the contest_measure_we_vote_id of the position
+    ballot_item_we_vote_id = models.CharField(
+        verbose_name="we vote permanent id for candidate or measure", max_length=255, null=False, db_index=True)
+    google_civic_election_id = models.PositiveIntegerField(
+        verbose_name="google civic election id", default=0, null=False, db_index=True)
+    # True for PositionEntered, False for PositionForFriends
+    is_public_position = models.BooleanField(default=True)
+
+    # The speaker
+    organization_id = models.BigIntegerField(null=True, blank=True)
+    organization_we_vote_id = models.CharField(max_length=255, null=True, blank=True)
+    voter_id = models.BigIntegerField(null=True, blank=True)
+    voter_we_vote_id = models.CharField(max_length=255, null=True, blank=True)
+    # Needed so we can show only the most recent rating from each organization
+    vote_smart_time_span = models.CharField(max_length=255, null=True, blank=True)
+
+    # SUPPORT or a rating of 66% or greater / OPPOSE or a rating of 33% or less
+    counts_as_support = models.BooleanField(default=False)
+    counts_as_oppose = models.BooleanField(default=False)
+
+    date_last_changed = models.DateTimeField(verbose_name='date last changed', null=True, auto_now=True)
+
+    def __unicode__(self):
+        return self.position_we_vote_id
+
+
+class SupportOpposeTallyElection(models.Model):
+    """
+    An election whose SupportOpposeTally entries have been built from the positions tables, by the
+    refresh_support_oppose_tallies management command. Until then, we count that election's positions directly.
+    """
+    google_civic_election_id = models.PositiveIntegerField(
+        verbose_name="google civic election id", null=False, unique=True)
+    date_tallies_refreshed = models.DateTimeField(verbose_name='date tallies refreshed', null=True, auto_now=True)
+
+
+class SupportOpposeTallyManager(models.Model):
+
+    def __unicode__(self):
+        return "SupportOpposeTallyManager"
+
+    def generate_tally_values_from_position(self, position, is_public_position):
+        """
+        Return the values a SupportOpposeTally entry should have for this position, or None if the position isn't
+        about a candidate or measure
+        :param position: PositionEntered or PositionForFriends
+        :param is_public_position:
+        :return:
+        """
+        if positive_value_exists(position.candidate_campaign_we_vote_id):
+            ballot_item_we_vote_id = position.candidate_campaign_we_vote_id
+        elif positive_value_exists(position.contest_measure_we_vote_id):
+            ballot_item_we_vote_id = position.contest_measure_we_vote_id
+        else:
+            return None
+
+        return {
+            'ballot_item_we_vote_id':   ballot_item_we_vote_id.lower(),
+            'google_civic_election_id': convert_to_int(position.google_civic_election_id),
+            'is_public_position':       is_public_position,
+            'organization_id':          position.organization_id,
+            'organization_we_vote_id':  position.organization_we_vote_id,
+            'voter_id':                 position.voter_id,
+            'voter_we_vote_id':         position.voter_we_vote_id.lower() if position.voter_we_vote_id else None,
+            'vote_smart_time_span':     position.vote_smart_time_span,
+            'counts_as_support':        position.is_support_or_positive_rating(),
+            'counts_as_oppose':         position.is_oppose_or_negative_rating(),
+        }
+
+    def update_or_create_tally_from_position(self, position, is_public_position):
+        """
+        Bring the tally entry for one position up-to-date. Called every time a position is saved with save().
+        :param position: PositionEntered or PositionForFriends
+        :param is_public_position:
+        :return:
+        """
+        success = False
+        if not positive_value_exists(position.we_vote_id):
+            status = "TALLY_NOT_UPDATED-MISSING_POSITION_WE_VOTE_ID"
+            results = {
+                'success':  success,
+                'status':   status,
+            }
+            return results
+
+        tally_values = self.generate_tally_values_from_position(position, is_public_position)
+        try:
+            if tally_values is None:
+                # Positions about offices aren't counted, so make sure we aren't holding on to an old entry
+                SupportOpposeTally.objects.filter(position_we_vote_id=position.we_vote_id.lower()).delete()
+                status = "TALLY_NOT_NEEDED"
+            else:
+                SupportOpposeTally.objects.update_or_create(
+                    position_we_vote_id=position.we_vote_id.lower(),
+                    defaults=tally_values)
+                status = "TALLY_UPDATED"
+            success = True
+        except Exception as e:
+            handle_record_not_saved_exception(e, logger=logger)
+            status = "TALLY_COULD_NOT_BE_UPDATED"
+
+        results = {
+            'success':  success,
+            'status':   status,
+        }
+        return results
+
+    def generate_tally_values_list_from_position_list(self, position_list, is_public_position):
+        """
+        The values of the SupportOpposeTally entries for position_list, each with its position_we_vote_id. Positions
+        that aren't about a candidate or measure are left out.
+        :param position_list: PositionEntered or PositionForFriends entries (or an iterator over them)
+        :param is_public_position:
+        :return:
+        """
+        tally_values_list = []
+        for one_position in position_list:
+            if not positive_value_exists(one_position.we_vote_id):
+                continue
+            tally_values = self.generate_tally_values_from_position(one_position, is_public_position)
+            if tally_values is not None:
+                tally_values['position_we_vote_id'] = one_position.we_vote_id.lower()
+                tally_values_list.append(tally_values)
+        return tally_values_list
+
+    def update_or_create_tallies_from_position_list(self, position_list, is_public_position):
+        """
+        Bring the tally entries for a batch of positions up-to-date with one bulk upsert, instead of an
+        update_or_create for each position. Called for each batch of positions written by bulk_upsert.
+        :param position_list: PositionEntered or PositionForFriends
+        :param is_public_position:
+        :return:
+        """
+        tally_values_list = self.generate_tally_values_list_from_position_list(position_list, is_public_position)
+        tallied_position_we_vote_id_set = set(tally_values['position_we_vote_id'] for tally_values in tally_values_list)
+        # Positions about offices aren't counted, so make sure we aren't holding on to old entries
+        not_tallied_position_we_vote_id_list = [
+            one_position.we_vote_id.lower() for one_position in position_list
+            if positive_value_exists(one_position.we_vote_id) and
+            one_position.we_vote_id.lower() not in tallied_position_we_vote_id_set]
+        try:
+            if not_tallied_position_we_vote_id_list:
+                SupportOpposeTally.objects.filter(position_we_vote_id__in=not_tallied_position_we_vote_id_list)\
+                    .delete()
+            upsert_results = bulk_upsert(SupportOpposeTally, tally_values_list,
+                                         key_field_names=('position_we_vote_id',))
+            success = not upsert_results['not_processed']
+            status = "TALLIES_UPDATED " + upsert_results['status']
+        except Exception as e:
+            handle_record_not_saved_exception(e, logger=logger)
+            success = False
+            status = "TALLIES_COULD_NOT_BE_UPDATED"
+
+        results = {
+            'success':  success,
+            'status':   status,
+        }
+        return results
+
+    def delete_tally_for_position(self, position_we_vote_id, is_public_position):
+        """
+        Called every time a position is deleted. A position that switches visibility is saved in the other table with
+        the same we_vote_id before the old one is deleted, so we only delete the entry if it is still for this table.
+        :param position_we_vote_id:
+        :param is_public_position:
+        :return:
+        """
+        if not positive_value_exists(position_we_vote_id):
+            return False
+        try:
+            SupportOpposeTally.objects.filter(position_we_vote_id=position_we_vote_id.lower(),
+                                              is_public_position=is_public_position).delete()
+            return True
+        except Exception as e:
+            logger.error("delete_tally_for_position: " + str(e))
+            return False
+
+    def replace_tallies_for_election(self, google_civic_election_id, tally_list):
+        """
+        Throw away the tallies for this election and store the freshly calculated tally_list in one bulk insert.
+        From then on we count this election from its tallies.
+        :param google_civic_election_id:
+        :param tally_list: list of unsaved SupportOpposeTally objects
+        :return:
+        """
+        google_civic_election_id = convert_to_int(google_civic_election_id)
+        try:
+            with transaction.atomic():
+                SupportOpposeTally.objects.filter(google_civic_election_id=google_civic_election_id).delete()
+                SupportOpposeTally.objects.bulk_create(tally_list, batch_size=1000)
+                SupportOpposeTallyElection.objects.update_or_create(google_civic_election_id=google_civic_election_id)
+            status = "TALLIES_REPLACED_FOR_ELECTION"
+            success = True
+        except Exception as e:
+            handle_record_not_saved_exception(e, logger=logger)
+            status = "TALLIES_COULD_NOT_BE_REPLACED_FOR_ELECTION"
+            success = False
+
+        results = {
+            'success':      success,
+            'status':       status,
+            'tally_count':  len(tally_list) if success else 0,
+        }
+        return results
+
+    def retrieve_tally_list_for_ballot_items(self, ballot_item_we_vote_id_list):
+        """
+        One query for every tally entry on a ballot.
+        :param ballot_item_we_vote_id_list:
+        :return: dict with ballot_item_we_vote_id as key, and a list of SupportOpposeTally entries as value
+        """
+        tally_dict = {}
+        ballot_item_we_vote_id_list = [one_we_vote_id.lower() for one_we_vote_id in ballot_item_we_vote_id_list
+                                       if positive_value_exists(one_we_vote_id)]
+        if not len(ballot_item_we_vote_id_list):
+            return tally_dict
+
+        try:
+            tally_query = SupportOpposeTally.objects.filter(ballot_item_we_vote_id__in=ballot_item_we_vote_id_list)
+            for one_tally in tally_query:
+                tally_dict.setdefault(one_tally.ballot_item_we_vote_id, []).append(one_tally)
+        except Exception as e:
+            logger.error("retrieve_tally_list_for_ballot_items: " + str(e))
+
+        return tally_dict
+
+    def tallies_refreshed_for_election(self, google_civic_election_id):
+        """
+        Positions saved before SupportOpposeTally existed only have an entry once the election has been refreshed
+        :param google_civic_election_id:
+        :return:
+        """
+        google_civic_election_id = convert_to_int(google_civic_election_id)
+        if not positive_value_exists(google_civic_election_id):
+            return False
+        try:
+            return SupportOpposeTallyElection.objects.filter(google_civic_election_id=google_civic_election_id)\
+                .exists()
+        except Exception as e:
+            return False
@@ -0,0 +1,83 @@
+# support_oppose_deciding/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.test import TestCase
+from position.models import OPPOSE, PositionEntered, PositionForFriends, SUPPORT
+from support_oppose_deciding.controllers import refresh_support_oppose_tallies_for_election, \
+    support_and_oppose_counts_from_tallies
+from support_oppose_deciding.models import SupportOpposeTally, SupportOpposeTallyManager
+from wevote_functions.bulk_upsert import bulk_upsert
+
+CANDIDATE_WE_VOTE_ID = "wv01cand1"
+GOOGLE_CIVIC_ELECTION_ID = 1000
+
+
+class SupportOpposeTallyTestCase(TestCase):
+
+    def count_public_positions(self):
+        # A voter who follows nobody, counting the positions they don't follow
+        return support_and_oppose_counts_from_tallies(
+            0, False, [], [], [CANDIDATE_WE_VOTE_ID], GOOGLE_CIVIC_ELECTION_ID)[0]
+
+    def test_tallies_follow_every_write(self):
+        position = PositionEntered.objects.create(
+            candidate_campaign_we_vote_id=CANDIDATE_WE_VOTE_ID, google_civic_election_id=GOOGLE_CIVIC_ELECTION_ID,
+            organization_we_vote_id="wv01org1", stance=SUPPORT)
+        one_tally = SupportOpposeTally.objects.get(position_we_vote_id=position.we_vote_id)
+        self.assertTrue(one_tally.is_public_position)
+        self.assertTrue(one_tally.counts_as_support)
+
+        position.stance = OPPOSE
+        position.save()
+        self.assertTrue(SupportOpposeTally.objects.get(position_we_vote_id=position.we_vote_id).counts_as_oppose)
+
+        # Switching to friends only: the new entry is saved before the old one is deleted
+        friends_only_position = PositionForFriends.objects.create(
+            we_vote_id=position.we_vote_id, candidate_campaign_we_vote_id=CANDIDATE_WE_VOTE_ID,
+            google_civic_election_id=GOOGLE_CIVIC_ELECTION_ID, voter_we_vote_id="wv01voter1", stance=OPPOSE)
+        PositionEntered.objects.filter(id=position.id).delete()
+        self.assertFalse(SupportOpposeTally.objects.get(position_we_vote_id=position.we_vote_id).is_public_position)
+
+        PositionForFriends.objects.filter(id=friends_only_position.id).delete()
+        self.assertFalse(SupportOpposeTally.objects.exists())
+
+    def test_positions_from_before_the_tallies_are_counted(self):
+        PositionEntered.objects.create(
+            candidate_campaign_we_vote_id=CANDIDATE_WE_VOTE_ID, google_civic_election_id=GOOGLE_CIVIC_ELECTION_ID,
+            organization_we_vote_id="wv01org1", stance=SUPPORT)
+        PositionEntered.objects.create(
+            candidate_campaign_we_vote_id=CANDIDATE_WE_VOTE_ID, google_civic_election_id=GOOGLE_CIVIC_ELECTION_ID,
+            organization_we_vote_id="wv01org2", stance=SUPPORT)
+        # Like positions saved before the receivers existed
+        SupportOpposeTally.objects.all().delete()
+
+        support_oppose_tally_manager = SupportOpposeTallyManager()
+        self.assertFalse(support_oppose_tally_manager.tallies_refreshed_for_election(GOOGLE_CIVIC_ELECTION_ID))
+        self.assertEqual(self.count_public_positions()['support_count'], 2)
+
+        refresh_support_oppose_tallies_for_election(GOOGLE_CIVIC_ELECTION_ID)
+        self.assertTrue(support_oppose_tally_manager.tallies_refreshed_for_election(GOOGLE_CIVIC_ELECTION_ID))
+        self.assertEqual(SupportOpposeTally.objects.count(), 2)
+        self.assertEqual(self.count_public_positions()['support_count'], 2)
+
+    def test_tallies_follow_bulk_upsert(self):
+        bulk_upsert(PositionEntered, [
+            {'we_vote_id': 'wv01pos1', 'candidate_campaign_we_vote_id': CANDIDATE_WE_VOTE_ID,
+             'google_civic_election_id': GOOGLE_CIVIC_ELECTION_ID, 'organization_we_vote_id': "wv01org1",
+             'stance': SUPPORT},
+            {'we_vote_id': 'wv01pos2', 'candidate_campaign_we_vote_id': CANDIDATE_WE_VOTE_ID,
+             'google_civic_election_id': GOOGLE_CIVIC_ELECTION_ID, 'organization_we_vote_id': "wv01org2",
+             'stance': OPPOSE},
+        ])
+        self.assertEqual(list(SupportOpposeTally.objects.order_by('position_we_vote_id').values_list(
+            'position_we_vote_id', 'counts_as_support', 'counts_as_oppose')),
+            [('wv01pos1', True, False), ('wv01pos2', False, True)])
+
+        bulk_upsert(PositionEntered, [
+            {'we_vote_id': 'wv01pos2', 'stance': SUPPORT},
+            # Positions about offices aren't counted
+            {'we_vote_id': 'wv01pos1', 'candidate_campaign_we_vote_id': '', 'contest_office_we_vote_id': "wv01off1"},
+        ])
+        self.assertEqual(list(SupportOpposeTally.objects.values_list('position_we_vote_id', 'counts_as_support')),
+                         [('wv01pos2', True)])
@@ -1,8 +1,9 @@
 # voter/controllers.py
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
-from .models import BALLOT_ADDRESS, fetch_voter_id_from_voter_device_link, Voter, VoterAddressManager, \
-    VoterDeviceLink, VoterDeviceLinkManager, VoterManager
+from .models import BALLOT_ADDRESS, clear_voter_cache, clear_voter_device_link_cache, \
+    fetch_voter_id_from_voter_device_link, Voter, VoterAddressManager, VoterDeviceLink, VoterDeviceLinkManager, \
+    VoterManager
 from django.http import HttpResponse
 from analytics.controllers import move_analytics_info_to_another_voter
 from analytics.models import AnalyticsManager, ACTION_FACEBOOK_AUTHENTICATION_EXISTS, ACTION_GOOGLE_AUTHENTICATION_EXISTS, \
@@ -1090,6 +1091,10 @@ def voter_merge_two_accounts_for_api(  # voterMergeTwoAccounts
     if update_link_results['voter_device_link_updated']:
         success = True
         status += " MERGE_TWO_ACCOUNTS_VOTER_DEVICE_LINK_UPDATED"
+    # Some of the moves above update the voter table directly, so don't trust anything cached for either voter
+    clear_voter_device_link_cache(voter_device_id)
+    clear_voter_cache(voter.id)
+    clear_voter_cache(new_owner_voter.id)
 
     # Data healing scripts
     position_list_manager = PositionListManager()
@@ -1919,6 +1924,8 @@ def voter_sign_out_for_api(voter_device_id, sign_out_all_devices=False):  # vote
     else:
         results = voter_device_link_manager.delete_voter_device_link(voter_device_id)
     status += results['status']
+    # Whatever happened above, this device must not keep resolving to the voter who signed out
+    clear_voter_device_link_cache(voter_device_id)
 
     results = {
         'success':  results['success'],
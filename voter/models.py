@@ -5,11 +5,13 @@
 from django.db import (models, IntegrityError)
 from django.db.models import Q
 from django.contrib.auth.models import (BaseUserManager, AbstractBaseUser)  # PermissionsMixin
+from django.core.signals import request_finished, request_started
 from django.core.validators import RegexValidator
 from exception.models import handle_exception, handle_record_found_more_than_one_exception,\
     handle_record_not_saved_exception
-from import_export_facebook.models import FacebookManager
-from twitter.models import TwitterUserManager
+from import_export_facebook.models import FacebookLinkToVoter, FacebookManager
+from twitter.models import TwitterLinkToVoter, TwitterUserManager
+import threading
 from validate_email import validate_email
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, generate_voter_device_id, \
@@ -30,6 +32,45 @@ BALLOT_INTRO_VOTE_COMPLETED = 128  # ...the voter learned about casting their vo
 INTERFACE_STATUS_THRESHOLD_ISSUES_FOLLOWED = 5
 INTERFACE_STATUS_THRESHOLD_ORGANIZATIONS_FOLLOWED = 5
 
+# voter_device_id -> (voter_id, voter) for the request this thread is handling right now. None outside of a request.
+# Nothing is kept between requests, so signing out or relinking a device takes effect in every process right away.
+_voter_request_cache = threading.local()
+
+
+def start_voter_request_cache(**kwargs):
+    _voter_request_cache.voter_by_device_id = {}
+
+
+def end_voter_request_cache(**kwargs):
+    _voter_request_cache.voter_by_device_id = None
+
+
+request_started.connect(start_voter_request_cache, dispatch_uid="start_voter_request_cache")
+request_finished.connect(end_voter_request_cache, dispatch_uid="end_voter_request_cache")
+
+
+def fetch_voter_request_cache():
+    return getattr(_voter_request_cache, 'voter_by_device_id', None)
+
+
+def clear_voter_device_link_cache(voter_device_id):
+    if not positive_value_exists(voter_device_id):
+        return
+    request_cache = fetch_voter_request_cache()
+    if request_cache is not None:
+        request_cache.pop(voter_device_id, None)
+
+
+def clear_voter_cache(voter_id):
+    voter_id = convert_to_int(voter_id)
+    if not positive_value_exists(voter_id):
+        return
+    request_cache = fetch_voter_request_cache()
+    if request_cache:
+        for voter_device_id, (cached_voter_id, cached_voter) in list(request_cache.items()):
+            if cached_voter_id == voter_id:
+                del request_cache[voter_device_id]
+
 # This way of extending the base user described here:
 # https://docs.djangoproject.com/en/1.8/topics/auth/customizing/#a-full-example
 # I then altered with this: http://buildthis.com/customizing-djangos-default-user-model/
@@ -208,9 +249,32 @@ class VoterManager(BaseUserManager):
         return results
 
     def retrieve_voter_from_voter_device_id(self, voter_device_id):
-        voter_id = fetch_voter_id_from_voter_device_link(voter_device_id)
+        """
+        Nearly every API call starts here, so the answer is cached for the rest of the request. A lookup that isn't
+        cached is one query.
+        :param voter_device_id:
+        :return:
+        """
+        request_cache = fetch_voter_request_cache()
+        if request_cache is not None and voter_device_id in request_cache:
+            voter_id, voter_on_stage = request_cache[voter_device_id]
+            results = {
+                'voter_found':  True,
+                'voter_id':     voter_id,
+                'voter':        voter_on_stage,
+            }
+            return results
 
-        if not voter_id:
+        voter_on_stage = None
+        if positive_value_exists(voter_device_id):
+            try:
+                # The VoterDeviceLink and the Voter in one query
+                voter_on_stage = Voter.objects.get(
+                    id__in=VoterDeviceLink.objects.filter(voter_device_id=voter_device_id).values('voter_id'))
+            except (Voter.DoesNotExist, Voter.MultipleObjectsReturned):
+                pass
+
+        if voter_on_stage is None:
             results = {
                 'voter_found':  False,
                 'voter_id':     0,
@@ -218,16 +282,10 @@ class VoterManager(BaseUserManager):
             }
             return results
 
-        voter_manager = VoterManager()
-        results = voter_manager.retrieve_voter_by_id(voter_id)
-        if results['voter_found']:
-            voter_on_stage = results['voter']
-            voter_on_stage_found = True
-            voter_id = results['voter_id']
-        else:
-            voter_on_stage = Voter()
-            voter_on_stage_found = False
-            voter_id = 0
+        voter_id = voter_on_stage.id
+        if request_cache is not None:
+            request_cache[voter_device_id] = (voter_id, voter_on_stage)
+        voter_on_stage_found = True
 
         results = {
             'voter_found':  voter_on_stage_found,
@@ -1628,6 +1686,12 @@ class Voter(AbstractBaseUser):
         if self.we_vote_id == "" or self.we_vote_id is None:  # If there isn't a value...
             self.generate_new_we_vote_id()
         super(Voter, self).save(*args, **kwargs)
+        clear_voter_cache(self.id)
+
+    def delete(self, *args, **kwargs):
+        voter_id = self.id
+        super(Voter, self).delete(*args, **kwargs)
+        clear_voter_cache(voter_id)
 
     def generate_new_we_vote_id(self):
         # ...generate a new id
@@ -1860,7 +1924,11 @@ class VoterDeviceLinkManager(models.Model):
 
         try:
             if positive_value_exists(voter_id):
+                voter_device_id_list = list(
+                    VoterDeviceLink.objects.filter(voter_id=voter_id).values_list('voter_device_id', flat=True))
                 VoterDeviceLink.objects.filter(voter_id=voter_id).delete()
+                for one_voter_device_id in voter_device_id_list:
+                    clear_voter_device_link_cache(one_voter_device_id)
                 status = "DELETE_ALL_VOTER_DEVICE_LINKS_SUCCESSFUL"
                 success = True
             else:
@@ -1880,6 +1948,7 @@ class VoterDeviceLinkManager(models.Model):
         try:
             if positive_value_exists(voter_device_id):
                 VoterDeviceLink.objects.filter(voter_device_id=voter_device_id).delete()
+                clear_voter_device_link_cache(voter_device_id)
                 status = "DELETE_VOTER_DEVICE_LINK_SUCCESSFUL"
                 success = True
             else:
@@ -2010,6 +2079,7 @@ class VoterDeviceLinkManager(models.Model):
                 if positive_value_exists(state_code):
                     voter_device_link.state_code = state_code
                 voter_device_link.save()
+                clear_voter_device_link_cache(voter_device_link.voter_device_id)
 
                 voter_device_link_id = voter_device_link.id
             else:
@@ -2032,6 +2102,10 @@ class VoterDeviceLinkManager(models.Model):
 
 # This method *just* returns the voter_id or 0
 def fetch_voter_id_from_voter_device_link(voter_device_id):
+    request_cache = fetch_voter_request_cache()
+    if request_cache is not None and voter_device_id in request_cache:
+        return request_cache[voter_device_id][0]
+
     voter_device_link_manager = VoterDeviceLinkManager()
     results = voter_device_link_manager.retrieve_voter_device_link_from_voter_device_id(voter_device_id)
     if results['voter_device_link_found']:
@@ -2061,17 +2135,12 @@ def fetch_voter_we_vote_id_from_voter_id(voter_id):
 
 
 def fetch_voter_we_vote_id_from_voter_device_link(voter_device_id):
-    voter_device_link_manager = VoterDeviceLinkManager()
-    results = voter_device_link_manager.retrieve_voter_device_link_from_voter_device_id(voter_device_id)
-    if results['voter_device_link_found']:
-        voter_device_link = results['voter_device_link']
-        voter_id = voter_device_link.voter_id
-        voter_manager = VoterManager()
-        results = voter_manager.retrieve_voter_by_id(voter_id)
-        if results['voter_found']:
-            voter = results['voter']
-            return voter.we_vote_id
-        return ""
+    voter_manager = VoterManager()
+    results = voter_manager.retrieve_voter_from_voter_device_id(voter_device_id)
+    if results['voter_found']:
+        voter = results['voter']
+        return voter.we_vote_id
+    return ""
 
 
 def retrieve_voter_authority(request):
@@ -2674,3 +2743,57 @@ class VoterMetricsManager(models.Model):
         except Exception as e:
             pass
         return positive_value_exists(count_result)
+
+    def fetch_voter_metrics_details(self, voter_we_vote_id_list):
+        """
+        What calculate_sitewide_voter_metrics_for_one_voter needs from each voter (the voter id, how they have signed
+        in, and fetch_voter_entered_full_address), for many voters with one query per table. Like retrieve_voter,
+        voter_we_vote_ids that only differ in case are the same voter.
+        :param voter_we_vote_id_list:
+        :return: lower case voter_we_vote_id -> {voter_id, signed_in_twitter, signed_in_facebook, signed_in_with_email,
+         entered_full_address}, or None if a query failed. Voters we can't find are left out.
+        """
+        voter_we_vote_id_lower_list = list(set(voter_we_vote_id.lower() for voter_we_vote_id in voter_we_vote_id_list
+                                               if positive_value_exists(voter_we_vote_id)))
+        voter_metrics_details = {}
+        if not voter_we_vote_id_lower_list:
+            return voter_metrics_details
+        lower_case_we_vote_id_filter = {
+            'where':    ["LOWER(voter_we_vote_id) IN %s"],
+            'params':   [tuple(voter_we_vote_id_lower_list)],
+        }
+        try:
+            voter_query = Voter.objects.extra(
+                where=["LOWER(we_vote_id) IN %s"], params=[tuple(voter_we_vote_id_lower_list)])
+            voter_list = list(voter_query)
+
+            # signed_in_twitter and signed_in_facebook look for these links one voter at a time
+            twitter_link_query = TwitterLinkToVoter.objects.extra(**lower_case_we_vote_id_filter)
+            voter_we_vote_ids_with_twitter = set(
+                voter_we_vote_id.lower() for voter_we_vote_id, twitter_id
+                in twitter_link_query.values_list('voter_we_vote_id', 'twitter_id')
+                if positive_value_exists(twitter_id))
+            facebook_link_query = FacebookLinkToVoter.objects.extra(**lower_case_we_vote_id_filter)
+            voter_we_vote_ids_with_facebook = set(
+                voter_we_vote_id.lower() for voter_we_vote_id, facebook_user_id
+                in facebook_link_query.values_list('voter_we_vote_id', 'facebook_user_id')
+                if positive_value_exists(facebook_user_id))
+
+            address_query = VoterAddress.objects.using('readonly').filter(
+                voter_id__in=[voter.id for voter in voter_list], refreshed_from_google=True)
+            voter_ids_with_full_address = set(address_query.values_list('voter_id', flat=True))
+        except Exception as e:
+            logger.error("fetch_voter_metrics_details: {error}".format(error=e))
+            return None
+
+        for voter in voter_list:
+            voter_we_vote_id_lower = voter.we_vote_id.lower()
+            voter_metrics_details[voter_we_vote_id_lower] = {
+                'voter_id':                 voter.id,
+                'signed_in_twitter':        voter_we_vote_id_lower in voter_we_vote_ids_with_twitter,
+                'signed_in_facebook':       voter_we_vote_id_lower in voter_we_vote_ids_with_facebook,
+                'signed_in_with_email':     voter.signed_in_with_email(),
+                'entered_full_address':     voter.id in voter_ids_with_full_address,
+            }
+        return voter_metrics_details
+
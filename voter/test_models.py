@@ -6,6 +6,9 @@ from django.core.urlresolvers import reverse
 from django.test import Client, TestCase
 from django.http import SimpleCookie
 import json
+from voter.controllers import voter_sign_out_for_api
+from voter.models import end_voter_request_cache, start_voter_request_cache, VoterDeviceLinkManager, VoterManager
+from wevote_functions.functions import generate_voter_device_id
 
 
 # class WeVoteTestsVoter(TestCase):
@@ -82,3 +85,49 @@ import json
 #             json_data3['status'], 'VOTER_ALREADY_EXISTS',
 #             "status: {status} (VOTER_ALREADY_EXISTS expected), voter_device_id: {voter_device_id}".format(
 #                 status=json_data3['status'], voter_device_id=json_data3['voter_device_id']))
+
+
+class WeVoteTestsVoterDeviceLinkCache(TestCase):
+
+    def setUp(self):
+        start_voter_request_cache()
+        self.voter_manager = VoterManager()
+        self.voter_device_link_manager = VoterDeviceLinkManager()
+        self.voter_device_id = generate_voter_device_id()
+        self.voter = self.voter_manager.create_voter()['voter']
+        self.voter_device_link_manager.save_new_voter_device_link(self.voter_device_id, self.voter.id)
+
+    def tearDown(self):
+        end_voter_request_cache()
+
+    def test_voter_resolved_once_per_request(self):
+        with self.assertNumQueries(1):
+            results = self.voter_manager.retrieve_voter_from_voter_device_id(self.voter_device_id)
+        self.assertEqual(results['voter_id'], self.voter.id)
+        with self.assertNumQueries(0):
+            results = self.voter_manager.retrieve_voter_from_voter_device_id(self.voter_device_id)
+        self.assertEqual(results['voter_id'], self.voter.id)
+
+    def test_voter_not_cached_between_requests(self):
+        self.voter_manager.retrieve_voter_from_voter_device_id(self.voter_device_id)
+        end_voter_request_cache()
+        # Like a sign out handled by another process, which can't clear this process's cache
+        self.voter_device_link_manager.delete_voter_device_link(self.voter_device_id)
+        start_voter_request_cache()
+        results = self.voter_manager.retrieve_voter_from_voter_device_id(self.voter_device_id)
+        self.assertFalse(results['voter_found'])
+
+    def test_relinking_device_clears_cache(self):
+        self.voter_manager.retrieve_voter_from_voter_device_id(self.voter_device_id)
+        other_voter = self.voter_manager.create_voter()['voter']
+        voter_device_link = self.voter_device_link_manager.retrieve_voter_device_link(
+            self.voter_device_id)['voter_device_link']
+        self.voter_device_link_manager.update_voter_device_link(voter_device_link, other_voter)
+        results = self.voter_manager.retrieve_voter_from_voter_device_id(self.voter_device_id)
+        self.assertEqual(results['voter_id'], other_voter.id)
+
+    def test_signed_out_device_not_resolved(self):
+        self.voter_manager.retrieve_voter_from_voter_device_id(self.voter_device_id)
+        voter_sign_out_for_api(self.voter_device_id)
+        results = self.voter_manager.retrieve_voter_from_voter_device_id(self.voter_device_id)
+        self.assertFalse(results['voter_found'])
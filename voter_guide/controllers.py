@@ -14,14 +14,18 @@ import json
 
 from organization.controllers import organization_follow_or_unfollow_or_ignore
 from organization.models import OrganizationManager, OrganizationListManager
-from position.controllers import retrieve_ballot_item_we_vote_ids_for_organizations_to_follow
+from position.controllers import retrieve_ballot_item_we_vote_ids_for_organization_list_to_follow
 from position.models import ANY_STANCE, PositionEntered, PositionManager, PositionListManager, SUPPORT
 import requests
 from voter.models import fetch_voter_id_from_voter_device_link, fetch_voter_we_vote_id_from_voter_device_link, \
     VoterManager
-from voter_guide.models import VoterGuideListManager, VoterGuideManager, VoterGuidePossibilityManager
+from voter_guide.models import ORGANIZATION, VoterGuide, VoterGuideListManager, VoterGuideManager, \
+    VoterGuidePossibilityManager
 import wevote_functions.admin
-from wevote_functions.functions import is_voter_device_id_valid, positive_value_exists, process_request_from_master
+from wevote_functions.bulk_upsert import bulk_upsert
+from wevote_functions.functions import canonicalize_we_vote_id, canonicalize_we_vote_id_list, \
+    is_voter_device_id_valid, positive_value_exists
+from wevote_functions.master_sync import import_from_master_server_in_chunks
 
 logger = wevote_functions.admin.get_logger(__name__)
 
@@ -122,35 +126,39 @@ def voter_guides_import_from_master_server(request, google_civic_election_id):
     Get the json data, and either create new entries or update existing
     :return:
     """
-    import_results, structured_json = process_request_from_master(
+    duplicate_index_by_scope = {}
+
+    def import_voter_guides_chunk(structured_json):
+        results = filter_voter_guides_structured_json_for_local_duplicates(structured_json, duplicate_index_by_scope)
+        import_results = voter_guides_import_from_structured_json(results['structured_json'])
+        import_results['duplicates_removed'] = results['duplicates_removed']
+        return import_results
+
+    return import_from_master_server_in_chunks(
         request, "Loading Voter Guides from We Vote Master servers",
         VOTER_GUIDES_SYNC_URL, {
             "key":                      WE_VOTE_API_KEY,  # This comes from an environment variable
             "format":                   'json',
             "google_civic_election_id": str(google_civic_election_id),
-        }
-    )
-
-    if import_results['success']:
-        results = filter_voter_guides_structured_json_for_local_duplicates(structured_json)
-        filtered_structured_json = results['structured_json']
-        duplicates_removed = results['duplicates_removed']
-
-        import_results = voter_guides_import_from_structured_json(filtered_structured_json)
-        import_results['duplicates_removed'] = duplicates_removed
+        },
+        import_voter_guides_chunk, 'voter_guides')
 
-    return import_results
 
-
-def filter_voter_guides_structured_json_for_local_duplicates(structured_json):
+def filter_voter_guides_structured_json_for_local_duplicates(structured_json, duplicate_index_by_scope=None):
     """
     With this function, we remove voter_guides that seem to be duplicates, but have different we_vote_id's.
     :param structured_json:
+    :param duplicate_index_by_scope: when importing in chunks, pass the same dict with each chunk so we only load
+     the local entries once
     :return:
     """
     duplicates_removed = 0
     filtered_structured_json = []
     voter_guide_list_manager = VoterGuideListManager()
+    # We load the local voter guides for each election (or time span) once, instead of running a query for every
+    # incoming voter guide
+    if duplicate_index_by_scope is None:
+        duplicate_index_by_scope = {}
     for one_voter_guide in structured_json:
         we_vote_id = one_voter_guide['we_vote_id'] if 'we_vote_id' in one_voter_guide else ''
         google_civic_election_id = one_voter_guide['google_civic_election_id'] \
@@ -166,13 +174,15 @@ def filter_voter_guides_structured_json_for_local_duplicates(structured_json):
         # Check to see if there is an entry that matches in all critical ways, minus the we_vote_id
         we_vote_id_from_master = we_vote_id
 
-        results = voter_guide_list_manager.retrieve_possible_duplicate_voter_guides(
-            google_civic_election_id, vote_smart_time_span,
-            organization_we_vote_id, public_figure_we_vote_id,
-            twitter_handle,
-            we_vote_id_from_master)
+        scope = voter_guide_list_manager.fetch_possible_duplicate_voter_guides_scope(
+            google_civic_election_id, vote_smart_time_span)
+        if scope not in duplicate_index_by_scope:
+            duplicate_index_by_scope[scope] = voter_guide_list_manager.retrieve_possible_duplicate_voter_guides_index(
+                google_civic_election_id, vote_smart_time_span)
 
-        if results['voter_guide_list_found']:
+        if voter_guide_list_manager.is_possible_duplicate_voter_guide(
+                duplicate_index_by_scope[scope], organization_we_vote_id, public_figure_we_vote_id, twitter_handle,
+                we_vote_id_from_master):
             # There seems to be a duplicate already in this database using a different we_vote_id
             duplicates_removed += 1
         else:
@@ -199,6 +209,18 @@ def voter_guides_import_from_structured_json(structured_json):
     voter_guides_saved = 0
     voter_guides_updated = 0
     voter_guides_not_processed = 0
+
+    # Organization voter guides for an election (nearly all of them) are written with bulk_upsert, matched on
+    #  organization and election like update_or_create_organization_voter_guide_by_election_id. We read every
+    #  organization they need in one query.
+    organization_list_manager = OrganizationListManager()
+    organization_results = organization_list_manager.retrieve_organizations_by_organization_we_vote_id_list(
+        canonicalize_we_vote_id_list([one_voter_guide.get('organization_we_vote_id')
+                                      for one_voter_guide in structured_json]))
+    organization_dict = {organization.we_vote_id: organization
+                         for organization in organization_results['organization_list']}
+    voter_guide_values_list = []
+
     for one_voter_guide in structured_json:
         we_vote_id = one_voter_guide['we_vote_id'] if 'we_vote_id' in one_voter_guide else ''
         google_civic_election_id = one_voter_guide['google_civic_election_id'] \
@@ -239,8 +261,28 @@ def voter_guides_import_from_structured_json(structured_json):
 
         if proceed_to_update_or_create:
             if positive_value_exists(organization_we_vote_id) and positive_value_exists(google_civic_election_id):
-                results = voter_guide_manager.update_or_create_organization_voter_guide_by_election_id(
-                    organization_we_vote_id, google_civic_election_id, state_code)
+                organization = organization_dict.get(canonicalize_we_vote_id(organization_we_vote_id))
+                if organization is None:
+                    voter_guides_not_processed += 1
+                    continue
+                voter_guide_values_list.append({
+                    # Values we search against
+                    'google_civic_election_id':     google_civic_election_id,
+                    'organization_we_vote_id':      organization_we_vote_id,
+                    # The rest of the values
+                    'we_vote_id':                   we_vote_id,
+                    'voter_guide_owner_type':       ORGANIZATION,
+                    'image_url':                    organization.organization_photo_url(),
+                    'twitter_handle':               organization.organization_twitter_handle,
+                    'twitter_description':          organization.twitter_description,
+                    'twitter_followers_count':      organization.twitter_followers_count,
+                    'display_name':                 organization.organization_name,
+                    'state_code':                   state_code,
+                    'we_vote_hosted_profile_image_url_large':  organization.we_vote_hosted_profile_image_url_large,
+                    'we_vote_hosted_profile_image_url_medium': organization.we_vote_hosted_profile_image_url_medium,
+                    'we_vote_hosted_profile_image_url_tiny':   organization.we_vote_hosted_profile_image_url_tiny,
+                })
+                continue
             elif positive_value_exists(organization_we_vote_id) and positive_value_exists(vote_smart_time_span):
                 results = voter_guide_manager.update_or_create_organization_voter_guide_by_time_span(
                     organization_we_vote_id, vote_smart_time_span)
@@ -266,12 +308,17 @@ def voter_guides_import_from_structured_json(structured_json):
                 voter_guides_updated += 1
         else:
             voter_guides_not_processed += 1
+
+    # A voter guide we already have keeps its own we_vote_id
+    results = bulk_upsert(VoterGuide, voter_guide_values_list,
+                          key_field_names=('organization_we_vote_id', 'google_civic_election_id'),
+                          create_only_field_names=('we_vote_id',))
     voter_guides_results = {
         'success':          True,
-        'status':           "VOTER_GUIDES_IMPORT_PROCESS_COMPLETE",
-        'saved':            voter_guides_saved,
-        'updated':          voter_guides_updated,
-        'not_processed':    voter_guides_not_processed,
+        'status':           "VOTER_GUIDES_IMPORT_PROCESS_COMPLETE " + results['status'],
+        'saved':            voter_guides_saved + results['saved'],
+        'updated':          voter_guides_updated + results['updated'],
+        'not_processed':    voter_guides_not_processed + results['not_processed'],
     }
     return voter_guides_results
 
@@ -753,12 +800,11 @@ def retrieve_voter_guides_to_follow_by_election_for_api(voter_id, google_civic_e
 
     position_list_manager = PositionListManager()
     if positive_value_exists(google_civic_election_id):
-        # This method finds all ballot_items in this election, and then retrieves *all* positions by any org or person
-        # about each ballot_item. This will pick up We Vote positions or Vote Smart ratings, regardless of what time
-        # period they were entered for.
-        public_only = True  # Do not return positions that are from friends only since we only want public positions
-        all_positions_list_for_election = position_list_manager.retrieve_all_positions_for_election(
-            google_civic_election_id, ANY_STANCE, public_only)
+        # One compact entry for *all* public positions by any org or person about each ballot_item in this
+        # election. This will pick up We Vote positions or Vote Smart ratings, regardless of what time period they
+        # were entered for.
+        position_index_for_election = position_list_manager.retrieve_public_position_index_for_election(
+            google_civic_election_id)
     else:
         voter_guide_list = []
         results = {
@@ -770,16 +816,24 @@ def retrieve_voter_guides_to_follow_by_election_for_api(voter_id, google_civic_e
         return results
 
     if filter_voter_guides_by_issue and organization_we_vote_id_list_for_voter_issues is not None:
-        all_positions_list_for_election = position_list_manager.remove_positions_unrelated_to_issues(
-            all_positions_list_for_election, organization_we_vote_id_list_for_voter_issues)
-
-    positions_list_minus_ignored = position_list_manager.remove_positions_ignored_by_voter(
-        all_positions_list_for_election, organizations_ignored_by_voter)
-
-    positions_list_minus_ignored_and_followed = position_list_manager.calculate_positions_not_followed_by_voter(
-        positions_list_minus_ignored, organizations_followed_by_voter)
-
-    if not len(positions_list_minus_ignored_and_followed):
+        organization_we_vote_ids_for_voter_issues = set(organization_we_vote_id_list_for_voter_issues)
+    else:
+        organization_we_vote_ids_for_voter_issues = None
+    organization_ids_ignored_or_followed = set(organizations_ignored_by_voter) | set(organizations_followed_by_voter)
+
+    # Only keep the positions from organizations related to the voter's issues (if requested), and that the voter
+    # isn't following or ignoring
+    positions_minus_ignored_and_followed = []
+    for one_position in position_index_for_election:
+        # Some positions are for individual voters, so we want to filter those out
+        if not one_position.organization_id or one_position.organization_id in organization_ids_ignored_or_followed:
+            continue
+        if organization_we_vote_ids_for_voter_issues is not None and \
+                one_position.organization_we_vote_id not in organization_we_vote_ids_for_voter_issues:
+            continue
+        positions_minus_ignored_and_followed.append(one_position)
+
+    if not len(positions_minus_ignored_and_followed):
         # If no positions are found, exit
         voter_guide_list = []
         results = {
@@ -793,14 +847,16 @@ def retrieve_voter_guides_to_follow_by_election_for_api(voter_id, google_civic_e
     # We want to retrieve an ordered list of organization_we_vote_id's (not followed or ignored) that have a position
     # in this election. For speed we only retrieve full voter_guide data for the limited list that we need
     voter_guide_list_manager = VoterGuideListManager()
-    # This is a list of orgs that the voter isn't following or ignoring
+    # This is a list of orgs that the voter isn't following or ignoring. Every entry in the index is from this
+    # election, so they all qualify.
     org_list_found_by_google_civic_election_id = []
-    for one_position in positions_list_minus_ignored_and_followed:
-        if positive_value_exists(one_position.organization_we_vote_id) and \
-                positive_value_exists(one_position.google_civic_election_id):
+    orgs_found_by_google_civic_election_id = set()
+    for one_position in positions_minus_ignored_and_followed:
+        if positive_value_exists(one_position.organization_we_vote_id):
             # Make sure we haven't already recorded that we want to retrieve the voter_guide for this org
-            if one_position.organization_we_vote_id in org_list_found_by_google_civic_election_id:
+            if one_position.organization_we_vote_id in orgs_found_by_google_civic_election_id:
                 continue
+            orgs_found_by_google_civic_election_id.add(one_position.organization_we_vote_id)
             org_list_found_by_google_civic_election_id.append(one_position.organization_we_vote_id)
 
     # status += " len(org_list_found_by_google_civic_election_id): " + \
@@ -825,30 +881,29 @@ def retrieve_voter_guides_to_follow_by_election_for_api(voter_id, google_civic_e
         list_from_election_id_found = False
 
     # Second, retrieve the voter_guides stored by org & vote_smart_time_span
-    # All positions were found above with position_list_manager.retrieve_all_positions_for_election
+    # All positions were found above with position_list_manager.retrieve_public_position_index_for_election
     # We give precedence to full voter guides from above, where we have an actual position of an org (as opposed to
     # Vote Smart ratings)
     maximum_number_of_guides_to_retrieve_by_time_span = \
         maximum_number_to_retrieve - len(voter_guide_list_from_election_id)
     if positive_value_exists(maximum_number_of_guides_to_retrieve_by_time_span):
-        org_list_found_by_time_span = []
+        orgs_found_by_time_span = set()
         orgs_we_need_found_by_position_and_time_span_list_of_dicts = []
-        for one_position in positions_list_minus_ignored_and_followed:
+        for one_position in positions_minus_ignored_and_followed:
             # If this was a position found that was based on vote_smart_time_span...
             #  (That is, ignore the positions already retrieved based on google_civic_election_id)
             if positive_value_exists(one_position.organization_we_vote_id) and \
                     positive_value_exists(one_position.vote_smart_time_span):
                 # This shouldn't be possible, but we have it here for safety
                 org_found_by_election_id_above = one_position.organization_we_vote_id in \
-                    org_list_found_by_google_civic_election_id
+                    orgs_found_by_google_civic_election_id
                 # If we already recorded that we want to look for this org under a different time span...
-                org_found_by_different_time_span = one_position.organization_we_vote_id in \
-                    org_list_found_by_time_span
+                org_found_by_different_time_span = one_position.organization_we_vote_id in orgs_found_by_time_span
                 # Don't record that we want to look for a voter guide by this org we_vote_id or time span
                 if org_found_by_election_id_above or org_found_by_different_time_span:
                     continue
 
-                org_list_found_by_time_span.append(one_position.organization_we_vote_id)
+                orgs_found_by_time_span.add(one_position.organization_we_vote_id)
                 one_position_dict = {'organization_we_vote_id': one_position.organization_we_vote_id,
                                      'vote_smart_time_span': one_position.vote_smart_time_span}
                 orgs_we_need_found_by_position_and_time_span_list_of_dicts.append(one_position_dict)
@@ -888,22 +943,20 @@ def retrieve_voter_guides_to_follow_by_election_for_api(voter_id, google_civic_e
 
     if len(voter_guide_list):
         voter_guide_list_found = True
+        # Augment each voter guide with a list of ballot_item we_vote_id's that this org supports
+        stance_we_are_looking_for = SUPPORT
+        organization_we_vote_id_list = [one_voter_guide.organization_we_vote_id
+                                        for one_voter_guide in voter_guide_list]
+        ballot_item_results = retrieve_ballot_item_we_vote_ids_for_organization_list_to_follow(
+            organization_we_vote_id_list, stance_we_are_looking_for, google_civic_election_id)
+        ballot_item_we_vote_ids_by_organization = ballot_item_results['ballot_item_we_vote_ids_by_organization']
+
         updated_voter_guide_list = []
         for one_voter_guide in voter_guide_list:
-            # Augment the voter guide with a list of ballot_item we_vote_id's that this org supports
-            stance_we_are_looking_for = SUPPORT
-            organization_id = 0
-            ballot_item_results = retrieve_ballot_item_we_vote_ids_for_organizations_to_follow(
-                voter_id, organization_id, one_voter_guide.organization_we_vote_id, stance_we_are_looking_for,
-                google_civic_election_id)
-
-            if ballot_item_results['count']:
-                ballot_item_we_vote_ids_this_org_supports = ballot_item_results['ballot_item_we_vote_ids_list']
-            else:
-                ballot_item_we_vote_ids_this_org_supports = []
-
+            organization_we_vote_id = one_voter_guide.organization_we_vote_id.lower() \
+                if one_voter_guide.organization_we_vote_id else ''
             one_voter_guide.ballot_item_we_vote_ids_this_org_supports = \
-                ballot_item_we_vote_ids_this_org_supports
+                ballot_item_we_vote_ids_by_organization.get(organization_we_vote_id, [])
             updated_voter_guide_list.append(one_voter_guide)
         voter_guide_list = updated_voter_guide_list
 
@@ -10,7 +10,8 @@ from exception.models import handle_exception, handle_record_not_found_exception
 import operator
 from organization.models import Organization, OrganizationManager
 import wevote_functions.admin
-from wevote_functions.functions import convert_to_int, convert_to_str, positive_value_exists
+from wevote_functions.functions import canonicalize_we_vote_id, canonicalize_we_vote_id_fields, convert_to_int, \
+    convert_to_str, fetch_duplicate_index_value, LocalDuplicateIndex, positive_value_exists
 from wevote_settings.models import fetch_site_unique_id_prefix, fetch_next_we_vote_id_voter_guide_integer
 
 logger = wevote_functions.admin.get_logger(__name__)
@@ -77,7 +78,7 @@ class VoterGuideManager(models.Manager):
                     }
                     voter_guide_on_stage, new_voter_guide_created = VoterGuide.objects.update_or_create(
                         google_civic_election_id__exact=google_civic_election_id,
-                        organization_we_vote_id__iexact=organization_we_vote_id,
+                        organization_we_vote_id=canonicalize_we_vote_id(organization_we_vote_id),
                         defaults=updated_values)
                     success = True
                     if new_voter_guide_created:
@@ -142,7 +143,7 @@ class VoterGuideManager(models.Manager):
                     }
                     voter_guide_on_stage, new_voter_guide_created = VoterGuide.objects.update_or_create(
                         vote_smart_time_span__exact=vote_smart_time_span,
-                        organization_we_vote_id__iexact=organization_we_vote_id,
+                        organization_we_vote_id=canonicalize_we_vote_id(organization_we_vote_id),
                         defaults=updated_values)
                     success = True
                     if new_voter_guide_created:
@@ -188,7 +189,7 @@ class VoterGuideManager(models.Manager):
                 voter_guide_on_stage, new_voter_guide_created = VoterGuide.objects.update_or_create(
                     google_civic_election_id__exact=google_civic_election_id,
                     voter_guide_owner_type__iexact=voter_guide_owner_type,
-                    public_figure_we_vote_id__iexact=public_figure_we_vote_id,
+                    public_figure_we_vote_id=canonicalize_we_vote_id(public_figure_we_vote_id),
                     defaults=updated_values)
                 success = True
                 if new_voter_guide_created:
@@ -264,8 +265,9 @@ class VoterGuideManager(models.Manager):
 
         try:
             if positive_value_exists(organization_we_vote_id) and positive_value_exists(google_civic_election_id):
-                voter_guide_query = VoterGuide.objects.filter(google_civic_election_id=google_civic_election_id,
-                                                              organization_we_vote_id__iexact=organization_we_vote_id)
+                voter_guide_query = VoterGuide.objects.filter(
+                    google_civic_election_id=google_civic_election_id,
+                    organization_we_vote_id=canonicalize_we_vote_id(organization_we_vote_id))
                 voter_guide_found = True if voter_guide_query.count() > 0 else False
         except VoterGuide.MultipleObjectsReturned as e:
             voter_guide_found = True
@@ -295,26 +297,30 @@ class VoterGuideManager(models.Manager):
                 status = "VOTER_GUIDE_FOUND_WITH_ID"
             elif positive_value_exists(organization_we_vote_id) and positive_value_exists(google_civic_election_id):
                 status = "ERROR_RETRIEVING_VOTER_GUIDE_WITH_ORGANIZATION_WE_VOTE_ID"  # Set this in case the get fails
-                voter_guide_on_stage = VoterGuide.objects.get(google_civic_election_id=google_civic_election_id,
-                                                              organization_we_vote_id__iexact=organization_we_vote_id)
+                voter_guide_on_stage = VoterGuide.objects.get(
+                    google_civic_election_id=google_civic_election_id,
+                    organization_we_vote_id=canonicalize_we_vote_id(organization_we_vote_id))
                 voter_guide_on_stage_id = voter_guide_on_stage.id
                 status = "VOTER_GUIDE_FOUND_WITH_ORGANIZATION_WE_VOTE_ID"
             elif positive_value_exists(organization_we_vote_id) and positive_value_exists(vote_smart_time_span):
                 status = "ERROR_RETRIEVING_VOTER_GUIDE_WITH_ORGANIZATION_WE_VOTE_ID_AND_TIME_SPAN"
-                voter_guide_on_stage = VoterGuide.objects.get(vote_smart_time_span=vote_smart_time_span,
-                                                              organization_we_vote_id__iexact=organization_we_vote_id)
+                voter_guide_on_stage = VoterGuide.objects.get(
+                    vote_smart_time_span=vote_smart_time_span,
+                    organization_we_vote_id=canonicalize_we_vote_id(organization_we_vote_id))
                 voter_guide_on_stage_id = voter_guide_on_stage.id
                 status = "VOTER_GUIDE_FOUND_WITH_ORGANIZATION_WE_VOTE_ID_AND_TIME_SPAN"
             elif positive_value_exists(public_figure_we_vote_id) and positive_value_exists(google_civic_election_id):
                 status = "ERROR_RETRIEVING_VOTER_GUIDE_WITH_PUBLIC_FIGURE_WE_VOTE_ID"  # Set this in case the get fails
-                voter_guide_on_stage = VoterGuide.objects.get(google_civic_election_id=google_civic_election_id,
-                                                              public_figure_we_vote_id__iexact=public_figure_we_vote_id)
+                voter_guide_on_stage = VoterGuide.objects.get(
+                    google_civic_election_id=google_civic_election_id,
+                    public_figure_we_vote_id=canonicalize_we_vote_id(public_figure_we_vote_id))
                 voter_guide_on_stage_id = voter_guide_on_stage.id
                 status = "VOTER_GUIDE_FOUND_WITH_PUBLIC_FIGURE_WE_VOTE_ID"
             elif positive_value_exists(owner_we_vote_id) and positive_value_exists(google_civic_election_id):
                 status = "ERROR_RETRIEVING_VOTER_GUIDE_WITH_VOTER_WE_VOTE_ID"  # Set this in case the get fails
-                voter_guide_on_stage = VoterGuide.objects.get(google_civic_election_id=google_civic_election_id,
-                                                              owner_we_vote_id__iexact=owner_we_vote_id)
+                voter_guide_on_stage = VoterGuide.objects.get(
+                    google_civic_election_id=google_civic_election_id,
+                    owner_we_vote_id=canonicalize_we_vote_id(owner_we_vote_id))
                 voter_guide_on_stage_id = voter_guide_on_stage.id
                 status = "VOTER_GUIDE_FOUND_WITH_VOTER_WE_VOTE_ID"
             else:
@@ -635,7 +641,7 @@ class VoterGuide(models.Model):
     # NOTE: We are using we_vote_id's instead of internal ids
     # The unique id of the organization. May be null if voter_guide owned by a public figure or voter instead of org.
     organization_we_vote_id = models.CharField(
-        verbose_name="organization we vote id", max_length=255, null=True, blank=True, unique=False)
+        verbose_name="organization we vote id", max_length=255, null=True, blank=True, unique=False, db_index=True)
 
     # The unique id of the public figure. May be null if voter_guide owned by org or voter instead of public figure.
     public_figure_we_vote_id = models.CharField(
@@ -643,7 +649,8 @@ class VoterGuide(models.Model):
 
     # The unique id of the public figure. May be null if voter_guide owned by org or public figure instead of voter.
     owner_we_vote_id = models.CharField(
-        verbose_name="individual voter's we vote id", max_length=255, null=True, blank=True, unique=False)
+        verbose_name="individual voter's we vote id", max_length=255, null=True, blank=True, unique=False,
+        db_index=True)
 
     # The unique id of the voter that owns this guide. May be null if voter_guide owned by an org
     # or public figure instead of by a voter.
@@ -753,6 +760,7 @@ class VoterGuide(models.Model):
             self.we_vote_id = self.we_vote_id.strip().lower()
         if self.we_vote_id == "" or self.we_vote_id is None:  # If there isn't a value...
             self.generate_new_we_vote_id()
+        canonicalize_we_vote_id_fields(self)
         super(VoterGuide, self).save(*args, **kwargs)
 
     def generate_new_we_vote_id(self):
@@ -906,13 +914,13 @@ class VoterGuideListManager(models.Model):
             voter_guide_queryset = VoterGuide.objects.all()
             if positive_value_exists(organization_we_vote_id):
                 voter_guide_queryset = voter_guide_queryset.filter(
-                    organization_we_vote_id__iexact=organization_we_vote_id)
+                    organization_we_vote_id=canonicalize_we_vote_id(organization_we_vote_id))
             elif positive_value_exists(owner_voter_id):
                 voter_guide_queryset = voter_guide_queryset.filter(
                     owner_voter_id=owner_voter_id)
             elif positive_value_exists(owner_voter_we_vote_id):
                 voter_guide_queryset = voter_guide_queryset.filter(
-                    owner_voter_we_vote_id__iexact=owner_voter_we_vote_id)
+                    owner_voter_we_vote_id=canonicalize_we_vote_id(owner_voter_we_vote_id))
             voter_guide_list = voter_guide_queryset
 
             if len(voter_guide_list):
@@ -1013,7 +1021,7 @@ class VoterGuideListManager(models.Model):
             filter_list = Q()
             for item in orgs_we_need_found_by_position_and_time_span_list_of_dicts:
                 filter_list |= Q(vote_smart_time_span=item['vote_smart_time_span'],
-                                 organization_we_vote_id__iexact=item['organization_we_vote_id'])
+                                 organization_we_vote_id=canonicalize_we_vote_id(item['organization_we_vote_id']))
             voter_guide_queryset = voter_guide_queryset.filter(filter_list)
 
             if search_string:
@@ -1208,15 +1216,16 @@ class VoterGuideListManager(models.Model):
 
             # Ignore entries with we_vote_id coming in from master server
             if positive_value_exists(we_vote_id_from_master):
-                voter_guide_queryset = voter_guide_queryset.filter(~Q(we_vote_id__iexact=we_vote_id_from_master))
+                voter_guide_queryset = voter_guide_queryset.filter(
+                    ~Q(we_vote_id=canonicalize_we_vote_id(we_vote_id_from_master)))
 
             # We want to find candidates with *any* of these values
             if positive_value_exists(organization_we_vote_id):
-                new_filter = Q(organization_we_vote_id__iexact=organization_we_vote_id)
+                new_filter = Q(organization_we_vote_id=canonicalize_we_vote_id(organization_we_vote_id))
                 filters.append(new_filter)
 
             if positive_value_exists(public_figure_we_vote_id):
-                new_filter = Q(public_figure_we_vote_id__iexact=public_figure_we_vote_id)
+                new_filter = Q(public_figure_we_vote_id=canonicalize_we_vote_id(public_figure_we_vote_id))
                 filters.append(new_filter)
 
             if positive_value_exists(twitter_handle):
@@ -1262,6 +1271,66 @@ class VoterGuideListManager(models.Model):
         }
         return results
 
+    def fetch_possible_duplicate_voter_guides_scope(self, google_civic_election_id, vote_smart_time_span):
+        """
+        Which voter guides retrieve_possible_duplicate_voter_guides looks through: one election, one
+        vote_smart_time_span, or all of them
+        """
+        if positive_value_exists(google_civic_election_id):
+            return 'google_civic_election_id', str(google_civic_election_id)
+        elif positive_value_exists(vote_smart_time_span):
+            return 'vote_smart_time_span', fetch_duplicate_index_value(vote_smart_time_span)
+        return 'all',
+
+    def retrieve_possible_duplicate_voter_guides_index(self, google_civic_election_id, vote_smart_time_span):
+        """
+        Load the voter guides in one scope (see fetch_possible_duplicate_voter_guides_scope) into a
+        LocalDuplicateIndex, so is_possible_duplicate_voter_guide can do the retrieve_possible_duplicate_voter_guides
+        check without a query per voter guide
+        :param google_civic_election_id:
+        :param vote_smart_time_span:
+        :return:
+        """
+        duplicate_index = LocalDuplicateIndex()
+        try:
+            voter_guide_queryset = VoterGuide.objects.all()
+            if positive_value_exists(google_civic_election_id):
+                voter_guide_queryset = voter_guide_queryset.filter(google_civic_election_id=google_civic_election_id)
+            elif positive_value_exists(vote_smart_time_span):
+                voter_guide_queryset = voter_guide_queryset.filter(vote_smart_time_span__iexact=vote_smart_time_span)
+            for we_vote_id, organization_we_vote_id, public_figure_we_vote_id, twitter_handle in \
+                    voter_guide_queryset.values_list('we_vote_id', 'organization_we_vote_id',
+                                                     'public_figure_we_vote_id', 'twitter_handle').iterator():
+                duplicate_index.add_entry([
+                    ('organization_we_vote_id', fetch_duplicate_index_value(organization_we_vote_id, False)),
+                    ('public_figure_we_vote_id', fetch_duplicate_index_value(public_figure_we_vote_id, False)),
+                    ('twitter_handle', fetch_duplicate_index_value(twitter_handle)),
+                ], we_vote_id)
+        except Exception as e:
+            handle_exception(e, logger=logger,
+                             exception_message="retrieve_possible_duplicate_voter_guides_index failed")
+        return duplicate_index
+
+    def is_possible_duplicate_voter_guide(self, duplicate_index, organization_we_vote_id, public_figure_we_vote_id,
+                                          twitter_handle, we_vote_id_from_master=''):
+        """
+        The same test as retrieve_possible_duplicate_voter_guides, against an index from
+        retrieve_possible_duplicate_voter_guides_index
+        """
+        key_list = []
+        if positive_value_exists(organization_we_vote_id):
+            key_list.append(('organization_we_vote_id', canonicalize_we_vote_id(organization_we_vote_id)))
+        if positive_value_exists(public_figure_we_vote_id):
+            key_list.append(('public_figure_we_vote_id', canonicalize_we_vote_id(public_figure_we_vote_id)))
+        if positive_value_exists(twitter_handle):
+            key_list.append(('twitter_handle', fetch_duplicate_index_value(twitter_handle)))
+        if not len(key_list):
+            key_list.append(LocalDuplicateIndex.ANY_ENTRY)
+
+        identity_to_ignore = canonicalize_we_vote_id(we_vote_id_from_master) \
+            if positive_value_exists(we_vote_id_from_master) else None
+        return duplicate_index.has_duplicate(key_list, identity_to_ignore)
+
 
 class VoterGuidePossibilityManager(models.Manager):
     """
@@ -1374,7 +1443,7 @@ class VoterGuidePossibilityManager(models.Manager):
                 status = "ERROR_RETRIEVING_VOTER_GUIDE_POSSIBILITY_WITH_ORGANIZATION_WE_VOTE_ID"
                 voter_guide_possibility_on_stage = VoterGuidePossibility.objects.get(
                     google_civic_election_id=google_civic_election_id,
-                    organization_we_vote_id__iexact=organization_we_vote_id)
+                    organization_we_vote_id=canonicalize_we_vote_id(organization_we_vote_id))
                 voter_guide_possibility_on_stage_id = voter_guide_possibility_on_stage.id
                 status = "VOTER_GUIDE_POSSIBILITY_FOUND_WITH_ORGANIZATION_WE_VOTE_ID"
                 success = True
@@ -1383,7 +1452,7 @@ class VoterGuidePossibilityManager(models.Manager):
                 status = "ERROR_RETRIEVING_VOTER_GUIDE_POSSIBILITY_WITH_PUBLIC_FIGURE_WE_VOTE_ID"
                 voter_guide_possibility_on_stage = VoterGuidePossibility.objects.get(
                     google_civic_election_id=google_civic_election_id,
-                    public_figure_we_vote_id__iexact=public_figure_we_vote_id)
+                    public_figure_we_vote_id=canonicalize_we_vote_id(public_figure_we_vote_id))
                 voter_guide_possibility_on_stage_id = voter_guide_possibility_on_stage.id
                 status = "VOTER_GUIDE_POSSIBILITY_FOUND_WITH_PUBLIC_FIGURE_WE_VOTE_ID"
                 success = True
@@ -1392,7 +1461,7 @@ class VoterGuidePossibilityManager(models.Manager):
                 status = "ERROR_RETRIEVING_VOTER_GUIDE_POSSIBILITY_WITH_VOTER_WE_VOTE_ID"
                 voter_guide_possibility_on_stage = VoterGuidePossibility.objects.get(
                     google_civic_election_id=google_civic_election_id,
-                    owner_we_vote_id__iexact=owner_we_vote_id)
+                    owner_we_vote_id=canonicalize_we_vote_id(owner_we_vote_id))
                 voter_guide_possibility_on_stage_id = voter_guide_possibility_on_stage.id
                 status = "VOTER_GUIDE_POSSIBILITY_FOUND_WITH_VOTER_WE_VOTE_ID"
                 success = True
@@ -1502,3 +1571,8 @@ class VoterGuidePossibility(models.Model):
             logger.error("voter_guide.organization did not find")
             return
         return organization
+
+    # We override the save function so every we_vote_id is stored in lower case, and can be found with an exact match
+    def save(self, *args, **kwargs):
+        canonicalize_we_vote_id_fields(self)
+        super(VoterGuidePossibility, self).save(*args, **kwargs)
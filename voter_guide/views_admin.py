@@ -21,6 +21,7 @@ from position.models import PositionEntered, PositionForFriends, PositionListMan
 from voter.models import voter_has_authority
 from wevote_functions.functions import convert_to_int, extract_twitter_handle_from_text_string, positive_value_exists, \
     STATE_CODE_MAP
+from wevote_functions.master_sync import fetch_sync_out_changed_since, fetch_sync_out_watermark, sync_out_response
 from django.http import HttpResponse
 import json
 
@@ -28,9 +29,13 @@ import json
 # This page does not need to be protected.
 def voter_guides_sync_out_view(request):  # voterGuidesSyncOut
     google_civic_election_id = convert_to_int(request.GET.get('google_civic_election_id', 0))
+    changed_since = fetch_sync_out_changed_since(request)
+    sync_watermark = fetch_sync_out_watermark()
 
     try:
         voter_guide_list = VoterGuide.objects.all()
+        if changed_since is not None:
+            voter_guide_list = voter_guide_list.filter(last_updated__gte=changed_since)
         if positive_value_exists(google_civic_election_id):
             voter_guide_list = voter_guide_list.filter(google_civic_election_id=google_civic_election_id)
 
@@ -38,15 +43,13 @@ def voter_guides_sync_out_view(request):  # voterGuidesSyncOut
         # return Response(serializer.data)
         voter_guide_list = voter_guide_list.extra(
             select={'last_updated': "to_char(last_updated, 'YYYY-MM-DD HH24:MI:SS')"})
-        voter_guide_list_dict = voter_guide_list.values('we_vote_id', 'display_name', 'google_civic_election_id',
-                                                        'image_url', 'last_updated', 'organization_we_vote_id',
-                                                        'owner_we_vote_id', 'public_figure_we_vote_id',
-                                                        'twitter_description', 'twitter_followers_count',
-                                                        'twitter_handle', 'vote_smart_time_span',
-                                                        'voter_guide_owner_type')
-        if voter_guide_list_dict:
-            voter_guide_list_list_json = list(voter_guide_list_dict)
-            return HttpResponse(json.dumps(voter_guide_list_list_json), content_type='application/json')
+        response = sync_out_response(request, voter_guide_list, [
+            'we_vote_id', 'display_name', 'google_civic_election_id', 'image_url', 'last_updated',
+            'organization_we_vote_id', 'owner_we_vote_id', 'public_figure_we_vote_id', 'twitter_description',
+            'twitter_followers_count', 'twitter_handle', 'vote_smart_time_span',
+            'voter_guide_owner_type'], sync_watermark)
+        if response is not None:
+            return response
     except Exception as e:
         pass
 
@@ -0,0 +1,300 @@
+# wevote_functions/bulk_upsert.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+# Creating or updating many entries of one model at a time, for the *_import_from_structured_json importers.
+# Instead of a select and a save per entry, each batch costs one select to find the entries we already have, one
+# bulk_create for the new ones, and one UPDATE for each set of fields that changed, all in one transaction.
+# bulk_create and update() skip save() and the model signals. So here we put every *we_vote_id field in canonical
+# form and set auto_now fields. Instead of a pre_save and post_save for each entry, we send post_bulk_upsert once for
+# each batch we write, so a receiver can do its work for the whole batch at once (like clearing a cache once for each
+# election in the batch). Anything else a model does in save() is up to the importer.
+
+from collections import OrderedDict
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, Value, When
+from django.dispatch import Signal
+from django.utils import timezone
+from exception.models import handle_record_not_saved_exception
+import wevote_functions.admin
+from wevote_functions.functions import canonicalize_we_vote_id, convert_to_int
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+BULK_UPSERT_BATCH_SIZE = 500
+
+# Sent once for each batch written. created_entry_list and updated_entry_list hold the entries as they are now.
+#  previous_values_by_pk holds, for each updated entry, the values its changed fields had before the update.
+post_bulk_upsert = Signal(providing_args=['created_entry_list', 'updated_entry_list', 'previous_values_by_pk',
+                                          'using'])
+
+
+def fetch_bulk_upsert_field_value(field, value):
+    """
+    The value as it will come back from the database, so we can tell whether an existing entry has changed
+    :param field:
+    :param value:
+    :return:
+    """
+    value = field.to_python(value)
+    if field.name.endswith('we_vote_id'):
+        value = canonicalize_we_vote_id(value)
+    return value
+
+
+def fetch_bulk_upsert_key(model_instance, key_field_list):
+    return tuple(fetch_bulk_upsert_field_value(field, getattr(model_instance, field.attname))
+                 for field in key_field_list)
+
+
+def fetch_bulk_upsert_google_civic_election_id_set(created_entry_list, updated_entry_list, previous_values_by_pk):
+    """
+    For post_bulk_upsert receivers: the elections the entries of a batch are in now, and the elections the updated
+    entries were moved out of
+    :param created_entry_list:
+    :param updated_entry_list:
+    :param previous_values_by_pk:
+    :return:
+    """
+    google_civic_election_id_set = set()
+    for entry in created_entry_list + updated_entry_list:
+        google_civic_election_id_set.add(convert_to_int(entry.google_civic_election_id))
+        previous_values = previous_values_by_pk.get(entry.pk, {})
+        if 'google_civic_election_id' in previous_values:
+            google_civic_election_id_set.add(convert_to_int(previous_values['google_civic_election_id']))
+    google_civic_election_id_set.discard(0)
+    return google_civic_election_id_set
+
+
+def bulk_upsert(model, entry_values_list, key_field_names=('we_vote_id',), create_only_field_names=(),
+                batch_size=BULK_UPSERT_BATCH_SIZE, using=None):
+    """
+    Create or update entries of model, batch_size at a time. An entry already in the database is one with the same
+    values in key_field_names. Existing entries that haven't changed aren't written.
+    If writing a batch fails (an entry breaks a unique constraint, for example), we write that batch again one entry
+    at a time, so only the bad entries are lost.
+    :param model:
+    :param entry_values_list: a dict of field name -> value for each entry. A field that is left out keeps its current
+     value (or gets its default, in a new entry). If the same key is in the list twice, the later values win.
+    :param key_field_names:
+    :param create_only_field_names: fields we only set in new entries, like the defaults of a get_or_create
+    :param batch_size:
+    :param using: the database to write to, for models that live in one like 'analytics'
+    :return: saved and updated count the entries like update_or_create would. unchanged is how many of the updated
+     entries didn't need to be written. not_processed_keys lists the entries we couldn't write.
+    """
+    key_field_list = [model._meta.get_field(field_name) for field_name in key_field_names]
+    bulk_upsert_results = {
+        'success':              True,
+        'status':               "",
+        'saved':                0,
+        'updated':              0,
+        'unchanged':            0,
+        'not_processed':        0,
+        'not_processed_keys':   [],
+    }
+    for batch_start in range(0, len(entry_values_list), batch_size):
+        batch_results = bulk_upsert_batch(model, entry_values_list[batch_start:batch_start + batch_size],
+                                          key_field_list, create_only_field_names, using)
+        for count_name in ('saved', 'updated', 'unchanged', 'not_processed'):
+            bulk_upsert_results[count_name] += batch_results[count_name]
+        bulk_upsert_results['not_processed_keys'] += batch_results['not_processed_keys']
+        if batch_results['status'] not in bulk_upsert_results['status']:
+            bulk_upsert_results['status'] += batch_results['status']
+    return bulk_upsert_results
+
+
+def bulk_upsert_batch(model, entry_values_batch, key_field_list, create_only_field_names=(), using=None):
+    saved = 0
+    updated = 0
+    unchanged = 0
+    not_processed = 0
+    not_processed_keys = []
+    status = ""
+    auto_now_field_list = [field for field in model._meta.concrete_fields if getattr(field, 'auto_now', False)]
+    auto_now_field_names = [field.name for field in auto_now_field_list]
+
+    # key -> values for that entry, in the form the database will give them back
+    values_by_key = OrderedDict()
+    for entry_values in entry_values_batch:
+        try:
+            values = {}
+            for field_name, value in entry_values.items():
+                if field_name in auto_now_field_names:
+                    # save() would replace it with the current time anyway
+                    continue
+                values[field_name] = fetch_bulk_upsert_field_value(model._meta.get_field(field_name), value)
+            key = tuple(values[field.name] for field in key_field_list)
+        except (KeyError, ValidationError) as e:
+            status += "BULK_UPSERT_VALUE_NOT_VALID {error} ".format(error=e)
+            not_processed += 1
+            continue
+        if any(key_value is None or key_value == '' for key_value in key):
+            not_processed += 1
+            continue
+        if key in values_by_key:
+            # Like a second update_or_create with the same key
+            values_by_key[key].update(values)
+            updated += 1
+        else:
+            values_by_key[key] = values
+
+    if not values_by_key:
+        return {
+            'status':               status,
+            'saved':                saved,
+            'updated':              updated,
+            'unchanged':            unchanged,
+            'not_processed':        not_processed,
+            'not_processed_keys':   not_processed_keys,
+        }
+
+    # One query finds every existing entry in this batch. It can return a few entries we don't want (when there is
+    #  more than one key field), which we skip over.
+    existing_entries_by_key = {}
+    keys_found_more_than_once = set()
+    existing_filters = {}
+    for field_index, field in enumerate(key_field_list):
+        existing_filters[field.name + '__in'] = list(set(key[field_index] for key in values_by_key))
+    for existing_entry in model.objects.using(using).filter(**existing_filters):
+        existing_key = fetch_bulk_upsert_key(existing_entry, key_field_list)
+        if existing_key in existing_entries_by_key:
+            keys_found_more_than_once.add(existing_key)
+        existing_entries_by_key[existing_key] = existing_entry
+
+    entries_to_create = []
+    entries_to_update = []  # (entry, names of the fields that changed)
+    previous_values_by_pk = {}
+    for key, values in values_by_key.items():
+        if key in keys_found_more_than_once:
+            # update_or_create would raise MultipleObjectsReturned
+            if "BULK_UPSERT_MULTIPLE_ENTRIES_FOUND " not in status:
+                status += "BULK_UPSERT_MULTIPLE_ENTRIES_FOUND "
+            not_processed += 1
+            not_processed_keys.append(key)
+        elif key in existing_entries_by_key:
+            existing_entry = existing_entries_by_key[key]
+            changed_field_names = []
+            previous_values = {}
+            for field_name, value in values.items():
+                if field_name in create_only_field_names:
+                    continue
+                field = model._meta.get_field(field_name)
+                if getattr(existing_entry, field.attname) != value:
+                    previous_values[field_name] = getattr(existing_entry, field.attname)
+                    setattr(existing_entry, field.attname, value)
+                    changed_field_names.append(field_name)
+            if changed_field_names:
+                entries_to_update.append((existing_entry, tuple(sorted(changed_field_names))))
+                previous_values_by_pk[existing_entry.pk] = previous_values
+            else:
+                unchanged += 1
+            updated += 1
+        else:
+            entries_to_create.append(model(**values))
+
+    entries_created = entries_to_create
+    entries_updated = [existing_entry for existing_entry, changed_field_names in entries_to_update]
+    try:
+        write_bulk_upsert_entries(model, entries_to_create, entries_to_update, auto_now_field_list, using)
+        saved += len(entries_to_create)
+    except Exception as e:
+        status += "BULK_UPSERT_BATCH_FAILED_SAVING_ONE_AT_A_TIME {error} [type: {error_type}] ".format(
+            error=e, error_type=type(e))
+        logger.error(status)
+        entries_created = []
+        entries_updated = []
+        for new_entry in entries_to_create:
+            try:
+                write_bulk_upsert_entries(model, [new_entry], [], auto_now_field_list, using)
+                saved += 1
+                entries_created.append(new_entry)
+            except Exception as e:
+                handle_record_not_saved_exception(e, logger=logger)
+                not_processed += 1
+                not_processed_keys.append(fetch_bulk_upsert_key(new_entry, key_field_list))
+        for existing_entry, changed_field_names in entries_to_update:
+            try:
+                write_bulk_upsert_entries(model, [], [(existing_entry, changed_field_names)], auto_now_field_list,
+                                          using)
+                entries_updated.append(existing_entry)
+            except Exception as e:
+                handle_record_not_saved_exception(e, logger=logger)
+                updated -= 1
+                not_processed += 1
+                not_processed_keys.append(fetch_bulk_upsert_key(existing_entry, key_field_list))
+
+    send_post_bulk_upsert(model, entries_created, entries_updated, previous_values_by_pk, key_field_list, using)
+
+    return {
+        'status':               status,
+        'saved':                saved,
+        'updated':              updated,
+        'unchanged':            unchanged,
+        'not_processed':        not_processed,
+        'not_processed_keys':   not_processed_keys,
+    }
+
+
+def write_bulk_upsert_entries(model, entries_to_create, entries_to_update, auto_now_field_list, using=None):
+    """
+    Write one batch in one transaction
+    :param model:
+    :param entries_to_create: new model instances
+    :param entries_to_update: (existing model instance with its new values set, names of the fields that changed)
+    :param auto_now_field_list:
+    :param using:
+    :return:
+    """
+    date_now = timezone.now()
+    with transaction.atomic(using=using):
+        if entries_to_create:
+            model.objects.using(using).bulk_create(entries_to_create)
+
+        # Entries with the same fields changed share one UPDATE, with a CASE per field picking each entry's value
+        entries_to_update_by_fields = OrderedDict()
+        for existing_entry, changed_field_names in entries_to_update:
+            entries_to_update_by_fields.setdefault(changed_field_names, []).append(existing_entry)
+        for changed_field_names, existing_entry_list in entries_to_update_by_fields.items():
+            update_values = {}
+            for field_name in changed_field_names:
+                field = model._meta.get_field(field_name)
+                update_values[field.attname] = Case(
+                    *[When(pk=existing_entry.pk, then=Value(getattr(existing_entry, field.attname)))
+                      for existing_entry in existing_entry_list],
+                    output_field=field)
+            for field in auto_now_field_list:
+                update_values[field.attname] = date_now
+                for existing_entry in existing_entry_list:
+                    setattr(existing_entry, field.attname, date_now)
+            model.objects.using(using).filter(pk__in=[existing_entry.pk for existing_entry in existing_entry_list])\
+                .update(**update_values)
+
+
+def send_post_bulk_upsert(model, entries_created, entries_updated, previous_values_by_pk, key_field_list,
+                          using=None):
+    """
+    Send post_bulk_upsert once for the entries written in one batch
+    :param model:
+    :param entries_created: the new entries, as we gave them to bulk_create
+    :param entries_updated: the existing entries, with their new values set
+    :param previous_values_by_pk:
+    :param key_field_list:
+    :param using:
+    :return:
+    """
+    if not (entries_created or entries_updated) or not post_bulk_upsert.has_listeners(model):
+        return
+
+    created_entry_list = []
+    if entries_created:
+        # bulk_create doesn't give us the new ids, so we read the new entries back
+        created_keys = set(fetch_bulk_upsert_key(new_entry, key_field_list) for new_entry in entries_created)
+        created_filters = {}
+        for field_index, field in enumerate(key_field_list):
+            created_filters[field.name + '__in'] = list(set(key[field_index] for key in created_keys))
+        created_entry_list = [created_entry for created_entry in model.objects.using(using).filter(**created_filters)
+                              if fetch_bulk_upsert_key(created_entry, key_field_list) in created_keys]
+    post_bulk_upsert.send(sender=model, created_entry_list=created_entry_list, updated_entry_list=entries_updated,
+                          previous_values_by_pk=previous_values_by_pk, using=using)
@@ -10,9 +10,6 @@ import string
 import sys
 import types
 import wevote_functions.admin
-import json
-import requests
-from django.contrib import messages
 
 
 logger = wevote_functions.admin.get_logger(__name__)
@@ -145,6 +142,84 @@ def convert_to_int(value):
     return new_value
 
 
+# We store every we_vote_id in lower case, so lookups can be exact matches (or IN lists) that use the index,
+# instead of __iexact, which compiles to UPPER(column) = UPPER(value) and scans the table
+def canonicalize_we_vote_id(we_vote_id):
+    if isinstance(we_vote_id, str):
+        return we_vote_id.strip().lower()
+    return we_vote_id
+
+
+def canonicalize_we_vote_id_list(we_vote_id_list):
+    return [canonicalize_we_vote_id(one_we_vote_id) for one_we_vote_id in we_vote_id_list
+            if positive_value_exists(one_we_vote_id)]
+
+
+def canonicalize_we_vote_id_fields(model_instance):
+    """
+    Called from save() so every field ending in "we_vote_id" is stored in canonical form
+    :param model_instance:
+    :return:
+    """
+    for field in model_instance._meta.fields:
+        if field.name.endswith('we_vote_id'):
+            setattr(model_instance, field.attname, canonicalize_we_vote_id(getattr(model_instance, field.attname)))
+
+
+def fetch_duplicate_index_value(value, case_insensitive=True):
+    """
+    The form of a value we use in a LocalDuplicateIndex key. case_insensitive matches a Django __iexact lookup,
+    otherwise we match like an exact lookup. Numbers and strings compare equal, since the master server's json
+    might give us either.
+    :param value:
+    :param case_insensitive:
+    :return:
+    """
+    if value is None:
+        return None
+    value = str(value)
+    return value.lower() if case_insensitive else value
+
+
+class LocalDuplicateIndex(object):
+    """
+    Used by the filter_*_structured_json_for_local_duplicates functions so they can check each incoming entry with
+    a few dict lookups, instead of one retrieve_possible_duplicate_* query per entry. We load the local entries
+    once, and file each one under every key (a tuple of identifying values) it could be matched on.
+    For each key we keep at most two distinct identities (normally the we_vote_id), which is all we need to answer
+    "is there a local entry with this key, other than the incoming entry itself?"
+    """
+    # Every local entry is filed under this key, for when an incoming entry has none of the identifying values
+    ANY_ENTRY = ('any_entry',)
+
+    def __init__(self):
+        self.identities_by_key = {}
+        self.entries_indexed = 0
+
+    def add_entry(self, key_list, identity):
+        self.entries_indexed += 1
+        for key in list(key_list) + [self.ANY_ENTRY]:
+            identities = self.identities_by_key.get(key)
+            if identities is None:
+                self.identities_by_key[key] = [identity]
+            elif len(identities) < 2 and identity not in identities:
+                identities.append(identity)
+
+    def has_duplicate(self, key_list, identity_to_ignore=None):
+        """
+        :param key_list: the keys to look under. An entry matching any one of them is a duplicate.
+        :param identity_to_ignore: entries with this identity don't count. None means every entry counts.
+        :return:
+        """
+        for key in key_list:
+            identities = self.identities_by_key.get(key)
+            if not identities:
+                continue
+            if identity_to_ignore is None or len(identities) > 1 or identities[0] != identity_to_ignore:
+                return True
+        return False
+
+
 # This is how we make sure a variable is a string
 def convert_to_str(value):
     try:
@@ -633,41 +708,3 @@ def convert_state_code_to_state_text(incoming_state_code):
             return state_name
     else:
         return ""
-
-
-def process_request_from_master(request, message_text, get_url, get_params):
-    """
-
-    :param request:
-    :param message_text:
-    :param get_url:
-    :param get_params:
-    :return: structured_json and import_results
-    """
-    if 'google_civic_election_id' in get_params:
-        message_text += " for google_civic_election_id " + str(get_params['google_civic_election_id'])
-    messages.add_message(request, messages.INFO, message_text)
-    logger.info(message_text)
-    print(message_text)  # Please don't remove this line
-
-    response = requests.get(get_url, params=get_params)
-
-    structured_json = json.loads(response.text)
-    if 'success' in structured_json and not structured_json['success']:
-        import_results = {
-            'success': False,
-            'status': "Error: " + structured_json['status'],
-        }
-    else:
-        import_results = {
-            'success': True,
-            'status': "",
-        }
-
-    if 'google_civic_election_id' in get_params:
-        print("... the master server returned " + str(len(structured_json)) + " items.  Election " +
-              str(get_params['google_civic_election_id']))  # Please don't remove this line
-    else:
-        print("... the master server returned " + str(len(structured_json)) + " items.") # Please don't remove this line
-
-    return import_results, structured_json
@@ -0,0 +1,370 @@
+# wevote_functions/master_sync.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+# Moving data from the master We Vote server to developer and replica servers.
+# The client side reads each *SyncOut export as it arrives and hands it to the importer MASTER_SYNC_CHUNK_SIZE
+# entries at a time, so the size of an export doesn't decide how much memory a sync needs.
+# Syncs are incremental: every *SyncOut response carries a watermark (the master's clock when the export started).
+# We save it per table, election and state, and the next time only ask for the entries changed since then.
+# The server side streams each *SyncOut export (as a json array, or one json object per line with format=ndjson),
+# reading the table SYNC_OUT_QUERY_CHUNK_SIZE entries at a time in id order. A client can also page through an export
+# with limit, passing the cursor it gets back (in the SYNC_OUT_NEXT_CURSOR_HEADER) to get the next page.
+
+import codecs
+from django.contrib import messages
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.text import compress_sequence
+import json
+import requests
+import wevote_functions.admin
+from wevote_functions.functions import convert_to_int, positive_value_exists
+from wevote_settings.models import WeVoteSettingsManager
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+MASTER_SYNC_CHUNK_SIZE = 1000
+MASTER_SYNC_READ_SIZE = 64 * 1024  # Bytes we read from the master server at a time
+MASTER_SYNC_TIMEOUT_SECONDS = 120
+MASTER_SYNC_WATERMARK_SETTING_PREFIX = "master_sync_watermark_"
+SYNC_OUT_CHANGED_SINCE = 'changed_since'
+SYNC_OUT_CURSOR = 'cursor'
+SYNC_OUT_FORMAT = 'format'
+SYNC_OUT_LIMIT = 'limit'
+SYNC_OUT_NDJSON = 'ndjson'
+SYNC_OUT_NEXT_CURSOR_HEADER = 'X-We-Vote-Sync-Next-Cursor'
+SYNC_OUT_QUERY_CHUNK_SIZE = 1000
+SYNC_OUT_WATERMARK_HEADER = 'X-We-Vote-Sync-Watermark'
+
+
+def iterate_json_array_items(text_chunk_iterator):
+    """
+    Decode a json array one item at a time, as its text arrives, so neither the whole text nor the whole array is
+    held in memory. If the text holds a single value that isn't an array (which is how the *SyncOut views report an
+    error), that value is the only item.
+    :param text_chunk_iterator: the json text, in pieces
+    :return: a generator of the items
+    """
+    decoder = json.JSONDecoder()
+    text_chunks = iter(text_chunk_iterator)
+    buffer = ''
+    end_of_text = False
+    array_started = False
+    while True:
+        buffer = buffer.lstrip()
+        if not buffer:
+            if end_of_text:
+                if array_started:
+                    raise ValueError("The json array was never closed")
+                return
+            next_text = next(text_chunks, None)
+            if next_text is None:
+                end_of_text = True
+            else:
+                buffer = next_text
+            continue
+
+        if not array_started:
+            if buffer[0] != '[':
+                yield json.loads(buffer + ''.join(text_chunks))
+                return
+            array_started = True
+            buffer = buffer[1:]
+            continue
+
+        if buffer[0] == ']':
+            return
+        if buffer[0] == ',':
+            buffer = buffer[1:]
+            continue
+
+        try:
+            item, item_end = decoder.raw_decode(buffer)
+            # Until we see the "," or "]" after it, a number might still be missing some digits
+            text_after_item = buffer[item_end:].lstrip()
+            item_complete = text_after_item[:1] in (',', ']') or (end_of_text and not text_after_item)
+            if end_of_text and not item_complete:
+                raise ValueError("Expected ',' or ']' after an item in the json array")
+        except ValueError:
+            if end_of_text:
+                raise
+            item, item_end = None, 0
+            item_complete = False
+        if not item_complete:
+            next_text = next(text_chunks, None)
+            if next_text is None:
+                end_of_text = True
+            else:
+                buffer += next_text
+            continue
+
+        yield item
+        buffer = buffer[item_end:]
+
+
+def iterate_response_text(response, read_size=MASTER_SYNC_READ_SIZE):
+    """
+    The text of a streamed requests response, in pieces. The *SyncOut views don't name a charset, so we default to
+    utf-8 like json does.
+    """
+    text_decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')()
+    for content in response.iter_content(chunk_size=read_size):
+        text = text_decoder.decode(content)
+        if text:
+            yield text
+    text = text_decoder.decode(b'', final=True)
+    if text:
+        yield text
+
+
+def merge_import_results(import_results, chunk_import_results):
+    """
+    Add the results of importing one chunk to the results so far. Counts are added together, success stays True
+    only if every chunk succeeded, and each different status is kept.
+    :param import_results:
+    :param chunk_import_results:
+    :return:
+    """
+    if not import_results:
+        return dict(chunk_import_results)
+
+    merged_results = dict(import_results)
+    for key, value in chunk_import_results.items():
+        if key == 'success':
+            merged_results['success'] = merged_results.get('success', True) and value
+        elif key == 'status':
+            if positive_value_exists(value) and value not in merged_results.get('status', ''):
+                merged_results['status'] = (merged_results.get('status', '') + " " + value).strip()
+        elif isinstance(value, int) and not isinstance(value, bool) \
+                and isinstance(merged_results.get(key), int):
+            merged_results[key] += value
+        else:
+            merged_results[key] = value
+    return merged_results
+
+
+def fetch_master_sync_watermark_setting_name(sync_table_name, get_params):
+    """
+    We keep a separate watermark for each table and each combination of election and state we sync
+    :param sync_table_name:
+    :param get_params: the parameters we send to the *SyncOut view
+    :return:
+    """
+    setting_name = MASTER_SYNC_WATERMARK_SETTING_PREFIX + sync_table_name
+    for param_name in sorted(get_params):
+        if param_name in ('key', 'format', SYNC_OUT_CHANGED_SINCE) or \
+                not positive_value_exists(get_params[param_name]):
+            continue
+        setting_name += "_{param_name}_{value}".format(param_name=param_name, value=get_params[param_name])
+    return setting_name.lower()[:255]
+
+
+def import_from_master_server_in_chunks(request, message_text, get_url, get_params, import_chunk_function,
+                                        sync_table_name=''):
+    """
+    Stream one *SyncOut export from the master server into import_chunk_function, MASTER_SYNC_CHUNK_SIZE entries
+    at a time.
+    :param request: add full_sync=1 to the request to ignore the saved watermark
+    :param message_text:
+    :param get_url:
+    :param get_params:
+    :param import_chunk_function: takes a list of entries, and returns import results (success, status and counts)
+    :param sync_table_name: when given, we only ask for entries changed since our last sync of this table (with the
+     same election and state), and save the new watermark when the import succeeds
+    :return: import results, with the counts from every chunk added together
+    """
+    get_params = dict(get_params)
+    watermark_setting_name = ''
+    we_vote_settings_manager = WeVoteSettingsManager()
+    if positive_value_exists(sync_table_name):
+        watermark_setting_name = fetch_master_sync_watermark_setting_name(sync_table_name, get_params)
+        full_sync = request is not None and positive_value_exists(request.GET.get('full_sync', False))
+        if not full_sync:
+            changed_since = we_vote_settings_manager.fetch_setting(watermark_setting_name)
+            if positive_value_exists(changed_since):
+                get_params[SYNC_OUT_CHANGED_SINCE] = changed_since
+
+    if 'google_civic_election_id' in get_params:
+        message_text += " for google_civic_election_id " + str(get_params['google_civic_election_id'])
+    if SYNC_OUT_CHANGED_SINCE in get_params:
+        message_text += " (changed since " + get_params[SYNC_OUT_CHANGED_SINCE] + ")"
+    messages.add_message(request, messages.INFO, message_text)
+    logger.info(message_text)
+    print(message_text)  # Please don't remove this line
+
+    import_results = {}
+    entries_received = 0
+    sync_watermark = ''
+    response = None
+    try:
+        response = requests.get(get_url, params=get_params, stream=True, timeout=MASTER_SYNC_TIMEOUT_SECONDS)
+        sync_watermark = response.headers.get(SYNC_OUT_WATERMARK_HEADER, '')
+        entry_chunk = []
+        for one_entry in iterate_json_array_items(iterate_response_text(response)):
+            if not entries_received and isinstance(one_entry, dict) and 'success' in one_entry \
+                    and not one_entry['success']:
+                return {
+                    'success':  False,
+                    'status':   "Error: " + str(one_entry.get('status', '')),
+                }
+            entries_received += 1
+            entry_chunk.append(one_entry)
+            if len(entry_chunk) >= MASTER_SYNC_CHUNK_SIZE:
+                import_results = merge_import_results(import_results, import_chunk_function(entry_chunk))
+                entry_chunk = []
+        if entry_chunk or not entries_received:
+            import_results = merge_import_results(import_results, import_chunk_function(entry_chunk))
+    except (requests.RequestException, ValueError) as e:
+        # Whatever was imported before this stays imported. We don't move the watermark, so the next sync asks for
+        # those entries again.
+        import_results = merge_import_results(import_results, {
+            'success':  False,
+            'status':   "FAILED_TO_GET_JSON_FROM_MASTER_SERVER {error} [type: {error_type}]".format(
+                error=e, error_type=type(e)),
+        })
+        return import_results
+    finally:
+        if response is not None:
+            response.close()
+
+    if 'google_civic_election_id' in get_params:
+        print("... the master server returned " + str(entries_received) + " items.  Election " +
+              str(get_params['google_civic_election_id']))  # Please don't remove this line
+    else:
+        print("... the master server returned " + str(entries_received) + " items.")  # Please don't remove this line
+
+    # If any entry couldn't be imported (for example a candidate whose office hasn't been synced yet), we keep the
+    # old watermark so that entry is sent again next time
+    if positive_value_exists(watermark_setting_name) and positive_value_exists(sync_watermark) \
+            and import_results.get('success') and not positive_value_exists(import_results.get('not_processed')):
+        we_vote_settings_manager.save_setting(watermark_setting_name, sync_watermark)
+    return import_results
+
+
+def fetch_sync_out_changed_since(request):
+    """
+    For the *SyncOut views
+    :param request:
+    :return: the changed_since datetime the client sent, or None if it wants everything
+    """
+    try:
+        return parse_datetime(request.GET.get(SYNC_OUT_CHANGED_SINCE, '') or '')
+    except ValueError:
+        return None
+
+
+def fetch_sync_out_watermark():
+    """
+    Take this before querying for an export. The client sends it back as changed_since on its next sync, so anything
+    saved while we are exporting goes out again next time rather than being missed.
+    """
+    return timezone.now().isoformat()
+
+
+def iterate_sync_out_entries(queryset, field_name_list, last_id=0, maximum_id=None):
+    """
+    The values of each entry in queryset, in id order. We read SYNC_OUT_QUERY_CHUNK_SIZE entries per query, each
+    query starting after the last id of the one before, so neither we nor the database driver hold the whole export.
+    :param queryset:
+    :param field_name_list:
+    :param last_id: start after this id
+    :param maximum_id: stop after this id
+    :return: a generator of dicts, like values() gives
+    """
+    include_id = 'id' in field_name_list
+    value_field_name_list = list(field_name_list) if include_id else ['id'] + list(field_name_list)
+    queryset = queryset.order_by('id')
+    if maximum_id is not None:
+        queryset = queryset.filter(id__lte=maximum_id)
+    while True:
+        entry_chunk = list(queryset.filter(id__gt=last_id).values(*value_field_name_list)[:SYNC_OUT_QUERY_CHUNK_SIZE])
+        if not entry_chunk:
+            return
+        last_id = entry_chunk[-1]['id']
+        for entry in entry_chunk:
+            if not include_id:
+                del entry['id']
+            yield entry
+        if len(entry_chunk) < SYNC_OUT_QUERY_CHUNK_SIZE:
+            return
+
+
+def iterate_sync_out_text(entry_iterator, ndjson=False):
+    """
+    The json text of an export, in pieces of up to SYNC_OUT_QUERY_CHUNK_SIZE entries
+    :param entry_iterator:
+    :param ndjson: one json object per line, instead of a json array
+    :return:
+    """
+    if not ndjson:
+        yield '['
+    text_list = []
+    first_entry = True
+    try:
+        for entry in entry_iterator:
+            entry_text = json.dumps(entry)
+            if ndjson:
+                text_list.append(entry_text + '\n')
+            else:
+                text_list.append(entry_text if first_entry else ',' + entry_text)
+            first_entry = False
+            if len(text_list) >= SYNC_OUT_QUERY_CHUNK_SIZE:
+                yield ''.join(text_list)
+                text_list = []
+    except Exception as e:
+        # The response has already started, so we can't send an error status. We leave the array unclosed instead,
+        # so the client knows the export is incomplete and keeps its old watermark.
+        logger.error("Sync out export stopped: {error}".format(error=e))
+        if text_list:
+            yield ''.join(text_list)
+        return
+    if text_list:
+        yield ''.join(text_list)
+    if not ndjson:
+        yield ']'
+
+
+def sync_out_response(request, queryset, field_name_list, sync_watermark):
+    """
+    Stream a *SyncOut export, gzipped if the client accepts it. The request can ask for format=ndjson, and for one
+    page of the export with cursor (the id to start after) and limit.
+    :param request:
+    :param queryset: the entries to export, already filtered by the view
+    :param field_name_list: the fields of each entry to send
+    :param sync_watermark: from fetch_sync_out_watermark, taken before the view built queryset
+    :return: None when a full export (not changed_since, and not a page) would be empty, so the view can report the
+     list is missing like it always has
+    """
+    last_id = convert_to_int(request.GET.get(SYNC_OUT_CURSOR, 0))
+    limit = convert_to_int(request.GET.get(SYNC_OUT_LIMIT, 0))
+    paging = SYNC_OUT_CURSOR in request.GET or positive_value_exists(limit)
+    if not paging and fetch_sync_out_changed_since(request) is None and not queryset.exists():
+        return None
+
+    maximum_id = None
+    if positive_value_exists(limit):
+        # The id of the last entry on this page. If there isn't one, this page is the end of the export.
+        last_id_on_page = list(queryset.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)
+                               [limit - 1:limit])
+        if last_id_on_page:
+            maximum_id = last_id_on_page[0]
+
+    ndjson = request.GET.get(SYNC_OUT_FORMAT, '') == SYNC_OUT_NDJSON
+    streaming_content = iterate_sync_out_text(
+        iterate_sync_out_entries(queryset, field_name_list, last_id, maximum_id), ndjson)
+    gzip_response = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+    if gzip_response:
+        streaming_content = compress_sequence(streaming_content)
+
+    response = StreamingHttpResponse(streaming_content,
+                                     content_type='application/x-ndjson' if ndjson else 'application/json')
+    if gzip_response:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    response[SYNC_OUT_WATERMARK_HEADER] = sync_watermark
+    if maximum_id is not None:
+        response[SYNC_OUT_NEXT_CURSOR_HEADER] = str(maximum_id)
+    return response
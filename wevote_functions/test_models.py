@@ -2,8 +2,14 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+from django.db.models.signals import post_save
 from django.test import TestCase
-from .functions import positive_value_exists
+from voter_guide.models import VoterGuide
+from .bulk_upsert import bulk_upsert, post_bulk_upsert
+from .functions import canonicalize_we_vote_id, canonicalize_we_vote_id_list, fetch_duplicate_index_value, \
+    LocalDuplicateIndex, positive_value_exists
+from .master_sync import iterate_json_array_items, iterate_sync_out_text, merge_import_results
+import json
 
 
 class WeVoteFunctionsTestsModels(TestCase):
@@ -74,3 +80,107 @@ class WeVoteFunctionsTestsModels(TestCase):
         value_to_test = []
         self.assertEqual(positive_value_exists(value_to_test), False,
                          "Testing value: {value_to_test}, False expected".format(value_to_test=value_to_test))
+
+    def test_canonicalize_we_vote_id(self):
+        self.assertEqual(canonicalize_we_vote_id(' WV02Voter123 '), 'wv02voter123')
+        self.assertEqual(canonicalize_we_vote_id(None), None)
+        self.assertEqual(canonicalize_we_vote_id_list(['wv02voter1', 'WV02VOTER2', '', None]),
+                         ['wv02voter1', 'wv02voter2'])
+
+    def test_local_duplicate_index(self):
+        duplicate_index = LocalDuplicateIndex()
+        duplicate_index.add_entry([('name', fetch_duplicate_index_value('Jane Doe'))], 'wv02cand1')
+        duplicate_index.add_entry([('name', fetch_duplicate_index_value('John Roe'))], 'wv02cand2')
+        duplicate_index.add_entry([('name', fetch_duplicate_index_value('John Roe'))], 'wv02cand3')
+
+        # The only match is the incoming entry itself
+        self.assertFalse(duplicate_index.has_duplicate([('name', fetch_duplicate_index_value('JANE DOE'))],
+                                                       'wv02cand1'))
+        # A local entry with a different we_vote_id
+        self.assertTrue(duplicate_index.has_duplicate([('name', fetch_duplicate_index_value('jane doe'))],
+                                                      'wv02cand9'))
+        self.assertTrue(duplicate_index.has_duplicate([('name', fetch_duplicate_index_value('John Roe'))],
+                                                      'wv02cand2'))
+        self.assertTrue(duplicate_index.has_duplicate([('name', fetch_duplicate_index_value('jane doe'))]))
+        self.assertFalse(duplicate_index.has_duplicate([('name', fetch_duplicate_index_value('Nobody'))]))
+        self.assertTrue(duplicate_index.has_duplicate([LocalDuplicateIndex.ANY_ENTRY], 'wv02cand1'))
+        self.assertFalse(LocalDuplicateIndex().has_duplicate([LocalDuplicateIndex.ANY_ENTRY]))
+        self.assertEqual(fetch_duplicate_index_value(123, False), '123')
+
+    def test_iterate_json_array_items(self):
+        entry_list = [{'we_vote_id': 'wv02cand{number}'.format(number=number), 'candidate_name': 'Jane, [Doe]'}
+                      for number in range(20)] + [-1.5e3, None, []]
+        json_text = json.dumps(entry_list, indent=1)
+        for piece_size in (1, 7, len(json_text)):
+            json_pieces = [json_text[start:start + piece_size] for start in range(0, len(json_text), piece_size)]
+            self.assertEqual(list(iterate_json_array_items(json_pieces)), entry_list)
+
+        # This is how the *SyncOut views report an error
+        self.assertEqual(list(iterate_json_array_items(['{"success": false, ', '"status": "MISSING"}'])),
+                         [{'success': False, 'status': 'MISSING'}])
+        with self.assertRaises(ValueError):
+            list(iterate_json_array_items(['[{"we_vote_id": ', '"wv02cand1"}, ']))
+
+    def test_iterate_sync_out_text(self):
+        entry_list = [{'we_vote_id': 'wv02cand{number}'.format(number=number)} for number in range(2500)]
+        self.assertEqual(list(iterate_json_array_items(iterate_sync_out_text(iter(entry_list)))), entry_list)
+        self.assertEqual(list(iterate_json_array_items(iterate_sync_out_text(iter([])))), [])
+        ndjson_text = ''.join(iterate_sync_out_text(iter(entry_list), ndjson=True))
+        self.assertEqual([json.loads(line) for line in ndjson_text.splitlines()], entry_list)
+
+    def test_merge_import_results(self):
+        import_results = merge_import_results({}, {'success': True, 'status': "DONE", 'saved': 2, 'updated': 1})
+        import_results = merge_import_results(import_results, {'success': True, 'status': "DONE", 'saved': 3,
+                                                               'updated': 0})
+        self.assertEqual(import_results, {'success': True, 'status': "DONE", 'saved': 5, 'updated': 1})
+        import_results = merge_import_results(import_results, {'success': False, 'status': "FAILED"})
+        self.assertFalse(import_results['success'])
+        self.assertEqual(import_results['status'], "DONE FAILED")
+
+    def test_bulk_upsert(self):
+        """
+        New entries are created, changed entries are updated, and unchanged entries aren't written
+        """
+        VoterGuide.objects.create(we_vote_id='wv01vg1', google_civic_election_id=4184, display_name='Old name')
+        VoterGuide.objects.create(we_vote_id='wv01vg2', google_civic_election_id=4184, display_name='Same name')
+        results = bulk_upsert(VoterGuide, [
+            {'we_vote_id': 'WV01VG1', 'google_civic_election_id': '4184', 'display_name': 'New name'},
+            {'we_vote_id': 'wv01vg2', 'google_civic_election_id': 4184, 'display_name': 'Same name'},
+            {'we_vote_id': 'wv01vg3', 'google_civic_election_id': 4184, 'display_name': 'Brand new'},
+            {'we_vote_id': '', 'display_name': 'No key'},
+        ], batch_size=2)
+        self.assertEqual((results['saved'], results['updated'], results['unchanged'], results['not_processed']),
+                         (1, 2, 1, 1))
+        self.assertEqual(list(VoterGuide.objects.order_by('we_vote_id').values_list('we_vote_id', 'display_name')),
+                         [('wv01vg1', 'New name'), ('wv01vg2', 'Same name'), ('wv01vg3', 'Brand new')])
+
+    def test_bulk_upsert_sends_one_signal_for_each_batch(self):
+        voter_guide = VoterGuide.objects.create(we_vote_id='wv01vg1', google_civic_election_id=4184,
+                                                display_name='Old name')
+        signal_list = []
+
+        def record_bulk_upsert(sender, created_entry_list, updated_entry_list, previous_values_by_pk, **kwargs):
+            signal_list.append((sorted(entry.we_vote_id for entry in created_entry_list),
+                                [entry.we_vote_id for entry in updated_entry_list], previous_values_by_pk,
+                                all(entry.pk for entry in created_entry_list)))
+
+        def record_save(sender, instance, **kwargs):
+            signal_list.append(instance.we_vote_id)
+
+        post_bulk_upsert.connect(record_bulk_upsert, sender=VoterGuide)
+        post_save.connect(record_save, sender=VoterGuide)
+        try:
+            bulk_upsert(VoterGuide, [
+                {'we_vote_id': 'wv01vg1', 'display_name': 'New name'},
+                {'we_vote_id': 'wv01vg2', 'display_name': 'Brand new'},
+                {'we_vote_id': 'wv01vg3', 'display_name': 'Brand new too'},
+                # Nothing changes in the second batch, so nothing is sent for it
+                {'we_vote_id': 'wv01vg1', 'display_name': 'New name'},
+            ], batch_size=3)
+        finally:
+            post_bulk_upsert.disconnect(record_bulk_upsert, sender=VoterGuide)
+            post_save.disconnect(record_save, sender=VoterGuide)
+
+        self.assertEqual(signal_list, [
+            (['wv01vg2', 'wv01vg3'], ['wv01vg1'], {voter_guide.pk: {'display_name': 'Old name'}}, True),
+        ])
@@ -2,16 +2,32 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
-from django.db import models
+from django.db import models, transaction
 from exception.models import handle_record_found_more_than_one_exception,\
     handle_record_not_saved_exception
 import string
+import threading
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, generate_random_string
 
 
 logger = wevote_functions.admin.get_logger(__name__)
 
+# Each server process reserves this many we_vote_id integers at a time, and hands them out from memory
+WE_VOTE_ID_INTEGER_BLOCK_SIZE = 1000
+
+# setting_name -> [next integer to hand out, last integer reserved by this process]
+_we_vote_id_integer_blocks = {}
+_we_vote_id_integer_blocks_lock = threading.Lock()
+
+
+class WeVoteIdIntegerNotReserved(Exception):
+    """
+    We couldn't reserve a we_vote_id integer. Saving an entry without a we_vote_id is better than saving it with one
+    that another entry may already have.
+    """
+    pass
+
 
 class WeVoteSetting(models.Model):
     """
@@ -137,6 +153,53 @@ class WeVoteSettingsManager(models.Model):
             we_vote_setting.string_value = setting_value
         return we_vote_setting
 
+    def reserve_integer_block(self, setting_name, block_size):
+        """
+        Atomically move an integer setting forward by block_size, so the integers between the old value (exclusive)
+        and the new value (inclusive) belong to the caller alone. The row stays locked until the transaction
+        commits, so concurrent server processes can never reserve overlapping blocks.
+        :param setting_name:
+        :param block_size:
+        :return:
+        """
+        status = ""
+        first_integer = 0
+        last_integer = 0
+        success = False
+        if not WeVoteSetting.objects.filter(name=setting_name).exists():
+            results = self.save_setting(setting_name, 0)
+            status += "INTEGER_SETTING_CREATED " if results['success'] else "INTEGER_SETTING_NOT_CREATED "
+
+        try:
+            with transaction.atomic():
+                we_vote_setting = WeVoteSetting.objects.select_for_update().get(name=setting_name)
+                if we_vote_setting.integer_value is not None:
+                    last_integer_used = convert_to_int(we_vote_setting.integer_value)
+                else:
+                    last_integer_used = convert_to_int(we_vote_setting.string_value)
+                we_vote_setting = self.set_setting_value_by_type(
+                    we_vote_setting, last_integer_used + block_size, WeVoteSetting.INTEGER)
+                we_vote_setting.value_type = WeVoteSetting.INTEGER
+                we_vote_setting.save()
+            first_integer = last_integer_used + 1
+            last_integer = last_integer_used + block_size
+            status += "INTEGER_BLOCK_RESERVED "
+            success = True
+        except WeVoteSetting.MultipleObjectsReturned as e:
+            handle_record_found_more_than_one_exception(e, logger=logger)
+            status += "INTEGER_BLOCK_NOT_RESERVED-MORE_THAN_ONE_SETTING_FOUND "
+        except Exception as e:
+            handle_record_not_saved_exception(e, logger=logger)
+            status += "INTEGER_BLOCK_NOT_RESERVED "
+
+        results = {
+            'success':          success,
+            'status':           status,
+            'first_integer':    first_integer,
+            'last_integer':     last_integer,
+        }
+        return results
+
 # site_unique_id_prefix
 # we_vote_id_last_org_integer
 # we_vote_id_last_position_integer
@@ -164,168 +227,111 @@ def fetch_site_unique_id_prefix():
     return site_unique_id_prefix
 
 
-def fetch_next_we_vote_id_ballot_returned_integer():
+def fetch_next_we_vote_id_integer_from_block(setting_name, block_size=WE_VOTE_ID_INTEGER_BLOCK_SIZE):
+    """
+    Hand out the next we_vote_id integer from the block this process has reserved, reserving a new block when the
+    current one is used up. This means one settings write per block_size new we_vote_ids instead of a read and a
+    write for every one, and no duplicates between server processes. Integers reserved by a process that stops
+    are simply never used, so we_vote_ids are unique and increasing within a process, but may have gaps.
+    Inside transaction.atomic() we reserve one integer at a time and don't keep it. If that transaction is rolled
+    back, the setting goes back to where it was, so the rest of a block kept in memory would be reserved again.
+    Rolling back the single integer is fine, since whatever used it is rolled back too.
+    :param setting_name:
+    :param block_size:
+    :return:
+    :raises WeVoteIdIntegerNotReserved:
+    """
     we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_integer = we_vote_settings_manager.fetch_setting('we_vote_id_last_ballot_returned_integer')
-    we_vote_id_last_integer = convert_to_int(we_vote_id_last_integer)
-    we_vote_id_last_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_ballot_returned_integer',
-                                          we_vote_id_last_integer)
-    return we_vote_id_last_integer
+    if transaction.get_connection().in_atomic_block:
+        results = we_vote_settings_manager.reserve_integer_block(setting_name, 1)
+        if not results['success']:
+            raise WeVoteIdIntegerNotReserved(setting_name + ": " + results['status'])
+        return results['first_integer']
+
+    with _we_vote_id_integer_blocks_lock:
+        integer_block = _we_vote_id_integer_blocks.get(setting_name)
+        if integer_block is None or integer_block[0] > integer_block[1]:
+            results = we_vote_settings_manager.reserve_integer_block(setting_name, block_size)
+            if not results['success']:
+                raise WeVoteIdIntegerNotReserved(setting_name + ": " + results['status'])
+            integer_block = [results['first_integer'], results['last_integer']]
+            _we_vote_id_integer_blocks[setting_name] = integer_block
+        next_integer = integer_block[0]
+        integer_block[0] += 1
+    return next_integer
+
+
+def clear_we_vote_id_integer_blocks():
+    """
+    Forget the blocks this process has reserved. The unused integers in them will not be handed out.
+    """
+    with _we_vote_id_integer_blocks_lock:
+        _we_vote_id_integer_blocks.clear()
+
+
+def fetch_next_we_vote_id_ballot_returned_integer():
+    return fetch_next_we_vote_id_integer_from_block('we_vote_id_last_ballot_returned_integer')
 
 
 def fetch_next_we_vote_id_org_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_org_integer = we_vote_settings_manager.fetch_setting('we_vote_id_last_org_integer')
-    we_vote_id_last_org_integer = convert_to_int(we_vote_id_last_org_integer)
-    we_vote_id_last_org_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_org_integer', we_vote_id_last_org_integer)
-    return we_vote_id_last_org_integer
+    return fetch_next_we_vote_id_integer_from_block('we_vote_id_last_org_integer')
 
 
 def fetch_next_we_vote_id_position_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_position_integer = we_vote_settings_manager.fetch_setting('we_vote_id_last_position_integer')
-    we_vote_id_last_position_integer = convert_to_int(we_vote_id_last_position_integer)
-    we_vote_id_last_position_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_position_integer', we_vote_id_last_position_integer)
-    return we_vote_id_last_position_integer
+    return fetch_next_we_vote_id_integer_from_block('we_vote_id_last_position_integer')
 
 
 def fetch_next_we_vote_id_candidate_campaign_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_candidate_campaign_integer = \
-        we_vote_settings_manager.fetch_setting('we_vote_id_last_candidate_campaign_integer')
-    we_vote_id_last_candidate_campaign_integer = convert_to_int(we_vote_id_last_candidate_campaign_integer)
-    we_vote_id_last_candidate_campaign_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_candidate_campaign_integer',
-                                          we_vote_id_last_candidate_campaign_integer)
-    return we_vote_id_last_candidate_campaign_integer
+    return fetch_next_we_vote_id_integer_from_block('we_vote_id_last_candidate_campaign_integer')
 
 
 def fetch_next_we_vote_id_contest_office_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_contest_office_integer = \
-        we_vote_settings_manager.fetch_setting('we_vote_id_last_contest_office_integer')
-    we_vote_id_last_contest_office_integer = convert_to_int(we_vote_id_last_contest_office_integer)
-    we_vote_id_last_contest_office_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_contest_office_integer',
-                                          we_vote_id_last_contest_office_integer)
-    return we_vote_id_last_contest_office_integer
+    return fetch_next_we_vote_id_integer_from_block('we_vote_id_last_contest_office_integer')
 
 
 def fetch_next_we_vote_id_elected_office_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_elected_office_integer = \
-        we_vote_settings_manager.fetch_setting('we_vote_id_last_elected_office_integer')
-    we_vote_id_last_elected_office_integer = convert_to_int(we_vote_id_last_elected_office_integer)
-    we_vote_id_last_elected_office_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_elected_office_integer',
-                                          we_vote_id_last_elected_office_integer)
-    return we_vote_id_last_elected_office_integer
+    return fetch_next_we_vote_id_integer_from_block('we_vote_id_last_elected_office_integer')
 
 
 def fetch_next_we_vote_id_contest_measure_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_contest_measure_integer = \
-        we_vote_settings_manager.fetch_setting('we_vote_id_last_contest_measure_integer')
-    we_vote_id_last_contest_measure_integer = convert_to_int(we_vote_id_last_contest_measure_integer)
-    we_vote_id_last_contest_measure_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_contest_measure_integer',
-                                          we_vote_id_last_contest_measure_integer)
-    return we_vote_id_last_contest_measure_integer
+    return fetch_next_we_vote_id_integer_from_block('we_vote_id_last_contest_measure_integer')
 
 
 def fetch_next_we_vote_id_email_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_email_integer = we_vote_settings_manager.fetch_setting('we_vote_id_last_email_integer')
-    we_vote_id_last_email_integer = convert_to_int(we_vote_id_last_email_integer)
-    we_vote_id_last_email_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_email_integer',
-                                          we_vote_id_last_email_integer)
-    return we_vote_id_last_email_integer
+    return fetch_next_we_vote_id_integer_from_block('we_vote_id_last_email_integer')
 
 
 def fetch_next_we_vote_id_issue_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_issue_integer = we_vote_settings_manager.fetch_setting('we_vote_id_last_issue_integer')
-    we_vote_id_last_issue_integer = convert_to_int(we_vote_id_last_issue_integer)
-    we_vote_id_last_issue_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_issue_integer',
-                                          we_vote_id_last_issue_integer)
-    return we_vote_id_last_issue_integer
+    return fetch_next_we_vote_id_integer_from_block('we_vote_id_last_issue_integer')
 
 
 def fetch_next_we_vote_id_measure_campaign_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_measure_campaign_integer = \
-        we_vote_settings_manager.fetch_setting('we_vote_id_last_measure_campaign_integer')
-    we_vote_id_last_measure_campaign_integer = convert_to_int(we_vote_id_last_measure_campaign_integer)
-    we_vote_id_last_measure_campaign_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_measure_campaign_integer',
-                                          we_vote_id_last_measure_campaign_integer)
-    return we_vote_id_last_measure_campaign_integer
+    return fetch_next_we_vote_id_integer_from_block('we_vote_id_last_measure_campaign_integer')
 
 
 def fetch_next_we_vote_id_politician_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_politician_integer = \
-        we_vote_settings_manager.fetch_setting('we_vote_id_last_politician_integer')
-    we_vote_id_last_politician_integer = convert_to_int(we_vote_id_last_politician_integer)
-    we_vote_id_last_politician_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_politician_integer',
-                                          we_vote_id_last_politician_integer)
-    return we_vote_id_last_politician_integer
+    return fetch_next_we_vote_id_integer_from_block('we_vote_id_last_politician_integer')
 
 
 def fetch_next_we_vote_id_polling_location_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_polling_location_integer = \
-        we_vote_settings_manager.fetch_setting('we_vote_id_last_polling_location_integer')
-    we_vote_id_last_polling_location_integer = convert_to_int(we_vote_id_last_polling_location_integer)
-    we_vote_id_last_polling_location_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_polling_location_integer',
-                                          we_vote_id_last_polling_location_integer)
-    return we_vote_id_last_polling_location_integer
+    return fetch_next_we_vote_id_integer_from_block('we_vote_id_last_polling_location_integer')
 
 
 def fetch_next_we_vote_id_quick_info_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_quick_info_integer = we_vote_settings_manager.fetch_setting('we_vote_id_last_quick_info_integer')
-    we_vote_id_last_quick_info_integer = convert_to_int(we_vote_id_last_quick_info_integer)
-    we_vote_id_last_quick_info_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_quick_info_integer', we_vote_id_last_quick_info_integer)
-    return we_vote_id_last_quick_info_integer
+    return fetch_next_we_vote_id_integer_from_block('we_vote_id_last_quick_info_integer')
 
 
 def fetch_next_we_vote_id_quick_info_master_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_quick_info_master_integer = \
-        we_vote_settings_manager.fetch_setting('we_vote_id_last_quick_info_master_integer')
-    we_vote_id_last_quick_info_master_integer = convert_to_int(we_vote_id_last_quick_info_master_integer)
-    we_vote_id_last_quick_info_master_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_quick_info_master_integer',
-                                          we_vote_id_last_quick_info_master_integer)
-    return we_vote_id_last_quick_info_master_integer
+    return fetch_next_we_vote_id_integer_from_block('we_vote_id_last_quick_info_master_integer')
 
 
 def fetch_next_we_vote_id_voter_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_voter_integer = we_vote_settings_manager.fetch_setting('we_vote_id_last_voter_integer')
-    we_vote_id_last_voter_integer = convert_to_int(we_vote_id_last_voter_integer)
-    we_vote_id_last_voter_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_voter_integer', we_vote_id_last_voter_integer)
-    return we_vote_id_last_voter_integer
+    return fetch_next_we_vote_id_integer_from_block('we_vote_id_last_voter_integer')
 
 
 # Related to voter guide
 def fetch_next_we_vote_id_voter_guide_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_voter_guide_integer = we_vote_settings_manager.fetch_setting('we_vote_id_last_voter_guide_integer')
-    we_vote_id_last_voter_guide_integer = convert_to_int(we_vote_id_last_voter_guide_integer)
-    we_vote_id_last_voter_guide_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_last_voter_guide_integer', we_vote_id_last_voter_guide_integer)
-    return we_vote_id_last_voter_guide_integer
+    return fetch_next_we_vote_id_integer_from_block('we_vote_id_last_voter_guide_integer')
 
 
 def fetch_next_we_vote_id_election_integer():
@@ -341,22 +347,8 @@ def fetch_next_we_vote_id_election_integer():
 
 
 def fetch_next_we_vote_id_electoral_district_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_electoral_district_integer = \
-        we_vote_settings_manager.fetch_setting('we_vote_id_electoral_district_integer')
-    we_vote_id_electoral_district_integer = convert_to_int(we_vote_id_electoral_district_integer)
-    we_vote_id_electoral_district_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_electoral_district_integer',
-                                          we_vote_id_electoral_district_integer)
-    return we_vote_id_electoral_district_integer
+    return fetch_next_we_vote_id_integer_from_block('we_vote_id_electoral_district_integer')
 
 
 def fetch_next_we_vote_id_party_integer():
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_party_integer = \
-        we_vote_settings_manager.fetch_setting('we_vote_id_party_integer')
-    we_vote_id_party_integer = convert_to_int(we_vote_id_party_integer)
-    we_vote_id_party_integer += 1
-    we_vote_settings_manager.save_setting('we_vote_id_party_integer',
-                                          we_vote_id_party_integer)
-    return we_vote_id_party_integer
+    return fetch_next_we_vote_id_integer_from_block('we_vote_id_party_integer')
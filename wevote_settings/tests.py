@@ -0,0 +1,103 @@
+# wevote_settings/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from wevote_settings.models import clear_we_vote_id_integer_blocks, fetch_next_we_vote_id_integer_from_block, \
+    WeVoteIdIntegerNotReserved, WeVoteSettingsManager
+
+
+class WeVoteIdIntegerBlockTestCase(TransactionTestCase):
+    """
+    Outside of a transaction, so integers are handed out from blocks kept in memory.
+    """
+
+    def setUp(self):
+        clear_we_vote_id_integer_blocks()
+
+    def tearDown(self):
+        clear_we_vote_id_integer_blocks()
+
+    def test_integers_come_from_one_reserved_block(self):
+        we_vote_settings_manager = WeVoteSettingsManager()
+        we_vote_settings_manager.save_setting('we_vote_id_test_integer', 10)
+
+        next_integers = [fetch_next_we_vote_id_integer_from_block('we_vote_id_test_integer', block_size=5)
+                         for _ in range(3)]
+
+        self.assertEqual(next_integers, [11, 12, 13])
+        # The whole block was reserved with one settings write
+        self.assertEqual(we_vote_settings_manager.fetch_setting('we_vote_id_test_integer'), 15)
+
+    def test_new_block_is_reserved_when_block_runs_out(self):
+        we_vote_settings_manager = WeVoteSettingsManager()
+
+        next_integers = [fetch_next_we_vote_id_integer_from_block('we_vote_id_test_integer', block_size=2)
+                         for _ in range(5)]
+
+        self.assertEqual(next_integers, [1, 2, 3, 4, 5])
+        self.assertEqual(we_vote_settings_manager.fetch_setting('we_vote_id_test_integer'), 6)
+
+    def test_block_reserved_by_another_process_is_skipped(self):
+        we_vote_settings_manager = WeVoteSettingsManager()
+        self.assertEqual(fetch_next_we_vote_id_integer_from_block('we_vote_id_test_integer', block_size=2), 1)
+        # Another server process reserves the next block
+        results = we_vote_settings_manager.reserve_integer_block('we_vote_id_test_integer', 2)
+        self.assertEqual((results['first_integer'], results['last_integer']), (3, 4))
+
+        self.assertEqual(fetch_next_we_vote_id_integer_from_block('we_vote_id_test_integer', block_size=2), 2)
+        self.assertEqual(fetch_next_we_vote_id_integer_from_block('we_vote_id_test_integer', block_size=2), 5)
+
+    def test_failed_reservation_raises(self):
+        failed_results = {
+            'success':          False,
+            'status':           "INTEGER_BLOCK_NOT_RESERVED ",
+            'first_integer':    0,
+            'last_integer':     0,
+        }
+        with mock.patch.object(WeVoteSettingsManager, 'reserve_integer_block', return_value=failed_results):
+            with self.assertRaises(WeVoteIdIntegerNotReserved):
+                fetch_next_we_vote_id_integer_from_block('we_vote_id_test_integer')
+
+
+class WeVoteIdIntegerInTransactionTestCase(TestCase):
+    """
+    TestCase runs each test inside transaction.atomic(), like any caller that saves inside a transaction.
+    """
+
+    def setUp(self):
+        clear_we_vote_id_integer_blocks()
+
+    def tearDown(self):
+        clear_we_vote_id_integer_blocks()
+
+    def test_integers_are_not_kept_after_rollback(self):
+        we_vote_settings_manager = WeVoteSettingsManager()
+        we_vote_settings_manager.save_setting('we_vote_id_test_integer', 10)
+
+        try:
+            with transaction.atomic():
+                self.assertEqual(fetch_next_we_vote_id_integer_from_block('we_vote_id_test_integer'), 11)
+                self.assertEqual(fetch_next_we_vote_id_integer_from_block('we_vote_id_test_integer'), 12)
+                raise IOError("Saving the entry failed")
+        except IOError:
+            pass
+
+        # Only one integer is reserved at a time, and nothing is remembered past the rollback
+        self.assertEqual(we_vote_settings_manager.fetch_setting('we_vote_id_test_integer'), 10)
+        self.assertEqual(fetch_next_we_vote_id_integer_from_block('we_vote_id_test_integer'), 11)
+        self.assertEqual(we_vote_settings_manager.fetch_setting('we_vote_id_test_integer'), 11)
+
+    def test_failed_reservation_raises(self):
+        failed_results = {
+            'success':          False,
+            'status':           "INTEGER_BLOCK_NOT_RESERVED ",
+            'first_integer':    0,
+            'last_integer':     0,
+        }
+        with mock.patch.object(WeVoteSettingsManager, 'reserve_integer_block', return_value=failed_results):
+            with self.assertRaises(WeVoteIdIntegerNotReserved):
+                fetch_next_we_vote_id_integer_from_block('we_vote_id_test_integer')